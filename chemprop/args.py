@@ -12,7 +12,8 @@ from tap import Tap  # pip install typed-argument-parser (https://github.com/swa
 import numpy as np
 
 import chemprop.data.utils
-from chemprop.data import set_cache_mol, empty_cache
+from chemprop.data import set_cache_mol, empty_cache, packed_graphs_path, set_graph_store, set_cache_graph_max_bytes, \
+    set_cache_mol_max_bytes
 from chemprop.features import get_available_features_generators
 
 
@@ -120,6 +121,32 @@ class CommonArgs(Tap):
     """
     Whether to empty all caches before training or predicting. This is necessary if multiple jobs are run within a single script and the atom or bond features change.
     """
+    cache_graph_max_mb: float = None
+    """
+    Memory budget in MB of the cache of molecular graphs. Least recently used graphs are evicted once it is exceeded.
+    By default the cache is unbounded. When set, training always caches graphs and loads data sequentially, regardless of :code:`cache_cutoff`.
+    """
+    cache_mol_max_mb: float = None
+    """
+    Memory budget in MB of the cache of RDKit molecules. Least recently used molecules are evicted once it is exceeded.
+    By default the cache is unbounded.
+    """
+    featurization_workers: int = 0
+    """
+    Number of processes used to build the datapoints when loading data, i.e. to parse the SMILES, run the
+    features generators and, with :code:`graph_store_path`, featurize the molecular graphs. 0 loads the data in the main process.
+    """
+    sparse_features: bool = False
+    """
+    Whether to keep the features of pickled sparse matrices given by :code:`features_path` sparse, so that they are
+    only made dense one batch at a time. The features cannot be scaled, i.e. :code:`no_features_scaling` is required for training.
+    """
+    graph_store_path: str = None
+    """
+    Path to a directory used as a persistent on-disk cache of molecular graph featurizations, shared across training runs, hyperparameter trials and prediction jobs.
+    Graphs are keyed by SMILES and the featurization settings. Graphs with extra atom or bond features are not stored.
+    When training on a packed dataset compiled with :code:`featurize_graphs`, defaults to the graphs of the dataset.
+    """
     constraints_path: str = None
     """
     Path to constraints applied to atomic/bond properties prediction.
@@ -238,7 +265,20 @@ class CommonArgs(Tap):
             raise NotImplementedError('Bond descriptors are currently only supported with one molecule '
                                       'per input (i.e., number_of_molecules = 1).')
 
+        if self.sparse_features and self.features_generator is not None:
+            raise ValueError('Sparse features cannot be combined with features generators.')
+
+        if self.featurization_workers < 0:
+            raise ValueError('The number of featurization workers must be non-negative.')
+
+        for cache_max_mb in (self.cache_graph_max_mb, self.cache_mol_max_mb):
+            if cache_max_mb is not None and cache_max_mb < 0:
+                raise ValueError('Cache memory budgets must be non-negative.')
+
         set_cache_mol(not self.no_cache_mol)
+        set_cache_graph_max_bytes(int(self.cache_graph_max_mb * 2 ** 20) if self.cache_graph_max_mb is not None else None)
+        set_cache_mol_max_bytes(int(self.cache_mol_max_mb * 2 ** 20) if self.cache_mol_max_mb is not None else None)
+        set_graph_store(self.graph_store_path)
 
         if self.empty_cache:
             empty_cache()
@@ -327,7 +367,7 @@ class TrainArgs(CommonArgs):
     Maximum number of molecules in dataset to allow caching.
     Below this number, caching is used and data loading is sequential.
     Above this number, caching is not used and data loading is parallel.
-    Use "inf" to always cache.
+    Use "inf" to always cache. Ignored when :code:`cache_graph_max_mb` bounds the cache.
     """
     save_preds: bool = False
     """Whether to save test split predictions during training."""
@@ -336,6 +376,37 @@ class TrainArgs(CommonArgs):
     Whether to resume the experiment.
     Loads test results from any folds that have already been completed and skips training those folds.
     """
+    train_workers: int = 0
+    """
+    Number of processes training ensemble members and cross-validation folds concurrently on the CPU.
+    Each worker trains one member of one fold at a time and the checkpoints are evaluated once all are trained.
+    0 trains the models one after another in the main process.
+    """
+    threads_per_worker: int = None
+    """
+    Number of PyTorch threads used by each training worker. Defaults to the number of CPUs divided by :code:`train_workers`.
+    """
+    distributed: bool = False
+    """
+    Whether to train each model data-parallel across processes with :code:`torch.distributed` on the gloo backend.
+    Every process trains on a shard of each epoch with a batch size of :code:`batch_size` and the gradients are averaged,
+    while validation, checkpointing and test evaluation run on rank 0 only.
+    """
+    world_size: int = None
+    """
+    Number of processes of distributed training. Defaults to the :code:`WORLD_SIZE` environment variable.
+    """
+    rank: int = None
+    """
+    Rank of this process in distributed training. Defaults to the :code:`RANK` environment variable.
+    Without a rank, :code:`chemprop_train` starts :code:`world_size` processes on this host.
+    """
+    dist_init_file: str = None
+    """
+    Path to a file on a filesystem shared by all processes, used for the rendezvous of distributed training across hosts.
+    The file must not exist before the first process starts.
+    By default, the rendezvous uses the :code:`MASTER_ADDR` and :code:`MASTER_PORT` environment variables.
+    """
 
     # Model arguments
     bias: bool = False
@@ -361,6 +432,13 @@ class TrainArgs(CommonArgs):
     """Centers messages on atoms instead of on bonds."""
     undirected: bool = False
     """Undirected edges (always sum the two relevant bond vectors)."""
+    message_aggregation: Literal['dense', 'sparse'] = 'dense'
+    """
+    How the messages of neighboring bonds are summed. :code:`dense` gathers them into a padded
+    :code:`num_atoms x max_num_bonds x hidden_size` tensor, while :code:`sparse` adds each message into its atom
+    with :code:`index_add`, which uses less memory and time when a few atoms have many more neighbors than the rest.
+    Both give the same results.
+    """
     ffn_hidden_size: int = None
     """Hidden dim for higher-capacity FFN (defaults to hidden_size)."""
     ffn_num_layers: int = 2
@@ -394,8 +472,13 @@ class TrainArgs(CommonArgs):
     """
     ensemble_size: int = 1
     """Number of models in ensemble."""
-    aggregation: Literal['mean', 'sum', 'norm'] = 'mean'
-    """Aggregation scheme for atomic vectors into molecular vectors"""
+    aggregation: Literal['mean', 'sum', 'norm', 'weighted', 'attention'] = 'mean'
+    """
+    Aggregation scheme for atomic vectors into molecular vectors.
+    :code:`weighted` sums the atomic vectors weighted by a learned sigmoid gate of each atom, and
+    :code:`attention` weights them by a learned softmax over the atoms of each molecule
+    and requires PyTorch 1.12 or later.
+    """
     aggregation_norm: int = 100
     """For norm aggregation, number by which to divide summed up atomic features"""
     reaction: bool = False
@@ -467,6 +550,16 @@ class TrainArgs(CommonArgs):
     """Maximum magnitude of gradient during training."""
     class_balance: bool = False
     """Trains with an equal number of positives and negatives in each batch."""
+    size_buckets: int = None
+    """
+    Number of buckets of molecules of similar sizes (by number of atoms) to draw the training batches from,
+    which reduces padding and evens out the cost of the training steps. Batches are shuffled within and across buckets.
+    """
+    batch_atoms: int = None
+    """
+    Target total number of atoms per training batch, used instead of :code:`batch_size` to build the training batches.
+    Without :code:`size_buckets`, the batches are drawn from a single bucket.
+    """
     spectra_activation: Literal['exp', 'softplus'] = 'exp'
     """Indicates which function to use in dataset_type spectra training to constrain outputs to be positive."""
     spectra_target_floor: float = 1e-8
@@ -502,6 +595,12 @@ class TrainArgs(CommonArgs):
     Default (False) is to use the checkpoint to freeze all encoders.
     (only relevant for number_of_molecules > 1, where checkpoint model has number_of_molecules = 1)
     """
+    cache_frozen_embeddings: bool = False
+    """
+    Whether to compute the outputs of the frozen encoder and frozen FFN layers (see :code:`checkpoint_frzn`) once per model
+    and train and validate only the remaining FFN layers on these cached, memory-mapped embeddings.
+    The embeddings are computed without dropout, so dropout only applies to the trainable FFN layers.
+    """
 
     def __init__(self, *args, **kwargs) -> None:
         super(TrainArgs, self).__init__(*args, **kwargs)
@@ -644,6 +743,10 @@ class TrainArgs(CommonArgs):
         self._bond_constraints = bond_constraints
 
     def process_args(self) -> None:
+        # Use the featurized graphs of a packed dataset unless another graph store is given
+        if self.graph_store_path is None:
+            self.graph_store_path = packed_graphs_path(self.data_path)
+
         super(TrainArgs, self).process_args()
 
         global temp_save_dir  # Prevents the temporary directory from being deleted upon function return
@@ -761,10 +864,53 @@ class TrainArgs(CommonArgs):
         if self.class_balance and self.dataset_type != 'classification':
             raise ValueError('Class balance can only be applied if the dataset type is classification.')
 
+        # Validate batching by molecule size
+        if self.size_buckets is not None and self.size_buckets <= 0:
+            raise ValueError(f'size_buckets must be positive but got {self.size_buckets}.')
+        if self.batch_atoms is not None and self.batch_atoms <= 0:
+            raise ValueError(f'batch_atoms must be positive but got {self.batch_atoms}.')
+        if self.class_balance and (self.size_buckets is not None or self.batch_atoms is not None):
+            raise ValueError('Class balance cannot be combined with size_buckets or batch_atoms.')
+
+        # Validate concurrent training
+        if self.train_workers < 0:
+            raise ValueError('The number of training workers must be non-negative.')
+        if self.threads_per_worker is not None and self.threads_per_worker <= 0:
+            raise ValueError(f'threads_per_worker must be positive but got {self.threads_per_worker}.')
+        if self.train_workers > 0 and self.cuda:
+            raise ValueError('Concurrent training with train_workers is only supported on CPU. Use --no_cuda.')
+
+        # Validate distributed training
+        if self.distributed:
+            if self.world_size is None and 'WORLD_SIZE' in os.environ:
+                self.world_size = int(os.environ['WORLD_SIZE'])
+            if self.rank is None and 'RANK' in os.environ:
+                self.rank = int(os.environ['RANK'])
+            if self.world_size is None or self.world_size <= 0:
+                raise ValueError('Distributed training requires a positive world_size, either given or from WORLD_SIZE.')
+            if self.rank is not None and not 0 <= self.rank < self.world_size:
+                raise ValueError(f'The rank must be between 0 and {self.world_size - 1} but got {self.rank}.')
+            if self.train_workers > 0:
+                raise ValueError('Distributed training cannot be combined with train_workers.')
+            if self.cuda:
+                raise ValueError('Distributed training uses the gloo backend and is only supported on CPU. Use --no_cuda.')
+
+        # Validate frozen embedding caching
+        if self.cache_frozen_embeddings:
+            if self.checkpoint_frzn is None:
+                raise ValueError('Caching frozen embeddings requires a frozen model given by checkpoint_frzn.')
+            if self.freeze_first_only and self.number_of_molecules > 1:
+                raise ValueError('Caching frozen embeddings requires all encoders to be frozen, not only the first.')
+            if self.is_atom_bond_targets:
+                raise ValueError('Caching frozen embeddings is not supported with atomic/bond targets.')
+
         # Validate features
         if self.features_only and not (self.features_generator or self.features_path):
             raise ValueError('When using features_only, a features_generator or features_path must be provided.')
 
+        if self.sparse_features and self.features_scaling:
+            raise ValueError('Sparse features cannot be scaled. Please specify --no_features_scaling.')
+
         # Handle FFN hidden size
         if self.ffn_hidden_size is None:
             self.ffn_hidden_size = self.hidden_size
@@ -773,6 +919,9 @@ class TrainArgs(CommonArgs):
         if self.atom_messages and self.undirected:
             raise ValueError('Undirected is unnecessary when using atom_messages '
                              'since atom_messages are by their nature undirected.')
+        if self.aggregation == 'attention' and version.parse(torch.__version__) < version.parse('1.12.0'):
+            raise ValueError('Attention aggregation uses Tensor.scatter_reduce, which requires PyTorch 1.12 or later. '
+                             'Use another --aggregation, or upgrade PyTorch.')
 
         # Validate split type settings
         if not (self.split_type == 'predetermined') == (self.folds_file is not None) == (self.test_fold_index is not None):
@@ -911,6 +1060,43 @@ class PredictArgs(CommonArgs):
     """Deprecated. Whether to calculate the variance of ensembles as a measure of epistemic uncertainty. If True, the variance is saved as an additional column for each target in the preds_path."""
     individual_ensemble_predictions: bool = False
     """Whether to return the predictions made by each of the individual models rather than the average of the ensemble"""
+    ensemble_execution: Literal['per_model', 'fused', 'stacked'] = 'per_model'
+    """
+    How the models of an ensemble are run.
+    :code:`per_model` loads the models one at a time and makes a pass through the data with each of them.
+    :code:`fused` loads all the models and runs each of them on every batch, so that the molecules are only
+    featurized and collated once.
+    :code:`stacked` additionally runs the models with the same architecture as a single vectorized forward pass
+    (requires PyTorch 2.0, e.g. with :code:`pip install chemprop[stacked]`).
+    """
+    chunk_size: int = None
+    """
+    Number of rows of the test file to read and predict at a time. The predictions for each chunk are appended to
+    :code:`preds_path` before the next chunk is read, so memory use does not grow with the size of the file.
+    By default, the whole file is read at once.
+    """
+    resumable: bool = False
+    """
+    Whether to commit the predictions for each chunk of :code:`chunk_size` rows to a shard file and record the progress in a
+    manifest next to :code:`preds_path`. Rerunning an interrupted job with the same arguments resumes after the last completed chunk.
+    The shards are merged into :code:`preds_path` once all chunks are done.
+    """
+    quantize: bool = False
+    """
+    Whether to apply dynamic int8 quantization to the linear layers of the models for faster inference on CPU.
+    The quantized models are cached next to the checkpoints.
+    """
+    quantize_eval_path: str = None
+    """
+    Path to a CSV file with targets on which the metrics of the quantized models are compared to those of the float models.
+    When fingerprinting, the fingerprints of the quantized models are compared to those of the float models instead,
+    so no targets are needed.
+    """
+    backend: Literal['torch', 'onnxruntime'] = 'torch'
+    """
+    The runtime making the predictions. With :code:`onnxruntime`, the models are exported to ONNX graphs,
+    cached next to the checkpoints, and run with onnxruntime on CPU.
+    """
     # Uncertainty arguments
     uncertainty_method: Literal[
         'mve',
@@ -1038,6 +1224,37 @@ class PredictArgs(CommonArgs):
                 "conformal_alpha should be in the range [0,1]"
             )
 
+        if self.ensemble_execution == 'stacked' and version.parse(torch.__version__) < version.parse('2.0.0'):
+            raise ValueError('Stacked ensemble execution uses torch.func, which requires PyTorch 2.0 or later. '
+                             'Use --ensemble_execution per_model or fused, or upgrade PyTorch.')
+
+        if self.quantize:
+            if self.cuda:
+                raise ValueError('Quantized models only run on CPU. Use --no_cuda.')
+            if self.ensemble_execution == 'stacked':
+                raise ValueError('Quantized models cannot be stacked. Use --ensemble_execution per_model or fused.')
+        if self.quantize_eval_path is not None and not self.quantize:
+            raise ValueError('The argument `--quantize_eval_path` requires `--quantize`.')
+
+        if self.backend == 'onnxruntime':
+            if self.quantize:
+                raise ValueError('Quantized models cannot be run with the onnxruntime backend.')
+            if self.ensemble_execution == 'stacked':
+                raise ValueError('ONNX models cannot be stacked. Use --ensemble_execution per_model or fused.')
+            if self.uncertainty_method == 'dropout':
+                raise ValueError('Dropout uncertainty is not supported with the onnxruntime backend.')
+
+        if self.resumable and self.chunk_size is None:
+            raise ValueError('Resumable prediction jobs require `--chunk_size`.')
+
+        if self.chunk_size is not None:
+            if self.chunk_size <= 0:
+                raise ValueError('The argument `--chunk_size` must be a positive integer.')
+            if self.evaluation_methods is not None:
+                raise ValueError('Uncertainty evaluation needs all of the predictions at once and cannot be used with `--chunk_size`.')
+            if self.atom_descriptors is not None or self.bond_descriptors is not None:
+                raise NotImplementedError('Atom and bond descriptors are not supported with `--chunk_size`.')
+
 
 class InterpretArgs(CommonArgs):
     """:class:`InterpretArgs` includes :class:`CommonArgs` along with additional arguments used for interpreting a trained Chemprop model."""
@@ -1176,6 +1393,90 @@ class HyperoptArgs(TrainArgs):
         self.search_parameters = list(search_parameters)
 
 
+class DistillArgs(TrainArgs):
+    """:class:`DistillArgs` includes :class:`TrainArgs` along with additional arguments used for distilling an ensemble into a single model.
+
+    The :code:`data_path` is an unlabeled file of SMILES, which are labeled with the predictions of the ensemble.
+    """
+
+    teacher_checkpoint_dir: str = None
+    """Directory from which to load the model checkpoints of the ensemble (walks directory and ensembles all models that are found)."""
+    teacher_checkpoint_paths: List[str] = None
+    """List of paths to the model checkpoints of the ensemble (:code:`.pt` files)."""
+
+    def process_args(self) -> None:
+        super(DistillArgs, self).process_args()
+
+        self.teacher_checkpoint_paths = get_checkpoint_paths(
+            checkpoint_paths=self.teacher_checkpoint_paths,
+            checkpoint_dir=self.teacher_checkpoint_dir,
+        )
+        if self.teacher_checkpoint_paths is None:
+            raise ValueError('Distillation requires the ensemble checkpoints, '
+                             'given by `--teacher_checkpoint_dir` or `--teacher_checkpoint_paths`.')
+
+        if self.dataset_type != 'regression' or self.loss_function not in ['mse', 'mve', 'evidential']:
+            raise ValueError('Only regression models trained with the mse, mve or evidential loss functions can be distilled.')
+
+        # The molecules are repeated in the distillation data to match the variance of the ensemble
+        if self.loss_function in ['mve', 'evidential'] and \
+                (self.features_path is not None or self.data_weights_path is not None):
+            raise ValueError('Distilling the variance of an ensemble does not support `--features_path` or `--data_weights_path`.')
+
+
+class PreprocessArgs(CommonArgs):
+    """:class:`PreprocessArgs` includes :class:`CommonArgs` along with additional arguments used for compiling a data CSV file and its additional data files into a packed dataset.
+
+    The packed dataset is then used as the :code:`data_path` of training, with the same options as the CSV file.
+    """
+
+    data_path: str
+    """Path to data CSV file."""
+    save_dir: str
+    """Directory where the packed dataset is written."""
+    target_columns: List[str] = None
+    """
+    Name of the columns containing target values.
+    By default, uses all columns except the SMILES column and the :code:`ignore_columns`.
+    """
+    ignore_columns: List[str] = None
+    """Name of the columns to ignore when :code:`target_columns` is not provided."""
+    data_weights_path: str = None
+    """Path to weights for each molecule in the training data, affecting the relative weight of molecules in the loss function"""
+    featurize_graphs: bool = False
+    """Whether to also featurize the molecular graphs and store them in the packed dataset, where training finds them."""
+    reaction: bool = False
+    """Whether the SMILES are reactions, as with the :code:`reaction` option of training."""
+    reaction_mode: Literal['reac_prod', 'reac_diff', 'prod_diff', 'reac_prod_balance', 'reac_diff_balance', 'prod_diff_balance'] = 'reac_diff'
+    """Choices for construction of atom and bond features for reactions, as with the :code:`reaction_mode` option of training."""
+    reaction_solvent: bool = False
+    """Whether the SMILES are a reaction and a molecule, as with the :code:`reaction_solvent` option of training."""
+    explicit_h: bool = False
+    """Whether H are explicitly specified in input (and should be kept this way), as with the :code:`explicit_h` option of training."""
+    adding_h: bool = False
+    """Whether RDKit molecules will be constructed with adding the Hs to them, as with the :code:`adding_h` option of training."""
+    keeping_atom_map: bool = False
+    """Whether RDKit molecules keep the original atom mapping, as with the :code:`keeping_atom_map` option of training."""
+
+    def process_args(self) -> None:
+        super(PreprocessArgs, self).process_args()
+
+        self.smiles_columns = chemprop.data.utils.preprocess_smiles_columns(
+            path=self.data_path,
+            smiles_columns=self.smiles_columns,
+            number_of_molecules=self.number_of_molecules,
+        )
+
+        if self.reaction is True and self.reaction_solvent is True:
+            raise ValueError('Only reaction or reaction_solvent mode can be used, not both.')
+
+        if self.reaction_solvent is True and self.number_of_molecules != 2:
+            raise ValueError('In reaction_solvent mode, --number_of_molecules 2 must be specified.')
+
+        if self.constraints_path is not None:
+            raise ValueError('Packed datasets do not support atomic/bond targets, so constraints cannot be compiled.')
+
+
 class SklearnTrainArgs(TrainArgs):
     """:class:`SklearnTrainArgs` includes :class:`TrainArgs` along with additional arguments for training a scikit-learn model."""
 
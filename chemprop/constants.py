@@ -4,5 +4,7 @@ HYPEROPT_LOGGER_NAME = 'hyperparameter-optimization'
 
 # Save file names
 MODEL_FILE_NAME = 'model.pt'
+QUANTIZED_MODEL_SUFFIX = '.int8'
+ONNX_MODEL_SUFFIX = '.onnx'
 TEST_SCORES_FILE_NAME = 'test_scores.csv'
 HYPEROPT_SEED_FILE_NAME = 'hyperopt_seeds.txt'
@@ -1,11 +1,16 @@
 from .data import cache_graph, cache_mol, MoleculeDatapoint, MoleculeDataset, MoleculeDataLoader, \
-    MoleculeSampler, set_cache_graph, empty_cache, set_cache_mol
+    MoleculeSampler, MoleculeSizeBatchSampler, DistributedMoleculeSampler, set_cache_graph, empty_cache, set_cache_mol, graph_store, set_graph_store, \
+    set_cache_graph_max_bytes, set_cache_mol_max_bytes, cache_stats
+from .cache import LRUCache
+from .graph_store import MolGraphStore, featurization_key
+from .packed import is_packed_dataset, load_packed_dataset, packed_graphs_path, save_packed_dataset
 from .scaffold import generate_scaffold, log_scaffold_stats, scaffold_split, scaffold_to_smiles
 from .scaler import StandardScaler, AtomBondScaler
-from .utils import filter_invalid_smiles, get_class_sizes, get_data, get_data_from_smiles, \
+from .targets import TargetArrays
+from .utils import filter_invalid_smiles, get_class_sizes, get_data, get_data_chunks, get_data_from_smiles, \
     get_header, get_smiles, get_task_names, get_mixed_task_names, get_data_weights, get_constraints, \
     preprocess_smiles_columns, split_data, validate_data, validate_dataset_type, get_invalid_smiles_from_file, \
-    get_invalid_smiles_from_list
+    get_invalid_smiles_from_list, open_data_file
 
 __all__ = [
     'cache_graph',
@@ -15,22 +20,39 @@ __all__ = [
     'MoleculeDataset',
     'MoleculeDataLoader',
     'MoleculeSampler',
+    'MoleculeSizeBatchSampler',
+    'DistributedMoleculeSampler',
     'set_cache_graph',
     'set_cache_mol',
+    'set_cache_graph_max_bytes',
+    'set_cache_mol_max_bytes',
+    'cache_stats',
+    'LRUCache',
+    'graph_store',
+    'set_graph_store',
+    'MolGraphStore',
+    'featurization_key',
+    'is_packed_dataset',
+    'load_packed_dataset',
+    'packed_graphs_path',
+    'save_packed_dataset',
     'generate_scaffold',
     'log_scaffold_stats',
     'scaffold_split',
     'scaffold_to_smiles',
     'StandardScaler',
     'AtomBondScaler',
+    'TargetArrays',
     'filter_invalid_smiles',
     'get_class_sizes',
     'get_data',
     'get_data_weights',
     'get_constraints',
+    'get_data_chunks',
     'get_data_from_smiles',
     'get_invalid_smiles_from_file',
     'get_invalid_smiles_from_list',
+    'open_data_file',
     'get_header',
     'get_smiles',
     'get_task_names',
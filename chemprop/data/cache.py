@@ -0,0 +1,156 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Union
+
+import numpy as np
+from rdkit import Chem
+
+from chemprop.features import MolGraph
+
+# Rough in-memory size of an RDKit molecule, since RDKit does not report it
+MOL_BASE_BYTES = 1000
+MOL_BYTES_PER_ATOM = 600
+MOL_BYTES_PER_BOND = 600
+
+# Size of the Python objects around the arrays of a MolGraph
+GRAPH_BASE_BYTES = 1000
+
+_MISSING = object()
+
+
+def mol_nbytes(mol: Union[Chem.Mol, Tuple[Chem.Mol, Chem.Mol]]) -> int:
+    """
+    Estimates the memory used by an RDKit molecule.
+
+    :param mol: An RDKit molecule or a tuple of reactant and product molecules.
+    :return: The estimated number of bytes.
+    """
+    mols = mol if isinstance(mol, tuple) else (mol,)
+
+    return sum(MOL_BASE_BYTES + MOL_BYTES_PER_ATOM * m.GetNumAtoms() + MOL_BYTES_PER_BOND * m.GetNumBonds()
+               for m in mols if m is not None)
+
+
+def graph_nbytes(mol_graph: MolGraph) -> int:
+    """
+    Estimates the memory used by a :class:`~chemprop.features.MolGraph`.
+
+    Arrays that are memory-mapped from a :class:`~chemprop.data.MolGraphStore` live in the page cache rather than in
+    the process and are not counted.
+
+    :param mol_graph: A :class:`~chemprop.features.MolGraph`.
+    :return: The estimated number of bytes.
+    """
+    nbytes = GRAPH_BASE_BYTES
+    for name in ('f_atoms', 'f_bonds', 'b2a', 'b2revb', 'b2br'):
+        array = getattr(mol_graph, name, None)
+        if isinstance(array, np.ndarray) and not isinstance(array, np.memmap):
+            nbytes += array.nbytes
+
+    return nbytes
+
+
+class LRUCache:
+    """
+    A :class:`LRUCache` is a mapping with a memory budget that evicts the least recently used entries once the
+    estimated size of its values exceeds the budget.
+
+    It keeps count of the hits, misses, and evictions, which are reported by :meth:`stats`.
+    """
+
+    def __init__(self, sizeof: Callable[[Any], int], max_bytes: Optional[int] = None):
+        """
+        :param sizeof: A function estimating the number of bytes used by a value.
+        :param max_bytes: The memory budget in bytes. None means the cache is unbounded.
+        """
+        self.sizeof = sizeof
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()  # key -> (value, nbytes), from least to most recently used
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Looks up a value and marks it as most recently used.
+
+        :param key: The key.
+        :param default: The value returned on a miss.
+        :return: The cached value or :code:`default`.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[0]
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        nbytes = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            if self.max_bytes is not None and nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            self._evict()
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self) -> None:
+        """Drops the least recently used entries until the cache fits its budget. Must hold the lock."""
+        if self.max_bytes is None:
+            return
+        while self.nbytes > self.max_bytes:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.nbytes -= nbytes
+            self.evictions += 1
+
+    def resize(self, max_bytes: Optional[int]) -> None:
+        """
+        Changes the memory budget, evicting entries right away if the cache no longer fits.
+
+        :param max_bytes: The memory budget in bytes. None means the cache is unbounded.
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self) -> None:
+        """Removes all entries. The counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        """
+        Reports the size and usage of the cache.
+
+        :return: A dictionary with the number of entries, the estimated bytes used, the budget,
+                 and the number of hits, misses, and evictions.
+        """
+        return {
+            'entries': len(self._entries),
+            'nbytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -4,10 +4,15 @@ from random import Random
 from typing import Dict, Iterator, List, Optional, Union, Tuple
 
 import numpy as np
+import torch
 from torch.utils.data import DataLoader, Dataset, Sampler
 from rdkit import Chem
+from scipy.sparse import issparse
 
+from .cache import LRUCache, graph_nbytes, mol_nbytes
+from .graph_store import MolGraphStore
 from .scaler import StandardScaler, AtomBondScaler
+from .targets import TargetArrays
 from chemprop.features import get_features_generator
 from chemprop.features import BatchMolGraph, MolGraph
 from chemprop.features import is_explicit_h, is_reaction, is_adding_hs, is_mol, is_keeping_atom_map
@@ -15,12 +20,16 @@ from chemprop.rdkit import make_mol
 
 # Cache of graph featurizations
 CACHE_GRAPH = True
-SMILES_TO_GRAPH: Dict[str, MolGraph] = {}
+SMILES_TO_GRAPH = LRUCache(sizeof=graph_nbytes)  # Dict[str, MolGraph] with a memory budget
+
+
+# Persistent on-disk store of graph featurizations, shared across runs
+GRAPH_STORE: Optional[MolGraphStore] = None
 
 
 # Cache of RDKit molecules
 CACHE_MOL = True
-SMILES_TO_MOL: Dict[str, Union[Chem.Mol, Tuple[Chem.Mol, Chem.Mol]]] = {}
+SMILES_TO_MOL = LRUCache(sizeof=mol_nbytes)  # Dict[str, Union[Chem.Mol, Tuple[Chem.Mol, Chem.Mol]]] with a memory budget
 
 
 def cache_graph() -> bool:
@@ -34,12 +43,56 @@ def set_cache_graph(cache_graph: bool) -> None:
     CACHE_GRAPH = cache_graph
 
 
+def set_cache_graph_max_bytes(max_bytes: Optional[int]) -> None:
+    r"""
+    Sets the memory budget of the :class:`~chemprop.features.MolGraph` cache. Least recently used graphs are evicted beyond it.
+
+    :param max_bytes: The budget in bytes, or None for an unbounded cache.
+    """
+    SMILES_TO_GRAPH.resize(max_bytes)
+
+
+def set_cache_mol_max_bytes(max_bytes: Optional[int]) -> None:
+    r"""
+    Sets the memory budget of the RDKit molecule cache. Least recently used molecules are evicted beyond it.
+
+    :param max_bytes: The budget in bytes, or None for an unbounded cache.
+    """
+    SMILES_TO_MOL.resize(max_bytes)
+
+
+def cache_stats() -> Dict[str, Dict[str, Optional[int]]]:
+    r"""
+    Reports the size and hit, miss, and eviction counts of the :class:`~chemprop.features.MolGraph` and RDKit molecule caches.
+
+    :return: A dictionary mapping :code:`'graph'` and :code:`'mol'` to :meth:`~chemprop.data.cache.LRUCache.stats`.
+    """
+    return {'graph': SMILES_TO_GRAPH.stats(), 'mol': SMILES_TO_MOL.stats()}
+
+
 def empty_cache():
     r"""Empties the cache of :class:`~chemprop.features.MolGraph` and RDKit molecules."""
     SMILES_TO_GRAPH.clear()
     SMILES_TO_MOL.clear()
 
 
+def graph_store() -> Optional[MolGraphStore]:
+    r"""Returns the on-disk store of :class:`~chemprop.features.MolGraph`\ s, or None if graphs are not stored."""
+    return GRAPH_STORE
+
+
+def set_graph_store(path: Optional[str]) -> None:
+    r"""
+    Sets the directory of the on-disk store of :class:`~chemprop.features.MolGraph`\ s.
+
+    :param path: Path to the store directory, or None to stop storing graphs.
+    """
+    global GRAPH_STORE
+    if GRAPH_STORE is not None:
+        GRAPH_STORE.flush()
+    GRAPH_STORE = MolGraphStore(path) if path is not None else None
+
+
 def cache_mol() -> bool:
     r"""Returns whether RDKit molecules will be cached."""
     return CACHE_MOL
@@ -51,9 +104,85 @@ def set_cache_mol(cache_mol: bool) -> None:
     CACHE_MOL = cache_mol
 
 
+# Interned flags of the molecules of datapoints, which are shared by all datapoints with the same flags
+MOLECULE_FLAGS: Dict[Tuple[Tuple[bool, ...], ...], Tuple[Tuple[bool, ...], ...]] = {}
+
+
+def _molecule_flags(smiles: List[str]) -> Tuple[Tuple[bool, ...], ...]:
+    """
+    Gets the flags of the molecules given by a list of SMILES under the current featurization parameters.
+
+    :param smiles: A list of the SMILES strings for the molecules.
+    :return: A tuple with whether each molecule is a molecule (and not a reaction), is a reaction, keeps its
+             explicit hydrogens, adds hydrogens and keeps its atom map, interned so that it is shared by datapoints.
+    """
+    is_mol_list = tuple(is_mol(s) for s in smiles)
+    flags = (is_mol_list,
+             tuple(is_reaction(x) for x in is_mol_list),
+             tuple(is_explicit_h(x) for x in is_mol_list),
+             tuple(is_adding_hs(x) for x in is_mol_list),
+             tuple(is_keeping_atom_map(x) for x in is_mol_list))
+
+    return MOLECULE_FLAGS.setdefault(flags, flags)
+
+
+def _as_float32(array: np.ndarray, replace_token: float = 0) -> np.ndarray:
+    """
+    Converts an array to float32, replacing its nans, without copying it if it is already a float32 array without nans.
+
+    :param array: The array to convert.
+    :param replace_token: The value replacing nans.
+    :return: The float32 array.
+    """
+    array = np.asarray(array, dtype=np.float32)
+    nans = np.isnan(array)
+    if nans.any():
+        array = np.where(nans, np.float32(replace_token), array)
+
+    return array
+
+
+# Number of rows scaled at once by MoleculeDataset.normalize_features, which bounds its float64 temporaries
+NORMALIZE_CHUNK_SIZE = 65536
+
+
+def _stack_raw(name: str, arrays: List[np.ndarray]) -> np.ndarray:
+    """
+    Stacks the raw molecule features or atom/bond features or descriptors of datapoints into a single matrix.
+
+    :param name: The name of the features, i.e. :code:`features` or e.g. :code:`atom_descriptors`.
+    :param arrays: The raw features of each datapoint.
+    :return: A float32 matrix with a row per molecule or per atom/bond.
+    """
+    if name == 'features':
+        return np.stack(arrays).astype(np.float32, copy=False)
+
+    return np.concatenate(arrays).astype(np.float32, copy=False)
+
+
+def _share_buffer(arrays: List[np.ndarray]) -> bool:
+    """
+    Checks whether arrays are all views of the same buffer.
+
+    :param arrays: A list of numpy arrays.
+    :return: Whether all the arrays are views of the same buffer.
+    """
+    bases = {id(array.base) if array.base is not None else id(array) for array in arrays}
+
+    return len(arrays) > 1 and len(bases) == 1 and arrays[0].base is not None
+
+
 class MoleculeDatapoint:
     """A :class:`MoleculeDatapoint` contains a single molecule and its associated features and targets."""
 
+    # A dataset holds many datapoints, so they have no __dict__
+    __slots__ = ('smiles', 'targets', 'atom_targets', 'bond_targets', 'row', 'data_weight', 'gt_targets', 'lt_targets',
+                 'features', 'features_generator', 'phase_features', 'atom_features', 'atom_descriptors',
+                 'bond_features', 'bond_descriptors', 'raw_constraints', 'constraints',
+                 'overwrite_default_atom_features', 'overwrite_default_bond_features', 'raw_features', 'raw_targets',
+                 'raw_atom_targets', 'raw_bond_targets', 'raw_atom_descriptors', 'raw_atom_features',
+                 'raw_bond_descriptors', 'raw_bond_features', '_flags')
+
     def __init__(self,
                  smiles: List[str],
                  targets: List[Optional[float]] = None,
@@ -110,11 +239,7 @@ class MoleculeDatapoint:
         self.raw_constraints = raw_constraints
         self.overwrite_default_atom_features = overwrite_default_atom_features
         self.overwrite_default_bond_features = overwrite_default_bond_features
-        self.is_mol_list = [is_mol(s) for s in smiles]
-        self.is_reaction_list = [is_reaction(x) for x in self.is_mol_list]
-        self.is_explicit_h_list = [is_explicit_h(x) for x in self.is_mol_list]
-        self.is_adding_hs_list = [is_adding_hs(x) for x in self.is_mol_list]
-        self.is_keeping_atom_map_list = [is_keeping_atom_map(x) for x in self.is_mol_list]
+        self._flags = _molecule_flags(smiles)
 
         if data_weight is not None:
             self.data_weight = data_weight
@@ -149,26 +274,29 @@ class MoleculeDatapoint:
 
             self.features = np.array(self.features)
 
-        # Fix nans in features
+        # Store the features and descriptors as float32, as used by the model, and fix their nans
         replace_token = 0
-        if self.features is not None:
-            self.features = np.where(np.isnan(self.features), replace_token, self.features)
+        if self.features is not None and issparse(self.features):
+            self.features = self.features.astype(np.float32)
+            self.features.data = np.where(np.isnan(self.features.data), replace_token, self.features.data)
+        elif isinstance(self.features, np.memmap):
+            # Rows of a memory-mapped features file are kept as they are so that they stay mapped, and
+            # MoleculeDataset.features converts them one batch at a time
+            pass
+        elif self.features is not None:
+            self.features = _as_float32(self.features, replace_token)
 
-        # Fix nans in atom_descriptors
         if self.atom_descriptors is not None:
-            self.atom_descriptors = np.where(np.isnan(self.atom_descriptors), replace_token, self.atom_descriptors)
+            self.atom_descriptors = _as_float32(self.atom_descriptors, replace_token)
 
-        # Fix nans in atom_features
         if self.atom_features is not None:
-            self.atom_features = np.where(np.isnan(self.atom_features), replace_token, self.atom_features)
+            self.atom_features = _as_float32(self.atom_features, replace_token)
 
-        # Fix nans in bond_descriptors
         if self.bond_descriptors is not None:
-            self.bond_descriptors = np.where(np.isnan(self.bond_descriptors), replace_token, self.bond_descriptors)
+            self.bond_descriptors = _as_float32(self.bond_descriptors, replace_token)
 
-        # Fix nans in bond_features
         if self.bond_features is not None:
-            self.bond_features = np.where(np.isnan(self.bond_features), replace_token, self.bond_features)
+            self.bond_features = _as_float32(self.bond_features, replace_token)
 
         # Save a copy of the raw features and targets to enable different scaling later on
         self.raw_features, self.raw_targets, self.raw_atom_targets, self.raw_bond_targets = \
@@ -176,6 +304,40 @@ class MoleculeDatapoint:
         self.raw_atom_descriptors, self.raw_atom_features, self.raw_bond_descriptors, self.raw_bond_features = \
             self.atom_descriptors, self.atom_features, self.bond_descriptors, self.bond_features
 
+    def __getstate__(self) -> Dict[str, object]:
+        return {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+
+    def __setstate__(self, state: Dict[str, object]) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+        # Datapoints pickled by featurization workers share their flags again
+        self._flags = MOLECULE_FLAGS.setdefault(self._flags, self._flags)
+
+    @property
+    def is_mol_list(self) -> Tuple[bool, ...]:
+        """Gets whether each SMILES is a molecule rather than a reaction."""
+        return self._flags[0]
+
+    @property
+    def is_reaction_list(self) -> Tuple[bool, ...]:
+        """Gets whether each SMILES is featurized as a reaction."""
+        return self._flags[1]
+
+    @property
+    def is_explicit_h_list(self) -> Tuple[bool, ...]:
+        """Gets whether each SMILES keeps its explicit hydrogens."""
+        return self._flags[2]
+
+    @property
+    def is_adding_hs_list(self) -> Tuple[bool, ...]:
+        """Gets whether hydrogens are added to each SMILES."""
+        return self._flags[3]
+
+    @property
+    def is_keeping_atom_map_list(self) -> Tuple[bool, ...]:
+        """Gets whether each SMILES keeps its atom map."""
+        return self._flags[4]
+
     @property
     def mol(self) -> List[Union[Chem.Mol, Tuple[Chem.Mol, Chem.Mol]]]:
         """Gets the corresponding list of RDKit molecules for the corresponding SMILES list."""
@@ -194,9 +356,6 @@ class MoleculeDatapoint:
                             keep_h_list=self.is_explicit_h_list,
                             add_h_list=self.is_adding_hs_list,
                             keep_atom_map_list=self.is_keeping_atom_map_list)
-        if cache_mol():
-            for s, m in zip(self.smiles, mol):
-                SMILES_TO_MOL[s] = m
 
         return mol
 
@@ -290,6 +449,8 @@ class MoleculeDatapoint:
 
         :param features: A 1D numpy array of extra features for the molecule.
         """
+        if isinstance(self.features, np.memmap):
+            self.features = _as_float32(self.features)
         self.features = np.append(self.features, features) if self.features is not None else features
 
     def num_tasks(self) -> int:
@@ -325,6 +486,10 @@ class MoleculeDataset(Dataset):
         """
         self._data = data
         self._batch_graph = None
+        self._target_arrays = None
+        self._target_tensors = None
+        self._embeddings = None
+        self._scaled_features = {}
         self._random = Random()
 
     def smiles(self, flatten: bool = False) -> Union[List[str], List[List[str]]]:
@@ -415,25 +580,7 @@ class MoleculeDataset(Dataset):
         if self._batch_graph is None:
             self._batch_graph = []
 
-            mol_graphs = []
-            for d in self._data:
-                mol_graphs_list = []
-                for s, m in zip(d.smiles, d.mol):
-                    if s in SMILES_TO_GRAPH:
-                        mol_graph = SMILES_TO_GRAPH[s]
-                    else:
-                        if len(d.smiles) > 1 and (d.atom_features is not None or d.bond_features is not None):
-                            raise NotImplementedError('Atom descriptors are currently only supported with one molecule '
-                                                      'per input (i.e., number_of_molecules = 1).')
-
-                        mol_graph = MolGraph(m, d.atom_features, d.bond_features,
-                                             overwrite_default_atom_features=d.overwrite_default_atom_features,
-                                             overwrite_default_bond_features=d.overwrite_default_bond_features)
-                        if cache_graph():
-                            SMILES_TO_GRAPH[s] = mol_graph
-                    mol_graphs_list.append(mol_graph)
-                mol_graphs.append(mol_graphs_list)
-
+            mol_graphs = [make_mol_graphs(d) for d in self._data]
             self._batch_graph = [BatchMolGraph([g[i] for g in mol_graphs]) for i in range(len(mol_graphs[0]))]
 
         return self._batch_graph
@@ -447,7 +594,12 @@ class MoleculeDataset(Dataset):
         if len(self._data) == 0 or self._data[0].features is None:
             return None
 
-        return [d.features for d in self._data]
+        features = [d.features for d in self._data]
+        if isinstance(features[0], np.memmap):
+            # Memory-mapped features are only converted to float32 without nans when read
+            features = [_as_float32(f) for f in features]
+
+        return features
 
     def phase_features(self) -> List[np.ndarray]:
         """
@@ -593,6 +745,68 @@ class MoleculeDataset(Dataset):
 
         return [d.lt_targets for d in self._data]
 
+    def target_arrays(self) -> TargetArrays:
+        """
+        Computes (if necessary) and returns the targets, masks, data weights, and inequality flags of the dataset
+        as contiguous float32 and boolean arrays.
+
+        The arrays are recomputed after the targets are set through the dataset.
+
+        :return: A :class:`~chemprop.data.targets.TargetArrays` for the whole dataset.
+        """
+        if self._target_arrays is None:
+            self._target_arrays = TargetArrays(
+                targets=self.targets(),
+                data_weights=self.data_weights(),
+                is_atom_bond_targets=self.is_atom_bond_targets,
+                lt_targets=self.lt_targets(),
+                gt_targets=self.gt_targets(),
+            )
+
+        return self._target_arrays
+
+    def target_tensors(self) -> Dict[str, Optional[Union[torch.Tensor, List[torch.Tensor]]]]:
+        """
+        Returns the tensors of targets, masks, data weights, and inequality flags used to train on the dataset.
+
+        Batches built by a :class:`MoleculeDataLoader` get them sliced from the arrays of the full dataset.
+
+        :return: A dictionary with the :code:`targets`, :code:`mask`, :code:`data_weights`, :code:`lt_targets`,
+                 and :code:`gt_targets` tensors, as returned by :meth:`~chemprop.data.targets.TargetArrays.batch`.
+        """
+        if self._target_tensors is None:
+            self._target_tensors = self.target_arrays().batch(range(len(self._data)))
+
+        return self._target_tensors
+
+    def embeddings(self) -> Optional[torch.Tensor]:
+        """
+        Returns the cached frozen embeddings of the molecules, if any.
+
+        Batches built by a :class:`MoleculeDataLoader` get them sliced from the embeddings of the full dataset.
+
+        :return: A float32 tensor of shape :code:`(num_molecules, embedding_size)` or None.
+        """
+        if self._embeddings is None:
+            return None
+
+        return torch.from_numpy(np.require(self._embeddings, requirements='W'))
+
+    def set_embeddings(self, embeddings: Optional[np.ndarray]) -> None:
+        """
+        Sets the frozen embeddings of the molecules, which are then used instead of their graphs by
+        :meth:`~chemprop.models.model.MoleculeModel.forward`.
+
+        :param embeddings: An array of shape :code:`(num_molecules, embedding_size)`, possibly memory-mapped,
+                           aligned with the datapoints. None removes the embeddings.
+        """
+        if embeddings is not None and len(embeddings) != len(self._data):
+            raise ValueError(
+                "number of molecules and embeddings must be of same length! "
+                f"num molecules: {len(self._data)}, num embeddings: {len(embeddings)}"
+            )
+        self._embeddings = embeddings
+
     def num_tasks(self) -> int:
         """
         Returns the number of prediction tasks.
@@ -607,7 +821,7 @@ class MoleculeDataset(Dataset):
 
         :return: The size of the additional features vector.
         """
-        return len(self._data[0].features) if len(self._data) > 0 and self._data[0].features is not None else None
+        return self._data[0].features.shape[-1] if len(self._data) > 0 and self._data[0].features is not None else None
 
     def atom_descriptors_size(self) -> int:
         """
@@ -645,6 +859,41 @@ class MoleculeDataset(Dataset):
         return len(self._data[0].bond_features[0]) \
             if len(self._data) > 0 and self._data[0].bond_features is not None else None
 
+    def consolidate_features(self) -> None:
+        """
+        Moves the raw molecule features and the atom and bond features and descriptors of the datapoints into
+        contiguous float32 matrices which the datapoints then hold views of.
+
+        This replaces the many small arrays allocated while loading the datapoints by one buffer per kind of
+        features. Features which already are views of a single buffer (e.g. of a memory-mapped features file),
+        sparse features and molecule features of different lengths (e.g. those of invalid molecules that were kept)
+        are left as they are.
+        """
+        if len(self._data) == 0:
+            return
+
+        raw_features = [d.raw_features for d in self._data]
+        if raw_features[0] is not None and not issparse(raw_features[0]) and not _share_buffer(raw_features) \
+                and len({features.shape for features in raw_features}) == 1:
+            matrix = np.stack(raw_features).astype(np.float32, copy=False)
+            for d, features, row in zip(self._data, raw_features, matrix):
+                if d.features is features:
+                    d.features = row
+                d.raw_features = row
+
+        for name in ['atom_descriptors', 'atom_features', 'bond_descriptors', 'bond_features']:
+            arrays = [getattr(d, f'raw_{name}') for d in self._data]
+            if arrays[0] is None or _share_buffer(arrays):
+                continue
+
+            offsets = np.cumsum([0] + [len(array) for array in arrays])
+            matrix = np.concatenate(arrays).astype(np.float32, copy=False)
+            for d, array, start, end in zip(self._data, arrays, offsets[:-1], offsets[1:]):
+                view = matrix[start:end]
+                if getattr(d, name) is array:
+                    setattr(d, name, view)
+                setattr(d, f'raw_{name}', view)
+
     def normalize_features(self, scaler: StandardScaler = None, replace_nan_token: int = 0,
                            scale_atom_descriptors: bool = False, scale_bond_descriptors: bool = False) -> StandardScaler:
         """
@@ -671,35 +920,49 @@ class MoleculeDataset(Dataset):
                 (self._data[0].features is None and not scale_bond_descriptors and not scale_atom_descriptors):
             return None
 
-        if scaler is None:
-            if scale_atom_descriptors and not self._data[0].atom_descriptors is None:
-                features = np.vstack([d.raw_atom_descriptors for d in self._data])
-            elif scale_atom_descriptors and not self._data[0].atom_features is None:
-                features = np.vstack([d.raw_atom_features for d in self._data])
-            elif scale_bond_descriptors and not self._data[0].bond_descriptors is None:
-                features = np.vstack([d.raw_bond_descriptors for d in self._data])
-            elif scale_bond_descriptors and not self._data[0].bond_features is None:
-                features = np.vstack([d.raw_bond_features for d in self._data])
-            else:
-                features = np.vstack([d.raw_features for d in self._data])
-            scaler = StandardScaler(replace_nan_token=replace_nan_token)
-            scaler.fit(features)
-
         if scale_atom_descriptors and not self._data[0].atom_descriptors is None:
-            for d in self._data:
-                d.set_atom_descriptors(scaler.transform(d.raw_atom_descriptors))
+            name = 'atom_descriptors'
         elif scale_atom_descriptors and not self._data[0].atom_features is None:
-            for d in self._data:
-                d.set_atom_features(scaler.transform(d.raw_atom_features))
+            name = 'atom_features'
         elif scale_bond_descriptors and not self._data[0].bond_descriptors is None:
-            for d in self._data:
-                d.set_bond_descriptors(scaler.transform(d.raw_bond_descriptors))
+            name = 'bond_descriptors'
         elif scale_bond_descriptors and not self._data[0].bond_features is None:
-            for d in self._data:
-                d.set_bond_features(scaler.transform(d.raw_bond_features))
+            name = 'bond_features'
         else:
-            for d in self._data:
-                d.set_features(scaler.transform(d.raw_features.reshape(1, -1))[0])
+            name = 'features'
+
+        if name == 'features' and issparse(self._data[0].features):
+            raise ValueError('Sparse features cannot be scaled. Please train with --no_features_scaling.')
+
+        raw_arrays = [getattr(d, f'raw_{name}') for d in self._data]
+
+        if scaler is None:
+            scaler = StandardScaler(replace_nan_token=replace_nan_token)
+            scaler.fit(_stack_raw(name, raw_arrays))
+
+        # The scaled features are kept so that scaling again with the same scaler, e.g. with each model of an
+        # ensemble after resetting the features, only sets them
+        cached = self._scaled_features.get(name)
+        if cached is None or not cached[0].same_scaling(scaler):
+            raw = _stack_raw(name, raw_arrays)
+            scaled = np.empty(raw.shape, dtype=np.float32)
+            for start in range(0, len(raw), NORMALIZE_CHUNK_SIZE):
+                scaled[start:start + NORMALIZE_CHUNK_SIZE] = scaler.transform(raw[start:start + NORMALIZE_CHUNK_SIZE])
+
+            if name == 'features':
+                views = list(scaled)
+            else:
+                views = np.split(scaled, np.cumsum([len(array) for array in raw_arrays])[:-1])
+
+            cached = (StandardScaler(np.copy(scaler.means), np.copy(scaler.stds), scaler.replace_nan_token),
+                      list(zip(self._data, views)))
+            self._scaled_features[name] = cached
+
+        for d, view in cached[1]:
+            setattr(d, name, view)
+
+        if name in ['atom_features', 'bond_features']:
+            self._batch_graph = None  # The atom and bond features are part of the graphs
 
         return scaler
 
@@ -765,11 +1028,15 @@ class MoleculeDataset(Dataset):
             )
         for i in range(len(self._data)):
             self._data[i].set_targets(targets[i])
+        self._target_arrays = self._target_tensors = None
 
     def reset_features_and_targets(self) -> None:
         """Resets the features (atom, bond, and molecule) and targets to their raw values."""
         for d in self._data:
             d.reset_features_and_targets()
+        self._target_arrays = self._target_tensors = None
+        if len(self._data) > 0 and (self._data[0].atom_features is not None or self._data[0].bond_features is not None):
+            self._batch_graph = None  # The atom and bond features are part of the graphs
 
     def __len__(self) -> int:
         """
@@ -847,6 +1114,128 @@ class MoleculeSampler(Sampler):
         return self.length
 
 
+class MoleculeSizeBatchSampler(Sampler):
+    """
+    A :class:`MoleculeSizeBatchSampler` yields batches of indices of molecules of similar sizes, which reduces the
+    padding in a :class:`~chemprop.features.BatchMolGraph` and evens out the cost of the training steps.
+
+    The datapoints are sorted by their total number of atoms (then bonds) and split into buckets of equal counts.
+    Batches are built within each bucket, either of :code:`batch_size` datapoints or up to a total of :code:`batch_atoms`
+    atoms, and the batches of all buckets are then visited in a random order. With shuffling, the datapoints are
+    shuffled within each bucket every epoch.
+    """
+
+    def __init__(self,
+                 dataset: MoleculeDataset,
+                 batch_size: int = 50,
+                 num_buckets: int = 10,
+                 batch_atoms: int = None,
+                 shuffle: bool = False,
+                 seed: int = 0):
+        """
+        :param dataset: The :class:`MoleculeDataset` to sample from.
+        :param batch_size: The number of datapoints per batch. Ignored if :code:`batch_atoms` is given.
+        :param num_buckets: The number of size buckets.
+        :param batch_atoms: The target total number of atoms per batch. A batch holds at least one datapoint,
+                            even if it exceeds the target on its own.
+        :param shuffle: Whether to shuffle the datapoints within the buckets and the order of the batches.
+        :param seed: Random seed. Only needed if :code:`shuffle` is True.
+        """
+        super(Sampler, self).__init__()
+
+        self.batch_size = batch_size
+        self.batch_atoms = batch_atoms
+        self.shuffle = shuffle
+        self._random = Random(seed)
+
+        self.num_atoms, num_bonds = np.zeros(len(dataset), dtype=np.int64), np.zeros(len(dataset), dtype=np.int64)
+        for i, d in enumerate(dataset):
+            self.num_atoms[i], num_bonds[i] = count_atoms_and_bonds(d)
+
+        order = np.lexsort((num_bonds, self.num_atoms))
+        self.buckets = [bucket.tolist() for bucket in np.array_split(order, min(num_buckets, max(1, len(order))))]
+        self._batches = None
+
+    def _make_batches(self) -> List[List[int]]:
+        """Splits the buckets into batches and orders the batches."""
+        batches = []
+        for bucket in self.buckets:
+            if self.shuffle:
+                bucket = list(bucket)
+                self._random.shuffle(bucket)
+
+            if self.batch_atoms is None:
+                batches.extend(bucket[i:i + self.batch_size] for i in range(0, len(bucket), self.batch_size))
+            else:
+                batch, batch_atoms = [], 0
+                for index in bucket:
+                    if len(batch) > 0 and batch_atoms + self.num_atoms[index] > self.batch_atoms:
+                        batches.append(batch)
+                        batch, batch_atoms = [], 0
+                    batch.append(index)
+                    batch_atoms += self.num_atoms[index]
+                if len(batch) > 0:
+                    batches.append(batch)
+
+        if self.shuffle:
+            self._random.shuffle(batches)
+
+        return batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        """Creates an iterator over batches of indices."""
+        batches = self._batches if self._batches is not None else self._make_batches()
+        self._batches = None
+
+        return iter(batches)
+
+    def __len__(self) -> int:
+        """Returns the number of batches in the next iteration."""
+        # With a target number of atoms, the number of batches depends on the shuffling, so the batches are made now
+        if self._batches is None:
+            self._batches = self._make_batches()
+
+        return len(self._batches)
+
+
+class DistributedMoleculeSampler(Sampler):
+    """
+    A :class:`DistributedMoleculeSampler` shards the indices or batches of a sampler across the processes of
+    distributed data-parallel training.
+
+    Every process draws the same epoch from its copy of the sampler, which is padded by repeating its first items
+    to a multiple of the number of processes, and then keeps every :code:`num_replicas`-th item starting at its
+    rank. All processes therefore run the same number of steps per epoch.
+    """
+
+    def __init__(self,
+                 sampler: Union[MoleculeSampler, MoleculeSizeBatchSampler],
+                 num_replicas: int,
+                 rank: int):
+        """
+        :param sampler: The sampler to shard, seeded the same way in every process.
+        :param num_replicas: The number of processes.
+        :param rank: The rank of this process.
+        """
+        super(Sampler, self).__init__()
+
+        self.sampler = sampler
+        self.num_replicas = num_replicas
+        self.rank = rank
+
+    def __iter__(self) -> Iterator[Union[int, List[int]]]:
+        """Creates an iterator over the items of this process."""
+        items = list(iter(self.sampler))
+        num_items = -(-len(items) // self.num_replicas) * self.num_replicas
+        items = [items[i % len(items)] for i in range(num_items)]
+
+        return iter(items[self.rank::self.num_replicas])
+
+    def __len__(self) -> int:
+        """Returns the number of items of this process."""
+        return -(-len(self.sampler) // self.num_replicas)
+
+
 def construct_molecule_batch(data: List[MoleculeDatapoint]) -> MoleculeDataset:
     r"""
     Constructs a :class:`MoleculeDataset` from a list of :class:`MoleculeDatapoint`\ s.
@@ -863,6 +1252,31 @@ def construct_molecule_batch(data: List[MoleculeDatapoint]) -> MoleculeDataset:
     return data
 
 
+class MoleculeBatchCollator:
+    """
+    A :class:`MoleculeBatchCollator` builds the batches of a :class:`MoleculeDataLoader` from the indices of their
+    molecules, slicing the target arrays and the frozen embeddings of the dataset if they have been computed.
+    """
+
+    def __init__(self, dataset: MoleculeDataset):
+        """
+        :param dataset: The :class:`MoleculeDataset` the indices refer to.
+        """
+        self.dataset = dataset
+
+    def __call__(self, indices: List[int]) -> MoleculeDataset:
+        if self.dataset._embeddings is not None:
+            # The embeddings replace the graphs, which are not built
+            batch = MoleculeDataset([self.dataset[index] for index in indices])
+            batch._embeddings = self.dataset._embeddings[np.asarray(indices, dtype=np.int64)]
+        else:
+            batch = construct_molecule_batch([self.dataset[index] for index in indices])
+        if self.dataset._target_arrays is not None:
+            batch._target_tensors = self.dataset._target_arrays.batch(indices)
+
+        return batch
+
+
 class MoleculeDataLoader(DataLoader):
     """A :class:`MoleculeDataLoader` is a PyTorch :class:`DataLoader` for loading a :class:`MoleculeDataset`."""
 
@@ -872,7 +1286,11 @@ class MoleculeDataLoader(DataLoader):
                  num_workers: int = 8,
                  class_balance: bool = False,
                  shuffle: bool = False,
-                 seed: int = 0):
+                 seed: int = 0,
+                 size_buckets: int = None,
+                 batch_atoms: int = None,
+                 num_replicas: int = 1,
+                 rank: int = 0):
         """
         :param dataset: The :class:`MoleculeDataset` containing the molecules to load.
         :param batch_size: Batch size.
@@ -883,6 +1301,12 @@ class MoleculeDataLoader(DataLoader):
                               subset of the larger class.
         :param shuffle: Whether to shuffle the data.
         :param seed: Random seed. Only needed if shuffle is True.
+        :param size_buckets: The number of size buckets of a :class:`MoleculeSizeBatchSampler` used to batch
+                             molecules of similar sizes together. The batches are then not in dataset order.
+        :param batch_atoms: The target total number of atoms per batch, used instead of :code:`batch_size`.
+        :param num_replicas: The number of processes of distributed training, across which the molecules or
+                             batches are sharded by a :class:`DistributedMoleculeSampler`.
+        :param rank: The rank of this process in distributed training.
         """
         self._dataset = dataset
         self._batch_size = batch_size
@@ -890,6 +1314,7 @@ class MoleculeDataLoader(DataLoader):
         self._class_balance = class_balance
         self._shuffle = shuffle
         self._seed = seed
+        self._num_replicas = num_replicas
         self._context = None
         self._timeout = 0
         is_main_thread = threading.current_thread() is threading.main_thread()
@@ -904,14 +1329,46 @@ class MoleculeDataLoader(DataLoader):
             seed=self._seed
         )
 
+        self._size_batching = size_buckets is not None or batch_atoms is not None
+        if self._size_batching:
+            if self._class_balance:
+                raise ValueError('Class balance cannot be combined with batching by molecule size.')
+
+            batch_sampler = MoleculeSizeBatchSampler(
+                dataset=self._dataset,
+                batch_size=self._batch_size,
+                num_buckets=size_buckets if size_buckets is not None else 1,
+                batch_atoms=batch_atoms,
+                shuffle=self._shuffle,
+                seed=self._seed
+            )
+            if num_replicas > 1:
+                batch_sampler = DistributedMoleculeSampler(batch_sampler, num_replicas=num_replicas, rank=rank)
+            batching = {'batch_sampler': batch_sampler}
+        elif num_replicas > 1:
+            sampler = DistributedMoleculeSampler(self._sampler, num_replicas=num_replicas, rank=rank)
+            batching = {'batch_size': self._batch_size, 'sampler': sampler}
+        else:
+            batching = {'batch_size': self._batch_size, 'sampler': self._sampler}
+
         super(MoleculeDataLoader, self).__init__(
             dataset=self._dataset,
-            batch_size=self._batch_size,
-            sampler=self._sampler,
             num_workers=self._num_workers,
             collate_fn=construct_molecule_batch,
             multiprocessing_context=self._context,
-            timeout=self._timeout
+            timeout=self._timeout,
+            **batching
+        )
+
+        # Batches are loaded by fetching indices, which the collator turns into batches of datapoints and
+        # target tensors, while the dataset of the loader remains the MoleculeDataset
+        self._index_loader = DataLoader(
+            dataset=range(len(self._dataset)),
+            num_workers=self._num_workers,
+            collate_fn=MoleculeBatchCollator(self._dataset),
+            multiprocessing_context=self._context,
+            timeout=self._timeout,
+            **batching
         )
 
     @property
@@ -921,8 +1378,9 @@ class MoleculeDataLoader(DataLoader):
 
         :return: A list of lists of floats (or None) containing the targets.
         """
-        if self._class_balance or self._shuffle:
-            raise ValueError('Cannot safely extract targets when class balance or shuffle are enabled.')
+        if self._class_balance or self._shuffle or self._size_batching or self._num_replicas > 1:
+            raise ValueError('Cannot safely extract targets when class balance, shuffle, batching by size or '
+                             'distributed sharding are enabled.')
 
         return [self._dataset[index].targets for index in self._sampler]
 
@@ -933,8 +1391,9 @@ class MoleculeDataLoader(DataLoader):
 
         :return: A list of lists of booleans (or None) containing the targets.
         """
-        if self._class_balance or self._shuffle:
-            raise ValueError('Cannot safely extract targets when class balance or shuffle are enabled.')
+        if self._class_balance or self._shuffle or self._size_batching or self._num_replicas > 1:
+            raise ValueError('Cannot safely extract targets when class balance, shuffle, batching by size or '
+                             'distributed sharding are enabled.')
         
         if not hasattr(self._dataset[0],'gt_targets'):
             return None
@@ -948,8 +1407,9 @@ class MoleculeDataLoader(DataLoader):
 
         :return: A list of lists of booleans (or None) containing the targets.
         """
-        if self._class_balance or self._shuffle:
-            raise ValueError('Cannot safely extract targets when class balance or shuffle are enabled.')
+        if self._class_balance or self._shuffle or self._size_batching or self._num_replicas > 1:
+            raise ValueError('Cannot safely extract targets when class balance, shuffle, batching by size or '
+                             'distributed sharding are enabled.')
 
         if not hasattr(self._dataset[0],'lt_targets'):
             return None
@@ -957,6 +1417,13 @@ class MoleculeDataLoader(DataLoader):
         return [self._dataset[index].lt_targets for index in self._sampler]
 
 
+    def precompute_targets(self) -> None:
+        """
+        Computes the target arrays of the dataset, so that the targets, masks, and data weights of each batch are
+        sliced from them rather than built from the datapoints.
+        """
+        self._dataset.target_arrays()
+
     @property
     def iter_size(self) -> int:
         """Returns the number of data points included in each full iteration through the :class:`MoleculeDataLoader`."""
@@ -964,7 +1431,7 @@ class MoleculeDataLoader(DataLoader):
 
     def __iter__(self) -> Iterator[MoleculeDataset]:
         r"""Creates an iterator which returns :class:`MoleculeDataset`\ s"""
-        return super(MoleculeDataLoader, self).__iter__()
+        return iter(self._index_loader)
 
     
 def make_mols(smiles: List[str], reaction_list: List[bool], keep_h_list: List[bool], add_h_list: List[bool], keep_atom_map_list: List[bool]):
@@ -980,9 +1447,109 @@ def make_mols(smiles: List[str], reaction_list: List[bool], keep_h_list: List[bo
     """
     mol = []
     for s, reaction, keep_h, add_h, keep_atom_map in zip(smiles, reaction_list, keep_h_list, add_h_list, keep_atom_map_list):
-        if reaction:
-            mol.append(SMILES_TO_MOL[s] if s in SMILES_TO_MOL else (make_mol(s.split(">")[0], keep_h, add_h, keep_atom_map), make_mol(s.split(">")[-1], keep_h, add_h, keep_atom_map)))
-        else:
-            mol.append(SMILES_TO_MOL[s] if s in SMILES_TO_MOL else make_mol(s, keep_h, add_h, keep_atom_map))
+        m = SMILES_TO_MOL.get(s)
+        if m is None:
+            if reaction:
+                m = (make_mol(s.split(">")[0], keep_h, add_h, keep_atom_map), make_mol(s.split(">")[-1], keep_h, add_h, keep_atom_map))
+            else:
+                m = make_mol(s, keep_h, add_h, keep_atom_map)
+            if cache_mol():
+                SMILES_TO_MOL[s] = m
+        mol.append(m)
     return mol
 
+
+def make_mol_graphs(datapoint: MoleculeDatapoint) -> List[MolGraph]:
+    r"""
+    Gets the :class:`~chemprop.features.MolGraph`\ s of a datapoint, from the graph cache or the
+    :class:`~chemprop.data.MolGraphStore` when possible and by featurizing the molecules otherwise.
+
+    :param datapoint: A :class:`MoleculeDatapoint`.
+    :return: A list of :class:`~chemprop.features.MolGraph`, one per molecule of the datapoint.
+    """
+    d = datapoint
+    store = graph_store()
+    # Graphs with extra atom or bond features depend on more than the SMILES so they are never stored
+    use_store = store is not None and d.atom_features is None and d.bond_features is None
+    atom_bond_targets = d.atom_targets is not None or d.bond_targets is not None
+
+    mol_graphs = []
+    mols = None
+    for i, s in enumerate(d.smiles):
+        mol_graph = SMILES_TO_GRAPH.get(s)
+        if mol_graph is None:
+            if len(d.smiles) > 1 and (d.atom_features is not None or d.bond_features is not None):
+                raise NotImplementedError('Atom descriptors are currently only supported with one molecule '
+                                          'per input (i.e., number_of_molecules = 1).')
+
+            mol_graph = store.get(s, atom_bond_targets) if use_store else None
+            if mol_graph is not None:
+                mol_graph.overwrite_default_atom_features = d.overwrite_default_atom_features
+                mol_graph.overwrite_default_bond_features = d.overwrite_default_bond_features
+            else:
+                if mols is None:
+                    mols = d.mol
+                mol_graph = MolGraph(mols[i], d.atom_features, d.bond_features,
+                                     overwrite_default_atom_features=d.overwrite_default_atom_features,
+                                     overwrite_default_bond_features=d.overwrite_default_bond_features)
+                if use_store:
+                    store.put(s, mol_graph, atom_bond_targets)
+            if cache_graph():
+                SMILES_TO_GRAPH[s] = mol_graph
+        mol_graphs.append(mol_graph)
+
+    return mol_graphs
+
+
+def count_atoms_and_bonds(datapoint: MoleculeDatapoint) -> Tuple[int, int]:
+    r"""
+    Counts the atoms and bonds of the molecules of a datapoint without featurizing them.
+
+    The counts come from the graph cache, the :class:`~chemprop.data.MolGraphStore` or the molecule cache when
+    possible. Otherwise the SMILES are parsed without sanitization, which skips building the full RDKit molecule,
+    and the hydrogens that would be added are counted from the implicit hydrogens of each atom.
+
+    :param datapoint: A :class:`MoleculeDatapoint`.
+    :return: The total numbers of atoms and bonds. A reaction counts as its larger side when its graph is not built.
+    """
+    d = datapoint
+    store = graph_store()
+    use_store = store is not None and d.atom_features is None and d.bond_features is None
+    atom_bond_targets = d.atom_targets is not None or d.bond_targets is not None
+
+    num_atoms = num_bonds = 0
+    for s, reaction, add_h in zip(d.smiles, d.is_reaction_list, d.is_adding_hs_list):
+        # Membership is checked first so that the counts do not touch the cache statistics or recency
+        mol_graph = SMILES_TO_GRAPH.get(s) if s in SMILES_TO_GRAPH else None
+        if mol_graph is None and use_store:
+            mol_graph = store.get(s, atom_bond_targets)
+        if mol_graph is not None:
+            num_atoms += mol_graph.n_atoms
+            num_bonds += mol_graph.n_bonds // 2
+            continue
+
+        m = SMILES_TO_MOL.get(s) if s in SMILES_TO_MOL else None
+        if m is not None:
+            mols, add_h = (m if isinstance(m, tuple) else (m,)), False
+        else:
+            params = Chem.SmilesParserParams()
+            params.sanitize = False
+            params.removeHs = False
+            sides = (s.split('>')[0], s.split('>')[-1]) if reaction else (s,)
+            mols = [Chem.MolFromSmiles(side, params) for side in sides]
+
+        sizes = []
+        for mol in mols:
+            if mol is None:
+                sizes.append((0, 0))
+                continue
+            num_hs = 0
+            if add_h:
+                mol.UpdatePropertyCache(strict=False)
+                num_hs = sum(atom.GetTotalNumHs() for atom in mol.GetAtoms())
+            sizes.append((mol.GetNumAtoms() + num_hs, mol.GetNumBonds() + num_hs))
+        # For a reaction, the graph holds about as many atoms as the larger side of the reaction
+        num_atoms += max(side_atoms for side_atoms, _ in sizes)
+        num_bonds += max(side_bonds for _, side_bonds in sizes)
+
+    return num_atoms, num_bonds
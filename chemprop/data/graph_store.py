@@ -0,0 +1,377 @@
+import hashlib
+import json
+import multiprocessing.util
+import os
+import shutil
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from chemprop.features import featurization
+from chemprop.features import MolGraph, is_explicit_h, is_reaction, is_adding_hs, is_mol, is_keeping_atom_map
+
+# Bumped whenever the layout of a stored graph or the default featurization changes
+GRAPH_STORE_VERSION = 1
+
+# Arrays stored for every segment, concatenated over the graphs of the segment
+SEGMENT_ARRAYS = ('f_atoms', 'f_bonds', 'b2a', 'b2revb', 'b2br')
+
+# Seconds after which the lock of a compaction is assumed to be left by a killed process
+COMPACT_LOCK_TIMEOUT = 600
+
+
+def _hash_featurization(atom_bond_targets: bool) -> str:
+    """
+    Hashes the current molecule featurization parameters.
+
+    :param atom_bond_targets: Whether the graphs are built for atomic/bond targets.
+    :return: A hex digest identifying the featurization.
+    """
+    params = featurization.PARAMS
+    settings = {
+        'version': GRAPH_STORE_VERSION,
+        'atom_features': {name: [int(choice) for choice in choices] for name, choices in params.ATOM_FEATURES.items()},
+        'atom_fdim': params.ATOM_FDIM,
+        'bond_fdim': params.BOND_FDIM,
+        'extra_atom_fdim': params.EXTRA_ATOM_FDIM,
+        'extra_bond_fdim': params.EXTRA_BOND_FDIM,
+        'reaction': params.REACTION,
+        'reaction_mode': params.REACTION_MODE,
+        'explicit_h': params.EXPLICIT_H,
+        'adding_h': params.ADDING_H,
+        'keep_atom_map': params.KEEP_ATOM_MAP,
+        'atom_bond_targets': atom_bond_targets,
+    }
+
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+
+# The featurization key of each set of featurization parameters, so they are only hashed when they change
+FEATURIZATION_KEYS: Dict[tuple, str] = {}
+
+
+def featurization_key(atom_bond_targets: bool = False) -> str:
+    """
+    Hashes the current molecule featurization parameters, i.e. everything apart from the SMILES that determines a
+    :class:`~chemprop.features.MolGraph`.
+
+    The hash is computed once for each value of the parameters set by the featurization setters. The atom feature
+    choices, which none of the setters change, are only hashed along with them.
+
+    :param atom_bond_targets: Whether the graphs are built for atomic/bond targets, which keeps the explicit Hs of the SMILES.
+    :return: A hex digest identifying the featurization.
+    """
+    params = featurization.PARAMS
+    settings = (params.ATOM_FDIM, params.BOND_FDIM, params.EXTRA_ATOM_FDIM, params.EXTRA_BOND_FDIM, params.REACTION,
+                params.REACTION_MODE, params.EXPLICIT_H, params.ADDING_H, params.KEEP_ATOM_MAP, atom_bond_targets)
+    if settings not in FEATURIZATION_KEYS:
+        FEATURIZATION_KEYS[settings] = _hash_featurization(atom_bond_targets)
+
+    return FEATURIZATION_KEYS[settings]
+
+
+class _Segment:
+    """An immutable set of graphs stored as memory-mapped arrays, along with the offsets of each graph."""
+
+    def __init__(self, path: str):
+        """
+        :param path: Path to the segment directory.
+        """
+        self.path = path
+        with open(os.path.join(path, 'smiles.txt')) as f:
+            self.smiles = f.read().splitlines()
+        # Columns: atom start, number of atoms, bond start, number of bonds, real bond start (-1 for reactions)
+        self.scope = np.load(os.path.join(path, 'scope.npy'))
+        # Mapped up front, so the graphs remain readable once the segment is removed by a compaction
+        self._arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in SEGMENT_ARRAYS}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._arrays[name]
+
+    def __len__(self) -> int:
+        return len(self.scope)
+
+    def graph(self, position: int, smiles: str) -> MolGraph:
+        """
+        Reconstructs a :class:`~chemprop.features.MolGraph` without parsing the molecule.
+
+        :param position: The position of the graph in the segment.
+        :param smiles: The SMILES of the graph.
+        :return: The stored :class:`~chemprop.features.MolGraph`. Its feature arrays are read-only views of the segment.
+        """
+        atom_start, n_atoms, bond_start, n_bonds, real_bond_start = self.scope[position].tolist()
+
+        mol_graph = MolGraph.__new__(MolGraph)
+        mol_graph.is_mol = is_mol(smiles)
+        mol_graph.is_reaction = is_reaction(mol_graph.is_mol)
+        mol_graph.is_explicit_h = is_explicit_h(mol_graph.is_mol)
+        mol_graph.is_adding_hs = is_adding_hs(mol_graph.is_mol)
+        mol_graph.is_keeping_atom_map = is_keeping_atom_map(mol_graph.is_mol)
+        mol_graph.reaction_mode = featurization.reaction_mode()
+        mol_graph.overwrite_default_atom_features = False
+        mol_graph.overwrite_default_bond_features = False
+        mol_graph.n_atoms = n_atoms
+        mol_graph.n_bonds = n_bonds
+        mol_graph.f_atoms = self['f_atoms'][atom_start:atom_start + n_atoms]
+        mol_graph.f_bonds = self['f_bonds'][bond_start:bond_start + n_bonds]
+        mol_graph.b2a = self['b2a'][bond_start:bond_start + n_bonds]
+        mol_graph.b2revb = self['b2revb'][bond_start:bond_start + n_bonds]
+        mol_graph._a2b = None
+        if real_bond_start >= 0:
+            mol_graph.b2br = self['b2br'][real_bond_start:real_bond_start + n_bonds // 2]
+
+        return mol_graph
+
+
+class _Featurization:
+    """The graphs of a :class:`MolGraphStore` that share one featurization."""
+
+    def __init__(self, path: str, key: str, atom_bond_targets: bool, flush_size: int, compact_segments: int):
+        """
+        :param path: Path to the directory of the featurization.
+        :param key: The :meth:`featurization_key` of the featurization.
+        :param atom_bond_targets: Whether the graphs are built for atomic/bond targets.
+        :param flush_size: The number of graphs of the segments that are not compacted.
+        :param compact_segments: The number of smaller segments from which they are merged into one.
+        """
+        self.path = path
+        self.flush_size = flush_size
+        self.compact_segments = compact_segments
+        os.makedirs(path, exist_ok=True)
+        settings_path = os.path.join(path, 'featurization.json')
+        if not os.path.exists(settings_path):
+            params = featurization.PARAMS
+            settings = {'key': key, 'reaction_mode': params.REACTION_MODE, 'explicit_h': params.EXPLICIT_H,
+                        'adding_h': params.ADDING_H, 'keep_atom_map': params.KEEP_ATOM_MAP,
+                        'extra_atom_fdim': params.EXTRA_ATOM_FDIM, 'extra_bond_fdim': params.EXTRA_BOND_FDIM,
+                        'atom_bond_targets': atom_bond_targets}
+            with open(settings_path, 'w') as f:
+                json.dump(settings, f, indent=4)
+
+        self.segments: List[_Segment] = []
+        self.index: Dict[str, Tuple[int, int]] = {}
+        self.pending: Dict[str, MolGraph] = {}
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Opens the segments committed since the last refresh, e.g. by other processes."""
+        opened = {segment.path for segment in self.segments}
+        for name in sorted(os.listdir(self.path)):
+            segment_path = os.path.join(self.path, name)
+            if not name.startswith('segment-') or segment_path in opened:
+                continue
+            try:
+                segment = _Segment(segment_path)
+            except FileNotFoundError:
+                # Removed by the compaction of another process, which stored its graphs in a new segment
+                continue
+            segment_id = len(self.segments)
+            self.segments.append(segment)
+            for position, s in enumerate(segment.smiles):
+                self.index.setdefault(s, (segment_id, position))
+
+    def _write_segment(self, smiles: List[str], scope: np.ndarray, arrays: Dict[str, np.ndarray]) -> None:
+        """
+        Writes a new segment, which becomes visible atomically once complete.
+
+        :param smiles: The SMILES of the graphs.
+        :param scope: The offsets of each graph in the arrays, as in :class:`_Segment`.
+        :param arrays: The :code:`SEGMENT_ARRAYS`, concatenated over the graphs.
+        """
+        segment_name = f'segment-{uuid.uuid4().hex}'
+        tmp_path = os.path.join(self.path, f'.tmp-{segment_name}')
+        os.makedirs(tmp_path)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_path, f'{name}.npy'), array)
+            np.save(os.path.join(tmp_path, 'scope.npy'), scope)
+            with open(os.path.join(tmp_path, 'smiles.txt'), 'w') as f:
+                f.write(''.join(f'{s}\n' for s in smiles))
+            os.rename(tmp_path, os.path.join(self.path, segment_name))
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+    def flush(self) -> None:
+        """Writes the pending graphs to a new segment and compacts the segments if there are too many."""
+        if len(self.pending) == 0:
+            return
+
+        smiles, graphs = list(self.pending.keys()), list(self.pending.values())
+        n_atoms = np.array([g.n_atoms for g in graphs], dtype=np.int64)
+        n_bonds = np.array([g.n_bonds for g in graphs], dtype=np.int64)
+        n_real_bonds = np.array([len(g.b2br) if hasattr(g, 'b2br') else 0 for g in graphs], dtype=np.int64)
+        scope = np.stack([np.cumsum(n_atoms) - n_atoms, n_atoms,
+                          np.cumsum(n_bonds) - n_bonds, n_bonds,
+                          np.where([hasattr(g, 'b2br') for g in graphs], np.cumsum(n_real_bonds) - n_real_bonds, -1)],
+                         axis=1)
+        arrays = {
+            'f_atoms': np.concatenate([np.asarray(g.f_atoms, dtype=np.float32) for g in graphs]),
+            'f_bonds': np.concatenate([np.asarray(g.f_bonds, dtype=np.float32) for g in graphs]),
+            'b2a': np.concatenate([np.asarray(g.b2a, dtype=np.int32) for g in graphs]),
+            'b2revb': np.concatenate([np.asarray(g.b2revb, dtype=np.int32) for g in graphs]),
+            'b2br': np.concatenate([np.asarray(g.b2br, dtype=np.int32).reshape(-1, 2) for g in graphs if hasattr(g, 'b2br')]
+                                   + [np.zeros((0, 2), dtype=np.int32)]),
+        }
+        self._write_segment(smiles, scope, arrays)
+
+        self.pending.clear()
+        self.refresh()
+        self.compact()
+
+    def compact(self) -> None:
+        """
+        Merges the segments with fewer than :code:`flush_size` graphs into one once there are
+        :code:`compact_segments` of them, e.g. after data loading workers flushed their graphs chunk by chunk.
+        Merged segments are only removed once the new one is complete, and processes that already opened them keep
+        reading them. Only one process compacts at a time.
+        """
+        if sum(len(segment) < self.flush_size for segment in self.segments) < self.compact_segments:
+            return
+
+        lock_path = os.path.join(self.path, 'compact.lock')
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                pass
+
+            # Another process is compacting, unless it was killed while doing so
+            try:
+                lock_age = time.time() - os.path.getmtime(lock_path)
+            except FileNotFoundError:
+                # The other process released the lock in the meantime
+                continue
+            if lock_age > COMPACT_LOCK_TIMEOUT:
+                try:
+                    os.remove(lock_path)
+                except FileNotFoundError:
+                    pass
+            return
+
+        try:
+            # Segments already merged by another process are gone from the directory
+            self.refresh()
+            small = [segment for segment in self.segments
+                     if len(segment) < self.flush_size and os.path.isdir(segment.path)]
+            if len(small) < self.compact_segments:
+                return
+
+            scopes, atom_offset, bond_offset, real_bond_offset = [], 0, 0, 0
+            for segment in small:
+                scope = segment.scope.copy()
+                scope[:, 0] += atom_offset
+                scope[:, 2] += bond_offset
+                scope[:, 4] = np.where(scope[:, 4] >= 0, scope[:, 4] + real_bond_offset, -1)
+                scopes.append(scope)
+                atom_offset += len(segment['f_atoms'])
+                bond_offset += len(segment['b2a'])
+                real_bond_offset += len(segment['b2br'])
+            self._write_segment(smiles=[s for segment in small for s in segment.smiles],
+                                scope=np.concatenate(scopes),
+                                arrays={name: np.concatenate([segment[name] for segment in small])
+                                        for name in SEGMENT_ARRAYS})
+            for segment in small:
+                shutil.rmtree(segment.path, ignore_errors=True)
+        finally:
+            os.remove(lock_path)
+
+        # Reopens the segments, as those merged are no longer in the directory
+        self.segments, self.index = [], {}
+        self.refresh()
+
+
+class MolGraphStore:
+    r"""
+    A persistent on-disk cache of :class:`~chemprop.features.MolGraph`\ s, so that featurization is only paid for once
+    across training runs, hyperparameter trials, and prediction jobs.
+
+    The store is a directory with one subdirectory per :meth:`featurization_key`. Each of those holds immutable
+    segments of memory-mapped arrays, along with the list of SMILES that indexes them. New graphs are buffered in
+    memory and written to a new segment by :meth:`flush`, which happens automatically every :code:`flush_size`
+    graphs and when the process exits. Once :code:`compact_segments` segments are smaller than :code:`flush_size`,
+    they are merged into one. Since segments are only ever replaced atomically, several processes can share a store.
+    """
+
+    def __init__(self, path: str, flush_size: int = 10000, compact_segments: int = 16):
+        """
+        :param path: Path to the directory of the store.
+        :param flush_size: The number of pending graphs after which a new segment is written.
+        :param compact_segments: The number of segments with fewer than :code:`flush_size` graphs from which they are
+                                 merged into one.
+        """
+        self.path = path
+        self.flush_size = flush_size
+        self.compact_segments = compact_segments
+        self._featurizations: Dict[str, _Featurization] = {}
+        self._pid = None
+
+    def _featurization(self, atom_bond_targets: bool) -> _Featurization:
+        key = featurization_key(atom_bond_targets)
+        if key not in self._featurizations:
+            self._featurizations[key] = _Featurization(os.path.join(self.path, key), key, atom_bond_targets,
+                                                       flush_size=self.flush_size,
+                                                       compact_segments=self.compact_segments)
+
+        return self._featurizations[key]
+
+    def get(self, smiles: str, atom_bond_targets: bool = False) -> Optional[MolGraph]:
+        """
+        Looks up a graph built with the current featurization parameters.
+
+        :param smiles: The SMILES of the molecule or reaction.
+        :param atom_bond_targets: Whether the graph is built for atomic/bond targets.
+        :return: The stored :class:`~chemprop.features.MolGraph` or None if the SMILES is not in the store.
+        """
+        graphs = self._featurization(atom_bond_targets)
+        if smiles in graphs.pending:
+            return graphs.pending[smiles]
+        if smiles not in graphs.index:
+            return None
+        segment_id, position = graphs.index[smiles]
+
+        return graphs.segments[segment_id].graph(position, smiles)
+
+    def put(self, smiles: str, mol_graph: MolGraph, atom_bond_targets: bool = False) -> None:
+        """
+        Adds a graph built with the current featurization parameters.
+
+        :param smiles: The SMILES of the molecule or reaction.
+        :param mol_graph: A :class:`~chemprop.features.MolGraph` without extra atom or bond features.
+        :param atom_bond_targets: Whether the graph is built for atomic/bond targets.
+        """
+        if self._pid != os.getpid():
+            # Pending graphs of a forked process (e.g. a data loader worker) are written when it exits
+            self._pid = os.getpid()
+            for graphs in self._featurizations.values():
+                graphs.pending.clear()
+            multiprocessing.util.Finalize(self, self.flush, exitpriority=10)
+
+        graphs = self._featurization(atom_bond_targets)
+        if smiles in graphs.index:
+            return
+        graphs.pending[smiles] = mol_graph
+        if len(graphs.pending) >= self.flush_size:
+            graphs.flush()
+
+    def refresh(self) -> None:
+        """Opens the segments written by other processes since the store was opened."""
+        for graphs in self._featurizations.values():
+            graphs.refresh()
+
+    def flush(self) -> None:
+        """Writes all pending graphs to disk."""
+        if self._pid != os.getpid():
+            # Pending graphs inherited from the parent process are written by the parent
+            return
+        for graphs in self._featurizations.values():
+            graphs.flush()
+
+    def __len__(self) -> int:
+        """Returns the number of graphs stored for the current featurization parameters."""
+        graphs = self._featurization(atom_bond_targets=False)
+
+        return len(graphs.index) + len(graphs.pending)
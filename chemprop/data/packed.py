@@ -0,0 +1,421 @@
+import json
+import os
+from collections.abc import Sequence
+from logging import Logger
+from typing import Any, Dict, List, Optional, Tuple
+from warnings import warn
+
+import numpy as np
+
+from .data import MoleculeDatapoint, MoleculeDataset, _as_float32
+
+# Bumped whenever the layout of a packed dataset changes
+PACKED_DATASET_VERSION = 1
+
+# Written last, so a directory is only recognized as a packed dataset once all of its arrays are complete
+PACKED_META_FILE_NAME = 'meta.json'
+
+# The :class:`~chemprop.data.MolGraphStore` holding the featurized graphs of a packed dataset, if any
+PACKED_GRAPHS_DIR_NAME = 'graphs'
+
+# The data files that can be compiled into a packed dataset
+PACKED_SOURCES = ('features_path', 'phase_features_path', 'data_weights_path', 'atom_descriptors_path',
+                  'bond_descriptors_path')
+
+
+def is_packed_dataset(path: str) -> bool:
+    """
+    Checks whether a path is a packed dataset directory written by :func:`save_packed_dataset`.
+
+    :param path: Path to a data CSV file or a packed dataset directory.
+    :return: Whether the path is a complete packed dataset.
+    """
+    return path is not None and os.path.isfile(os.path.join(path, PACKED_META_FILE_NAME))
+
+
+def packed_graphs_path(path: str) -> Optional[str]:
+    """
+    Gets the :class:`~chemprop.data.MolGraphStore` of a packed dataset, if its graphs were featurized.
+
+    :param path: Path to a data CSV file or a packed dataset directory.
+    :return: The path to the graph store of the packed dataset, or None if there is none.
+    """
+    if not is_packed_dataset(path):
+        return None
+    graphs_path = os.path.join(path, PACKED_GRAPHS_DIR_NAME)
+
+    return graphs_path if os.path.isdir(graphs_path) else None
+
+
+def _absolute_paths(paths: Any) -> Any:
+    """
+    Makes a path, or a list of paths, absolute so that paths given from different directories compare equal.
+
+    :param paths: A path, a list of paths, or None.
+    :return: The absolute path or paths, or None.
+    """
+    if paths is None:
+        return None
+    if isinstance(paths, str):
+        return os.path.abspath(paths)
+
+    return [os.path.abspath(p) for p in paths]
+
+
+def _ragged(arrays: List[Optional[np.ndarray]], width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Concatenates per-datapoint 2D arrays, e.g. atom descriptors, along with the offsets of each datapoint.
+
+    :param arrays: The array of each datapoint, None for datapoints without values.
+    :param width: The number of columns of the arrays.
+    :return: A tuple with the concatenated values and the offsets of each datapoint, with one extra final offset.
+    """
+    lengths = np.array([len(array) if array is not None else 0 for array in arrays], dtype=np.int64)
+    values = np.zeros((lengths.sum(), width), dtype=np.float32)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    for array, start, end in zip(arrays, offsets[:-1], offsets[1:]):
+        if end > start:
+            values[start:end] = array
+
+    return values, offsets
+
+
+def save_packed_dataset(path: str,
+                        data: MoleculeDataset,
+                        valid: List[bool],
+                        smiles_columns: List[str],
+                        task_names: List[str],
+                        features_generator: List[str] = None,
+                        sources: Dict[str, Any] = None,
+                        atom_descriptors: List[np.ndarray] = None,
+                        bond_descriptors: List[np.ndarray] = None) -> None:
+    r"""
+    Writes a dataset to a directory of :code:`.npy` arrays that :func:`load_packed_dataset` memory-maps.
+
+    The datapoints must be loaded with :code:`loss_function='bounded_mse'`, so that the inequality flags are kept,
+    and without skipping invalid SMILES, so that the rows of the dataset are the rows of the CSV file.
+
+    :param path: Path to the packed dataset directory.
+    :param data: A :class:`~chemprop.data.MoleculeDataset` with the datapoints of every row.
+    :param valid: Whether the molecules of each datapoint are valid, as checked by :func:`~chemprop.data.filter_invalid_smiles`.
+    :param smiles_columns: The names of the columns containing SMILES.
+    :param task_names: The names of the target columns.
+    :param features_generator: The features generators whose features are part of the datapoint features.
+    :param sources: The paths of the data files compiled into the dataset, keyed by the names of :code:`PACKED_SOURCES`.
+    :param atom_descriptors: The raw atom descriptors of each datapoint, if any.
+    :param bond_descriptors: The raw bond descriptors of each datapoint, if any.
+    """
+    sources = {name: _absolute_paths((sources or {}).get(name)) for name in PACKED_SOURCES}
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, PACKED_META_FILE_NAME)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    arrays = {}
+    encoded = [s.encode('utf-8') for d in data for s in d.smiles]
+    arrays['smiles'] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    arrays['smiles_offsets'] = np.concatenate([[0], np.cumsum([len(s) for s in encoded], dtype=np.int64)])
+    arrays['valid'] = np.array(valid, dtype=bool)
+    arrays['targets'] = np.array([d.targets for d in data], dtype=np.float64).reshape(len(data), len(task_names))
+    arrays['gt_targets'] = np.array([d.gt_targets for d in data], dtype=bool).reshape(len(data), len(task_names))
+    arrays['lt_targets'] = np.array([d.lt_targets for d in data], dtype=bool).reshape(len(data), len(task_names))
+
+    if sources['features_path'] is not None or sources['phase_features_path'] is not None or features_generator:
+        # Features generators do not produce anything for invalid molecules
+        features_size = max(len(d.features) for d in data)
+        arrays['features'] = np.zeros((len(data), features_size), dtype=np.float32)
+        for i, d in enumerate(data):
+            if len(d.features) == features_size:
+                # Memory-mapped features are kept as read, with their nans
+                arrays['features'][i] = _as_float32(d.features)
+
+    if sources['phase_features_path'] is not None:
+        arrays['phase_features'] = np.array([d.phase_features for d in data], dtype=np.float32)
+
+    if sources['data_weights_path'] is not None:
+        arrays['data_weights'] = np.array([d.data_weight for d in data], dtype=np.float64)
+
+    for name, descriptors in [('atom_descriptors', atom_descriptors), ('bond_descriptors', bond_descriptors)]:
+        if descriptors is not None:
+            width = next(len(d[0]) for d in descriptors if d is not None and len(d) > 0)
+            arrays[name], arrays[f'{name}_offsets'] = _ragged(descriptors, width)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), array)
+
+    meta = {
+        'version': PACKED_DATASET_VERSION,
+        'num_rows': len(data),
+        'smiles_columns': smiles_columns,
+        'task_names': task_names,
+        'features_generator': features_generator or None,
+        'sources': sources,
+        'has_inequalities': bool(arrays['gt_targets'].any() or arrays['lt_targets'].any()),
+        'arrays': sorted(arrays),
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=4)
+
+
+class PackedData:
+    """The arrays of a packed dataset directory, memory-mapped on first use."""
+
+    def __init__(self, path: str):
+        """
+        :param path: Path to the packed dataset directory.
+        """
+        self.path = path
+        with open(os.path.join(path, PACKED_META_FILE_NAME)) as f:
+            self.meta = json.load(f)
+        if self.meta['version'] != PACKED_DATASET_VERSION:
+            raise ValueError(f'The packed dataset {path} has version {self.meta["version"]} but version '
+                             f'{PACKED_DATASET_VERSION} is expected. Please run chemprop_preprocess again.')
+        self._arrays = {}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+
+        return self._arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.meta['arrays']
+
+    def __len__(self) -> int:
+        return self.meta['num_rows']
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Memory maps are reopened rather than copied into the pickle, e.g. when sent to a worker process
+        state = self.__dict__.copy()
+        state['_arrays'] = {}
+
+        return state
+
+    @property
+    def header(self) -> List[str]:
+        """The columns of the CSV file the dataset was compiled from, i.e. its SMILES and target columns."""
+        return self.meta['smiles_columns'] + self.meta['task_names']
+
+    def smiles(self, row: int) -> List[str]:
+        """
+        Decodes the SMILES of a row.
+
+        :param row: The index of the row in the CSV file.
+        :return: The SMILES of each molecule of the row.
+        """
+        number_of_molecules = len(self.meta['smiles_columns'])
+        offsets = self['smiles_offsets'][row * number_of_molecules:(row + 1) * number_of_molecules + 1].tolist()
+
+        return [self['smiles'][start:end].tobytes().decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def ragged(self, name: str, row: int) -> np.ndarray:
+        """
+        Gets the rows of a ragged array, e.g. the atom descriptors, that belong to a row of the dataset.
+
+        :param name: The name of the ragged array.
+        :param row: The index of the row in the CSV file.
+        :return: A read-only view of the array.
+        """
+        start, end = self[f'{name}_offsets'][row:row + 2].tolist()
+
+        return self[name][start:end]
+
+
+class PackedDatapoints(Sequence):
+    r"""
+    The :class:`~chemprop.data.MoleculeDatapoint`\ s of some rows of a :class:`PackedData`, which are only built
+    when first accessed and are then kept, so that a :class:`~chemprop.data.MoleculeDataset` over them can be
+    created without reading the dataset.
+    """
+
+    def __init__(self,
+                 packed: PackedData,
+                 rows: np.ndarray,
+                 target_indices: List[int],
+                 inequalities: bool = False,
+                 features: bool = False,
+                 phase_features: bool = False,
+                 data_weights: bool = False,
+                 atom_descriptors: str = None,
+                 bond_descriptors: str = None,
+                 overwrite_default_atom_features: bool = False,
+                 overwrite_default_bond_features: bool = False):
+        """
+        :param packed: The :class:`PackedData` of the dataset.
+        :param rows: The rows of the dataset.
+        :param target_indices: The indices of the targets in the packed targets.
+        :param inequalities: Whether to set the inequality flags of the targets.
+        :param features: Whether to set the features.
+        :param phase_features: Whether to set the phase features.
+        :param data_weights: Whether to set the data weights.
+        :param atom_descriptors: How to use the atom descriptors, i.e. :code:`'feature'`, :code:`'descriptor'`, or None.
+        :param bond_descriptors: How to use the bond descriptors, i.e. :code:`'feature'`, :code:`'descriptor'`, or None.
+        :param overwrite_default_atom_features: Boolean to overwrite default atom features by atom_features.
+        :param overwrite_default_bond_features: Boolean to overwrite default bond features by bond_features.
+        """
+        self.packed = packed
+        self.rows = rows
+        self.target_indices = target_indices
+        self.inequalities = inequalities
+        self.features = features
+        self.phase_features = phase_features
+        self.data_weights = data_weights
+        self.atom_descriptors = atom_descriptors
+        self.bond_descriptors = bond_descriptors
+        self.overwrite_default_atom_features = overwrite_default_atom_features
+        self.overwrite_default_bond_features = overwrite_default_bond_features
+        self._datapoints: List[Optional[MoleculeDatapoint]] = [None] * len(rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+
+        item = range(len(self))[item]
+        if self._datapoints[item] is None:
+            self._datapoints[item] = self._datapoint(int(self.rows[item]))
+
+        return self._datapoints[item]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _datapoint(self, row: int) -> MoleculeDatapoint:
+        packed = self.packed
+        targets = packed['targets'][row, self.target_indices]
+        kwargs = dict(
+            smiles=packed.smiles(row),
+            targets=[None if np.isnan(target) else target for target in targets.tolist()],
+            data_weight=float(packed['data_weights'][row]) if self.data_weights else None,
+            gt_targets=packed['gt_targets'][row, self.target_indices].tolist() if self.inequalities else None,
+            lt_targets=packed['lt_targets'][row, self.target_indices].tolist() if self.inequalities else None,
+            features=packed['features'][row] if self.features else None,
+            phase_features=packed['phase_features'][row].tolist() if self.phase_features else None,
+            overwrite_default_atom_features=self.overwrite_default_atom_features,
+            overwrite_default_bond_features=self.overwrite_default_bond_features,
+        )
+        if self.atom_descriptors is not None:
+            kwargs[f'atom_{self.atom_descriptors}s'] = packed.ragged('atom_descriptors', row)
+        if self.bond_descriptors is not None:
+            kwargs[f'bond_{self.bond_descriptors}s'] = packed.ragged('bond_descriptors', row)
+
+        return MoleculeDatapoint(**kwargs)
+
+
+def load_packed_dataset(path: str,
+                        smiles_columns: List[str] = None,
+                        target_columns: List[str] = None,
+                        skip_invalid_smiles: bool = True,
+                        features_path: List[str] = None,
+                        features_generator: List[str] = None,
+                        phase_features_path: str = None,
+                        data_weights_path: str = None,
+                        atom_descriptors: str = None,
+                        bond_descriptors: str = None,
+                        atom_descriptors_path: str = None,
+                        bond_descriptors_path: str = None,
+                        max_data_size: int = None,
+                        loss_function: str = None,
+                        skip_none_targets: bool = False,
+                        overwrite_default_atom_features: bool = False,
+                        overwrite_default_bond_features: bool = False,
+                        logger: Logger = None) -> MoleculeDataset:
+    r"""
+    Loads a packed dataset written by :func:`save_packed_dataset`.
+
+    Only the rows to keep are computed up front, with vectorized operations on the memory-mapped arrays, and the
+    :class:`~chemprop.data.MoleculeDatapoint`\ s are built as they are accessed. The features and descriptors were
+    compiled into the dataset, so the data files are not read again, but the same kinds of features must be requested
+    as when the dataset was compiled. Data file paths other than those the dataset was compiled from are not read, and
+    a warning is raised for them. The featurized graphs of the dataset, if any, are not set as the
+    :class:`~chemprop.data.MolGraphStore` here, see :func:`packed_graphs_path`.
+
+    :param path: Path to the packed dataset directory.
+    :param smiles_columns: The names of the columns containing SMILES. By default, uses those of the dataset.
+    :param target_columns: Name of the columns containing target values. By default, uses all those of the dataset.
+    :param skip_invalid_smiles: Whether to skip the datapoints with invalid SMILES.
+    :param features_path: The paths to the files containing features, which must have been compiled into the dataset.
+    :param features_generator: The features generators, which must be those the dataset was compiled with.
+    :param phase_features_path: The path to the phase features, which must have been compiled into the dataset.
+    :param data_weights_path: The path to the data weights. The compiled data weights are only used if it is given.
+    :param atom_descriptors: How to use the compiled atom descriptors, i.e. :code:`'feature'`, :code:`'descriptor'`, or None.
+    :param bond_descriptors: How to use the compiled bond descriptors, i.e. :code:`'feature'`, :code:`'descriptor'`, or None.
+    :param atom_descriptors_path: The path to the atom descriptors, which is only compared with the compiled one.
+    :param bond_descriptors_path: The path to the bond descriptors, which is only compared with the compiled one.
+    :param max_data_size: The maximum number of data points to load.
+    :param loss_function: The loss function to be used in training.
+    :param skip_none_targets: Whether to skip targets that are all 'None'.
+    :param overwrite_default_atom_features: Boolean to overwrite default atom features by atom_features.
+    :param overwrite_default_bond_features: Boolean to overwrite default bond features by bond_features.
+    :param logger: A logger for recording output.
+    :return: A :class:`~chemprop.data.MoleculeDataset` over the rows of the packed dataset.
+    """
+    debug = logger.debug if logger is not None else print
+    packed = PackedData(path)
+    meta = packed.meta
+
+    if smiles_columns is not None and list(smiles_columns) != meta['smiles_columns']:
+        raise ValueError(f'Provided smiles columns {smiles_columns} do not match those of the packed dataset '
+                         f'{path}: {meta["smiles_columns"]}.')
+    if target_columns is None:
+        target_columns = meta['task_names']
+    if any(column not in meta['task_names'] for column in target_columns):
+        raise ValueError(f'Packed dataset did not contain all provided target columns: {target_columns}. '
+                         f'Packed dataset target columns are: {meta["task_names"]}')
+
+    # The features are stored already concatenated, so they can only be used as a whole
+    sources = meta['sources']
+    if (features_generator or None) != meta['features_generator']:
+        raise ValueError(f'The packed dataset {path} was compiled with the features generators '
+                         f'{meta["features_generator"]} but {features_generator} were requested.')
+    for name, given in [('features_path', features_path), ('phase_features_path', phase_features_path)]:
+        if (given is not None) != (sources[name] is not None):
+            raise ValueError(f'The packed dataset {path} was compiled with {name} {sources[name]} '
+                             f'but {given} was requested.')
+    for name, given in [('data_weights_path', data_weights_path), ('atom_descriptors_path', atom_descriptors),
+                        ('bond_descriptors_path', bond_descriptors)]:
+        if given is not None and sources[name] is None:
+            raise ValueError(f'The packed dataset {path} was compiled without {name}. '
+                             f'Please run chemprop_preprocess with it.')
+    for name, given in [('features_path', features_path), ('phase_features_path', phase_features_path),
+                        ('data_weights_path', data_weights_path), ('atom_descriptors_path', atom_descriptors_path),
+                        ('bond_descriptors_path', bond_descriptors_path)]:
+        if given is not None and sources[name] is not None and _absolute_paths(given) != sources[name]:
+            warn(f'The packed dataset {path} was compiled with {name} {sources[name]}, which is used instead of '
+                 f'{given}. Please run chemprop_preprocess again to use other data files.')
+
+    inequalities = loss_function == 'bounded_mse'
+    if meta['has_inequalities'] and not inequalities:
+        raise ValueError('Inequality found in target data. To use inequality targets (> or <), '
+                         'the regression loss function bounded_mse must be used.')
+
+    target_indices = [meta['task_names'].index(column) for column in target_columns]
+    keep = np.ones(len(packed), dtype=bool)
+    if skip_none_targets:
+        keep &= ~np.isnan(packed['targets'][:, target_indices]).all(axis=1)
+    rows = np.flatnonzero(keep)
+    if max_data_size is not None:
+        rows = rows[:max_data_size]
+    if skip_invalid_smiles:
+        original_data_len = len(rows)
+        rows = rows[packed['valid'][rows]]
+
+        if len(rows) < original_data_len:
+            debug(f'Warning: {original_data_len - len(rows)} SMILES are invalid.')
+
+    return MoleculeDataset(PackedDatapoints(
+        packed=packed,
+        rows=rows,
+        target_indices=target_indices,
+        inequalities=inequalities,
+        features='features' in packed,
+        phase_features='phase_features' in packed,
+        data_weights=data_weights_path is not None,
+        atom_descriptors=atom_descriptors,
+        bond_descriptors=bond_descriptors,
+        overwrite_default_atom_features=overwrite_default_atom_features,
+        overwrite_default_bond_features=overwrite_default_bond_features,
+    ))
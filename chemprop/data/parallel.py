@@ -0,0 +1,88 @@
+from multiprocessing import Pool
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from rdkit import Chem
+from tqdm import tqdm
+
+from chemprop.features import featurization
+from chemprop.features.featurization import Featurization_parameters
+from .data import MoleculeDatapoint, SMILES_TO_MOL, cache_mol, empty_cache, graph_store, make_mol_graphs, \
+    set_cache_graph, set_graph_store
+
+
+def _init_worker(params: Featurization_parameters, graph_store_path: Optional[str]) -> None:
+    """
+    Sets up a featurization worker with the featurization parameters of the parent process.
+
+    :param params: The molecule featurization parameters.
+    :param graph_store_path: The path of the :class:`~chemprop.data.MolGraphStore`, if any.
+    """
+    featurization.PARAMS = params
+    # Graphs are only built to fill the store, which the parent reads them from
+    set_cache_graph(False)
+    set_graph_store(graph_store_path)
+
+
+def _featurize_chunk(chunk: List[Dict[str, Any]]) -> List[Tuple[MoleculeDatapoint, List[Union[Chem.Mol, Tuple[Chem.Mol, Chem.Mol]]]]]:
+    """
+    Builds the datapoints of a chunk, i.e. parses the molecules and runs the features generators,
+    and adds their graphs to the :class:`~chemprop.data.MolGraphStore` if one is used.
+
+    :param chunk: The keyword arguments of each :class:`~chemprop.data.MoleculeDatapoint`.
+    :return: The datapoints along with their RDKit molecules.
+    """
+    store = graph_store()
+    results = []
+    for kwargs in chunk:
+        datapoint = MoleculeDatapoint(**kwargs)
+        mols = datapoint.mol
+        if store is not None and all(mol is not None for mol in mols):
+            make_mol_graphs(datapoint)
+        results.append((datapoint, mols))
+
+    if store is not None:
+        store.flush()
+    # The molecules are sent back to the parent so there is no need to keep them in the worker
+    empty_cache()
+
+    return results
+
+
+def make_datapoints(datapoint_kwargs: List[Dict[str, Any]],
+                    num_workers: int,
+                    chunk_size: int = None) -> List[MoleculeDatapoint]:
+    r"""
+    Builds :class:`~chemprop.data.MoleculeDatapoint`\ s in a pool of processes.
+
+    Each worker builds chunks of consecutive datapoints, including SMILES parsing, features generators and, when a
+    :class:`~chemprop.data.MolGraphStore` is set, graph featurization. The RDKit molecules are added to the molecule
+    cache of the calling process.
+
+    :param datapoint_kwargs: The keyword arguments of each :class:`~chemprop.data.MoleculeDatapoint`.
+    :param num_workers: The number of worker processes.
+    :param chunk_size: The number of datapoints sent to a worker at a time. By default, each worker gets about
+                       four chunks, with at most 1000 datapoints per chunk.
+    :return: The datapoints, in the same order as :code:`datapoint_kwargs`.
+    """
+    if chunk_size is None:
+        chunk_size = min(1000, max(1, len(datapoint_kwargs) // (4 * num_workers)))
+    chunks = [datapoint_kwargs[i:i + chunk_size] for i in range(0, len(datapoint_kwargs), chunk_size)]
+    store = graph_store()
+
+    data = []
+    with Pool(num_workers, initializer=_init_worker,
+              initargs=(featurization.PARAMS, store.path if store is not None else None)) as pool:
+        with tqdm(total=len(datapoint_kwargs)) as progress_bar:
+            for results in pool.imap(_featurize_chunk, chunks):
+                for datapoint, mols in results:
+                    if cache_mol():
+                        for s, mol in zip(datapoint.smiles, mols):
+                            SMILES_TO_MOL[s] = mol
+                    data.append(datapoint)
+                progress_bar.update(len(results))
+
+    if store is not None:
+        # Opens the segments written by the workers
+        store.refresh()
+
+    return data
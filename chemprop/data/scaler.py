@@ -62,6 +62,20 @@ class StandardScaler:
 
         return transformed_with_none
 
+    def same_scaling(self, other: Optional['StandardScaler']) -> bool:
+        """
+        Checks whether another scaler performs the same scaling as this one.
+
+        :param other: Another :class:`StandardScaler` or None.
+        :return: Whether both scalers have the same means, standard deviations and NaN replacement token.
+        """
+        if other is None:
+            return False
+
+        return other is self or (np.array_equal(self.means, other.means, equal_nan=True)
+                                 and np.array_equal(self.stds, other.stds, equal_nan=True)
+                                 and self.replace_nan_token == other.replace_nan_token)
+
 class AtomBondScaler(StandardScaler):
     """A :class:`AtomBondScaler` normalizes the features of a dataset.
 
@@ -0,0 +1,100 @@
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import torch
+
+
+def _not_none(values: Sequence) -> np.ndarray:
+    """Returns a boolean array indicating which values are not None."""
+    return np.not_equal(np.array(values, dtype=object), None)
+
+
+def _to_float32(values: Sequence, mask: np.ndarray) -> np.ndarray:
+    """Converts values to a float32 array, replacing the missing values (None) by zero."""
+    return np.where(mask, np.array(values, dtype=object), 0).astype(np.float32)
+
+
+def ragged_take(offsets: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """
+    Computes the positions of the rows of a flat ragged array that belong to the given items.
+
+    :param offsets: An array of shape :code:`(num_items + 1,)` with the start of the rows of each item.
+    :param indices: The indices of the items to take.
+    :return: The positions of the rows of the items, in the order of :code:`indices`.
+    """
+    starts, lengths = offsets[indices], offsets[indices + 1] - offsets[indices]
+    batch_starts = np.cumsum(lengths) - lengths
+
+    return np.repeat(starts - batch_starts, lengths) + np.arange(lengths.sum())
+
+
+class TargetArrays:
+    """
+    A :class:`TargetArrays` holds the targets, masks, and loss weights of a whole dataset as contiguous arrays,
+    from which the tensors of the training batches are sliced.
+
+    Molecule-level targets are stored as :code:`(num_molecules, num_tasks)` arrays. Atomic and bond targets, which
+    have a value per atom or bond, are stored per task as a flat array of the values of all molecules along with the
+    offsets of each molecule.
+    """
+
+    def __init__(self, targets: List[List], data_weights: List[float], is_atom_bond_targets: bool = False,
+                 lt_targets: List[List[bool]] = None, gt_targets: List[List[bool]] = None):
+        """
+        :param targets: The targets of each molecule (containing None for unknown target values).
+        :param data_weights: The loss weight of each molecule.
+        :param is_atom_bond_targets: Whether the targets are atomic/bond targets, i.e. a list of values per task.
+        :param lt_targets: Whether each target is a less-than inequality, if any.
+        :param gt_targets: Whether each target is a greater-than inequality, if any.
+        """
+        self.is_atom_bond_targets = is_atom_bond_targets
+        self.data_weights = np.array(data_weights, dtype=np.float32)
+
+        if is_atom_bond_targets:
+            self.targets, self.mask, self.offsets = [], [], []
+            for task_targets in zip(*targets):
+                lengths = np.array([len(t) for t in task_targets], dtype=np.int64)
+                values = np.concatenate([np.asarray(t, dtype=object) for t in task_targets]) \
+                    if len(task_targets) > 0 else np.zeros(0, dtype=object)
+                mask = _not_none(values)
+                self.targets.append(_to_float32(values, mask))
+                self.mask.append(mask)
+                self.offsets.append(np.concatenate([[0], np.cumsum(lengths)]))
+            self.lt_targets = self.gt_targets = None
+        else:
+            self.mask = _not_none(targets).reshape(len(targets), -1)
+            self.targets = _to_float32(targets, self.mask).reshape(len(targets), -1)
+            self.lt_targets = np.array(lt_targets, dtype=bool) if lt_targets is not None else None
+            self.gt_targets = np.array(gt_targets, dtype=bool) if gt_targets is not None else None
+
+    def batch(self, indices: Sequence[int]) -> Dict[str, Optional[Union[torch.Tensor, List[torch.Tensor]]]]:
+        """
+        Slices the tensors of a batch.
+
+        :param indices: The indices of the molecules in the batch.
+        :return: A dictionary with the :code:`targets`, :code:`mask`, :code:`data_weights`, :code:`lt_targets`,
+                 and :code:`gt_targets` of the batch. For atomic/bond targets, the targets, masks, and data weights
+                 are lists with a flat tensor per task, and the data weights are repeated for each atom or bond.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+
+        if self.is_atom_bond_targets:
+            targets, mask, data_weights = [], [], []
+            for task_targets, task_mask, offsets in zip(self.targets, self.mask, self.offsets):
+                positions = ragged_take(offsets, indices)
+                targets.append(torch.from_numpy(task_targets[positions]))
+                mask.append(torch.from_numpy(task_mask[positions]))
+                data_weights.append(torch.from_numpy(
+                    np.repeat(self.data_weights[indices], offsets[indices + 1] - offsets[indices])
+                ).unsqueeze(1))
+
+            return {'targets': targets, 'mask': mask, 'data_weights': data_weights,
+                    'lt_targets': None, 'gt_targets': None}
+
+        return {
+            'targets': torch.from_numpy(self.targets[indices]),  # shape(batch, tasks)
+            'mask': torch.from_numpy(self.mask[indices]),  # shape(batch, tasks)
+            'data_weights': torch.from_numpy(self.data_weights[indices]).unsqueeze(1),  # shape(batch, 1)
+            'lt_targets': torch.from_numpy(self.lt_targets[indices]) if self.lt_targets is not None else None,
+            'gt_targets': torch.from_numpy(self.gt_targets[indices]) if self.gt_targets is not None else None,
+        }
@@ -1,20 +1,26 @@
 from collections import OrderedDict, defaultdict
+from itertools import islice
 import sys
 import csv
 import ctypes
+import gzip
+import io
 from logging import Logger
 import pickle
 from random import Random
-from typing import List, Set, Tuple, Union
+from typing import Dict, Iterator, List, Set, TextIO, Tuple, Union
 import os
 import json
 
 from rdkit import Chem
 import numpy as np
 import pandas as pd
+from scipy.sparse import hstack, issparse
 from tqdm import tqdm
 
 from .data import MoleculeDatapoint, MoleculeDataset, make_mols
+from .packed import PackedData, is_packed_dataset, load_packed_dataset
+from .parallel import make_datapoints
 from .scaffold import log_scaffold_stats, scaffold_split
 from chemprop.args import PredictArgs, TrainArgs
 from chemprop.features import load_features, load_valid_atom_or_bond_features, is_mol
@@ -26,15 +32,120 @@ csv.field_size_limit(int(ctypes.c_ulong(-1).value // 2))
 def get_header(path: str) -> List[str]:
     """
     Returns the header of a data CSV file.
-    :param path: Path to a CSV file.
+    :param path: Path to a CSV file or a packed dataset directory.
     :return: A list of strings containing the strings in the comma-separated header.
     """
-    with open(path) as f:
+    if is_packed_dataset(path):
+        return PackedData(path).header
+
+    with open_data_file(path) as f:
         header = next(csv.reader(f))
 
     return header
 
 
+def open_data_file(path: str) -> TextIO:
+    """
+    Opens a data CSV file for reading, decompressing gzip (:code:`.gz`) and Zstandard (:code:`.zst`) files on the fly.
+
+    :param path: Path to a CSV file, which may be compressed.
+    :return: A text file object.
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', newline='')
+
+    if path.endswith(('.zst', '.zstd')):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('Failed to import zstandard. Please install zstandard '
+                              '(pip install chemprop[zstd]) to read Zstandard-compressed files.')
+
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(reader, newline='')
+
+    return open(path, newline='')
+
+
+def read_data_csv(path: str, columns: List[str] = None, nrows: int = None) -> pd.DataFrame:
+    """
+    Reads the columns of a data CSV file as strings in a single pass with the C parser of pandas.
+
+    Empty cells are kept as empty strings, as read by :class:`csv.DictReader`.
+
+    :param path: Path to a CSV file, which may be compressed.
+    :param columns: The names of the columns to read. By default, reads all columns.
+    :param nrows: The maximum number of rows to read. By default, reads all rows.
+    :return: A :class:`~pandas.DataFrame` with a string column per column read.
+    """
+    with open_data_file(path) as f:
+        return pd.read_csv(f, usecols=columns, nrows=nrows, dtype=str, keep_default_na=False, na_filter=False,
+                           engine='c')
+
+
+def parse_targets(frame: pd.DataFrame,
+                  target_columns: List[str],
+                  loss_function: str = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, Dict[str, list]]:
+    """
+    Parses the target columns of a data CSV file read by :func:`read_data_csv`.
+
+    Numbers are parsed a column at a time. Only the remaining cells are then looked at: inequality targets
+    (:code:`<x` or :code:`>x`) and JSON lists of atom/bond targets, the latter decoded a column at a time.
+
+    :param frame: The :class:`~pandas.DataFrame` with the columns of the CSV file as strings.
+    :param target_columns: Name of the columns containing target values.
+    :param loss_function: The loss function to be used in training. Inequality targets require :code:`bounded_mse`.
+    :return: A tuple with a float array of the targets, a boolean array of the missing targets (empty or :code:`nan`),
+             boolean arrays of the targets of the form :code:`>x` and :code:`<x` and a dictionary mapping
+             the columns with JSON targets to a list of the decoded targets, which is None for the other cells.
+    """
+    num_rows, num_columns = len(frame), len(target_columns)
+    values = np.zeros((num_rows, num_columns))
+    missing = np.zeros((num_rows, num_columns), dtype=bool)
+    gt_targets = np.zeros((num_rows, num_columns), dtype=bool)
+    lt_targets = np.zeros((num_rows, num_columns), dtype=bool)
+    json_targets = {}
+
+    for j, column in enumerate(target_columns):
+        cells = frame[column]
+        numbers = pd.to_numeric(cells, errors='coerce').to_numpy(dtype=float)
+        missing[:, j] = cells.isin(['', 'nan']).to_numpy()
+        values[:, j] = numbers
+
+        unparsed = np.flatnonzero(np.isnan(numbers) & ~missing[:, j])
+        if len(unparsed) == 0:
+            continue
+
+        unparsed_cells = cells.iloc[unparsed]
+        gt = unparsed_cells.str.contains('>', regex=False).to_numpy()
+        lt = unparsed_cells.str.contains('<', regex=False).to_numpy()
+        if (gt & lt).any():
+            raise ValueError(f'A target value in column {column} contains both ">" and "<" symbols. '
+                             'Inequality targets must be on one edge and not express a range.')
+
+        inequality = gt | lt
+        if inequality.any():
+            if loss_function != 'bounded_mse':
+                raise ValueError('Inequality found in target data. To use inequality targets (> or <), '
+                                 'the regression loss function bounded_mse must be used.')
+            gt_targets[unparsed[gt], j] = True
+            lt_targets[unparsed[lt], j] = True
+            values[unparsed[inequality], j] = [float(value.strip('<>')) for value in unparsed_cells[inequality]]
+
+        is_json = ~inequality & unparsed_cells.str.contains(r'\[|\]').to_numpy()
+        if is_json.any():
+            decoded = json.loads('[' + ','.join(unparsed_cells[is_json].str.replace('None', 'null', regex=False)) + ']')
+            json_targets[column] = [None] * num_rows
+            for i, target in zip(unparsed[is_json], decoded):
+                json_targets[column][i] = target
+
+        # Other values, e.g. "NaN", are parsed as Python floats, which raises an error for invalid numbers
+        others = ~inequality & ~is_json
+        values[unparsed[others], j] = [float(value) for value in unparsed_cells[others]]
+
+    return values, missing, gt_targets, lt_targets, json_targets
+
+
 def preprocess_smiles_columns(path: str,
                               smiles_columns: Union[str, List[str]] = None,
                               number_of_molecules: int = 1) -> List[str]:
@@ -50,7 +161,7 @@ def preprocess_smiles_columns(path: str,
     """
 
     if smiles_columns is None:
-        if os.path.isfile(path):
+        if os.path.isfile(path) or is_packed_dataset(path):
             columns = get_header(path)
             smiles_columns = columns[:number_of_molecules]
         else:
@@ -58,7 +169,7 @@ def preprocess_smiles_columns(path: str,
     else:
         if isinstance(smiles_columns, str):
             smiles_columns = [smiles_columns]
-        if os.path.isfile(path):
+        if os.path.isfile(path) or is_packed_dataset(path):
             columns = get_header(path)
             if len(smiles_columns) != number_of_molecules:
                 raise ValueError('Length of smiles_columns must match number_of_molecules.')
@@ -145,7 +256,7 @@ def get_mixed_task_names(path: str,
     else:
         target_names = [column for column in columns if column not in ignore_columns]
 
-    with open(path) as f:
+    with open_data_file(path) as f:
         reader = csv.DictReader(f)
         for row in reader:
             atom_target_names, bond_target_names, molecule_target_names = [], [], []
@@ -203,7 +314,7 @@ def get_data_weights(path: str) -> List[float]:
     :return: A list of floats containing the data weights.
     """
     weights = []
-    with open(path) as f:
+    with open_data_file(path) as f:
         reader = csv.reader(f)
         next(reader)  # skip header row
         for line in reader:
@@ -261,7 +372,7 @@ def get_smiles(path: str,
     """
     Returns the SMILES from a data CSV file.
 
-    :param path: Path to a CSV file.
+    :param path: Path to a CSV file or a packed dataset directory.
     :param smiles_columns: A list of the names of the columns containing SMILES.
                            By default, uses the first :code:`number_of_molecules` columns.
     :param number_of_molecules: The number of molecules for each data point. Not necessary if
@@ -276,7 +387,18 @@ def get_smiles(path: str,
     if (isinstance(smiles_columns, str) or smiles_columns is None) and header:
         smiles_columns = preprocess_smiles_columns(path=path, smiles_columns=smiles_columns, number_of_molecules=number_of_molecules)
 
-    with open(path) as f:
+    if is_packed_dataset(path):
+        packed = PackedData(path)
+        if list(smiles_columns) != packed.meta['smiles_columns']:
+            raise ValueError(f'Provided smiles columns {smiles_columns} do not match those of the packed dataset '
+                             f'{path}: {packed.meta["smiles_columns"]}.')
+        smiles = [packed.smiles(row) for row in range(len(packed))]
+        if flatten:
+            smiles = [smile for smiles_list in smiles for smile in smiles_list]
+
+        return smiles
+
+    with open_data_file(path) as f:
         if header:
             reader = csv.DictReader(f)
         else:
@@ -375,11 +497,14 @@ def get_data(path: str,
              store_row: bool = False,
              logger: Logger = None,
              loss_function: str = None,
-             skip_none_targets: bool = False) -> MoleculeDataset:
+             skip_none_targets: bool = False,
+             featurization_workers: int = None) -> MoleculeDataset:
     """
-    Gets SMILES and target values from a CSV file.
+    Gets SMILES and target values from a CSV file or a packed dataset directory written by :code:`chemprop_preprocess`.
 
-    :param path: Path to a CSV file.
+    The CSV file is read in a single pass and its targets are parsed a column at a time, see :func:`parse_targets`.
+
+    :param path: Path to a CSV file, which may be gzip or Zstandard compressed, or a packed dataset directory.
     :param smiles_columns: The names of the columns containing SMILES.
                            By default, uses the first :code:`number_of_molecules` columns.
     :param target_columns: Name of the columns containing target values. By default, uses all columns
@@ -402,6 +527,8 @@ def get_data(path: str,
     :param skip_none_targets: Whether to skip targets that are all 'None'. This is mostly relevant when --target_columns
                               are passed in, so only a subset of tasks are examined.
     :param loss_function: The loss function to be used in training.
+    :param featurization_workers: The number of processes used to parse the molecules and compute the features.
+                                  0 builds the datapoints in the calling process.
     :return: A :class:`~chemprop.data.MoleculeDataset` containing SMILES and target values along
              with other info such as additional features when desired.
     """
@@ -422,18 +549,55 @@ def get_data(path: str,
         constraints_path = constraints_path if constraints_path is not None else args.constraints_path
         max_data_size = max_data_size if max_data_size is not None else args.max_data_size
         loss_function = loss_function if loss_function is not None else args.loss_function
+        featurization_workers = featurization_workers if featurization_workers is not None \
+            else args.featurization_workers
 
     if isinstance(smiles_columns, str) or smiles_columns is None:
         smiles_columns = preprocess_smiles_columns(path=path, smiles_columns=smiles_columns)
 
+    if is_packed_dataset(path):
+        if store_row:
+            raise ValueError(f'The packed dataset {path} does not store the rows of its CSV file.')
+        if target_columns is None:
+            target_columns = get_task_names(path=path, smiles_columns=smiles_columns, ignore_columns=ignore_columns,
+                                            loss_function=loss_function)
+
+        return load_packed_dataset(
+            path=path,
+            smiles_columns=smiles_columns,
+            target_columns=target_columns,
+            skip_invalid_smiles=skip_invalid_smiles,
+            features_path=features_path,
+            features_generator=features_generator,
+            phase_features_path=phase_features_path,
+            data_weights_path=data_weights_path,
+            atom_descriptors=args.atom_descriptors if args is not None else None,
+            bond_descriptors=args.bond_descriptors if args is not None else None,
+            atom_descriptors_path=atom_descriptors_path,
+            bond_descriptors_path=bond_descriptors_path,
+            max_data_size=max_data_size,
+            loss_function=loss_function,
+            skip_none_targets=skip_none_targets,
+            overwrite_default_atom_features=args.overwrite_default_atom_features if args is not None else False,
+            overwrite_default_bond_features=args.overwrite_default_bond_features if args is not None else False,
+            logger=logger,
+        )
+
     max_data_size = max_data_size or float('inf')
+    featurization_workers = featurization_workers or 0
 
     # Load features
+    sparse_features = args.sparse_features if args is not None else False
     if features_path is not None:
         features_data = []
         for feat_path in features_path:
-            features_data.append(load_features(feat_path))  # each is num_data x num_features
-        features_data = np.concatenate(features_data, axis=1)
+            features_data.append(load_features(feat_path, sparse=sparse_features))  # each is num_data x num_features
+        if len(features_data) == 1:
+            features_data = features_data[0]  # .npy features stay memory-mapped
+        elif sparse_features:
+            features_data = hstack(features_data, format='csr')
+        else:
+            features_data = np.concatenate(features_data, axis=1)
     else:
         features_data = None
 
@@ -442,7 +606,9 @@ def get_data(path: str,
         for d_phase in phase_features:
             if not (d_phase.sum() == 1 and np.count_nonzero(d_phase) == 1):
                 raise ValueError('Phase features must be one-hot encoded.')
-        if features_data is not None:
+        if features_data is not None and issparse(features_data):
+            features_data = hstack((features_data, phase_features), format='csr')
+        elif features_data is not None:
             features_data = np.concatenate((features_data, phase_features), axis=1)
         else:  # if there are no other molecular features, phase features become the only molecular features
             features_data = np.array(phase_features)
@@ -476,152 +642,225 @@ def get_data(path: str,
             loss_function=loss_function,
         )
 
-    # Find targets provided as inequalities
+    # Load data
+    header = get_header(path)
+    if any([c not in header for c in smiles_columns]):
+        raise ValueError(f'Data file did not contain all provided smiles columns: {smiles_columns}. Data file field names are: {header}')
+    if any([c not in header for c in target_columns]):
+        raise ValueError(f'Data file did not contain all provided target columns: {target_columns}. Data file field names are: {header}')
+
+    frame = read_data_csv(
+        path=path,
+        columns=None if store_row else list(dict.fromkeys(smiles_columns + target_columns)),
+        nrows=max_data_size if max_data_size < float('inf') and not skip_none_targets else None,
+    )
+    values, missing, gt_targets, lt_targets, json_targets = parse_targets(
+        frame=frame,
+        target_columns=target_columns,
+        loss_function=loss_function,
+    )
+
+    # Check whether all targets are None and skip if so
+    rows = np.flatnonzero(~missing.all(axis=1)) if skip_none_targets else np.arange(len(frame))
+    if max_data_size < len(rows):
+        rows = rows[:int(max_data_size)]
+
+    all_smiles = frame[smiles_columns].to_numpy()[rows].tolist()
+    targets_data = values[rows].astype(object)
+    targets_data[missing[rows]] = None
+    all_targets = targets_data.tolist()
+    all_atom_targets, all_bond_targets = [[] for _ in rows], [[] for _ in rows]
+
+    # Arrange the JSON lists of atom/bond targets
+    if json_targets:
+        atom_target_columns = args.atom_targets if args is not None else []
+        bond_target_columns = args.bond_targets if args is not None else []
+        for k, i in enumerate(rows):
+            for j, column in enumerate(target_columns):
+                if column not in json_targets or json_targets[column][i] is None:
+                    continue
+
+                target = np.array(json_targets[column][i])
+                if len(target.shape) == 1 and column in atom_target_columns:  # Atom targets saved as 1D list
+                    all_atom_targets[k].append(target)
+                elif len(target.shape) == 1 and column in bond_target_columns:  # Bond targets saved as 1D list
+                    all_bond_targets[k].append(target)
+                elif len(target.shape) == 2:  # Bond targets saved as 2D list
+                    mol = make_mol(all_smiles[k][0], args.explicit_h, args.adding_h, args.keeping_atom_map)
+                    target = np.array([target[bond.GetBeginAtom().GetIdx(), bond.GetEndAtom().GetIdx()]
+                                       for bond in mol.GetBonds()])
+                    all_bond_targets[k].append(target)
+                else:
+                    raise ValueError(f'Unrecognized targets of column {column} in {path}.')
+                all_targets[k][j] = target
+    has_atom_targets, has_bond_targets = any(all_atom_targets), any(all_bond_targets)
+
+    # Other data are indexed by the row of the data file
+    all_features = [features_data[i] for i in rows] if features_data is not None else []
+    all_phase_features = [phase_features[i] for i in rows] if phase_features is not None else []
+    all_constraints_data = [constraints_data[i] for i in rows] if constraints_data is not None else []
+    all_raw_constraints_data = [raw_constraints_data[i] for i in rows] if raw_constraints_data is not None else []
+    all_weights = [data_weights[i] for i in rows] if data_weights is not None else []
     if loss_function == 'bounded_mse':
-        gt_targets, lt_targets = get_inequality_targets(path=path, target_columns=target_columns)
+        all_gt, all_lt = gt_targets[rows].tolist(), lt_targets[rows].tolist()
     else:
         gt_targets, lt_targets = None, None
+    if store_row:
+        all_rows = [OrderedDict(zip(frame.columns, row)) for row in frame.to_numpy()[rows].tolist()]
 
-    # Load data
-    with open(path) as f:
-        reader = csv.DictReader(f)
-        fieldnames = reader.fieldnames
-        if any([c not in fieldnames for c in smiles_columns]):
-            raise ValueError(f'Data file did not contain all provided smiles columns: {smiles_columns}. Data file field names are: {fieldnames}')
-        if any([c not in fieldnames for c in target_columns]):
-            raise ValueError(f'Data file did not contain all provided target columns: {target_columns}. Data file field names are: {fieldnames}')
-
-        all_smiles, all_targets, all_atom_targets, all_bond_targets, all_rows, all_features, all_phase_features, all_constraints_data, all_raw_constraints_data, all_weights, all_gt, all_lt = [], [], [], [], [], [], [], [], [], [], [], []
-        for i, row in enumerate(tqdm(reader)):
-            smiles = [row[c] for c in smiles_columns]
+    atom_features = None
+    atom_descriptors = None
+    if args is not None and args.atom_descriptors is not None:
+        try:
+            descriptors = load_valid_atom_or_bond_features(atom_descriptors_path, [x[0] for x in all_smiles])
+        except Exception as e:
+            raise ValueError(f'Failed to load or validate custom atomic descriptors or features: {e}')
+
+        if args.atom_descriptors == 'feature':
+            atom_features = descriptors
+        elif args.atom_descriptors == 'descriptor':
+            atom_descriptors = descriptors
+
+    bond_features = None
+    bond_descriptors = None
+    if args is not None and args.bond_descriptors is not None:
+        try:
+            descriptors = load_valid_atom_or_bond_features(bond_descriptors_path, [x[0] for x in all_smiles])
+        except Exception as e:
+            raise ValueError(f'Failed to load or validate custom bond descriptors or features: {e}')
+
+        if args.bond_descriptors == 'feature':
+            bond_features = descriptors
+        elif args.bond_descriptors == 'descriptor':
+            bond_descriptors = descriptors
+
+    datapoint_kwargs = [
+        dict(
+            smiles=smiles,
+            targets=targets,
+            atom_targets=all_atom_targets[i] if has_atom_targets else None,
+            bond_targets=all_bond_targets[i] if has_bond_targets else None,
+            row=all_rows[i] if store_row else None,
+            data_weight=all_weights[i] if data_weights is not None else None,
+            gt_targets=all_gt[i] if gt_targets is not None else None,
+            lt_targets=all_lt[i] if lt_targets is not None else None,
+            features_generator=features_generator,
+            features=all_features[i] if features_data is not None else None,
+            phase_features=all_phase_features[i] if phase_features is not None else None,
+            atom_features=atom_features[i] if atom_features is not None else None,
+            atom_descriptors=atom_descriptors[i] if atom_descriptors is not None else None,
+            bond_features=bond_features[i] if bond_features is not None else None,
+            bond_descriptors=bond_descriptors[i] if bond_descriptors is not None else None,
+            constraints=all_constraints_data[i] if constraints_data is not None else None,
+            raw_constraints=all_raw_constraints_data[i] if raw_constraints_data is not None else None,
+            overwrite_default_atom_features=args.overwrite_default_atom_features if args is not None else False,
+            overwrite_default_bond_features=args.overwrite_default_bond_features if args is not None else False
+        ) for i, (smiles, targets) in enumerate(zip(all_smiles, all_targets))
+    ]
+
+    if featurization_workers > 0:
+        data = MoleculeDataset(make_datapoints(datapoint_kwargs, num_workers=featurization_workers))
+    else:
+        data = MoleculeDataset([MoleculeDatapoint(**kwargs) for kwargs in tqdm(datapoint_kwargs)])
 
-            targets, atom_targets, bond_targets = [], [], []
-            for column in target_columns:
-                value = row[column]
-                if value in ['', 'nan']:
-                    targets.append(None)
-                elif '>' in value or '<' in value:
-                    if loss_function == 'bounded_mse':
-                        targets.append(float(value.strip('<>')))
-                    else:
-                        raise ValueError('Inequality found in target data. To use inequality targets (> or <), the regression loss function bounded_mse must be used.')
-                elif '[' in value or ']' in value:
-                    value = value.replace('None', 'null')
-                    target = np.array(json.loads(value))
-                    if len(target.shape) == 1 and column in args.atom_targets:  # Atom targets saved as 1D list
-                        atom_targets.append(target)
-                        targets.append(target)
-                    elif len(target.shape) == 1 and column in args.bond_targets:  # Bond targets saved as 1D list
-                        bond_targets.append(target)
-                        targets.append(target)
-                    elif len(target.shape) == 2:  # Bond targets saved as 2D list
-                        bond_target_arranged = []
-                        mol = make_mol(smiles[0], args.explicit_h, args.adding_h, args.keeping_atom_map)
-                        for bond in mol.GetBonds():
-                            bond_target_arranged.append(target[bond.GetBeginAtom().GetIdx(), bond.GetEndAtom().GetIdx()])
-                        bond_targets.append(np.array(bond_target_arranged))
-                        targets.append(np.array(bond_target_arranged))
-                    else:
-                        raise ValueError(f'Unrecognized targets of column {column} in {path}.')
-                else:
-                    targets.append(float(value))
+    # Filter out invalid SMILES
+    if skip_invalid_smiles:
+        original_data_len = len(data)
+        data = filter_invalid_smiles(data)
 
-            # Check whether all targets are None and skip if so
-            if skip_none_targets and all(x is None for x in targets):
-                continue
+        if len(data) < original_data_len:
+            debug(f'Warning: {original_data_len - len(data)} SMILES are invalid.')
 
-            all_smiles.append(smiles)
-            all_targets.append(targets)
-            all_atom_targets.append(atom_targets)
-            all_bond_targets.append(bond_targets)
+    data.consolidate_features()
 
-            if features_data is not None:
-                all_features.append(features_data[i])
+    return data
 
-            if phase_features is not None:
-                all_phase_features.append(phase_features[i])
 
-            if constraints_data is not None:
-                all_constraints_data.append(constraints_data[i])
+def get_data_chunks(path: str,
+                    chunk_size: int,
+                    smiles_columns: Union[str, List[str]] = None,
+                    args: PredictArgs = None,
+                    features_path: List[str] = None,
+                    features_generator: List[str] = None,
+                    phase_features_path: str = None,
+                    start_row: int = 0,
+                    store_row: bool = False,
+                    featurization_workers: int = None) -> Iterator[MoleculeDataset]:
+    r"""
+    Reads SMILES from a CSV file in chunks of rows, without targets, so that files too large to fit in memory
+    can be processed one chunk at a time. Invalid SMILES are kept.
 
-            if raw_constraints_data is not None:
-                all_raw_constraints_data.append(raw_constraints_data[i])
+    Only the rows of the features files matching each chunk are loaded (see :func:`~chemprop.features.load_features`),
+    except for :code:`.npz` and pickle files, which cannot be read partially and are instead loaded once and sliced
+    for each chunk.
 
-            if data_weights is not None:
-                all_weights.append(data_weights[i])
+    :param path: Path to a CSV file.
+    :param chunk_size: The maximum number of datapoints in a chunk.
+    :param smiles_columns: The names of the columns containing SMILES.
+                           By default, uses the first :code:`number_of_molecules` columns.
+    :param args: Arguments, i.e. a :class:`~chemprop.args.PredictArgs`.
+    :param features_path: A list of paths to files containing features. If provided, it is used
+                          in place of :code:`args.features_path`.
+    :param features_generator: A list of features generators to use. If provided, it is used
+                               in place of :code:`args.features_generator`.
+    :param phase_features_path: A path to a file containing phase features as applicable to spectra.
+    :param start_row: The index of the first data row to read, e.g. to resume an interrupted job.
+    :param store_row: Whether to store the raw CSV row in each :class:`~chemprop.data.data.MoleculeDatapoint`.
+    :param featurization_workers: The number of processes used to parse the molecules and compute the features.
+    :return: An iterator over :class:`~chemprop.data.MoleculeDataset`\ s of consecutive rows, in file order.
+    """
+    if args is not None:
+        smiles_columns = smiles_columns if smiles_columns is not None else args.smiles_columns
+        features_path = features_path if features_path is not None else args.features_path
+        features_generator = features_generator if features_generator is not None else args.features_generator
+        phase_features_path = phase_features_path if phase_features_path is not None else args.phase_features_path
+        featurization_workers = featurization_workers if featurization_workers is not None \
+            else args.featurization_workers
+    featurization_workers = featurization_workers or 0
 
-            if gt_targets is not None:
-                all_gt.append(gt_targets[i])
+    if isinstance(smiles_columns, str) or smiles_columns is None:
+        smiles_columns = preprocess_smiles_columns(path=path, smiles_columns=smiles_columns)
 
-            if lt_targets is not None:
-                all_lt.append(lt_targets[i])
+    # Only the rows of the features files matching the current chunk are loaded
+    features_paths = (features_path or []) + ([phase_features_path] if phase_features_path is not None else [])
+    # Reading a file that cannot be read partially for every chunk would be quadratic in its number of rows
+    loaded_features = {feat_path: load_features(feat_path, sparse=True) for feat_path in features_paths
+                       if os.path.splitext(feat_path)[1] in ['.npz', '.pkl', '.pckl', '.pickle']}
 
-            if store_row:
-                all_rows.append(row)
+    with open_data_file(path) as f:
+        reader = csv.DictReader(f)
+        if any([c not in reader.fieldnames for c in smiles_columns]):
+            raise ValueError(f'Data file did not contain all provided smiles columns: {smiles_columns}. Data file field names are: {reader.fieldnames}')
 
-            if len(all_smiles) >= max_data_size:
+        rows = islice(enumerate(reader), start_row, None)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if len(chunk) == 0:
                 break
 
-        atom_features = None
-        atom_descriptors = None
-        if args is not None and args.atom_descriptors is not None:
-            try:
-                descriptors = load_valid_atom_or_bond_features(atom_descriptors_path, [x[0] for x in all_smiles])
-            except Exception as e:
-                raise ValueError(f'Failed to load or validate custom atomic descriptors or features: {e}')
-
-            if args.atom_descriptors == 'feature':
-                atom_features = descriptors
-            elif args.atom_descriptors == 'descriptor':
-                atom_descriptors = descriptors
-
-        bond_features = None
-        bond_descriptors = None
-        if args is not None and args.bond_descriptors is not None:
-            try:
-                descriptors = load_valid_atom_or_bond_features(bond_descriptors_path, [x[0] for x in all_smiles])
-            except Exception as e:
-                raise ValueError(f'Failed to load or validate custom bond descriptors or features: {e}')
-
-            if args.bond_descriptors == 'feature':
-                bond_features = descriptors
-            elif args.bond_descriptors == 'descriptor':
-                bond_descriptors = descriptors
-
-        data = MoleculeDataset([
-            MoleculeDatapoint(
-                smiles=smiles,
-                targets=targets,
-                atom_targets=all_atom_targets[i] if atom_targets else None,
-                bond_targets=all_bond_targets[i] if bond_targets else None,
-                row=all_rows[i] if store_row else None,
-                data_weight=all_weights[i] if data_weights is not None else None,
-                gt_targets=all_gt[i] if gt_targets is not None else None,
-                lt_targets=all_lt[i] if lt_targets is not None else None,
-                features_generator=features_generator,
-                features=all_features[i] if features_data is not None else None,
-                phase_features=all_phase_features[i] if phase_features is not None else None,
-                atom_features=atom_features[i] if atom_features is not None else None,
-                atom_descriptors=atom_descriptors[i] if atom_descriptors is not None else None,
-                bond_features=bond_features[i] if bond_features is not None else None,
-                bond_descriptors=bond_descriptors[i] if bond_descriptors is not None else None,
-                constraints=all_constraints_data[i] if constraints_data is not None else None,
-                raw_constraints=all_raw_constraints_data[i] if raw_constraints_data is not None else None,
-                overwrite_default_atom_features=args.overwrite_default_atom_features if args is not None else False,
-                overwrite_default_bond_features=args.overwrite_default_bond_features if args is not None else False
-            ) for i, (smiles, targets) in tqdm(enumerate(zip(all_smiles, all_targets)),
-                                            total=len(all_smiles))
-        ])
-
-    # Filter out invalid SMILES
-    if skip_invalid_smiles:
-        original_data_len = len(data)
-        data = filter_invalid_smiles(data)
-
-        if len(data) < original_data_len:
-            debug(f'Warning: {original_data_len - len(data)} SMILES are invalid.')
-
-    return data
+            first_row, end_row = chunk[0][0], chunk[0][0] + len(chunk)
+            features_data = []
+            for feat_path in features_paths:
+                if feat_path in loaded_features:
+                    features = loaded_features[feat_path][first_row:end_row]
+                    features_data.append(features.toarray() if issparse(features) else features)
+                else:
+                    features_data.append(load_features(feat_path, start_row=first_row, end_row=end_row))
+
+            datapoint_kwargs = [
+                dict(
+                    smiles=[row[c] for c in smiles_columns],
+                    row=row if store_row else None,
+                    features_generator=features_generator,
+                    features=np.concatenate([features[j] for features in features_data]) if features_data else None,
+                    phase_features=features_data[-1][j] if phase_features_path is not None else None,
+                ) for j, (_, row) in enumerate(chunk)
+            ]
+
+            if featurization_workers > 0:
+                yield MoleculeDataset(make_datapoints(datapoint_kwargs, num_workers=featurization_workers))
+            else:
+                yield MoleculeDataset([MoleculeDatapoint(**kwargs) for kwargs in datapoint_kwargs])
 
 
 def get_data_from_smiles(smiles: List[List[str]],
@@ -655,26 +894,24 @@ def get_data_from_smiles(smiles: List[List[str]],
         if len(data) < original_data_len:
             debug(f'Warning: {original_data_len - len(data)} SMILES are invalid.')
 
+    data.consolidate_features()
+
     return data
 
 
-def get_inequality_targets(path: str, target_columns: List[str] = None) -> List[str]:
+def get_inequality_targets(path: str, target_columns: List[str] = None) -> Tuple[List[List[bool]], List[List[bool]]]:
     """
+    Finds the targets of a data CSV file which are given as inequalities.
 
+    :param path: Path to a CSV file, which may be compressed.
+    :param target_columns: Name of the columns containing target values.
+    :return: A tuple of lists with whether each target of each row is of the form :code:`>x` and of the form :code:`<x`.
     """
-    gt_targets = []
-    lt_targets = []
-
-    with open(path) as f:
-        reader = csv.DictReader(f)
-        for line in reader:
-            values = [line[col] for col in target_columns]
-            gt_targets.append(['>' in val for val in values])
-            lt_targets.append(['<' in val for val in values])
-            if any(['<' in val and '>' in val for val in values]):
-                raise ValueError(f'A target value in csv file {path} contains both ">" and "<" symbols. Inequality targets must be on one edge and not express a range.')
+    frame = read_data_csv(path=path, columns=list(dict.fromkeys(target_columns)))
+    _, _, gt_targets, lt_targets, _ = parse_targets(frame=frame, target_columns=target_columns,
+                                                    loss_function='bounded_mse')
 
-    return gt_targets, lt_targets
+    return gt_targets.tolist(), lt_targets.tolist()
 
 def split_data(data: MoleculeDataset,
                split_type: str = 'random',
@@ -934,7 +1171,7 @@ def validate_data(data_path: str) -> Set[str]:
 
     header = get_header(data_path)
 
-    with open(data_path) as f:
+    with open_data_file(data_path) as f:
         reader = csv.reader(f)
         next(reader)  # Skip header
 
@@ -1,4 +1,5 @@
-from typing import List, Tuple, Union
+from typing import Dict, List, Tuple, Union
+from functools import lru_cache
 from itertools import zip_longest
 import logging
 
@@ -265,6 +266,90 @@ def bond_features(bond: Chem.rdchem.Bond) -> List[Union[bool, int, float]]:
     return fbond
 
 
+@lru_cache(maxsize=None)
+def _onek_columns(choices: Tuple[int, ...], offset: int) -> Tuple[Dict[int, int], int]:
+    """
+    Maps each choice to the column it sets in a one-hot encoding (see :meth:`onek_encoding_unk`).
+
+    :param choices: A tuple of possible values.
+    :param offset: The column at which the one-hot encoding starts.
+    :return: A dictionary from each choice to its column and the column used for uncommon values.
+    """
+    columns = {}
+    for i, choice in enumerate(choices):
+        columns.setdefault(int(choice), offset + i)
+
+    return columns, offset + len(choices)
+
+
+def atom_features_array(atoms: List[Chem.rdchem.Atom]) -> np.ndarray:
+    """
+    Builds the feature matrix for a list of atoms.
+
+    Row :code:`i` is identical to :code:`atom_features(atoms[i])`, but the one-hot encodings are written
+    directly into a preallocated array rather than built up as Python lists.
+
+    :param atoms: A list of RDKit atoms.
+    :return: A 2D numpy array of shape :code:`(len(atoms), ATOM_FDIM)` containing the atom features.
+    """
+    f_atoms = np.zeros((len(atoms), PARAMS.ATOM_FDIM), dtype=np.float32)
+    if len(atoms) == 0:
+        return f_atoms
+
+    offset = 0
+    columns = []
+    for name in ['atomic_num', 'degree', 'formal_charge', 'chiral_tag', 'num_Hs', 'hybridization']:
+        columns.append(_onek_columns(tuple(PARAMS.ATOM_FEATURES[name]), offset))
+        offset += len(PARAMS.ATOM_FEATURES[name]) + 1
+    (atomic_num, atomic_num_unk), (degree, degree_unk), (formal_charge, formal_charge_unk), \
+        (chiral_tag, chiral_tag_unk), (num_hs, num_hs_unk), (hybridization, hybridization_unk) = columns
+
+    props = np.array([(atomic_num.get(atom.GetAtomicNum() - 1, atomic_num_unk),
+                       degree.get(atom.GetTotalDegree(), degree_unk),
+                       formal_charge.get(atom.GetFormalCharge(), formal_charge_unk),
+                       chiral_tag.get(int(atom.GetChiralTag()), chiral_tag_unk),
+                       num_hs.get(int(atom.GetTotalNumHs()), num_hs_unk),
+                       hybridization.get(int(atom.GetHybridization()), hybridization_unk),
+                       atom.GetIsAromatic(),
+                       atom.GetMass() * 0.01)  # scaled to about the same range as other features
+                      for atom in atoms])
+    f_atoms[np.arange(len(atoms))[:, None], props[:, :6].astype(int)] = 1
+    f_atoms[:, offset:offset + 2] = props[:, 6:]
+
+    return f_atoms
+
+
+def bond_features_array(bonds: List[Chem.rdchem.Bond]) -> np.ndarray:
+    """
+    Builds the feature matrix for a list of bonds.
+
+    Row :code:`i` is identical to :code:`bond_features(bonds[i])`.
+
+    :param bonds: A list of RDKit bonds.
+    :return: A 2D numpy array of shape :code:`(len(bonds), BOND_FDIM)` containing the bond features.
+    """
+    f_bonds = np.zeros((len(bonds), PARAMS.BOND_FDIM), dtype=np.float32)
+    if len(bonds) == 0:
+        return f_bonds
+
+    bond_type, bond_type_unk = _onek_columns((Chem.rdchem.BondType.SINGLE, Chem.rdchem.BondType.DOUBLE,
+                                              Chem.rdchem.BondType.TRIPLE, Chem.rdchem.BondType.AROMATIC), 1)
+    stereo, stereo_unk = _onek_columns(tuple(range(6)), 7)
+
+    props = np.array([(bond_type.get(int(bond.GetBondType()), bond_type_unk),
+                       bond.GetIsConjugated(),
+                       bond.IsInRing(),
+                       stereo.get(int(bond.GetStereo()), stereo_unk))
+                      for bond in bonds], dtype=int)
+    rows = np.arange(len(bonds))
+    known_type = props[:, 0] != bond_type_unk  # other bond types (e.g. dative) set none of the bond type columns
+    f_bonds[rows[known_type], props[known_type, 0]] = 1
+    f_bonds[:, 5:7] = props[:, 1:3]
+    f_bonds[rows, props[:, 3]] = 1
+
+    return f_bonds
+
+
 def map_reac_to_prod(mol_reac: Chem.Mol, mol_prod: Chem.Mol):
     """
     Build a dictionary of mapping atom indices in the reactants to the products.
@@ -306,11 +391,11 @@ class MolGraph:
 
     * :code:`n_atoms`: The number of atoms in the molecule.
     * :code:`n_bonds`: The number of bonds in the molecule.
-    * :code:`f_atoms`: A mapping from an atom index to a list of atom features.
-    * :code:`f_bonds`: A mapping from a bond index to a list of bond features.
-    * :code:`a2b`: A mapping from an atom index to a list of incoming bond indices.
-    * :code:`b2a`: A mapping from a bond index to the index of the atom the bond originates from.
-    * :code:`b2revb`: A mapping from a bond index to the index of the reverse bond.
+    * :code:`f_atoms`: A float32 array mapping from an atom index to its atom features.
+    * :code:`f_bonds`: A float32 array mapping from a bond index to its bond features.
+    * :code:`a2b`: A mapping from an atom index to an int32 array of incoming bond indices.
+    * :code:`b2a`: An int32 array mapping from a bond index to the index of the atom the bond originates from.
+    * :code:`b2revb`: An int32 array mapping from a bond index to the index of the reverse bond.
     * :code:`overwrite_default_atom_features`: A boolean to overwrite default atom descriptors.
     * :code:`overwrite_default_bond_features`: A boolean to overwrite default bond descriptors.
     * :code:`is_mol`: A boolean whether the input is a molecule.
@@ -351,7 +436,7 @@ class MolGraph:
         self.n_bonds = 0  # number of bonds
         self.f_atoms = []  # mapping from atom index to atom features
         self.f_bonds = []  # mapping from bond index to concat(in_atom, bond) features
-        self.a2b = []  # mapping from atom index to incoming bond indices
+        self._a2b = None  # mapping from atom index to incoming bond indices, built on first access
         self.b2a = []  # mapping from bond index to the index of the atom the bond is coming from
         self.b2revb = []  # mapping from bond index to the index of the reverse bond
         self.overwrite_default_atom_features = overwrite_default_atom_features
@@ -359,59 +444,47 @@ class MolGraph:
 
         if not self.is_reaction:
             # Get atom features
-            self.f_atoms = [atom_features(atom) for atom in mol.GetAtoms()]
+            self.f_atoms = atom_features_array([mol.GetAtomWithIdx(i) for i in range(mol.GetNumAtoms())])
+            self.n_atoms = len(self.f_atoms)
             if atom_features_extra is not None:
+                if len(atom_features_extra) != self.n_atoms:
+                    raise ValueError(f'The number of atoms in {Chem.MolToSmiles(mol)} is different from the length of '
+                                     f'the extra atom features')
+                atom_features_extra = np.asarray(atom_features_extra, dtype=np.float32)
                 if overwrite_default_atom_features:
-                    self.f_atoms = [descs.tolist() for descs in atom_features_extra]
+                    self.f_atoms = atom_features_extra
                 else:
-                    self.f_atoms = [f_atoms + descs.tolist() for f_atoms, descs in zip(self.f_atoms, atom_features_extra)]
+                    self.f_atoms = np.hstack([self.f_atoms, atom_features_extra])
 
-            self.n_atoms = len(self.f_atoms)
-            if atom_features_extra is not None and len(atom_features_extra) != self.n_atoms:
-                raise ValueError(f'The number of atoms in {Chem.MolToSmiles(mol)} is different from the length of '
-                                 f'the extra atom features')
+            bonds = [mol.GetBondWithIdx(i) for i in range(mol.GetNumBonds())]
+            if bond_features_extra is not None and len(bond_features_extra) != len(bonds):
+                raise ValueError(f'The number of bonds in {Chem.MolToSmiles(mol)} is different from the length of '
+                                 f'the extra bond features')
 
-            # Initialize atom to bond mapping for each atom
-            for _ in range(self.n_atoms):
-                self.a2b.append([])
-
-            # Initialize f_bonds to real bonds mapping for each bond
-            self.b2br = np.zeros([len(mol.GetBonds()), 2])
+            # Order the bonds by (a1, a2) with a1 < a2, i.e. the order in which a search over all atom pairs finds them
+            ends = np.array([(bond.GetBeginAtomIdx(), bond.GetEndAtomIdx()) for bond in bonds], dtype=np.int32).reshape(-1, 2)
+            ends.sort(axis=1)
+            order = np.lexsort((ends[:, 1], ends[:, 0]))
+            ends = ends[order]
 
             # Get bond features
-            for a1 in range(self.n_atoms):
-                for a2 in range(a1 + 1, self.n_atoms):
-                    bond = mol.GetBondBetweenAtoms(a1, a2)
-
-                    if bond is None:
-                        continue
-
-                    f_bond = bond_features(bond)
-                    if bond_features_extra is not None:
-                        descr = bond_features_extra[bond.GetIdx()].tolist()
-                        if overwrite_default_bond_features:
-                            f_bond = descr
-                        else:
-                            f_bond += descr
-
-                    self.f_bonds.append(self.f_atoms[a1] + f_bond)
-                    self.f_bonds.append(self.f_atoms[a2] + f_bond)
-
-                    # Update index mappings
-                    b1 = self.n_bonds
-                    b2 = b1 + 1
-                    self.a2b[a2].append(b1)  # b1 = a1 --> a2
-                    self.b2a.append(a1)
-                    self.a2b[a1].append(b2)  # b2 = a2 --> a1
-                    self.b2a.append(a2)
-                    self.b2revb.append(b2)
-                    self.b2revb.append(b1)
-                    self.b2br[bond.GetIdx(), :] = [self.n_bonds, self.n_bonds + 1]
-                    self.n_bonds += 2
-
-            if bond_features_extra is not None and len(bond_features_extra) != self.n_bonds / 2:
-                raise ValueError(f'The number of bonds in {Chem.MolToSmiles(mol)} is different from the length of '
-                                 f'the extra bond features')
+            f_bond = bond_features_array([bonds[i] for i in order])
+            if bond_features_extra is not None:
+                descr = np.asarray(bond_features_extra, dtype=np.float32)[order]
+                if overwrite_default_bond_features:
+                    f_bond = descr
+                else:
+                    f_bond = np.hstack([f_bond, descr])
+
+            # Each bond b yields two directed bonds, 2b = a1 --> a2 and 2b + 1 = a2 --> a1
+            self.n_bonds = 2 * len(bonds)
+            self.b2a = ends.reshape(-1)
+            self.b2revb = np.arange(self.n_bonds, dtype=np.int32) ^ 1
+            self.f_bonds = np.hstack([self.f_atoms[self.b2a], np.repeat(f_bond, 2, axis=0)])
+
+            # Initialize f_bonds to real bonds mapping for each bond
+            self.b2br = np.zeros([len(bonds), 2], dtype=np.int32)
+            self.b2br[order] = np.arange(self.n_bonds, dtype=np.int32).reshape(-1, 2)
 
         else: # Reaction mode
             if atom_features_extra is not None:
@@ -452,64 +525,88 @@ class MolGraph:
             self.n_atoms = len(self.f_atoms)
             n_atoms_reac = mol_reac.GetNumAtoms()
 
-            # Initialize atom to bond mapping for each atom
-            for _ in range(self.n_atoms):
-                self.a2b.append([])
+            # Only atom pairs bonded in the reactants or in the products can yield a bond, so collect those pairs
+            # (in the combined reactant + product-only atom indexing) instead of searching over all atom pairs
+            prod_to_combined = {p: n_atoms_reac + i for i, p in enumerate(pio)}
+            prod_to_combined.update({p: r for r, p in ri2pi.items()})
+            bonded_pairs = {tuple(sorted((bond.GetBeginAtomIdx(), bond.GetEndAtomIdx()))) for bond in mol_reac.GetBonds()}
+            for bond in mol_prod.GetBonds():
+                a1, a2 = prod_to_combined.get(bond.GetBeginAtomIdx()), prod_to_combined.get(bond.GetEndAtomIdx())
+                if a1 is not None and a2 is not None:
+                    bonded_pairs.add(tuple(sorted((a1, a2))))
 
             # Get bond features
-            for a1 in range(self.n_atoms):
-                for a2 in range(a1 + 1, self.n_atoms):
-                    if a1 >= n_atoms_reac and a2 >= n_atoms_reac: # Both atoms only in product
-                        bond_prod = mol_prod.GetBondBetweenAtoms(pio[a1 - n_atoms_reac], pio[a2 - n_atoms_reac])
-                        if self.reaction_mode in ['reac_prod_balance', 'reac_diff_balance', 'prod_diff_balance']:
-                            bond_reac = bond_prod
-                        else:
-                            bond_reac = None
-                    elif a1 < n_atoms_reac and a2 >= n_atoms_reac: # One atom only in product
+            bond_ends = []
+            for a1, a2 in sorted(bonded_pairs):
+                if a1 >= n_atoms_reac and a2 >= n_atoms_reac: # Both atoms only in product
+                    bond_prod = mol_prod.GetBondBetweenAtoms(pio[a1 - n_atoms_reac], pio[a2 - n_atoms_reac])
+                    if self.reaction_mode in ['reac_prod_balance', 'reac_diff_balance', 'prod_diff_balance']:
+                        bond_reac = bond_prod
+                    else:
                         bond_reac = None
-                        if a1 in ri2pi.keys():
-                            bond_prod = mol_prod.GetBondBetweenAtoms(ri2pi[a1], pio[a2 - n_atoms_reac])
-                        else:
-                            bond_prod = None # Atom atom only in reactant, the other only in product
+                elif a1 < n_atoms_reac and a2 >= n_atoms_reac: # One atom only in product
+                    bond_reac = None
+                    if a1 in ri2pi.keys():
+                        bond_prod = mol_prod.GetBondBetweenAtoms(ri2pi[a1], pio[a2 - n_atoms_reac])
+                    else:
+                        bond_prod = None # Atom atom only in reactant, the other only in product
+                else:
+                    bond_reac = mol_reac.GetBondBetweenAtoms(a1, a2)
+                    if a1 in ri2pi.keys() and a2 in ri2pi.keys():
+                        bond_prod = mol_prod.GetBondBetweenAtoms(ri2pi[a1], ri2pi[a2]) #Both atoms in both reactant and product
                     else:
-                        bond_reac = mol_reac.GetBondBetweenAtoms(a1, a2)
-                        if a1 in ri2pi.keys() and a2 in ri2pi.keys():
-                            bond_prod = mol_prod.GetBondBetweenAtoms(ri2pi[a1], ri2pi[a2]) #Both atoms in both reactant and product
+                        if self.reaction_mode in ['reac_prod_balance', 'reac_diff_balance', 'prod_diff_balance']:
+                            if a1 in ri2pi.keys() or a2 in ri2pi.keys():
+                                bond_prod = None # One atom only in reactant
+                            else:
+                                bond_prod = bond_reac # Both atoms only in reactant
                         else:
-                            if self.reaction_mode in ['reac_prod_balance', 'reac_diff_balance', 'prod_diff_balance']:
-                                if a1 in ri2pi.keys() or a2 in ri2pi.keys():
-                                    bond_prod = None # One atom only in reactant
-                                else:
-                                    bond_prod = bond_reac # Both atoms only in reactant
-                            else:    
-                                bond_prod = None # One or both atoms only in reactant
-
-                    if bond_reac is None and bond_prod is None:
-                        continue
-
-                    f_bond_reac = bond_features(bond_reac)
-                    f_bond_prod = bond_features(bond_prod)
-                    if self.reaction_mode in ['reac_diff', 'prod_diff', 'reac_diff_balance', 'prod_diff_balance']:
-                        f_bond_diff = [y - x for x, y in zip(f_bond_reac, f_bond_prod)]
-                    if self.reaction_mode in ['reac_prod', 'reac_prod_balance']:
-                        f_bond = f_bond_reac + f_bond_prod
-                    elif self.reaction_mode in ['reac_diff', 'reac_diff_balance']:
-                        f_bond = f_bond_reac + f_bond_diff
-                    elif self.reaction_mode in ['prod_diff', 'prod_diff_balance']:
-                        f_bond = f_bond_prod + f_bond_diff
-                    self.f_bonds.append(self.f_atoms[a1] + f_bond)
-                    self.f_bonds.append(self.f_atoms[a2] + f_bond)
-
-                    # Update index mappings
-                    b1 = self.n_bonds
-                    b2 = b1 + 1
-                    self.a2b[a2].append(b1)  # b1 = a1 --> a2
-                    self.b2a.append(a1)
-                    self.a2b[a1].append(b2)  # b2 = a2 --> a1
-                    self.b2a.append(a2)
-                    self.b2revb.append(b2)
-                    self.b2revb.append(b1)
-                    self.n_bonds += 2                
+                            bond_prod = None # One or both atoms only in reactant
+
+                if bond_reac is None and bond_prod is None:
+                    continue
+
+                f_bond_reac = bond_features(bond_reac)
+                f_bond_prod = bond_features(bond_prod)
+                if self.reaction_mode in ['reac_diff', 'prod_diff', 'reac_diff_balance', 'prod_diff_balance']:
+                    f_bond_diff = [y - x for x, y in zip(f_bond_reac, f_bond_prod)]
+                if self.reaction_mode in ['reac_prod', 'reac_prod_balance']:
+                    f_bond = f_bond_reac + f_bond_prod
+                elif self.reaction_mode in ['reac_diff', 'reac_diff_balance']:
+                    f_bond = f_bond_reac + f_bond_diff
+                elif self.reaction_mode in ['prod_diff', 'prod_diff_balance']:
+                    f_bond = f_bond_prod + f_bond_diff
+                self.f_bonds.append(self.f_atoms[a1] + f_bond)
+                self.f_bonds.append(self.f_atoms[a2] + f_bond)
+                bond_ends.append((a1, a2))
+
+            self.f_atoms = np.array(self.f_atoms, dtype=np.float32).reshape(self.n_atoms, get_atom_fdim(is_reaction=True))
+            self.f_bonds = np.array(self.f_bonds, dtype=np.float32).reshape(2 * len(bond_ends), get_bond_fdim(is_reaction=True))
+
+            # Each bond b yields two directed bonds, 2b = a1 --> a2 and 2b + 1 = a2 --> a1
+            ends = np.array(bond_ends, dtype=np.int32).reshape(-1, 2)
+            self.n_bonds = 2 * len(ends)
+            self.b2a = ends.reshape(-1)
+            self.b2revb = np.arange(self.n_bonds, dtype=np.int32) ^ 1
+
+    @property
+    def a2b(self) -> List[np.ndarray]:
+        """
+        Groups the bonds by the atom they point to. Only built when accessed since
+        :class:`BatchMolGraph` derives its own mapping from :code:`b2a` and :code:`b2revb`.
+
+        :return: A list containing an int32 array of incoming bond indices (in increasing order) for each atom.
+        """
+        if self._a2b is None:
+            if self.n_atoms == 0:
+                self._a2b = []
+            else:
+                b2tgt = self.b2a[self.b2revb]
+                order = np.argsort(b2tgt, kind='stable').astype(np.int32)
+                n_incoming = np.bincount(b2tgt, minlength=self.n_atoms)
+                self._a2b = np.split(order, np.cumsum(n_incoming)[:-1])
+
+        return self._a2b
 
 class BatchMolGraph:
     """
@@ -522,6 +619,9 @@ class BatchMolGraph:
     * :code:`a_scope`: A list of tuples indicating the start and end atom indices for each molecule.
     * :code:`b_scope`: A list of tuples indicating the start and end bond indices for each molecule.
     * :code:`max_num_bonds`: The maximum number of bonds neighboring an atom in this batch.
+    * :code:`b2tgt`: A mapping from a bond index to the index of the atom the bond is going to.
+    * :code:`a_padding`: The number of padding entries in the row of each atom of :code:`a2b`.
+    * :code:`a2m`: A mapping from each atom index, excluding the padding atom, to the index of its molecule.
     * :code:`b2b`: (Optional) A mapping from a bond index to incoming bond indices.
     * :code:`a2a`: (Optional): A mapping from an atom index to neighboring atom indices.
     * :code:`b2br`: (Optional): A mapping from f_bonds to real bonds in molecule recorded in targets.
@@ -541,42 +641,50 @@ class BatchMolGraph:
                                       overwrite_default_atom=self.overwrite_default_atom_features,
                                       is_reaction=self.is_reaction)
 
-        # Start n_atoms and n_bonds at 1 b/c zero padding
-        self.n_atoms = 1  # number of atoms (start at 1 b/c need index 0 as padding)
-        self.n_bonds = 1  # number of bonds (start at 1 b/c need index 0 as padding)
-        self.a_scope = []  # list of tuples indicating (start_atom_index, num_atoms) for each molecule
-        self.b_scope = []  # list of tuples indicating (start_bond_index, num_bonds) for each molecule
+        # Start the atom and bond indices at 1 b/c index 0 is zero padding
+        mol_n_atoms = np.array([mol_graph.n_atoms for mol_graph in mol_graphs], dtype=np.int64)
+        mol_n_bonds = np.array([mol_graph.n_bonds for mol_graph in mol_graphs], dtype=np.int64)
+        atom_starts = 1 + np.cumsum(mol_n_atoms) - mol_n_atoms
+        bond_starts = 1 + np.cumsum(mol_n_bonds) - mol_n_bonds
+        self.n_atoms = 1 + int(mol_n_atoms.sum())  # number of atoms (start at 1 b/c need index 0 as padding)
+        self.n_bonds = 1 + int(mol_n_bonds.sum())  # number of bonds (start at 1 b/c need index 0 as padding)
+        # list of tuples indicating (start_atom_index, num_atoms) and (start_bond_index, num_bonds) for each molecule
+        self.a_scope = list(zip(atom_starts.tolist(), mol_n_atoms.tolist()))
+        self.b_scope = list(zip(bond_starts.tolist(), mol_n_bonds.tolist()))
 
         # All start with zero padding so that indexing with zero padding returns zeros
-        f_atoms = [[0] * self.atom_fdim]  # atom features
-        f_bonds = [[0] * self.bond_fdim]  # combined atom/bond features
-        a2b = [[]]  # mapping from atom index to incoming bond indices
-        b2a = [0]  # mapping from bond index to the index of the atom the bond is coming from
-        b2revb = [0]  # mapping from bond index to the index of the reverse bond
-        for mol_graph in mol_graphs:
-            f_atoms.extend(mol_graph.f_atoms)
-            f_bonds.extend(mol_graph.f_bonds)
-
-            for a in range(mol_graph.n_atoms):
-                a2b.append([b + self.n_bonds for b in mol_graph.a2b[a]])
-
-            for b in range(mol_graph.n_bonds):
-                b2a.append(self.n_atoms + mol_graph.b2a[b])
-                b2revb.append(self.n_bonds + mol_graph.b2revb[b])
-
-            self.a_scope.append((self.n_atoms, mol_graph.n_atoms))
-            self.b_scope.append((self.n_bonds, mol_graph.n_bonds))
-            self.n_atoms += mol_graph.n_atoms
-            self.n_bonds += mol_graph.n_bonds
-
-        self.max_num_bonds = max(1, max(
-            len(in_bonds) for in_bonds in a2b))  # max with 1 to fix a crash in rare case of all single-heavy-atom mols
-
-        self.f_atoms = torch.tensor(f_atoms, dtype=torch.float)
-        self.f_bonds = torch.tensor(f_bonds, dtype=torch.float)
-        self.a2b = torch.tensor([a2b[a] + [0] * (self.max_num_bonds - len(a2b[a])) for a in range(self.n_atoms)], dtype=torch.long)
-        self.b2a = torch.tensor(b2a, dtype=torch.long)
-        self.b2revb = torch.tensor(b2revb, dtype=torch.long)
+        f_atoms = np.concatenate([np.zeros((1, self.atom_fdim), dtype=np.float32)]
+                                 + [mol_graph.f_atoms for mol_graph in mol_graphs]).astype(np.float32, copy=False)  # atom features
+        f_bonds = np.concatenate([np.zeros((1, self.bond_fdim), dtype=np.float32)]
+                                 + [mol_graph.f_bonds for mol_graph in mol_graphs]).astype(np.float32, copy=False)  # combined atom/bond features
+
+        # Shift the per-molecule indices by the start index of their molecule
+        b2a = np.zeros(self.n_bonds, dtype=np.int64)  # mapping from bond index to the index of the atom the bond is coming from
+        b2revb = np.zeros(self.n_bonds, dtype=np.int64)  # mapping from bond index to the index of the reverse bond
+        if self.n_bonds > 1:
+            b2a[1:] = np.concatenate([mol_graph.b2a for mol_graph in mol_graphs]) + np.repeat(atom_starts, mol_n_bonds)
+            b2revb[1:] = np.concatenate([mol_graph.b2revb for mol_graph in mol_graphs]) + np.repeat(bond_starts, mol_n_bonds)
+
+        # Scatter each bond into the row of the atom it points to, keeping the bonds of each atom in increasing order
+        b2tgt = b2a[b2revb[1:]]
+        in_bonds = np.argsort(b2tgt, kind='stable')
+        n_in_bonds = np.bincount(b2tgt, minlength=self.n_atoms)
+        self.max_num_bonds = max(1, int(n_in_bonds.max()))  # max with 1 to fix a crash in rare case of all single-heavy-atom mols
+        a2b = np.zeros((self.n_atoms, self.max_num_bonds), dtype=np.int64)  # mapping from atom index to incoming bond indices
+        tgt = b2tgt[in_bonds]
+        a2b[tgt, np.arange(len(tgt)) - (np.cumsum(n_in_bonds) - n_in_bonds)[tgt]] = in_bonds + 1
+
+        self.f_atoms = torch.from_numpy(f_atoms)
+        self.f_bonds = torch.from_numpy(f_bonds)
+        self.a2b = torch.from_numpy(a2b)
+        self.b2a = torch.from_numpy(b2a)
+        self.b2revb = torch.from_numpy(b2revb)
+        # The padding bond goes to the padding atom, which counts it as one of its padding entries
+        self.b2tgt = torch.from_numpy(b2a[b2revb])
+        a_padding = self.max_num_bonds - n_in_bonds
+        a_padding[0] -= 1
+        self.a_padding = torch.from_numpy(a_padding)
+        self.a2m = torch.from_numpy(np.repeat(np.arange(len(mol_graphs), dtype=np.int64), mol_n_atoms))
         self.b2b = None  # try to avoid computing b2b b/c O(n_atoms^3)
         self.a2a = None  # only needed if using atom messages
         self.b2br = None  # only needed in predictions of atomic/bond targets
@@ -647,13 +755,10 @@ class BatchMolGraph:
         :return: A PyTorch tensor containing the mapping from f_bonds to real bonds in molecule recorded in targets.
         """
         if self.b2br is None:
-            n_bonds = 1 # number of bonds (start at 1 b/c need index 0 as padding)
-            b2br = []
-            for mol_graph in self.mol_graphs:
-                b2br.append(mol_graph.b2br + n_bonds)
-                n_bonds += mol_graph.n_bonds
-            b2br = np.concatenate(b2br, axis=0)
-            self.b2br = torch.tensor(b2br, dtype=torch.long)
+            # Shift each molecule's mapping by its start bond index (index 0 is padding)
+            b2br = np.concatenate([mol_graph.b2br for mol_graph in self.mol_graphs], axis=0).astype(np.int64)
+            b2br += np.repeat([start for start, _ in self.b_scope], [len(mol_graph.b2br) for mol_graph in self.mol_graphs])[:, None]
+            self.b2br = torch.from_numpy(b2br)
 
         return self.b2br
 
@@ -1,11 +1,11 @@
-import csv
 import os
 import pickle
-from typing import List
+from typing import List, Union
 
 import numpy as np
 import pandas as pd
 from rdkit.Chem import PandasTools
+from scipy.sparse import csr_matrix, issparse, vstack
 
 
 def save_features(path: str, features: List[np.ndarray]) -> None:
@@ -18,16 +18,19 @@ def save_features(path: str, features: List[np.ndarray]) -> None:
     np.savez_compressed(path, features=features)
 
 
-def load_features(path: str) -> np.ndarray:
+def load_features(path: str,
+                  start_row: int = 0,
+                  end_row: int = None,
+                  sparse: bool = False) -> Union[np.ndarray, csr_matrix]:
     """
     Loads features saved in a variety of formats.
 
     Supported formats:
 
     * :code:`.npz` compressed (assumes features are saved with name "features")
-    * .npy
+    * :code:`.npy`, which is memory-mapped rather than read into memory
     * :code:`.csv` / :code:`.txt` (assumes comma-separated features with a header and with one line per molecule)
-    * :code:`.pkl` / :code:`.pckl` / :code:`.pickle` containing a sparse numpy array
+    * :code:`.pkl` / :code:`.pckl` / :code:`.pickle` containing a list of sparse matrices, one row per molecule
 
     .. note::
 
@@ -35,28 +38,52 @@ def load_features(path: str) -> np.ndarray:
        order as the features loaded here.
 
     :param path: Path to a file containing features.
-    :return: A 2D numpy array of size :code:`(num_molecules, features_size)` containing the features.
+    :param start_row: The index of the first molecule to load, e.g. the start of a chunk of a larger file.
+    :param end_row: The index after the last molecule to load. By default, loads up to the last molecule.
+    :param sparse: Whether to return the features of pickled sparse matrices as a :class:`~scipy.sparse.csr_matrix`
+                   rather than as a dense array. The other formats are always dense.
+    :return: A 2D array or sparse matrix of size :code:`(num_molecules, features_size)` containing the features.
     """
     extension = os.path.splitext(path)[1]
+    rows = slice(start_row, end_row)
 
     if extension == '.npz':
-        features = np.load(path)['features']
+        features = np.load(path)['features'][rows]
     elif extension == '.npy':
-        features = np.load(path)
+        features = np.load(path, mmap_mode='r')[rows]
     elif extension in ['.csv', '.txt']:
-        with open(path) as f:
-            reader = csv.reader(f)
-            next(reader)  # skip header
-            features = np.array([[float(value) for value in row] for row in reader])
+        features = pd.read_csv(
+            path,
+            skiprows=range(1, start_row + 1),
+            nrows=end_row - start_row if end_row is not None else None,
+            engine='c',
+        ).to_numpy(dtype=np.float64)
     elif extension in ['.pkl', '.pckl', '.pickle']:
         with open(path, 'rb') as f:
-            features = np.array([np.squeeze(np.array(feat.todense())) for feat in pickle.load(f)])
+            features = pickle.load(f)[rows]
+        # Either a sparse matrix or a list of its rows
+        features = csr_matrix(features) if issparse(features) else vstack(features, format='csr')
+        if not sparse:
+            features = features.toarray()
     else:
         raise ValueError(f'Features path extension {extension} not supported.')
 
     return features
 
 
+def stack_features(features_batch: List[Union[np.ndarray, csr_matrix]]) -> np.ndarray:
+    """
+    Stacks the molecule features of a batch into a dense 2D array.
+
+    :param features_batch: The features of each molecule, either 1D arrays or sparse rows of size :code:`(1, features_size)`.
+    :return: A 2D numpy array of size :code:`(num_molecules, features_size)`.
+    """
+    if issparse(features_batch[0]):
+        return vstack(features_batch).toarray()
+
+    return np.stack(features_batch)
+
+
 def load_valid_atom_or_bond_features(path: str, smiles: List[str]) -> List[np.ndarray]:
     """
     Loads features saved in a variety of formats.
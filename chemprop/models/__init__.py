@@ -1,11 +1,15 @@
 from .model import MoleculeModel
 from .mpn import MPN, MPNEncoder
 from .ffn import MultiReadout, FFNAtten
+from .inference import InferenceModel, OnnxModel, inference_inputs
 
 __all__ = [
     'MoleculeModel',
     'MPN',
     'MPNEncoder',
     'MultiReadout',
-    'FFNAtten'
+    'FFNAtten',
+    'InferenceModel',
+    'OnnxModel',
+    'inference_inputs'
 ]
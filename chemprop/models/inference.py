@@ -0,0 +1,335 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from .model import MoleculeModel
+from .mpn import MPNEncoder
+from chemprop.features import BatchMolGraph, stack_features
+
+# The names of the inputs of :meth:`InferenceModel.forward`, e.g. in exported ONNX graphs
+INFERENCE_INPUT_NAMES = ['f_atoms', 'f_bonds', 'a2b', 'b2a', 'b2revb', 'a2m', 'features']
+
+
+class InferenceEncoder(nn.Module):
+    """
+    An :class:`InferenceEncoder` runs the message passing of a trained :class:`~chemprop.models.mpn.MPNEncoder`
+    on collated graph tensors, without any Python-level dispatch on its inputs, so that it can be scripted or traced.
+
+    The messages are always gathered with :code:`a2b`, which gives the same result as the sparse message aggregation.
+    """
+    __constants__ = ['atom_messages', 'undirected', 'depth', 'aggregation', 'aggregation_norm']
+
+    def __init__(self, encoder: MPNEncoder):
+        """
+        :param encoder: A trained :class:`~chemprop.models.mpn.MPNEncoder`.
+        """
+        super(InferenceEncoder, self).__init__()
+        self.atom_messages = encoder.atom_messages
+        self.undirected = encoder.undirected
+        self.depth = encoder.depth
+        self.aggregation = encoder.aggregation
+        self.aggregation_norm = float(encoder.aggregation_norm)
+        self.act_func = encoder.act_func
+        self.W_i, self.W_h, self.W_o = encoder.W_i, encoder.W_h, encoder.W_o
+        self.W_a = encoder.W_a if self.aggregation in ['weighted', 'attention'] else nn.Identity()
+
+    def forward(self,
+                f_atoms: torch.Tensor,
+                f_bonds: torch.Tensor,
+                a2b: torch.Tensor,
+                b2a: torch.Tensor,
+                b2revb: torch.Tensor,
+                a2m: torch.Tensor,
+                num_molecules: int) -> torch.Tensor:
+        """
+        Encodes a batch of molecular graphs.
+
+        :param f_atoms: The atom features, starting with the zero padding atom.
+        :param f_bonds: The bond features, starting with the zero padding bond.
+        :param a2b: A mapping from each atom to the indices of its incoming bonds.
+        :param b2a: A mapping from each bond to the index of the atom it comes from.
+        :param b2revb: A mapping from each bond to the index of its reverse bond.
+        :param a2m: A mapping from each atom, excluding the padding atom, to the index of its molecule.
+        :param num_molecules: The number of molecules.
+        :return: A tensor of shape :code:`(num_molecules, hidden_size)` containing the encoding of each molecule.
+        """
+        a2x = b2a[a2b] if self.atom_messages else a2b  # num_atoms x max_num_bonds
+
+        # Input
+        if self.atom_messages:
+            input = self.W_i(f_atoms)  # num_atoms x hidden_size
+        else:
+            input = self.W_i(f_bonds)  # num_bonds x hidden_size
+        message = self.act_func(input)
+
+        # Message passing
+        for _ in range(self.depth - 1):
+            if self.undirected:
+                message = (message + message[b2revb]) / 2
+
+            nei_a_message = message.index_select(0, a2x.view(-1)).view(a2x.size(0), a2x.size(1), -1)
+            if self.atom_messages:
+                nei_f_bonds = f_bonds.index_select(0, a2b.view(-1)).view(a2b.size(0), a2b.size(1), -1)
+                message = torch.cat((nei_a_message, nei_f_bonds), dim=2).sum(dim=1)  # num_atoms x hidden + bond_fdim
+            else:
+                message = nei_a_message.sum(dim=1)[b2a] - message[b2revb]  # num_bonds x hidden
+
+            message = self.act_func(input + self.W_h(message))
+
+        # Atom hidden
+        a_message = message.index_select(0, a2x.view(-1)).view(a2x.size(0), a2x.size(1), -1).sum(dim=1)
+        atom_hiddens = self.act_func(self.W_o(torch.cat([f_atoms, a_message], dim=1)))[1:]  # num_atoms - 1 x hidden
+
+        # Readout
+        if self.aggregation == 'weighted' or self.aggregation == 'attention':
+            scores = self.W_a(atom_hiddens).squeeze(1)
+            if self.aggregation == 'weighted':
+                weights = torch.sigmoid(scores)
+            else:
+                max_scores = scores.new_full((num_molecules,), -float('inf'))
+                max_scores = max_scores.scatter_reduce(0, a2m, scores, reduce='amax')
+                weights = torch.exp(scores - max_scores[a2m])
+                weights = weights / weights.new_zeros(num_molecules).index_add(0, a2m, weights)[a2m]
+            atom_hiddens = atom_hiddens * weights.unsqueeze(1)
+
+        mol_vecs = atom_hiddens.new_zeros((num_molecules, atom_hiddens.size(1))).index_add(0, a2m, atom_hiddens)
+
+        if self.aggregation == 'mean':
+            a_sizes = atom_hiddens.new_zeros(num_molecules).index_add(0, a2m, torch.ones_like(a2m, dtype=atom_hiddens.dtype))
+            mol_vecs = mol_vecs / a_sizes.clamp(min=1).unsqueeze(1)
+        elif self.aggregation == 'norm':
+            mol_vecs = mol_vecs / self.aggregation_norm
+
+        return mol_vecs
+
+
+class InferenceModel(nn.Module):
+    """
+    An :class:`InferenceModel` makes the predictions of a trained :class:`~chemprop.models.model.MoleculeModel`
+    from collated graph tensors (see :func:`inference_inputs`), so that it can be scripted with :func:`torch.jit.script`
+    or traced, and then saved and loaded with TorchScript alone.
+
+    The feature scaling and the inverse target scaling are part of the model, so it takes raw features and returns
+    the predictions in the units of the targets, in the layout of the output of :meth:`MoleculeModel.forward`.
+
+    Only models of a single molecule without atom/bond descriptors or atomic/bond targets are supported.
+    """
+    # Branches on constants are resolved when scripting, so the unused encoder and output heads are not compiled
+    __constants__ = ['features_only', 'use_input_features', 'classification', 'multiclass', 'num_classes',
+                     'loss_function', 'scale_features', 'scale_targets']
+
+    def __init__(self, model: MoleculeModel, scaler=None, features_scaler=None):
+        """
+        :param model: A trained :class:`~chemprop.models.model.MoleculeModel`.
+        :param scaler: The :class:`~chemprop.data.scaler.StandardScaler` fitted on the training targets, if any.
+        :param features_scaler: The :class:`~chemprop.data.scaler.StandardScaler` fitted on the features, if any.
+        """
+        super(InferenceModel, self).__init__()
+        mpn = model.encoder
+        if model.is_atom_bond_targets:
+            raise ValueError('Inference models do not support atomic/bond targets.')
+        if mpn.reaction_solvent or (not mpn.features_only and len(mpn.encoder) > 1):
+            raise ValueError('Inference models only support a single molecule per datapoint.')
+        if mpn.atom_descriptors is not None or mpn.bond_descriptors is not None:
+            raise ValueError('Inference models do not support atom or bond descriptors.')
+
+        self.features_only = mpn.features_only
+        self.use_input_features = mpn.use_input_features
+        self.atom_messages = False if mpn.features_only else mpn.encoder[0].atom_messages
+        self.aggregation = None if mpn.features_only else mpn.encoder[0].aggregation
+        self.encoder = nn.Identity() if mpn.features_only else InferenceEncoder(mpn.encoder[0])
+        self.readout = model.readout
+
+        self.atom_fdim, self.bond_fdim = mpn.atom_fdim, mpn.bond_fdim
+        self.features_size = self.readout[1].in_features
+        if not self.features_only:
+            self.features_size = self.features_size - mpn.encoder[0].hidden_size if self.use_input_features else 0
+
+        self.classification = model.classification
+        self.multiclass = model.multiclass
+        self.num_classes = model.num_classes if model.multiclass else 1
+        self.loss_function = model.loss_function
+
+        self.scale_features = features_scaler is not None
+        self.register_buffer('features_means', _scaler_tensor(features_scaler, 'means'))
+        self.register_buffer('features_stds', _scaler_tensor(features_scaler, 'stds'))
+        self.scale_targets = scaler is not None
+        self.register_buffer('target_means', _scaler_tensor(scaler, 'means'))
+        self.register_buffer('target_stds', _scaler_tensor(scaler, 'stds'))
+
+        self.eval()
+
+    def forward(self,
+                f_atoms: torch.Tensor,
+                f_bonds: torch.Tensor,
+                a2b: torch.Tensor,
+                b2a: torch.Tensor,
+                b2revb: torch.Tensor,
+                a2m: torch.Tensor,
+                features: torch.Tensor) -> torch.Tensor:
+        """
+        Makes predictions on a batch of molecular graphs.
+
+        :param f_atoms: The atom features, starting with the zero padding atom.
+        :param f_bonds: The bond features, starting with the zero padding bond.
+        :param a2b: A mapping from each atom to the indices of its incoming bonds.
+        :param b2a: A mapping from each bond to the index of the atom it comes from.
+        :param b2revb: A mapping from each bond to the index of its reverse bond.
+        :param a2m: A mapping from each atom, excluding the padding atom, to the index of its molecule.
+        :param features: A tensor of shape :code:`(num_molecules, features_size)` with the raw molecule features,
+                         which also gives the number of molecules. Its :code:`features_size` is 0 for models without features.
+        :return: The predictions of the model.
+        """
+        num_molecules = features.size(0)
+
+        if self.scale_features:
+            features = (features - self.features_means) / self.features_stds
+            features = torch.where(torch.isnan(features), torch.zeros_like(features), features)
+
+        if self.features_only:
+            encodings = features
+        else:
+            encodings = self.encoder(f_atoms, f_bonds, a2b, b2a, b2revb, a2m, num_molecules)
+            if self.use_input_features:
+                encodings = torch.cat([encodings, features], dim=1)
+
+        output = self.readout(encodings)
+
+        if self.classification and self.loss_function != 'dirichlet':
+            output = torch.sigmoid(output)
+        if self.multiclass:
+            output = output.reshape((output.size(0), -1, self.num_classes))
+            if self.loss_function != 'dirichlet':
+                output = torch.softmax(output, dim=2)
+
+        if self.loss_function == 'mve':
+            means, variances = torch.split(output, output.size(1) // 2, dim=1)
+            variances = nn.functional.softplus(variances)
+            if self.scale_targets:
+                means = means * self.target_stds + self.target_means
+                variances = variances * self.target_stds ** 2
+            output = torch.cat([means, variances], dim=1)
+        elif self.loss_function == 'evidential':
+            means, lambdas, alphas, betas = torch.split(output, output.size(1) // 4, dim=1)
+            lambdas = nn.functional.softplus(lambdas)
+            alphas = nn.functional.softplus(alphas) + 1
+            betas = nn.functional.softplus(betas)
+            if self.scale_targets:
+                means = means * self.target_stds + self.target_means
+                betas = betas * self.target_stds ** 2
+            output = torch.cat([means, lambdas, alphas, betas], dim=1)
+        elif self.loss_function == 'dirichlet':
+            output = nn.functional.softplus(output) + 1
+        elif self.scale_targets:
+            output = output * self.target_stds + self.target_means
+
+        return output
+
+    def example_inputs(self) -> Tuple[torch.Tensor, ...]:
+        """
+        Builds inputs with zero features for a batch of two molecules, a chain of three atoms and a single atom,
+        e.g. to trace the model.
+
+        :return: The positional arguments of :meth:`forward`.
+        """
+        a2b = torch.tensor([[0, 0], [2, 0], [1, 4], [3, 0], [0, 0]])
+        b2a = torch.tensor([0, 1, 2, 2, 3])
+        b2revb = torch.tensor([0, 2, 1, 4, 3])
+        a2m = torch.tensor([0, 0, 0, 1])
+
+        return (torch.zeros((5, self.atom_fdim)), torch.zeros((5, self.bond_fdim)), a2b, b2a, b2revb, a2m,
+                torch.zeros((2, self.features_size)))
+
+    def metadata(self) -> Dict[str, str]:
+        """
+        Returns the configuration needed to build the inputs and interpret the outputs of the model.
+
+        :return: A dictionary mapping the names of the attributes to their string values.
+        """
+        return {name: str(getattr(self, name)) for name in ['loss_function', 'classification', 'multiclass',
+                                                             'num_classes', 'atom_messages']}
+
+
+class OnnxModel:
+    """
+    An :class:`OnnxModel` runs an :class:`InferenceModel` exported to ONNX (see :func:`~chemprop.utils.export_onnx`)
+    with onnxruntime on CPU, with all of its graph optimizations.
+
+    It takes the inputs of :meth:`MoleculeModel.forward` and returns the output of the exported model, so that it can
+    replace a :class:`~chemprop.models.model.MoleculeModel` in :func:`~chemprop.train.predict.predict`. As the scalers
+    are part of the exported model, the features are expected to be raw and the predictions are already unscaled.
+    """
+    is_atom_bond_targets = False
+
+    def __init__(self, path: str):
+        """
+        :param path: Path to the ONNX file.
+        """
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError('Failed to import onnxruntime. Please install onnxruntime '
+                              '(https://onnxruntime.ai) to use the onnxruntime backend.')
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        # Inputs unused by the graph, e.g. the features of models without features, are pruned on export
+        self.input_names = {input.name for input in self.session.get_inputs()}
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.loss_function = metadata['loss_function']
+        self.classification = metadata['classification'] == 'True'
+        self.multiclass = metadata['multiclass'] == 'True'
+        self.atom_messages = metadata['atom_messages'] == 'True'
+
+    def eval(self) -> 'OnnxModel':
+        """The exported model is always in evaluation mode."""
+        return self
+
+    def __call__(self,
+                 batch: List[BatchMolGraph],
+                 features_batch: List[np.ndarray] = None,
+                 *args) -> torch.Tensor:
+        """
+        Runs the exported model on a batch.
+
+        :param batch: A list with the :class:`~chemprop.features.featurization.BatchMolGraph` of the batch.
+        :param features_batch: A list of numpy arrays containing the raw molecule features.
+        :param args: The other inputs of :meth:`MoleculeModel.forward`, which are not supported.
+        :return: The output of the exported model.
+        """
+        inputs = inference_inputs(batch[0], features_batch, self.atom_messages)
+        feeds = {name: input.numpy() for name, input in zip(INFERENCE_INPUT_NAMES, inputs) if name in self.input_names}
+
+        return torch.from_numpy(self.session.run(None, feeds)[0])
+
+
+def _scaler_tensor(scaler, name: str) -> torch.Tensor:
+    """Returns the means or standard deviations of a scaler as a float tensor, empty if there is no scaler."""
+    if scaler is None:
+        return torch.zeros(0)
+
+    return torch.tensor(np.asarray(getattr(scaler, name), dtype=float), dtype=torch.float)
+
+
+def inference_inputs(mol_graph: BatchMolGraph,
+                     features_batch: Optional[List[np.ndarray]] = None,
+                     atom_messages: bool = False) -> Tuple[torch.Tensor, ...]:
+    """
+    Builds the inputs of an :class:`InferenceModel` for a batch.
+
+    :param mol_graph: A :class:`~chemprop.features.featurization.BatchMolGraph` with the molecules of the batch.
+    :param features_batch: A list of numpy arrays containing the raw molecule features, if the model uses features.
+    :param atom_messages: Whether the model uses atom messages, i.e. :code:`InferenceModel.atom_messages`.
+    :return: The positional arguments of :meth:`InferenceModel.forward`.
+    """
+    f_atoms, f_bonds, a2b, b2a, b2revb, a_scope, _ = mol_graph.get_components(atom_messages=atom_messages)
+    if features_batch is not None and features_batch[0] is not None:
+        features = torch.from_numpy(stack_features(features_batch)).float()
+    else:
+        features = torch.zeros((len(a_scope), 0))
+
+    return f_atoms, f_bonds, a2b, b2a, b2revb, mol_graph.a2m, features
@@ -148,6 +148,12 @@ class MoleculeModel(nn.Module):
                 spectra_activation=args.spectra_activation,
             )
 
+        # Number of leading readout modules, up to the last frozen linear layer, whose outputs can be cached
+        if args.checkpoint_frzn is not None and args.frzn_ffn_layers > 0 and not self.is_atom_bond_targets:
+            self.frozen_readout_size = 3 * args.frzn_ffn_layers - 1
+        else:
+            self.frozen_readout_size = 0
+
         if args.checkpoint_frzn is not None:
             if args.frzn_ffn_layers > 0:
                 if self.is_atom_bond_targets:
@@ -232,6 +238,45 @@ class MoleculeModel(nn.Module):
         else:
             raise ValueError(f"Unsupported fingerprint type {fingerprint_type}.")
 
+    def frozen_embedding(
+        self,
+        batch: Union[
+            List[List[str]],
+            List[List[Chem.Mol]],
+            List[List[Tuple[Chem.Mol, Chem.Mol]]],
+            List[BatchMolGraph],
+        ],
+        features_batch: List[np.ndarray] = None,
+        atom_descriptors_batch: List[np.ndarray] = None,
+        atom_features_batch: List[np.ndarray] = None,
+        bond_descriptors_batch: List[np.ndarray] = None,
+        bond_features_batch: List[np.ndarray] = None,
+    ) -> torch.Tensor:
+        """
+        Computes the output of the frozen part of the model, i.e. the encoder followed by the frozen FFN layers.
+
+        These embeddings can be passed to :meth:`forward` as :code:`embeddings_batch` to run only the trainable layers.
+
+        :param batch: A list of list of SMILES, a list of list of RDKit molecules, or a
+                      list of :class:`~chemprop.features.featurization.BatchMolGraph`.
+        :param features_batch: A list of numpy arrays containing additional features.
+        :param atom_descriptors_batch: A list of numpy arrays containing additional atom descriptors.
+        :param atom_features_batch: A list of numpy arrays containing additional atom features.
+        :param bond_descriptors_batch: A list of numpy arrays containing additional bond descriptors.
+        :param bond_features_batch: A list of numpy arrays containing additional bond features.
+        :return: The frozen embeddings of the molecules.
+        """
+        encodings = self.encoder(
+            batch,
+            features_batch,
+            atom_descriptors_batch,
+            atom_features_batch,
+            bond_descriptors_batch,
+            bond_features_batch,
+        )
+
+        return self.readout[:self.frozen_readout_size](encodings)
+
     def forward(
         self,
         batch: Union[
@@ -247,6 +292,7 @@ class MoleculeModel(nn.Module):
         bond_features_batch: List[np.ndarray] = None,
         constraints_batch: List[torch.Tensor] = None,
         bond_types_batch: List[torch.Tensor] = None,
+        embeddings_batch: torch.Tensor = None,
     ) -> torch.Tensor:
         """
         Runs the :class:`MoleculeModel` on input.
@@ -262,9 +308,13 @@ class MoleculeModel(nn.Module):
         :param bond_features_batch: A list of numpy arrays containing additional bond features.
         :param constraints_batch: A list of PyTorch tensors which applies constraint on atomic/bond properties.
         :param bond_types_batch: A list of PyTorch tensors storing bond types of each bond determined by RDKit molecules.
+        :param embeddings_batch: The precomputed :meth:`frozen_embedding` of the molecules. If provided, the molecule
+                                 inputs are ignored and only the layers after the frozen ones are run.
         :return: The output of the :class:`MoleculeModel`, containing a list of property predictions.
         """
-        if self.is_atom_bond_targets:
+        if embeddings_batch is not None:
+            output = self.readout[self.frozen_readout_size:](embeddings_batch)
+        elif self.is_atom_bond_targets:
             encodings = self.encoder(
                 batch,
                 features_batch,
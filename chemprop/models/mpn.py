@@ -7,8 +7,8 @@ import torch
 import torch.nn as nn
 
 from chemprop.args import TrainArgs
-from chemprop.features import BatchMolGraph, get_atom_fdim, get_bond_fdim, mol2graph
-from chemprop.nn_utils import index_select_ND, get_activation_function
+from chemprop.features import BatchMolGraph, get_atom_fdim, get_bond_fdim, mol2graph, stack_features
+from chemprop.nn_utils import index_add_ND, index_select_ND, get_activation_function
 
 
 class MPNEncoder(nn.Module):
@@ -33,6 +33,7 @@ class MPNEncoder(nn.Module):
         self.depth = depth or args.depth
         self.layers_per_message = 1
         self.undirected = args.undirected
+        self.message_aggregation = args.message_aggregation
         self.device = args.device
         self.aggregation = args.aggregation
         self.aggregation_norm = args.aggregation_norm
@@ -73,6 +74,11 @@ class MPNEncoder(nn.Module):
             self.bond_descriptors_layer = nn.Linear(self.hidden_size + self.bond_descriptors_size,
                                                     self.hidden_size + self.bond_descriptors_size,)
 
+        # Readout
+        if self.aggregation in ['weighted', 'attention']:
+            readout_size = self.hidden_size + (self.atom_descriptors_size if args.atom_descriptors == 'descriptor' else 0)
+            self.W_a = nn.Linear(readout_size, 1)
+
     def forward(self,
                 mol_graph: BatchMolGraph,
                 atom_descriptors_batch: List[np.ndarray] = None,
@@ -106,7 +112,9 @@ class MPNEncoder(nn.Module):
                     bond_descriptors_batch[fi] = descriptors_batch[i]
                 bond_descriptors_batch = torch.from_numpy(bond_descriptors_batch).float().to(self.device)
 
-        if self.atom_messages:
+        if self.message_aggregation == 'sparse':
+            b2tgt, a_padding = mol_graph.b2tgt.to(self.device), mol_graph.a_padding.to(self.device)
+        elif self.atom_messages:
             a2a = mol_graph.get_a2a().to(self.device)
 
         # Input
@@ -121,7 +129,15 @@ class MPNEncoder(nn.Module):
             if self.undirected:
                 message = (message + message[b2revb]) / 2
 
-            if self.atom_messages:
+            if self.message_aggregation == 'sparse':
+                if self.atom_messages:
+                    nei_message = torch.cat((message[b2a], f_bonds), dim=1)  # num_bonds x hidden + bond_fdim
+                    message = index_add_ND(nei_message, b2tgt, len(f_atoms), a_padding)  # num_atoms x hidden + bond_fdim
+                else:
+                    a_message = index_add_ND(message, b2tgt, len(f_atoms), a_padding)  # num_atoms x hidden
+                    rev_message = message[b2revb]  # num_bonds x hidden
+                    message = a_message[b2a] - rev_message  # num_bonds x hidden
+            elif self.atom_messages:
                 nei_a_message = index_select_ND(message, a2a)  # num_atoms x max_num_bonds x hidden
                 nei_f_bonds = index_select_ND(f_bonds, a2b)  # num_atoms x max_num_bonds x bond_fdim
                 nei_message = torch.cat((nei_a_message, nei_f_bonds), dim=2)  # num_atoms x max_num_bonds x hidden + bond_fdim
@@ -139,9 +155,13 @@ class MPNEncoder(nn.Module):
             message = self.dropout(message)  # num_bonds x hidden
 
         # atom hidden
-        a2x = a2a if self.atom_messages else a2b
-        nei_a_message = index_select_ND(message, a2x)  # num_atoms x max_num_bonds x hidden
-        a_message = nei_a_message.sum(dim=1)  # num_atoms x hidden
+        if self.message_aggregation == 'sparse':
+            nei_message = message[b2a] if self.atom_messages else message  # num_bonds x hidden
+            a_message = index_add_ND(nei_message, b2tgt, len(f_atoms), a_padding)  # num_atoms x hidden
+        else:
+            a2x = a2a if self.atom_messages else a2b
+            nei_a_message = index_select_ND(message, a2x)  # num_atoms x max_num_bonds x hidden
+            a_message = nei_a_message.sum(dim=1)  # num_atoms x hidden
         a_input = torch.cat([f_atoms, a_message], dim=1)  # num_atoms x (atom_fdim + hidden)
         atom_hiddens = self.act_func(self.W_o(a_input))  # num_atoms x hidden
         atom_hiddens = self.dropout(atom_hiddens)  # num_atoms x hidden
@@ -174,24 +194,43 @@ class MPNEncoder(nn.Module):
         if self.is_atom_bond_targets:
             return atom_hiddens, a_scope, bond_hiddens, b_scope, b2br  # num_atoms x hidden, remove the first one which is zero padding
 
-        mol_vecs = []
-        for i, (a_start, a_size) in enumerate(a_scope):
-            if a_size == 0:
-                mol_vecs.append(self.cached_zero_vector)
+        return self.readout(atom_hiddens, mol_graph.a2m.to(self.device), len(a_scope))  # num_molecules x hidden
+
+    def readout(self, atom_hiddens: torch.Tensor, a2m: torch.Tensor, num_molecules: int) -> torch.Tensor:
+        """
+        Aggregates the atom hidden states of each molecule into a molecule vector.
+
+        :param atom_hiddens: A PyTorch tensor of shape :code:`(num_atoms, hidden_size)` containing the atom hidden
+                             states, starting with the zero padding atom.
+        :param a2m: A PyTorch tensor of shape :code:`(num_atoms - 1,)` containing the molecule index of each atom.
+        :param num_molecules: The number of molecules.
+        :return: A PyTorch tensor of shape :code:`(num_molecules, hidden_size)` containing the molecule vectors.
+        """
+        atom_hiddens = atom_hiddens[1:]  # (num_atoms - 1, hidden_size)
+
+        if self.aggregation in ['weighted', 'attention']:
+            scores = self.W_a(atom_hiddens).squeeze(1)  # (num_atoms - 1,)
+            if self.aggregation == 'weighted':
+                weights = torch.sigmoid(scores)
             else:
-                cur_hiddens = atom_hiddens.narrow(0, a_start, a_size)
-                mol_vec = cur_hiddens  # (num_atoms, hidden_size)
-                if self.aggregation == 'mean':
-                    mol_vec = mol_vec.sum(dim=0) / a_size
-                elif self.aggregation == 'sum':
-                    mol_vec = mol_vec.sum(dim=0)
-                elif self.aggregation == 'norm':
-                    mol_vec = mol_vec.sum(dim=0) / self.aggregation_norm
-                mol_vecs.append(mol_vec)
+                # Softmax over the atoms of each molecule, shifted by the molecule maximum for stability
+                max_scores = scores.new_full((num_molecules,), -float('inf'))
+                max_scores = max_scores.scatter_reduce(0, a2m, scores, reduce='amax')
+                weights = torch.exp(scores - max_scores[a2m])
+                weights = weights / weights.new_zeros(num_molecules).index_add(0, a2m, weights)[a2m]
+            atom_hiddens = atom_hiddens * weights.unsqueeze(1)
+
+        mol_vecs = atom_hiddens.new_zeros((num_molecules, atom_hiddens.size(1)))
+        mol_vecs = mol_vecs.index_add(0, a2m, atom_hiddens)  # (num_molecules, hidden_size)
 
-        mol_vecs = torch.stack(mol_vecs, dim=0)  # (num_molecules, hidden_size)
+        if self.aggregation == 'mean':
+            # Molecules without atoms keep a zero vector
+            a_sizes = torch.bincount(a2m, minlength=num_molecules).clamp(min=1)
+            mol_vecs = mol_vecs / a_sizes.unsqueeze(1).to(mol_vecs.dtype)
+        elif self.aggregation == 'norm':
+            mol_vecs = mol_vecs / self.aggregation_norm
 
-        return mol_vecs  # num_molecules x hidden
+        return mol_vecs
 
 
 class MPN(nn.Module):
@@ -303,7 +342,7 @@ class MPN(nn.Module):
                 batch = [mol2graph(b) for b in batch]
 
         if self.use_input_features:
-            features_batch = torch.from_numpy(np.stack(features_batch)).float().to(self.device)
+            features_batch = torch.from_numpy(stack_features(features_batch)).float().to(self.device)
 
             if self.features_only:
                 return features_batch
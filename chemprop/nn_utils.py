@@ -68,6 +68,32 @@ def index_select_ND(source: torch.Tensor, index: torch.Tensor) -> torch.Tensor:
     return target
 
 
+def index_add_ND(source: torch.Tensor,
+                 index: torch.Tensor,
+                 num_targets: int,
+                 padding: torch.Tensor = None) -> torch.Tensor:
+    """
+    Sums the message features from source into the atoms given by :code:`index`.
+
+    This is the sparse counterpart of :code:`index_select_ND(source, a2b).sum(dim=1)`. Since the padding entries of a
+    padded index select the first row of :code:`source`, each target also receives :code:`padding` times that row,
+    so that both give the same result.
+
+    :param source: A tensor of shape :code:`(num_bonds, hidden_size)` containing message features.
+    :param index: A tensor of shape :code:`(num_bonds,)` containing the index of the atom each message is added to.
+    :param num_targets: The number of atoms.
+    :param padding: A tensor of shape :code:`(num_atoms,)` containing the number of padding entries of each atom.
+    :return: A tensor of shape :code:`(num_atoms, hidden_size)` containing the summed message features of each atom.
+    """
+    target = source.new_zeros((num_targets,) + source.size()[1:])
+    target = target.index_add(0, index, source)  # (num_atoms, hidden_size)
+
+    if padding is not None:
+        target = target + padding.unsqueeze(1).to(source.dtype) * source[0]
+
+    return target
+
+
 def get_activation_function(activation: str) -> nn.Module:
     """
     Gets an activation function module given the name of the activation.
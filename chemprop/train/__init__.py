@@ -3,9 +3,12 @@ from .metrics import get_metric_func, prc_auc, bce, rmse, bounded_mse, bounded_m
 from .loss_functions import get_loss_func, bounded_mse_loss, \
     mcc_class_loss, mcc_multiclass_loss, sid_loss, wasserstein_loss
 from .cross_validate import chemprop_train, cross_validate, TRAIN_LOGGER_NAME
+from .distill import chemprop_distill, distill
 from .evaluate import evaluate, evaluate_predictions
 from .make_predictions import chemprop_predict, make_predictions, load_model, set_features, load_data, predict_and_save
 from .molecule_fingerprint import chemprop_fingerprint, model_fingerprint
+from .preprocess import chemprop_preprocess, preprocess
+from .parallel import train_concurrently
 from .predict import predict
 from .run_training import run_training
 from .train import train
@@ -14,6 +17,8 @@ __all__ = [
     'chemprop_train',
     'cross_validate',
     'TRAIN_LOGGER_NAME',
+    'chemprop_distill',
+    'distill',
     'evaluate',
     'evaluate_predictions',
     'chemprop_predict',
@@ -23,7 +28,10 @@ __all__ = [
     'set_features',
     'load_data',
     'predict_and_save',
+    'chemprop_preprocess',
+    'preprocess',
     'predict',
+    'train_concurrently',
     'run_training',
     'train',
     'get_metric_func',
@@ -1,5 +1,6 @@
 from collections import defaultdict
 import csv
+from functools import partial
 import json
 from logging import Logger
 import os
@@ -10,6 +11,8 @@ import subprocess
 import numpy as np
 import pandas as pd
 
+from .distributed import init_distributed, is_main_process, spawn_distributed
+from .parallel import train_concurrently
 from .run_training import run_training
 from chemprop.args import TrainArgs
 from chemprop.constants import TEST_SCORES_FILE_NAME, TRAIN_LOGGER_NAME
@@ -32,8 +35,15 @@ def cross_validate(args: TrainArgs,
                  loading data and training the Chemprop model.
     :param train_func: Function which runs training.
     :return: A tuple containing the mean and standard deviation performance across folds.
+             In distributed training, ranks other than 0 return NaNs.
     """
-    logger = create_logger(name=TRAIN_LOGGER_NAME, save_dir=args.save_dir, quiet=args.quiet)
+    if args.distributed:
+        init_distributed(args)
+    # In distributed training, only rank 0 writes logs, checkpoints and scores
+    is_main = is_main_process()
+
+    logger = create_logger(name=TRAIN_LOGGER_NAME, save_dir=args.save_dir if is_main else None,
+                           quiet=args.quiet or not is_main)
     if logger is not None:
         debug, info = logger.debug, logger.info
     else:
@@ -64,11 +74,12 @@ def cross_validate(args: TrainArgs,
 
     # Save args
     makedirs(args.save_dir)
-    try:
-        args.save(os.path.join(args.save_dir, 'args.json'))
-    except subprocess.CalledProcessError:
-        debug('Could not write the reproducibility section of the arguments to file, thus omitting this section.')
-        args.save(os.path.join(args.save_dir, 'args.json'), with_reproducibility=False)
+    if is_main:
+        try:
+            args.save(os.path.join(args.save_dir, 'args.json'))
+        except subprocess.CalledProcessError:
+            debug('Could not write the reproducibility section of the arguments to file, thus omitting this section.')
+            args.save(os.path.join(args.save_dir, 'args.json'), with_reproducibility=False)
 
     # set explicit H option and reaction option
     reset_featurization_parameters(logger=logger)
@@ -82,6 +93,8 @@ def cross_validate(args: TrainArgs,
     
     # Get data
     debug('Loading data')
+    if args.graph_store_path is not None:
+        debug(f'Using the graph store {args.graph_store_path}')
     data = get_data(
         path=args.data_path,
         args=args,
@@ -108,6 +121,19 @@ def cross_validate(args: TrainArgs,
     if args.target_weights is not None and len(args.target_weights) != args.num_tasks:
         raise ValueError('The number of provided target weights must match the number and order of the prediction tasks')
 
+    # Optionally train the models of all folds concurrently, then only evaluate them fold by fold
+    if args.train_workers > 0:
+        if train_func is not run_training:
+            raise ValueError('Concurrent training with train_workers is only supported by run_training.')
+        fold_nums = [
+            fold_num for fold_num in range(args.num_folds)
+            if not (args.resume_experiment
+                    and os.path.exists(os.path.join(save_dir, f'fold_{fold_num}', 'test_scores.json')))
+        ]
+        info(f'Training {len(fold_nums) * args.ensemble_size} models with {args.train_workers} workers')
+        train_concurrently(args, data, fold_nums)
+        train_func = partial(run_training, pretrained=True)
+
     # Run training on different random seeds for each fold
     all_scores = defaultdict(list)
     for fold_num in range(args.num_folds):
@@ -131,6 +157,9 @@ def cross_validate(args: TrainArgs,
             all_scores[metric].append(scores)
     all_scores = dict(all_scores)
 
+    if not is_main:
+        return float('nan'), float('nan')
+
     # Convert scores to numpy arrays
     for metric, scores in all_scores.items():
         all_scores[metric] = np.array(scores)
@@ -240,4 +269,9 @@ def chemprop_train() -> None:
 
     This is the entry point for the command line command :code:`chemprop_train`.
     """
-    cross_validate(args=TrainArgs().parse_args(), train_func=run_training)
+    args = TrainArgs().parse_args()
+
+    if args.distributed and args.rank is None:
+        spawn_distributed(args)
+    else:
+        cross_validate(args=args, train_func=run_training)
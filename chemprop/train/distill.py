@@ -0,0 +1,172 @@
+import csv
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+from .cross_validate import cross_validate
+from .predict import predict, scale_features
+from .run_training import run_training
+from chemprop.args import DistillArgs
+from chemprop.data import get_data, MoleculeDataLoader, MoleculeDataset
+from chemprop.features import set_explicit_h, set_adding_hs, set_keeping_atom_map, set_reaction, \
+    reset_featurization_parameters
+from chemprop.utils import load_args, load_checkpoint, load_scalers, makedirs
+
+DISTILLATION_TARGETS_FILE_NAME = 'distillation_targets.csv'
+
+
+def ensemble_soft_targets(args: DistillArgs, data: MoleculeDataset) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Predicts the mean and the variance of the ensemble on a dataset.
+
+    The variance of the ensemble is the mean of the variances predicted by the models trained with the
+    mve or evidential loss functions, zero for the other models, plus the variance of their predictions.
+
+    :param args: A :class:`~chemprop.args.DistillArgs` object containing the paths to the ensemble checkpoints.
+    :param data: A :class:`~chemprop.data.MoleculeDataset` with the valid molecules.
+    :return: A tuple with the mean and the variance of the ensemble, both of shape :code:`(num_molecules, num_tasks)`.
+    """
+    data_loader = MoleculeDataLoader(dataset=data, batch_size=args.batch_size, num_workers=args.num_workers)
+
+    all_preds, all_vars = [], []
+    for checkpoint_path in tqdm(args.teacher_checkpoint_paths, total=len(args.teacher_checkpoint_paths)):
+        model = load_checkpoint(checkpoint_path, device=args.device)
+        scaler, features_scaler, atom_descriptor_scaler, bond_descriptor_scaler, _ = load_scalers(checkpoint_path)
+        scale_features(data, features_scaler, atom_descriptor_scaler, bond_descriptor_scaler)
+
+        output = predict(model=model, data_loader=data_loader, scaler=scaler, return_unc_parameters=True)
+        if model.loss_function == 'mve':
+            preds, var = output
+        elif model.loss_function == 'evidential':
+            preds, lambdas, alphas, betas = output
+            var = np.array(betas) * (1 + 1 / np.array(lambdas)) / (np.array(alphas) - 1)
+        else:
+            preds, var = output, np.zeros_like(output)
+        all_preds.append(preds)
+        all_vars.append(var)
+    data.reset_features_and_targets()
+
+    all_preds, all_vars = np.array(all_preds, dtype=float), np.array(all_vars, dtype=float)
+
+    return all_preds.mean(axis=0), all_vars.mean(axis=0) + all_preds.var(axis=0)
+
+
+def save_soft_targets(path: str,
+                      smiles: List[List[str]],
+                      means: List[Optional[np.ndarray]],
+                      stds: Optional[List[Optional[np.ndarray]]],
+                      smiles_columns: List[str],
+                      task_names: List[str]) -> None:
+    """
+    Saves the soft targets of a dataset to a CSV file, leaving the targets of invalid molecules empty.
+
+    With standard deviations, the molecules are saved twice, first with the means minus the standard deviations and
+    then with the means plus the standard deviations. The mean squared error of a prediction over both copies is
+    its squared error to the mean plus the variance, so the Gaussian likelihood of the mve loss is maximized by
+    predicting the mean and the variance of the ensemble.
+
+    :param path: Path to the CSV file.
+    :param smiles: A list of the SMILES of each datapoint.
+    :param means: A list of the target means of each datapoint, :code:`None` for invalid molecules.
+    :param stds: A list of the target standard deviations of each datapoint, :code:`None` for invalid molecules,
+                 or :code:`None` to only save the means.
+    :param smiles_columns: The names of the SMILES columns.
+    :param task_names: The names of the tasks.
+    """
+    signs = [0] if stds is None else [-1, 1]
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(smiles_columns + task_names)
+        for sign in signs:
+            for i, (datapoint_smiles, mean) in enumerate(zip(smiles, means)):
+                if mean is None:
+                    writer.writerow(list(datapoint_smiles) + [''] * len(task_names))
+                else:
+                    targets = mean if sign == 0 else mean + sign * stds[i]
+                    writer.writerow(list(datapoint_smiles) + targets.tolist())
+
+
+def distill(args: DistillArgs) -> Tuple[float, float]:
+    """
+    Distills an ensemble into a single model.
+
+    The unlabeled molecules of :code:`args.data_path` are labeled with the predictions of the ensemble, and a model
+    is trained on them as usual, with the architecture given by :code:`args`. With the mve or evidential loss
+    functions, the model learns the variance of the ensemble as well as its mean.
+
+    :param args: A :class:`~chemprop.args.DistillArgs` object containing arguments for loading the ensemble
+                 and the unlabeled data and training the distilled model.
+    :return: A tuple containing the mean and standard deviation performance of the distilled model across folds.
+    """
+    print('Loading ensemble args')
+    teacher_args = load_args(args.teacher_checkpoint_paths[0])
+    if teacher_args.dataset_type != 'regression' or teacher_args.is_atom_bond_targets \
+            or teacher_args.loss_function == 'quantile_interval' \
+            or teacher_args.atom_descriptors is not None or teacher_args.bond_descriptors is not None:
+        raise ValueError('Only ensembles of regression models of molecular properties without atom or bond '
+                         'descriptors can be distilled.')
+
+    # The distilled model uses the molecule featurization of the ensemble
+    for name in ['explicit_h', 'adding_h', 'keeping_atom_map', 'reaction', 'reaction_mode', 'reaction_solvent']:
+        setattr(args, name, getattr(teacher_args, name))
+    reset_featurization_parameters()
+    set_explicit_h(args.explicit_h)
+    set_adding_hs(args.adding_h)
+    set_keeping_atom_map(args.keeping_atom_map)
+    if args.reaction:
+        set_reaction(args.reaction, args.reaction_mode)
+    elif args.reaction_solvent:
+        set_reaction(True, args.reaction_mode)
+
+    print('Loading unlabeled data')
+    data = get_data(
+        path=args.data_path,
+        smiles_columns=args.smiles_columns,
+        target_columns=[],
+        ignore_columns=[],
+        skip_invalid_smiles=False,
+        features_path=args.features_path,
+        features_generator=teacher_args.features_generator,
+        max_data_size=args.max_data_size,
+        featurization_workers=args.featurization_workers,
+    )
+    valid_indices = [i for i, datapoint in enumerate(data) if all(mol is not None for mol in datapoint.mol)]
+    print(f'Labeling {len(valid_indices):,} molecules with an ensemble of {len(args.teacher_checkpoint_paths)} models')
+    means, variances = ensemble_soft_targets(args, MoleculeDataset([data[i] for i in valid_indices]))
+
+    full_means, full_stds = [None] * len(data), [None] * len(data)
+    for i, mean, var in zip(valid_indices, means, variances):
+        full_means[i], full_stds[i] = mean, np.sqrt(var)
+    match_variance = args.loss_function in ['mve', 'evidential']
+
+    makedirs(args.save_dir)
+    soft_targets_path = os.path.join(args.save_dir, DISTILLATION_TARGETS_FILE_NAME)
+    save_soft_targets(
+        path=soft_targets_path,
+        smiles=data.smiles(),
+        means=full_means,
+        stds=full_stds if match_variance else None,
+        smiles_columns=args.smiles_columns,
+        task_names=teacher_args.task_names,
+    )
+    print(f'Saved soft targets to {soft_targets_path}')
+
+    # Train on the soft targets, keeping both copies of each molecule in the same split
+    args.data_path = soft_targets_path
+    args.target_columns, args.ignore_columns = teacher_args.task_names, None
+    args.max_data_size = None
+    if match_variance and args.split_type == 'random':
+        args.split_type = 'random_with_repeated_smiles'
+
+    return cross_validate(args=args, train_func=run_training)
+
+
+def chemprop_distill() -> None:
+    """Parses Chemprop distillation arguments and distills an ensemble of Chemprop models into a single model.
+
+    This is the entry point for the command line command :code:`chemprop_distill`.
+    """
+    distill(args=DistillArgs().parse_args())
@@ -0,0 +1,71 @@
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from chemprop.args import TrainArgs
+
+
+def init_distributed(args: TrainArgs) -> None:
+    """
+    Joins the process group of distributed training on the gloo backend, unless it is already initialized.
+
+    The rendezvous goes through :code:`args.dist_init_file` if given, and otherwise through the
+    :code:`MASTER_ADDR` and :code:`MASTER_PORT` environment variables.
+
+    :param args: A :class:`~chemprop.args.TrainArgs` object with the :code:`world_size` and :code:`rank` of the process.
+    """
+    if dist.is_initialized():
+        return
+
+    if args.dist_init_file is not None:
+        init_method = f'file://{os.path.abspath(args.dist_init_file)}'
+    else:
+        init_method = 'env://'
+
+    dist.init_process_group(backend='gloo', init_method=init_method, rank=args.rank, world_size=args.world_size)
+
+
+def is_main_process() -> bool:
+    """Returns whether this process is rank 0 of distributed training, or is not part of distributed training."""
+    return not (dist.is_available() and dist.is_initialized()) or dist.get_rank() == 0
+
+
+def _run_rank(rank: int, args: TrainArgs) -> None:
+    """
+    Runs cross-validation as one process of distributed training.
+
+    :param rank: The rank of the process.
+    :param args: The training arguments.
+    """
+    # Imported here since cross_validate imports this module
+    from .cross_validate import cross_validate
+    from .run_training import run_training
+
+    args.rank = rank
+    try:
+        cross_validate(args=args, train_func=run_training)
+    finally:
+        dist.destroy_process_group()
+
+
+def spawn_distributed(args: TrainArgs) -> None:
+    """
+    Runs distributed training with :code:`args.world_size` processes on this host.
+
+    Unless :code:`args.dist_init_file` is given, the processes meet through a file in a temporary directory.
+
+    :param args: A :class:`~chemprop.args.TrainArgs` object containing arguments for training the Chemprop model.
+    """
+    init_dir = None
+    if args.dist_init_file is None:
+        init_dir = mkdtemp()
+        args.dist_init_file = os.path.join(init_dir, 'rendezvous')
+
+    try:
+        mp.start_processes(_run_rank, args=(args,), nprocs=args.world_size, start_method='fork')
+    finally:
+        if init_dir is not None:
+            rmtree(init_dir, ignore_errors=True)
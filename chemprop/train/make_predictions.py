@@ -1,16 +1,23 @@
 from collections import OrderedDict
 import csv
-from typing import List, Optional, Union, Tuple
+import json
+import os
+import shutil
+from typing import Callable, List, Optional, Union, Tuple
 
 import numpy as np
 
 from chemprop.args import PredictArgs, TrainArgs
-from chemprop.data import get_data, get_data_from_smiles, MoleculeDataLoader, MoleculeDataset, StandardScaler, AtomBondScaler
-from chemprop.utils import load_args, load_checkpoint, load_scalers, makedirs, timeit, update_prediction_args
+from chemprop.data import get_data, get_data_chunks, get_data_from_smiles, MoleculeDataLoader, MoleculeDataset, StandardScaler, AtomBondScaler, \
+    empty_cache
+from chemprop.utils import load_args, load_checkpoint, load_onnx_checkpoint, load_quantized_checkpoint, load_scalers, \
+    makedirs, timeit, update_prediction_args
 from chemprop.features import set_extra_atom_fdim, set_extra_bond_fdim, set_reaction, set_explicit_h, set_adding_hs, set_keeping_atom_map, reset_featurization_parameters
 from chemprop.models import MoleculeModel
 from chemprop.uncertainty import UncertaintyCalibrator, build_uncertainty_calibrator, UncertaintyEstimator, build_uncertainty_evaluator
 from chemprop.multitask_utils import reshape_values
+from .evaluate import evaluate_predictions
+from .predict import predict, scale_features
 
 
 def load_model(args: PredictArgs, generator: bool = False):
@@ -32,12 +39,24 @@ def load_model(args: PredictArgs, generator: bool = False):
     args: Union[PredictArgs, TrainArgs]
 
     # Load model and scalers
-    models = (
-        load_checkpoint(checkpoint_path, device=args.device) for checkpoint_path in args.checkpoint_paths
-    )
+    if args.backend == "onnxruntime":
+        models = (
+            load_onnx_checkpoint(checkpoint_path) for checkpoint_path in args.checkpoint_paths
+        )
+    elif args.quantize:
+        models = (
+            load_quantized_checkpoint(checkpoint_path) for checkpoint_path in args.checkpoint_paths
+        )
+    else:
+        models = (
+            load_checkpoint(checkpoint_path, device=args.device) for checkpoint_path in args.checkpoint_paths
+        )
     scalers = (
         load_scalers(checkpoint_path) for checkpoint_path in args.checkpoint_paths
     )
+    if args.backend == "onnxruntime":
+        # The target and features scalers are part of the exported graphs
+        scalers = ((None, None) + scaler_list[2:] for scaler_list in scalers)
     if not generator:
         models = list(models)
         scalers = list(scalers)
@@ -74,6 +93,23 @@ def load_data(args: PredictArgs, smiles: List[List[str]]):
         )
 
     print("Validating SMILES")
+    test_data, test_data_loader, full_to_valid_indices = validate_data(args, full_data)
+
+    print(f"Test size = {len(test_data):,}")
+
+    return full_data, test_data, test_data_loader, full_to_valid_indices
+
+
+def validate_data(args: PredictArgs, full_data: MoleculeDataset):
+    """
+    Function to select the datapoints with valid SMILES.
+
+    :param args: A :class:`~chemprop.args.PredictArgs` object containing arguments for
+                 loading data and a model and making predictions.
+    :param full_data: A :class:`~chemprop.data.MoleculeDataset` containing all datapoints.
+    :return: A tuple of a :class:`~chemprop.data.MoleculeDataset` containing only valid datapoints,
+                 a :class:`~chemprop.data.MoleculeDataLoader` and a dictionary mapping full to valid indices.
+    """
     full_to_valid_indices = {}
     valid_index = 0
     for full_index in range(len(full_data)):
@@ -85,14 +121,74 @@ def load_data(args: PredictArgs, smiles: List[List[str]]):
         [full_data[i] for i in sorted(full_to_valid_indices.keys())]
     )
 
-    print(f"Test size = {len(test_data):,}")
-
     # Create data loader
     test_data_loader = MoleculeDataLoader(
         dataset=test_data, batch_size=args.batch_size, num_workers=args.num_workers
     )
 
-    return full_data, test_data, test_data_loader, full_to_valid_indices
+    return test_data, test_data_loader, full_to_valid_indices
+
+
+def evaluate_quantization(args: PredictArgs, train_args: TrainArgs, task_names: List[str]) -> dict:
+    """
+    Function to compare the metrics of the quantized models to those of the float models on :code:`args.quantize_eval_path`.
+
+    :param args: A :class:`~chemprop.args.PredictArgs` object containing arguments for
+                 loading data and a model and making predictions.
+    :param train_args: A :class:`~chemprop.args.TrainArgs` object containing arguments for training the model.
+    :param task_names: A list of task names.
+    :return: A dictionary mapping each metric of the models to a dictionary with the average score of the
+             :code:`float` and :code:`int8` ensembles and their :code:`delta`.
+    """
+    if args.is_atom_bond_targets:
+        raise NotImplementedError("Evaluating quantized models is not supported with atomic/bond targets.")
+
+    eval_data = get_data(
+        path=args.quantize_eval_path,
+        smiles_columns=args.smiles_columns,
+        target_columns=task_names,
+        args=args,
+        features_path=args.features_path,
+        features_generator=args.features_generator,
+        phase_features_path=args.phase_features_path,
+        atom_descriptors_path=args.atom_descriptors_path,
+        bond_descriptors_path=args.bond_descriptors_path,
+        loss_function=args.loss_function,
+    )
+    eval_data_loader = MoleculeDataLoader(dataset=eval_data, batch_size=args.batch_size, num_workers=args.num_workers)
+    print(f"Evaluating quantized models on {len(eval_data):,} molecules")
+
+    sum_preds = {"float": 0, "int8": 0}
+    for checkpoint_path in args.checkpoint_paths:
+        scaler, features_scaler, atom_descriptor_scaler, bond_descriptor_scaler, _ = load_scalers(checkpoint_path)
+        scale_features(eval_data, features_scaler, atom_descriptor_scaler, bond_descriptor_scaler)
+        for name, model in [
+            ("float", load_checkpoint(checkpoint_path, device=args.device)),
+            ("int8", load_quantized_checkpoint(checkpoint_path)),
+        ]:
+            sum_preds[name] = sum_preds[name] + np.array(predict(model=model, data_loader=eval_data_loader, scaler=scaler))
+
+    scores = {
+        name: evaluate_predictions(
+            preds=(preds / len(args.checkpoint_paths)).tolist(),
+            targets=eval_data.targets(),
+            num_tasks=train_args.num_tasks,
+            metrics=train_args.metrics,
+            dataset_type=args.dataset_type,
+            gt_targets=eval_data.gt_targets(),
+            lt_targets=eval_data.lt_targets(),
+            quantiles=train_args.quantiles,
+        )
+        for name, preds in sum_preds.items()
+    }
+
+    results = {}
+    for metric in train_args.metrics:
+        float_score, int8_score = np.nanmean(scores["float"][metric]), np.nanmean(scores["int8"][metric])
+        results[metric] = {"float": float_score, "int8": int8_score, "delta": int8_score - float_score}
+        print(f"Quantized {metric} = {int8_score:.6f} (float {float_score:.6f}, delta {int8_score - float_score:+.6f})")
+
+    return results
 
 
 def set_features(args: PredictArgs, train_args: TrainArgs):
@@ -136,6 +232,8 @@ def predict_and_save(
     calibrator: UncertaintyCalibrator = None,
     return_invalid_smiles: bool = False,
     save_results: bool = True,
+    append: bool = False,
+    preds_path: str = None,
 ):
     """
     Function to predict with a model and save the predictions to file.
@@ -155,6 +253,8 @@ def predict_and_save(
     :param calibrator: A :class: `~chemprop.uncertainty.UncertaintyCalibrator` object, for use in calibrating uncertainty predictions.
     :param return_invalid_smiles: Whether to return predictions of "Invalid SMILES" for invalid SMILES, otherwise will skip them in returned predictions.
     :param save_results: Whether to save the predictions in a csv. Function returns the predictions regardless.
+    :param append: Whether to append the predictions to an existing csv instead of overwriting it, e.g. for all but the first chunk of a file.
+    :param preds_path: Path to the csv to save the predictions to, :code:`args.preds_path` by default.
     :return: A list of lists of target predictions.
     """
     estimator = UncertaintyEstimator(
@@ -171,6 +271,7 @@ def predict_and_save(
         dropout_sampling_size=args.dropout_sampling_size,
         individual_ensemble_predictions=args.individual_ensemble_predictions,
         spectra_phase_mask=getattr(train_args, "spectra_phase_mask", None),
+        ensemble_execution=args.ensemble_execution,
     )
 
     preds, unc = estimator.calculate_uncertainty(
@@ -249,11 +350,12 @@ def predict_and_save(
 
     # Save results
     if save_results:
-        print(f"Saving predictions to {args.preds_path}")
+        preds_path = preds_path if preds_path is not None else args.preds_path
+        print(f"Saving predictions to {preds_path}")
         assert len(test_data) == len(preds)
         assert len(test_data) == len(unc)
 
-        makedirs(args.preds_path, isfile=True)
+        makedirs(preds_path, isfile=True)
 
         # Set multiclass column names, update num_tasks definitions
         if args.dataset_type == "multiclass":
@@ -324,9 +426,10 @@ def predict_and_save(
                         datapoint.row[pred_name + f"_model_{idx}"] = pred
 
         # Save
-        with open(args.preds_path, 'w', newline="") as f:
+        with open(preds_path, 'a' if append else 'w', newline="") as f:
             writer = csv.DictWriter(f, fieldnames=full_data[0].row.keys())
-            writer.writeheader()
+            if not append:
+                writer.writeheader()
 
             for datapoint in full_data:
                 writer.writerow(datapoint.row)
@@ -359,6 +462,267 @@ def predict_and_save(
         return preds, unc
 
 
+def predict_in_chunks(
+    args: PredictArgs,
+    train_args: TrainArgs,
+    task_names: List[str],
+    num_tasks: int,
+    models: List[MoleculeModel],
+    scalers: List[Union[StandardScaler, AtomBondScaler]],
+    num_models: int,
+    calibrator: UncertaintyCalibrator = None,
+) -> int:
+    r"""
+    Function to read the test file in chunks of :code:`args.chunk_size` rows and save the predictions for each chunk
+    before reading the next one, so that memory use does not depend on the size of the file.
+
+    The predictions are appended to :code:`args.preds_path`. For a resumable job, each chunk is instead committed
+    to a shard file and recorded in a manifest (see :func:`load_manifest`), so that rerunning an interrupted job
+    resumes after the last completed chunk. The shards are merged into :code:`args.preds_path` once all chunks are done.
+
+    :param args: A :class:`~chemprop.args.PredictArgs` object containing arguments for
+                 loading data and a model and making predictions.
+    :param train_args: A :class:`~chemprop.args.TrainArgs` object containing arguments for training the model.
+    :param task_names: A list of task names.
+    :param num_tasks: Number of tasks.
+    :param models: A list of :class:`~chemprop.models.MoleculeModel`\ s, which are used for every chunk.
+    :param scalers: A list of :class:`~chemprop.features.scaler.StandardScaler` objects.
+    :param num_models: The number of models included in the models and scalers input.
+    :param calibrator: A :class: `~chemprop.uncertainty.UncertaintyCalibrator` object, for use in calibrating uncertainty predictions.
+    :return: The number of rows written to :code:`args.preds_path`.
+    """
+    manifest = load_manifest(args) if args.resumable else None
+    num_rows = manifest["next_row"] if manifest is not None else 0
+    if num_rows > 0:
+        print(f"Resuming after {manifest['completed_chunks']:,} chunks ({num_rows:,} rows)")
+
+    def save_chunk(save: Callable[[str, bool], None], num_chunk_rows: int) -> str:
+        """
+        Saves a chunk with :code:`save(preds_path, append)`, as a new shard of a resumable job or to args.preds_path,
+        and returns the path of the csv the chunk was saved to.
+        """
+        nonlocal num_rows
+        if manifest is None:
+            path = args.preds_path
+            save(path, num_rows > 0)
+        else:
+            path = os.path.join(shard_dir(args), f"shard-{manifest['completed_chunks']:06d}.csv")
+            save(f"{path}.tmp", False)
+            os.replace(f"{path}.tmp", path)
+            manifest["shards"].append(os.path.basename(path))
+            manifest["completed_chunks"] += 1
+            manifest["next_row"] += num_chunk_rows
+            save_manifest(args, manifest)
+        num_rows += num_chunk_rows
+
+        return path
+
+    # The columns of the predictions file are only known once a chunk has been predicted. Rows with invalid SMILES
+    # read before then are kept in a pending csv and written along with the first chunk with valid SMILES.
+    fieldnames = None
+    if manifest is not None and len(manifest["shards"]) > 0:
+        fieldnames = read_header(os.path.join(shard_dir(args), manifest["shards"][0]))
+    pending_path = f"{args.preds_path}.invalid.tmp"
+    num_pending = 0
+
+    for full_data in get_data_chunks(
+        path=args.test_path,
+        chunk_size=args.chunk_size,
+        args=args,
+        start_row=num_rows,
+        store_row=not args.drop_extra_columns,
+    ):
+        test_data, test_data_loader, full_to_valid_indices = validate_data(args, full_data)
+        if len(test_data) == 0:
+            if fieldnames is not None:
+                save_chunk(
+                    lambda path, append: save_invalid_rows(args, full_data, fieldnames, path, append),
+                    len(full_data),
+                )
+            else:
+                makedirs(pending_path, isfile=True)
+                input_fieldnames = args.smiles_columns if args.drop_extra_columns else list(full_data[0].row.keys())
+                save_invalid_rows(args, full_data, input_fieldnames, pending_path, num_pending > 0)
+                num_pending += len(full_data)
+            continue
+
+        def save_predictions(path: str, append: bool) -> None:
+            """Saves the predictions of the chunk, after the pending rows if any."""
+            predict_and_save(
+                args=args,
+                train_args=train_args,
+                test_data=test_data,
+                task_names=task_names,
+                num_tasks=num_tasks,
+                test_data_loader=test_data_loader,
+                full_data=full_data,
+                full_to_valid_indices=full_to_valid_indices,
+                models=models,
+                scalers=scalers,
+                num_models=num_models,
+                calibrator=calibrator,
+                append=append,
+                preds_path=path if num_pending == 0 else f"{path}.chunk.tmp",
+            )
+            if num_pending > 0:
+                prepend_pending_rows(pending_path, f"{path}.chunk.tmp", path, append)
+
+        path = save_chunk(save_predictions, num_pending + len(full_data))
+        if num_pending > 0:
+            os.remove(pending_path)
+            num_pending = 0
+        if fieldnames is None:
+            fieldnames = read_header(path)
+        print(f"Predicted {num_rows:,} rows")
+
+        # Featurizations of previous chunks are unlikely to be needed again
+        empty_cache()
+
+    if num_pending > 0:
+        os.remove(pending_path)
+        if manifest is not None:
+            merge_shards(args, manifest)
+        raise ValueError(f"None of the {num_pending:,} rows of {args.test_path} has valid SMILES, no predictions were saved.")
+
+    if manifest is not None:
+        merge_shards(args, manifest)
+
+    return num_rows
+
+
+def read_header(path: str) -> List[str]:
+    """
+    Function to read the columns of a csv file.
+
+    :param path: Path to a csv file.
+    :return: The names of the columns in the header of the file.
+    """
+    with open(path, newline="") as f:
+        return next(csv.reader(f))
+
+
+def prepend_pending_rows(pending_path: str, chunk_path: str, preds_path: str, append: bool) -> None:
+    """
+    Function to save the predictions of a chunk after pending rows with invalid SMILES, and remove the chunk file.
+
+    :param pending_path: Path to a csv with the input columns of the pending rows.
+    :param chunk_path: Path to the csv with the predictions of the chunk.
+    :param preds_path: Path to the csv to save the rows to.
+    :param append: Whether to append the rows to an existing csv instead of overwriting it.
+    """
+    with open(chunk_path, newline="") as chunk_f, open(preds_path, 'a' if append else 'w', newline="") as f:
+        header = chunk_f.readline()
+        fieldnames = next(csv.reader([header]))
+        if not append:
+            f.write(header)
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        with open(pending_path, newline="") as pending_f:
+            for row in csv.DictReader(pending_f):
+                writer.writerow({name: row.get(name, "Invalid SMILES") for name in fieldnames})
+        shutil.copyfileobj(chunk_f, f)
+    os.remove(chunk_path)
+
+
+def save_invalid_rows(args: PredictArgs, full_data: MoleculeDataset, fieldnames: List[str], preds_path: str, append: bool) -> None:
+    """
+    Function to save datapoints with invalid SMILES, with "Invalid SMILES" in every prediction column.
+
+    :param args: A :class:`~chemprop.args.PredictArgs` object containing arguments for
+                 loading data and a model and making predictions.
+    :param full_data: A :class:`~chemprop.data.MoleculeDataset` containing datapoints with invalid SMILES.
+    :param fieldnames: The columns of the predictions file.
+    :param preds_path: Path to the csv to save the rows to.
+    :param append: Whether to append the rows to an existing csv instead of overwriting it.
+    """
+    with open(preds_path, 'a' if append else 'w', newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        if not append:
+            writer.writeheader()
+        for datapoint in full_data:
+            if args.drop_extra_columns:
+                row = OrderedDict(zip(args.smiles_columns, datapoint.smiles))
+            else:
+                row = datapoint.row
+            writer.writerow({name: row.get(name, "Invalid SMILES") for name in fieldnames})
+
+
+def shard_dir(args: PredictArgs) -> str:
+    """Returns the directory holding the shards of a resumable prediction job."""
+    return f"{args.preds_path}.shards"
+
+
+def load_manifest(args: PredictArgs) -> dict:
+    """
+    Function to load the manifest of a resumable prediction job, or start a new one.
+
+    The manifest is saved next to :code:`args.preds_path` and records the inputs of the job, the number of completed chunks,
+    the row of the test file to resume from, and the shard file of each completed chunk.
+
+    :param args: A :class:`~chemprop.args.PredictArgs` object containing arguments for
+                 loading data and a model and making predictions.
+    :return: The manifest as a dictionary.
+    """
+    job = {
+        "test_path": os.path.abspath(args.test_path),
+        "checkpoint_paths": [os.path.abspath(path) for path in args.checkpoint_paths],
+        "chunk_size": args.chunk_size,
+    }
+    manifest_path = f"{args.preds_path}.manifest.json"
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest["job"] != job:
+            raise ValueError(f"The prediction job recorded in {manifest_path} used a different test file, checkpoints or chunk size. "
+                             f"Delete it and {shard_dir(args)} to start over.")
+        return manifest
+
+    makedirs(shard_dir(args))
+    manifest = {"job": job, "completed_chunks": 0, "next_row": 0, "shards": []}
+    save_manifest(args, manifest)
+
+    return manifest
+
+
+def save_manifest(args: PredictArgs, manifest: dict) -> None:
+    """
+    Function to atomically replace the manifest of a resumable prediction job.
+
+    :param args: A :class:`~chemprop.args.PredictArgs` object containing arguments for
+                 loading data and a model and making predictions.
+    :param manifest: The manifest as a dictionary.
+    """
+    manifest_path = f"{args.preds_path}.manifest.json"
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+
+def merge_shards(args: PredictArgs, manifest: dict) -> None:
+    """
+    Function to concatenate the shards of a completed resumable prediction job into :code:`args.preds_path`
+    and remove the shards and the manifest.
+
+    :param args: A :class:`~chemprop.args.PredictArgs` object containing arguments for
+                 loading data and a model and making predictions.
+    :param manifest: The manifest as a dictionary.
+    """
+    if len(manifest["shards"]) > 0:
+        print(f"Merging {len(manifest['shards']):,} shards into {args.preds_path}")
+        with open(f"{args.preds_path}.tmp", "w", newline="") as f:
+            for i, shard in enumerate(manifest["shards"]):
+                with open(os.path.join(shard_dir(args), shard), newline="") as shard_f:
+                    header = shard_f.readline()
+                    if i == 0:
+                        f.write(header)
+                    shutil.copyfileobj(shard_f, f)
+        os.replace(f"{args.preds_path}.tmp", args.preds_path)
+
+    shutil.rmtree(shard_dir(args))
+    os.remove(f"{args.preds_path}.manifest.json")
+
+
 @timeit()
 def make_predictions(
     args: PredictArgs,
@@ -395,6 +759,8 @@ def make_predictions(
     :param return_index_dict: Whether to return the prediction results as a dictionary keyed from the initial data indexes.
     :param return_uncertainty: Whether to return uncertainty predictions alongside the model value predictions.
     :return: A list of lists of target predictions. If returning uncertainty, a tuple containing first prediction values then uncertainty estimates.
+             When predicting on :code:`args.test_path` in chunks of :code:`args.chunk_size` rows, the predictions are only saved to
+             :code:`args.preds_path` and None is returned.
     """
     if model_objects:
         (args, train_args, models, scalers, num_tasks, task_names) = model_objects
@@ -407,8 +773,13 @@ def make_predictions(
 
     set_features(args, train_args)
 
-    # Note: to get the invalid SMILES for your data, use the get_invalid_smiles_from_file or get_invalid_smiles_from_list functions from data/utils.py
-    full_data, test_data, test_data_loader, full_to_valid_indices = load_data(args, smiles)
+    chunked = args.chunk_size is not None and smiles is None
+    if chunked:
+        # The models are used for every chunk
+        models, scalers = list(models), list(scalers)
+    else:
+        # Note: to get the invalid SMILES for your data, use the get_invalid_smiles_from_file or get_invalid_smiles_from_list functions from data/utils.py
+        full_data, test_data, test_data_loader, full_to_valid_indices = load_data(args, smiles)
 
     if args.uncertainty_method is not None and args.calibration_method in [
         "conformal_regression",
@@ -487,7 +858,24 @@ def make_predictions(
             conformal_alpha=args.conformal_alpha,
             dropout_sampling_size=args.dropout_sampling_size,
             spectra_phase_mask=getattr(train_args, "spectra_phase_mask", None),
+            ensemble_execution=args.ensemble_execution,
+        )
+
+    if args.quantize_eval_path is not None:
+        evaluate_quantization(args, train_args, task_names)
+
+    if chunked:
+        predict_in_chunks(
+            args=args,
+            train_args=train_args,
+            task_names=task_names,
+            num_tasks=num_tasks,
+            models=models,
+            scalers=scalers,
+            num_models=num_models,
+            calibrator=calibrator,
         )
+        return None
 
     # Edge case if empty list of smiles is provided
     if len(test_data) == 0:
@@ -1,5 +1,5 @@
 import csv
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 
 import torch
 import numpy as np
@@ -7,7 +7,8 @@ from tqdm import tqdm
 
 from chemprop.args import FingerprintArgs, TrainArgs
 from chemprop.data import get_data, get_data_from_smiles, MoleculeDataLoader, MoleculeDataset
-from chemprop.utils import load_args, load_checkpoint, makedirs, timeit, load_scalers, update_prediction_args
+from chemprop.utils import load_args, load_checkpoint, load_quantized_checkpoint, makedirs, timeit, load_scalers, \
+    update_prediction_args
 from chemprop.data import MoleculeDataLoader, MoleculeDataset
 from chemprop.features import set_reaction, set_explicit_h, set_adding_hs, set_keeping_atom_map, reset_featurization_parameters, set_extra_atom_fdim, set_extra_bond_fdim
 from chemprop.models import MoleculeModel
@@ -107,32 +108,21 @@ def molecule_fingerprint(args: FingerprintArgs,
         raise ValueError(f'Fingerprint type {args.fingerprint_type} not supported')
     all_fingerprints = np.zeros((len(test_data), total_fp_size, len(args.checkpoint_paths)))
 
+    if args.quantize_eval_path is not None:
+        evaluate_fingerprint_quantization(args, train_args, total_fp_size)
+
     # Load model
     print(f'Encoding smiles into a fingerprint vector from {len(args.checkpoint_paths)} models.')
 
     for index, checkpoint_path in enumerate(tqdm(args.checkpoint_paths, total=len(args.checkpoint_paths))):
-        model = load_checkpoint(checkpoint_path, device=args.device)
-        scaler, features_scaler, atom_descriptor_scaler, bond_descriptor_scaler, atom_bond_scaler = load_scalers(args.checkpoint_paths[index])
-
-        # Normalize features
-        if args.features_scaling or train_args.atom_descriptor_scaling or train_args.bond_descriptor_scaling:
-            test_data.reset_features_and_targets()
-            if args.features_scaling:
-                test_data.normalize_features(features_scaler)
-            if train_args.atom_descriptor_scaling and args.atom_descriptors is not None:
-                test_data.normalize_features(atom_descriptor_scaler, scale_atom_descriptors=True)
-            if train_args.bond_descriptor_scaling and args.bond_descriptors is not None:
-                test_data.normalize_features(bond_descriptor_scaler, scale_bond_descriptors=True)
+        if args.quantize:
+            model = load_quantized_checkpoint(checkpoint_path)
+        else:
+            model = load_checkpoint(checkpoint_path, device=args.device)
+        normalize_fingerprint_features(test_data, args, train_args, checkpoint_path)
 
         # Make fingerprints
-        model_fp = model_fingerprint(
-            model=model,
-            data_loader=test_data_loader,
-            fingerprint_type=args.fingerprint_type
-        )
-        if args.fingerprint_type == 'MPN' and (args.features_path is not None or args.features_generator): # truncate any features from MPN fingerprint
-            model_fp = np.array(model_fp)[:,:total_fp_size] 
-        all_fingerprints[:,:,index] = model_fp
+        all_fingerprints[:,:,index] = checkpoint_fingerprint(model, test_data_loader, args, total_fp_size)
 
     # Save predictions
     print(f'Saving predictions to {args.preds_path}')
@@ -186,6 +176,99 @@ def molecule_fingerprint(args: FingerprintArgs,
     else:
         return all_fingerprints
 
+
+def normalize_fingerprint_features(data: MoleculeDataset,
+                                   args: Union[FingerprintArgs, TrainArgs],
+                                   train_args: TrainArgs,
+                                   checkpoint_path: str) -> None:
+    """
+    Scales the features and atom/bond descriptors of a dataset with the scalers of a checkpoint.
+
+    :param data: A :class:`~chemprop.data.MoleculeDataset`.
+    :param args: The fingerprint arguments, updated with the training arguments.
+    :param train_args: A :class:`~chemprop.args.TrainArgs` object containing arguments for training the model.
+    :param checkpoint_path: Path to the checkpoint with the scalers.
+    """
+    scaler, features_scaler, atom_descriptor_scaler, bond_descriptor_scaler, atom_bond_scaler = load_scalers(checkpoint_path)
+
+    if args.features_scaling or train_args.atom_descriptor_scaling or train_args.bond_descriptor_scaling:
+        data.reset_features_and_targets()
+        if args.features_scaling:
+            data.normalize_features(features_scaler)
+        if train_args.atom_descriptor_scaling and args.atom_descriptors is not None:
+            data.normalize_features(atom_descriptor_scaler, scale_atom_descriptors=True)
+        if train_args.bond_descriptor_scaling and args.bond_descriptors is not None:
+            data.normalize_features(bond_descriptor_scaler, scale_bond_descriptors=True)
+
+
+def checkpoint_fingerprint(model: MoleculeModel,
+                           data_loader: MoleculeDataLoader,
+                           args: Union[FingerprintArgs, TrainArgs],
+                           total_fp_size: int) -> np.ndarray:
+    """
+    Encodes molecules into the fingerprint vectors of one model, without the features appended to MPN fingerprints.
+
+    :param model: A :class:`~chemprop.models.model.MoleculeModel`.
+    :param data_loader: A :class:`~chemprop.data.data.MoleculeDataLoader`.
+    :param args: The fingerprint arguments, updated with the training arguments.
+    :param total_fp_size: The size of the fingerprint vectors.
+    :return: An array of size :code:`(num_molecules, total_fp_size)` with the fingerprint vectors.
+    """
+    model_fp = np.array(model_fingerprint(
+        model=model,
+        data_loader=data_loader,
+        fingerprint_type=args.fingerprint_type
+    ))
+    if args.fingerprint_type == 'MPN' and (args.features_path is not None or args.features_generator): # truncate any features from MPN fingerprint
+        model_fp = model_fp[:,:total_fp_size]
+
+    return model_fp
+
+
+def evaluate_fingerprint_quantization(args: FingerprintArgs, train_args: TrainArgs, total_fp_size: int) -> Dict[str, float]:
+    """
+    Compares the fingerprints of the quantized models to those of the float models on :code:`args.quantize_eval_path`.
+
+    The molecules are loaded and their features scaled as those being fingerprinted, so the comparison covers the
+    same inputs, including for MPN fingerprints whose feature sources are not validated.
+
+    :param args: The fingerprint arguments, updated with the training arguments.
+    :param train_args: A :class:`~chemprop.args.TrainArgs` object containing arguments for training the model.
+    :param total_fp_size: The size of the fingerprint vectors.
+    :return: A dictionary with the maximum and mean absolute differences between the :code:`int8` and :code:`float`
+             fingerprints and their difference relative to the norm of the :code:`float` fingerprints.
+    """
+    eval_data = get_data(path=args.quantize_eval_path, smiles_columns=args.smiles_columns, target_columns=[],
+                         ignore_columns=[], args=args)
+    if len(eval_data) == 0:
+        raise ValueError(f'No valid molecules to evaluate the quantized models on in {args.quantize_eval_path}.')
+    eval_data_loader = MoleculeDataLoader(dataset=eval_data, batch_size=args.batch_size, num_workers=args.num_workers)
+    print(f'Evaluating quantized fingerprints on {len(eval_data):,} molecules')
+
+    max_diff = sum_diff = sum_squared_diff = sum_squared_norm = 0
+    for checkpoint_path in args.checkpoint_paths:
+        normalize_fingerprint_features(eval_data, args, train_args, checkpoint_path)
+        float_fp = checkpoint_fingerprint(load_checkpoint(checkpoint_path, device=args.device), eval_data_loader,
+                                          args, total_fp_size)
+        int8_fp = checkpoint_fingerprint(load_quantized_checkpoint(checkpoint_path), eval_data_loader,
+                                         args, total_fp_size)
+        diff = np.abs(int8_fp - float_fp)
+        max_diff = max(max_diff, float(diff.max()))
+        sum_diff += float(diff.sum())
+        sum_squared_diff += float(np.square(diff).sum())
+        sum_squared_norm += float(np.square(float_fp).sum())
+
+    results = {
+        'max_abs_diff': max_diff,
+        'mean_abs_diff': sum_diff / (len(args.checkpoint_paths) * len(eval_data) * total_fp_size),
+        'relative_diff': np.sqrt(sum_squared_diff / sum_squared_norm) if sum_squared_norm > 0 else 0.0,
+    }
+    print(f"Quantized fingerprints: max abs diff = {results['max_abs_diff']:.6f}, "
+          f"mean abs diff = {results['mean_abs_diff']:.6f}, relative diff = {results['relative_diff']:.6f}")
+
+    return results
+
+
 def model_fingerprint(model: MoleculeModel,
             data_loader: MoleculeDataLoader,
             fingerprint_type: str = 'MPN',
@@ -0,0 +1,89 @@
+from copy import deepcopy
+from multiprocessing import Pool
+import os
+from typing import List, Optional, Tuple
+
+import torch
+from tqdm import tqdm
+
+from .run_training import run_training
+from chemprop.args import TrainArgs
+from chemprop.constants import TRAIN_LOGGER_NAME
+from chemprop.data import MoleculeDataset, graph_store, set_graph_store
+from chemprop.features import featurization
+from chemprop.features.featurization import Featurization_parameters
+from chemprop.utils import create_logger
+
+# The arguments and data shared by the training workers
+_ARGS: Optional[TrainArgs] = None
+_DATA: Optional[MoleculeDataset] = None
+
+
+def _init_worker(args: TrainArgs,
+                 data: MoleculeDataset,
+                 params: Featurization_parameters,
+                 graph_store_path: Optional[str],
+                 num_threads: int) -> None:
+    """
+    Sets up a training worker with the arguments, data and featurization parameters of the parent process.
+
+    With the default fork start method, the data is inherited from the parent rather than copied through a pipe,
+    and the molecular graphs of a :class:`~chemprop.data.MolGraphStore` are read from the same memory-mapped files.
+
+    :param args: The training arguments.
+    :param data: The full dataset, which each job splits for its fold.
+    :param params: The molecule featurization parameters.
+    :param graph_store_path: The path of the :class:`~chemprop.data.MolGraphStore`, if any.
+    :param num_threads: The number of PyTorch threads of the worker.
+    """
+    global _ARGS, _DATA
+    _ARGS, _DATA = args, data
+    featurization.PARAMS = params
+    set_graph_store(graph_store_path)
+    torch.set_num_threads(num_threads)
+
+
+def _train_member(job: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Trains one ensemble member of one cross-validation fold and saves it to :code:`fold_<k>/model_<i>`.
+
+    :param job: The fold number and the index of the ensemble member.
+    :return: The fold number and the index of the ensemble member.
+    """
+    fold_num, model_idx = job
+    args = deepcopy(_ARGS)
+    args.seed = _ARGS.seed + fold_num
+    args.save_dir = os.path.join(_ARGS.save_dir, f'fold_{fold_num}')
+    # Pool workers are daemonic and cannot start data loading workers of their own
+    args.num_workers = 0
+    logger = create_logger(name=TRAIN_LOGGER_NAME, save_dir=_ARGS.save_dir, quiet=_ARGS.quiet)
+
+    _DATA.reset_features_and_targets()
+    run_training(args, _DATA, logger, model_indices=[model_idx])
+
+    return fold_num, model_idx
+
+
+def train_concurrently(args: TrainArgs, data: MoleculeDataset, fold_nums: List[int]) -> None:
+    """
+    Trains the ensemble members of cross-validation folds concurrently in a pool of :code:`args.train_workers` processes.
+
+    Each ensemble member of each fold is a separate job, so that up to :code:`args.ensemble_size * len(fold_nums)`
+    models are trained at the same time. The models are saved in the usual :code:`fold_<k>/model_<i>` layout,
+    where :func:`~chemprop.train.run_training` with :code:`pretrained=True` evaluates them.
+
+    :param args: A :class:`~chemprop.args.TrainArgs` object with the :code:`save_dir` and :code:`seed` of the first fold.
+    :param data: A :class:`~chemprop.data.MoleculeDataset` containing the data.
+    :param fold_nums: The folds to train.
+    """
+    jobs = [(fold_num, model_idx) for fold_num in fold_nums for model_idx in range(args.ensemble_size)]
+    if len(jobs) == 0:
+        return
+
+    num_threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.train_workers)
+    store = graph_store()
+
+    with Pool(min(args.train_workers, len(jobs)), initializer=_init_worker,
+              initargs=(args, data, featurization.PARAMS, store.path if store is not None else None, num_threads)) as pool:
+        for _ in tqdm(pool.imap_unordered(_train_member, jobs), total=len(jobs)):
+            pass
@@ -1,11 +1,12 @@
-from typing import List
+import copy
+from typing import Any, List, Optional, Tuple
 
 import numpy as np
 import torch
 from tqdm import tqdm
 
 from chemprop.data import MoleculeDataLoader, MoleculeDataset, StandardScaler, AtomBondScaler
-from chemprop.models import MoleculeModel
+from chemprop.models import MoleculeModel, MPNEncoder
 from chemprop.nn_utils import activate_dropout
 
 
@@ -41,91 +42,385 @@ def predict(
 
         model.apply(activate_dropout_)
 
-    preds = []
-
-    var, lambdas, alphas, betas = [], [], [], []  # only used if returning uncertainty parameters
+    predictions = Predictions(model, scaler, atom_bond_scaler)
 
     for batch in tqdm(data_loader, disable=disable_progress_bar, leave=False):
         # Prepare batch
         batch: MoleculeDataset
-        mol_batch = batch.batch_graph()
-        features_batch = batch.features()
-        atom_descriptors_batch = batch.atom_descriptors()
-        atom_features_batch = batch.atom_features()
-        bond_descriptors_batch = batch.bond_descriptors()
-        bond_features_batch = batch.bond_features()
-        constraints_batch = batch.constraints()
-
-        if model.is_atom_bond_targets:
-            natoms, nbonds = batch.number_of_atoms, batch.number_of_bonds
-            natoms, nbonds = np.array(natoms).flatten(), np.array(nbonds).flatten()
-            constraints_batch = np.transpose(constraints_batch).tolist()
-            device = next(model.parameters()).device
-
-            # If the path to constraints is not given, the constraints matrix needs to be reformatted.
-            if constraints_batch == []:
-                for _ in batch._data:
-                    natom_targets = len(model.atom_targets)
-                    nbond_targets = len(model.bond_targets)
-                    ntargets = natom_targets + nbond_targets
-                    constraints_batch.append([None] * ntargets)
-
-            ind = 0
-            for i in range(len(model.atom_targets)):
-                if not model.atom_constraints[i]:
-                    constraints_batch[ind] = None
-                else:
-                    mean, std = atom_bond_scaler.means[ind][0], atom_bond_scaler.stds[ind][0]
-                    for j, natom in enumerate(natoms):
-                        constraints_batch[ind][j] = (constraints_batch[ind][j] - natom * mean) / std
-                    constraints_batch[ind] = torch.tensor(constraints_batch[ind]).to(device)
-                ind += 1
-            for i in range(len(model.bond_targets)):
-                if not model.bond_constraints[i]:
-                    constraints_batch[ind] = None
+        inputs = model_inputs(model, batch, atom_bond_scaler)
+
+        # Make predictions
+        with torch.no_grad():
+            batch_preds = model(*inputs)
+
+        predictions.add(batch_preds)
+
+    return predictions.result(return_unc_parameters)
+
+
+def predict_dropout(
+    model: MoleculeModel,
+    data_loader: MoleculeDataLoader,
+    sampling_size: int,
+    dropout_prob: float,
+    disable_progress_bar: bool = False,
+    scaler: StandardScaler = None,
+    atom_bond_scaler: AtomBondScaler = None,
+) -> Tuple[Any, Any]:
+    """
+    Makes Monte Carlo dropout predictions on a dataset, i.e. the mean and variance of the predictions of a model
+    over several samples of dropout masks.
+
+    Each batch is collated once and the input layer :code:`W_i` of every encoder, which dropout does not affect,
+    is computed once. Only the layers after it are rerun for every dropout sample, and the moments of the samples
+    are accumulated batch by batch (Welford), so the predictions of each sample are never collected.
+
+    :param model: A :class:`~chemprop.models.model.MoleculeModel`.
+    :param data_loader: A :class:`~chemprop.data.data.MoleculeDataLoader`.
+    :param sampling_size: The number of dropout samples.
+    :param dropout_prob: The dropout probability used to draw the samples.
+    :param disable_progress_bar: Whether to disable the progress bar.
+    :param scaler: A :class:`~chemprop.features.scaler.StandardScaler` object fit on the training targets.
+    :param atom_bond_scaler: A :class:`~chemprop.data.scaler.AtomBondScaler` fitted on the atomic/bond targets.
+    :return: A tuple with the mean and the variance of the predictions over the samples, each in the format
+             of the predictions returned by :func:`predict`.
+    """
+    model.eval()
+
+    def activate_dropout_(model):
+        return activate_dropout(model, dropout_prob)
+
+    model.apply(activate_dropout_)
+
+    encoders = [module for module in model.modules() if isinstance(module, MPNEncoder)]
+    input_layers = [_CachedInput(encoder.W_i) for encoder in encoders]
+    for encoder, input_layer in zip(encoders, input_layers):
+        encoder.W_i = input_layer
+
+    means, variances = [], []
+    try:
+        for batch in tqdm(data_loader, disable=disable_progress_bar, leave=False):
+            # Prepare batch
+            batch: MoleculeDataset
+            inputs = model_inputs(model, batch, atom_bond_scaler)
+            for input_layer in input_layers:
+                input_layer.outputs = []
+
+            # Running mean and sum of squared deviations (Welford) of each output array over the samples
+            batch_means = batch_m2 = None
+            for i in range(sampling_size):
+                for input_layer in input_layers:
+                    input_layer.calls = 0
+
+                with torch.no_grad():
+                    batch_preds = model(*inputs)
+
+                predictions = Predictions(model, scaler, atom_bond_scaler)
+                predictions.add(batch_preds)
+                if model.is_atom_bond_targets:
+                    sample = [np.asarray(x, dtype=float) for x in predictions.preds[0]]
                 else:
-                    mean, std = atom_bond_scaler.means[ind][0], atom_bond_scaler.stds[ind][0]
-                    for j, nbond in enumerate(nbonds):
-                        constraints_batch[ind][j] = (constraints_batch[ind][j] - nbond * mean) / std
-                    constraints_batch[ind] = torch.tensor(constraints_batch[ind]).to(device)
-                ind += 1
-            bond_types_batch = []
-            for i in range(len(model.atom_targets)):
-                bond_types_batch.append(None)
-            for i in range(len(model.bond_targets)):
-                if model.adding_bond_types and atom_bond_scaler is not None:
-                    mean, std = atom_bond_scaler.means[i+len(model.atom_targets)][0], atom_bond_scaler.stds[i+len(model.atom_targets)][0]
-                    bond_types = [(b.GetBondTypeAsDouble() - mean) / std for d in batch for b in d.mol[0].GetBonds()]
-                    bond_types = torch.FloatTensor(bond_types).to(device)
-                    bond_types_batch.append(bond_types)
+                    sample = [np.array(predictions.preds, dtype=float)]
+
+                if batch_means is None:
+                    batch_means, batch_m2 = sample, [np.zeros_like(x) for x in sample]
                 else:
-                    bond_types_batch.append(None)
-        else:
-            bond_types_batch = None
+                    for x, mean, m2 in zip(sample, batch_means, batch_m2):
+                        delta = x - mean
+                        mean += delta / (i + 1)
+                        m2 += delta * (x - mean)
+
+            means.append(batch_means)
+            variances.append([m2 / sampling_size for m2 in batch_m2])
+    finally:
+        for encoder, input_layer in zip(encoders, input_layers):
+            encoder.W_i = input_layer.layer
+
+    if model.is_atom_bond_targets:
+        return [np.concatenate(x) for x in zip(*means)], [np.concatenate(x) for x in zip(*variances)]
+
+    return [pred for mean in means for pred in mean[0].tolist()], \
+        [var for variance in variances for var in variance[0].tolist()]
+
+
+class _CachedInput(torch.nn.Module):
+    """
+    Wraps the input layer of an :class:`~chemprop.models.mpn.MPNEncoder` to compute its outputs on the first
+    dropout sample of a batch and return them again, in the same call order, on the following samples.
+    """
+
+    def __init__(self, layer: torch.nn.Module):
+        """
+        :param layer: The input layer of the encoder.
+        """
+        super(_CachedInput, self).__init__()
+        self.layer = layer
+        self.outputs = []
+        self.calls = 0
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        if self.calls == len(self.outputs):
+            self.outputs.append(self.layer(x))
+        output = self.outputs[self.calls]
+        self.calls += 1
+
+        return output
+
+
+def frozen_embeddings(
+    model: MoleculeModel,
+    data_loader: MoleculeDataLoader,
+    path: str,
+    disable_progress_bar: bool = False,
+) -> np.ndarray:
+    """
+    Computes the :meth:`~chemprop.models.model.MoleculeModel.frozen_embedding` of every molecule of a dataset
+    into a float32 array memory-mapped from a :code:`.npy` file.
+
+    :param model: A :class:`~chemprop.models.model.MoleculeModel`.
+    :param data_loader: A :class:`~chemprop.data.data.MoleculeDataLoader` over the dataset, in dataset order.
+    :param path: Path to the :code:`.npy` file in which the embeddings are stored.
+    :param disable_progress_bar: Whether to disable the progress bar.
+    :return: A read-only array of shape :code:`(num_molecules, embedding_size)`, indexed like the dataset.
+    """
+    model.eval()
+
+    embeddings, start = None, 0
+    for batch in tqdm(data_loader, disable=disable_progress_bar, leave=False):
+        batch: MoleculeDataset
+        inputs = model_inputs(model, batch)
 
-        # Make predictions
         with torch.no_grad():
-            batch_preds = model(
-                mol_batch,
-                features_batch,
-                atom_descriptors_batch,
-                atom_features_batch,
-                bond_descriptors_batch,
-                bond_features_batch,
-                constraints_batch,
-                bond_types_batch,
-            )
-
-        if model.is_atom_bond_targets:
+            batch_embeddings = model.frozen_embedding(*inputs[:6]).cpu().numpy()
+
+        if embeddings is None:
+            embeddings = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32,
+                                                   shape=(len(data_loader.dataset), batch_embeddings.shape[1]))
+        embeddings[start:start + len(batch_embeddings)] = batch_embeddings
+        start += len(batch_embeddings)
+
+    embeddings.flush()
+    del embeddings
+
+    return np.load(path, mmap_mode='r')
+
+
+def predict_ensemble(
+    models: List[MoleculeModel],
+    scalers: List[Tuple[Optional[StandardScaler], ...]],
+    data_loader: MoleculeDataLoader,
+    disable_progress_bar: bool = False,
+    return_unc_parameters: bool = False,
+    stack: bool = False,
+) -> List[Any]:
+    r"""
+    Makes predictions on a dataset with every model of an ensemble in a single pass through the data.
+
+    Each batch is featurized and collated once and then run through every model. Models with the same feature
+    scalers share the scaled batch. With :code:`stack`, the models that also have the same architecture are run
+    as one forward pass over their stacked parameters with :func:`torch.func.vmap`.
+
+    :param models: A list of :class:`~chemprop.models.model.MoleculeModel`\ s.
+    :param scalers: The scalers of each model, i.e. the target, features, atom descriptor, bond descriptor,
+                    and atom/bond target scalers as returned by :func:`~chemprop.utils.load_scalers`.
+    :param data_loader: A :class:`~chemprop.data.data.MoleculeDataLoader`.
+    :param disable_progress_bar: Whether to disable the progress bar.
+    :param return_unc_parameters: A bool indicating whether additional uncertainty parameters would be returned alongside the mean predictions.
+    :param stack: Whether to run the models with the same architecture as one batched forward pass.
+    :return: A list with the output of :func:`predict` for each model.
+    """
+    for model in models:
+        model.eval()
+
+    predictions = [Predictions(model, scaler_list[0], scaler_list[4]) for model, scaler_list in zip(models, scalers)]
+
+    # Group the models by feature scalers, then by architecture if stacking
+    input_groups = []
+    for i, scaler_list in enumerate(scalers):
+        for group in input_groups:
+            if all(_same_scaler(a, b) for a, b in zip(scaler_list[1:4], scalers[group[0]][1:4])):
+                group.append(i)
+                break
+        else:
+            input_groups.append([i])
+
+    runs = []  # (input group, [(model indices, stacked models or None)])
+    for group in input_groups:
+        model_groups = []
+        for i in group:
+            for model_group in model_groups:
+                if stack and not models[i].is_atom_bond_targets \
+                        and _architecture(models[i]) == _architecture(models[model_group[0]]):
+                    model_group.append(i)
+                    break
+            else:
+                model_groups.append([i])
+        runs.append((group, [(model_group, StackedModels([models[i] for i in model_group])
+                              if len(model_group) > 1 else None) for model_group in model_groups]))
+
+    for batch in tqdm(data_loader, disable=disable_progress_bar, leave=False):
+        batch: MoleculeDataset
+        for group, model_groups in runs:
+            if len(runs) > 1:
+                # Undoes the scaling of the previous group
+                batch.reset_features_and_targets()
+            scale_features(batch, *scalers[group[0]][1:4])
+            inputs = model_inputs(models[group[0]], batch, scalers[group[0]][4])
+
+            with torch.no_grad():
+                for model_group, stacked_models in model_groups:
+                    if stacked_models is None:
+                        batch_preds = [models[model_group[0]](*inputs)]
+                    else:
+                        batch_preds = stacked_models(*inputs)
+                    for i, model_preds in zip(model_group, batch_preds):
+                        predictions[i].add(model_preds)
+
+    return [p.result(return_unc_parameters) for p in predictions]
+
+
+def scale_features(data: MoleculeDataset,
+                   features_scaler: Optional[StandardScaler],
+                   atom_descriptor_scaler: Optional[StandardScaler],
+                   bond_descriptor_scaler: Optional[StandardScaler]) -> None:
+    """
+    Rescales the raw features and atom/bond descriptors of a dataset with the scalers of a model.
+
+    :param data: A :class:`~chemprop.data.MoleculeDataset`.
+    :param features_scaler: The scaler of the molecule features.
+    :param atom_descriptor_scaler: The scaler of the atom descriptors.
+    :param bond_descriptor_scaler: The scaler of the bond descriptors.
+    """
+    if features_scaler is None and atom_descriptor_scaler is None and bond_descriptor_scaler is None:
+        return
+
+    data.reset_features_and_targets()
+    if features_scaler is not None:
+        data.normalize_features(features_scaler)
+    if atom_descriptor_scaler is not None:
+        data.normalize_features(atom_descriptor_scaler, scale_atom_descriptors=True)
+    if bond_descriptor_scaler is not None:
+        data.normalize_features(bond_descriptor_scaler, scale_bond_descriptors=True)
+
+
+def model_inputs(model: MoleculeModel, batch: MoleculeDataset, atom_bond_scaler: AtomBondScaler = None) -> tuple:
+    """
+    Builds the inputs of a model for a batch.
+
+    :param model: A :class:`~chemprop.models.model.MoleculeModel`.
+    :param batch: A :class:`~chemprop.data.MoleculeDataset` with the batch.
+    :param atom_bond_scaler: A :class:`~chemprop.data.scaler.AtomBondScaler` fitted on the atomic/bond targets.
+    :return: The positional arguments of :meth:`~chemprop.models.model.MoleculeModel.forward`.
+    """
+    embeddings_batch = batch.embeddings()
+    if embeddings_batch is not None:
+        embeddings_batch = embeddings_batch.to(next(model.parameters()).device)
+    mol_batch = batch.batch_graph() if embeddings_batch is None else None
+    features_batch = batch.features()
+    atom_descriptors_batch = batch.atom_descriptors()
+    atom_features_batch = batch.atom_features()
+    bond_descriptors_batch = batch.bond_descriptors()
+    bond_features_batch = batch.bond_features()
+    constraints_batch = batch.constraints()
+
+    if model.is_atom_bond_targets:
+        natoms, nbonds = batch.number_of_atoms, batch.number_of_bonds
+        natoms, nbonds = np.array(natoms).flatten(), np.array(nbonds).flatten()
+        constraints_batch = np.transpose(constraints_batch).tolist()
+        device = next(model.parameters()).device
+
+        # If the path to constraints is not given, the constraints matrix needs to be reformatted.
+        if constraints_batch == []:
+            for _ in batch._data:
+                natom_targets = len(model.atom_targets)
+                nbond_targets = len(model.bond_targets)
+                ntargets = natom_targets + nbond_targets
+                constraints_batch.append([None] * ntargets)
+
+        ind = 0
+        for i in range(len(model.atom_targets)):
+            if not model.atom_constraints[i]:
+                constraints_batch[ind] = None
+            else:
+                mean, std = atom_bond_scaler.means[ind][0], atom_bond_scaler.stds[ind][0]
+                for j, natom in enumerate(natoms):
+                    constraints_batch[ind][j] = (constraints_batch[ind][j] - natom * mean) / std
+                constraints_batch[ind] = torch.tensor(constraints_batch[ind]).to(device)
+            ind += 1
+        for i in range(len(model.bond_targets)):
+            if not model.bond_constraints[i]:
+                constraints_batch[ind] = None
+            else:
+                mean, std = atom_bond_scaler.means[ind][0], atom_bond_scaler.stds[ind][0]
+                for j, nbond in enumerate(nbonds):
+                    constraints_batch[ind][j] = (constraints_batch[ind][j] - nbond * mean) / std
+                constraints_batch[ind] = torch.tensor(constraints_batch[ind]).to(device)
+            ind += 1
+        bond_types_batch = []
+        for i in range(len(model.atom_targets)):
+            bond_types_batch.append(None)
+        for i in range(len(model.bond_targets)):
+            if model.adding_bond_types and atom_bond_scaler is not None:
+                mean, std = atom_bond_scaler.means[i+len(model.atom_targets)][0], atom_bond_scaler.stds[i+len(model.atom_targets)][0]
+                bond_types = [(b.GetBondTypeAsDouble() - mean) / std for d in batch for b in d.mol[0].GetBonds()]
+                bond_types = torch.FloatTensor(bond_types).to(device)
+                bond_types_batch.append(bond_types)
+            else:
+                bond_types_batch.append(None)
+    else:
+        bond_types_batch = None
+
+    return (
+        mol_batch,
+        features_batch,
+        atom_descriptors_batch,
+        atom_features_batch,
+        bond_descriptors_batch,
+        bond_features_batch,
+        constraints_batch,
+        bond_types_batch,
+        embeddings_batch,
+    )
+
+
+class Predictions:
+    """
+    A :class:`Predictions` collects the outputs of a model over the batches of a dataset, splitting off the
+    uncertainty parameters and inverting the target scaling.
+    """
+
+    def __init__(self, model: MoleculeModel, scaler: StandardScaler = None, atom_bond_scaler: AtomBondScaler = None):
+        """
+        :param model: The :class:`~chemprop.models.model.MoleculeModel` making the predictions.
+        :param scaler: A :class:`~chemprop.features.scaler.StandardScaler` object fit on the training targets.
+        :param atom_bond_scaler: A :class:`~chemprop.data.scaler.AtomBondScaler` fitted on the atomic/bond targets.
+        """
+        self.is_atom_bond_targets = model.is_atom_bond_targets
+        self.loss_function = model.loss_function
+        self.classification = model.classification
+        self.multiclass = model.multiclass
+        self.scaler = scaler
+        self.atom_bond_scaler = atom_bond_scaler
+
+        self.preds = []
+        self.var, self.lambdas, self.alphas, self.betas = [], [], [], []  # only used if returning uncertainty parameters
+
+    def add(self, batch_preds: torch.Tensor) -> None:
+        """
+        Adds the output of the model for a batch.
+
+        :param batch_preds: The output of the model.
+        """
+        if self.is_atom_bond_targets:
             batch_preds = [x.data.cpu().numpy() for x in batch_preds]
             batch_vars, batch_lambdas, batch_alphas, batch_betas = [], [], [], []
 
             for i, batch_pred in enumerate(batch_preds):
-                if model.loss_function == "mve":
+                if self.loss_function == "mve":
                     batch_pred, batch_var = np.split(batch_pred, 2, axis=1)
                     batch_vars.append(batch_var)
-                elif model.loss_function == "dirichlet":
-                    if model.classification:
+                elif self.loss_function == "dirichlet":
+                    if self.classification:
                         batch_alpha = np.reshape(
                             batch_pred,
                             [batch_pred.shape[0], batch_pred.shape[1] // 2, 2],
@@ -134,11 +429,11 @@ def predict(
                             batch_alpha, axis=2
                         )  # shape(data, tasks, 2)
                         batch_alphas.append(batch_alpha)
-                    elif model.multiclass:
+                    elif self.multiclass:
                         raise ValueError(
-                            f"In atomic/bond properties prediction, {model.multiclass} is not supported."
+                            f"In atomic/bond properties prediction, {self.multiclass} is not supported."
                         )
-                elif model.loss_function == "evidential":  # regression
+                elif self.loss_function == "evidential":  # regression
                     batch_pred, batch_lambda, batch_alpha, batch_beta = np.split(
                         batch_pred, 4, axis=1
                     )
@@ -148,31 +443,31 @@ def predict(
                 batch_preds[i] = batch_pred
 
             # Inverse scale for each atom/bond target if regression
-            if atom_bond_scaler is not None:
-                batch_preds = atom_bond_scaler.inverse_transform(batch_preds)
-                for i, stds in enumerate(atom_bond_scaler.stds):
-                    if model.loss_function == "mve":
+            if self.atom_bond_scaler is not None:
+                batch_preds = self.atom_bond_scaler.inverse_transform(batch_preds)
+                for i, stds in enumerate(self.atom_bond_scaler.stds):
+                    if self.loss_function == "mve":
                         batch_vars[i] = batch_vars[i] * stds ** 2
-                    elif model.loss_function == "evidential":
+                    elif self.loss_function == "evidential":
                         batch_betas[i] = batch_betas[i] * stds ** 2
 
             # Collect vectors
-            preds.append(batch_preds)
-            if model.loss_function == "mve":
-                var.append(batch_vars)
-            elif model.loss_function == "dirichlet":
-                alphas.append(batch_alphas)
-            elif model.loss_function == "evidential":  # regression
-                lambdas.append(batch_lambdas)
-                alphas.append(batch_alphas)
-                betas.append(batch_betas)
+            self.preds.append(batch_preds)
+            if self.loss_function == "mve":
+                self.var.append(batch_vars)
+            elif self.loss_function == "dirichlet":
+                self.alphas.append(batch_alphas)
+            elif self.loss_function == "evidential":  # regression
+                self.lambdas.append(batch_lambdas)
+                self.alphas.append(batch_alphas)
+                self.betas.append(batch_betas)
         else:
             batch_preds = batch_preds.data.cpu().numpy()
 
-            if model.loss_function == "mve":
+            if self.loss_function == "mve":
                 batch_preds, batch_var = np.split(batch_preds, 2, axis=1)
-            elif model.loss_function == "dirichlet":
-                if model.classification:
+            elif self.loss_function == "dirichlet":
+                if self.classification:
                     batch_alphas = np.reshape(
                         batch_preds,
                         [batch_preds.shape[0], batch_preds.shape[1] // 2, 2],
@@ -180,49 +475,115 @@ def predict(
                     batch_preds = batch_alphas[:, :, 1] / np.sum(
                         batch_alphas, axis=2
                     )  # shape(data, tasks, 2)
-                elif model.multiclass:
+                elif self.multiclass:
                     batch_alphas = batch_preds
                     batch_preds = batch_preds / np.sum(
                         batch_alphas, axis=2, keepdims=True
                     )  # shape(data, tasks, num_classes)
-            elif model.loss_function == "evidential":  # regression
+            elif self.loss_function == "evidential":  # regression
                 batch_preds, batch_lambdas, batch_alphas, batch_betas = np.split(
                     batch_preds, 4, axis=1
                 )
 
             # Inverse scale if regression
-            if scaler is not None:
-                batch_preds = scaler.inverse_transform(batch_preds)
-                if model.loss_function == "mve":
-                    batch_var = batch_var * scaler.stds**2
-                elif model.loss_function == "evidential":
-                    batch_betas = batch_betas * scaler.stds**2
+            if self.scaler is not None:
+                batch_preds = self.scaler.inverse_transform(batch_preds)
+                if self.loss_function == "mve":
+                    batch_var = batch_var * self.scaler.stds**2
+                elif self.loss_function == "evidential":
+                    batch_betas = batch_betas * self.scaler.stds**2
 
             # Collect vectors
             batch_preds = batch_preds.tolist()
-            preds.extend(batch_preds)
-            if model.loss_function == "mve":
-                var.extend(batch_var.tolist())
-            elif model.loss_function == "dirichlet":
-                alphas.extend(batch_alphas.tolist())
-            elif model.loss_function == "evidential":  # regression
-                lambdas.extend(batch_lambdas.tolist())
-                alphas.extend(batch_alphas.tolist())
-                betas.extend(batch_betas.tolist())
+            self.preds.extend(batch_preds)
+            if self.loss_function == "mve":
+                self.var.extend(batch_var.tolist())
+            elif self.loss_function == "dirichlet":
+                self.alphas.extend(batch_alphas.tolist())
+            elif self.loss_function == "evidential":  # regression
+                self.lambdas.extend(batch_lambdas.tolist())
+                self.alphas.extend(batch_alphas.tolist())
+                self.betas.extend(batch_betas.tolist())
 
-    if model.is_atom_bond_targets:
-        preds = [np.concatenate(x) for x in zip(*preds)]
-        var = [np.concatenate(x) for x in zip(*var)]
-        alphas = [np.concatenate(x) for x in zip(*alphas)]
-        betas = [np.concatenate(x) for x in zip(*betas)]
-        lambdas = [np.concatenate(x) for x in zip(*lambdas)]
-
-    if return_unc_parameters:
-        if model.loss_function == "mve":
-            return preds, var
-        elif model.loss_function == "dirichlet":
-            return preds, alphas
-        elif model.loss_function == "evidential":
-            return preds, lambdas, alphas, betas
-
-    return preds
+    def result(self, return_unc_parameters: bool = False) -> Any:
+        """
+        Returns the collected predictions.
+
+        :param return_unc_parameters: A bool indicating whether additional uncertainty parameters would be returned alongside the mean predictions.
+        :return: The predictions, as returned by :func:`predict`.
+        """
+        preds, var, lambdas, alphas, betas = self.preds, self.var, self.lambdas, self.alphas, self.betas
+        if self.is_atom_bond_targets:
+            preds = [np.concatenate(x) for x in zip(*preds)]
+            var = [np.concatenate(x) for x in zip(*var)]
+            alphas = [np.concatenate(x) for x in zip(*alphas)]
+            betas = [np.concatenate(x) for x in zip(*betas)]
+            lambdas = [np.concatenate(x) for x in zip(*lambdas)]
+
+        if return_unc_parameters:
+            if self.loss_function == "mve":
+                return preds, var
+            elif self.loss_function == "dirichlet":
+                return preds, alphas
+            elif self.loss_function == "evidential":
+                return preds, lambdas, alphas, betas
+
+        return preds
+
+
+class StackedModels:
+    r"""
+    A :class:`StackedModels` runs :class:`~chemprop.models.model.MoleculeModel`\ s with the same architecture
+    as a single forward pass, vectorized over their stacked parameters with :func:`torch.func.vmap`.
+    """
+
+    def __init__(self, models: List[MoleculeModel]):
+        r"""
+        :param models: A list of :class:`~chemprop.models.model.MoleculeModel`\ s with the same architecture.
+        """
+        # torch.func is only available from PyTorch 2.0, which stacking requires
+        from torch.func import stack_module_state
+
+        self.params, self.buffers = stack_module_state(models)
+        # The parameters are passed to the calls, so the base model only needs their shapes
+        self.base = copy.deepcopy(models[0]).to('meta')
+
+    def _call(self, params, buffers, *inputs) -> torch.Tensor:
+        from torch.func import functional_call
+
+        return functional_call(self.base, (params, buffers), inputs)
+
+    def __call__(self, *inputs) -> torch.Tensor:
+        """
+        Runs the models on the same inputs.
+
+        :return: The outputs of the models, stacked along the first dimension.
+        """
+        from torch.func import vmap
+
+        return vmap(self._call, in_dims=(0, 0) + (None,) * len(inputs))(self.params, self.buffers, *inputs)
+
+
+def _same_scaler(a: Optional[StandardScaler], b: Optional[StandardScaler]) -> bool:
+    """Checks whether two scalers perform the same scaling."""
+    if a is None or b is None:
+        return a is b
+
+    return a.same_scaling(b)
+
+
+def _architecture(model: MoleculeModel) -> tuple:
+    """
+    Describes the architecture of a model by the settings of its modules and the shapes of its parameters,
+    such that models with the same description compute the same function of their parameters.
+    """
+    settings = tuple(
+        (name, type(module).__name__, tuple(sorted(
+            (key, value) for key, value in vars(module).items()
+            if value is None or isinstance(value, (bool, int, float, str))
+        )))
+        for name, module in model.named_modules()
+    )
+    shapes = tuple((key, tuple(value.shape), value.dtype) for key, value in model.state_dict().items())
+
+    return settings, shapes
@@ -0,0 +1,100 @@
+import os
+
+from tqdm import tqdm
+
+from chemprop.args import PreprocessArgs
+from chemprop.data import filter_invalid_smiles, get_data, get_task_names, graph_store, set_cache_graph, \
+    set_graph_store
+from chemprop.data.data import make_mol_graphs
+from chemprop.data.packed import PACKED_GRAPHS_DIR_NAME, PACKED_SOURCES, is_packed_dataset, save_packed_dataset
+from chemprop.features import load_valid_atom_or_bond_features, set_explicit_h, set_adding_hs, \
+    set_keeping_atom_map, set_reaction, reset_featurization_parameters
+
+
+def preprocess(args: PreprocessArgs) -> None:
+    """
+    Compiles a data CSV file, along with its features, descriptors and data weights, into a packed dataset.
+
+    The molecules are parsed and the features generators are run once, and the rows, including those with invalid
+    SMILES, are written to memory-mapped arrays, so that loading the packed dataset for training does not read
+    any of the files again.
+
+    :param args: A :class:`~chemprop.args.PreprocessArgs` object containing the paths to the data files
+                 and the directory of the packed dataset.
+    """
+    if is_packed_dataset(args.data_path):
+        raise ValueError(f'{args.data_path} is already a packed dataset.')
+
+    # The validity of the molecules and their graphs depend on the featurization
+    reset_featurization_parameters()
+    set_explicit_h(args.explicit_h)
+    set_adding_hs(args.adding_h)
+    set_keeping_atom_map(args.keeping_atom_map)
+    if args.reaction:
+        set_reaction(args.reaction, args.reaction_mode)
+    elif args.reaction_solvent:
+        set_reaction(True, args.reaction_mode)
+
+    if args.featurize_graphs:
+        # The graphs are only needed on disk
+        set_cache_graph(False)
+        set_graph_store(os.path.join(args.save_dir, PACKED_GRAPHS_DIR_NAME))
+
+    print('Loading data')
+    task_names = get_task_names(
+        path=args.data_path,
+        smiles_columns=args.smiles_columns,
+        target_columns=args.target_columns,
+        ignore_columns=args.ignore_columns,
+    )
+    data = get_data(
+        path=args.data_path,
+        smiles_columns=args.smiles_columns,
+        target_columns=task_names,
+        skip_invalid_smiles=False,
+        data_weights_path=args.data_weights_path,
+        features_path=args.features_path,
+        features_generator=args.features_generator,
+        phase_features_path=args.phase_features_path,
+        max_data_size=args.max_data_size,
+        loss_function='bounded_mse',
+        featurization_workers=args.featurization_workers,
+    )
+    valid_datapoints = {id(d) for d in filter_invalid_smiles(data)}
+    valid = [id(d) in valid_datapoints for d in data]
+
+    descriptors = {}
+    for name in ['atom_descriptors_path', 'bond_descriptors_path']:
+        if getattr(args, name) is not None:
+            try:
+                descriptors[name] = load_valid_atom_or_bond_features(getattr(args, name), [d.smiles[0] for d in data])
+            except Exception as e:
+                raise ValueError(f'Failed to load or validate custom atomic or bond descriptors: {e}')
+
+    if args.featurize_graphs:
+        print('Featurizing graphs')
+        for d, is_valid in zip(tqdm(data), valid):
+            if is_valid:
+                make_mol_graphs(d)
+        graph_store().flush()
+
+    print(f'Writing {len(data):,} rows to {args.save_dir}')
+    save_packed_dataset(
+        path=args.save_dir,
+        data=data,
+        valid=valid,
+        smiles_columns=args.smiles_columns,
+        task_names=task_names,
+        features_generator=args.features_generator,
+        sources={name: getattr(args, name) for name in PACKED_SOURCES},
+        atom_descriptors=descriptors.get('atom_descriptors_path'),
+        bond_descriptors=descriptors.get('bond_descriptors_path'),
+    )
+
+
+def chemprop_preprocess() -> None:
+    """Parses Chemprop preprocessing arguments and compiles a data CSV file into a packed dataset.
+
+    This is the entry point for the command line command :code:`chemprop_preprocess`.
+    """
+    preprocess(args=PreprocessArgs().parse_args())
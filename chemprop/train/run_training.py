@@ -9,11 +9,12 @@ warnings.filterwarnings("ignore", category=np.VisibleDeprecationWarning)
 import pandas as pd
 from tensorboardX import SummaryWriter
 import torch
+from torch.nn.parallel import DistributedDataParallel
 from tqdm import trange
 from torch.optim.lr_scheduler import ExponentialLR
 
 from .evaluate import evaluate, evaluate_predictions
-from .predict import predict
+from .predict import frozen_embeddings, predict
 from .train import train
 from .loss_functions import get_loss_func
 from chemprop.spectra_utils import normalize_spectra, load_phase_mask
@@ -28,7 +29,9 @@ from chemprop.utils import build_optimizer, build_lr_scheduler, load_checkpoint,
 
 def run_training(args: TrainArgs,
                  data: MoleculeDataset,
-                 logger: Logger = None) -> Dict[str, List[float]]:
+                 logger: Logger = None,
+                 model_indices: List[int] = None,
+                 pretrained: bool = False) -> Dict[str, List[float]]:
     """
     Loads data, trains a Chemprop model, and returns test scores for the model checkpoint with the highest validation score.
 
@@ -36,7 +39,13 @@ def run_training(args: TrainArgs,
                  loading data and training the Chemprop model.
     :param data: A :class:`~chemprop.data.MoleculeDataset` containing the data.
     :param logger: A logger to record output.
+    :param model_indices: The indices of the ensemble members to train. If provided, only these members are trained
+                          and saved, without evaluating the ensemble, and an empty dictionary is returned.
+                          Each member is then seeded with :code:`args.pytorch_seed` plus its index.
+    :param pretrained: Whether the ensemble members were already trained, e.g. by :func:`train_concurrently`,
+                       in which case their checkpoints are loaded from :code:`args.save_dir` and evaluated.
     :return: A dictionary mapping each metric in :code:`args.metrics` to a list of values for each task.
+             In distributed training, ranks other than 0 only train and return an empty dictionary.
 
     """
     if logger is not None:
@@ -44,6 +53,9 @@ def run_training(args: TrainArgs,
     else:
         debug = info = print
 
+    # In distributed training, only rank 0 validates, saves and evaluates the models
+    is_main = not args.distributed or args.rank == 0
+
     # Set pytorch seed for random initial weights
     torch.manual_seed(args.pytorch_seed)
 
@@ -111,7 +123,7 @@ def run_training(args: TrainArgs,
         train_class_sizes = get_class_sizes(train_data, proportion=False)
         args.train_class_sizes = train_class_sizes
 
-    if args.save_smiles_splits:
+    if args.save_smiles_splits and is_main:
         save_smiles_splits(
             data_path=args.data_path,
             save_dir=args.save_dir,
@@ -212,7 +224,7 @@ def run_training(args: TrainArgs,
         sum_test_preds = np.zeros((len(test_smiles), args.num_tasks))
 
     # Automatically determine whether to cache
-    if len(data) <= args.cache_cutoff:
+    if len(data) <= args.cache_cutoff or args.cache_graph_max_mb is not None:
         set_cache_graph(True)
         num_workers = 0
     else:
@@ -226,7 +238,11 @@ def run_training(args: TrainArgs,
         num_workers=num_workers,
         class_balance=args.class_balance,
         shuffle=True,
-        seed=args.seed
+        seed=args.seed,
+        size_buckets=args.size_buckets,
+        batch_atoms=args.batch_atoms,
+        num_replicas=args.world_size if args.distributed else 1,
+        rank=args.rank if args.distributed else 0
     )
     val_data_loader = MoleculeDataLoader(
         dataset=val_data,
@@ -244,120 +260,178 @@ def run_training(args: TrainArgs,
 
     # Train ensemble of models
     for model_idx in range(args.ensemble_size):
+        if model_indices is not None and model_idx not in model_indices:
+            continue
+
         # Tensorboard writer
         save_dir = os.path.join(args.save_dir, f'model_{model_idx}')
         makedirs(save_dir)
-        try:
-            writer = SummaryWriter(log_dir=save_dir)
-        except:
-            writer = SummaryWriter(logdir=save_dir)
-
-        # Load/build model
-        if args.checkpoint_paths is not None:
-            debug(f'Loading model {model_idx} from {args.checkpoint_paths[model_idx]}')
-            model = load_checkpoint(args.checkpoint_paths[model_idx], logger=logger)
+        if is_main:
+            try:
+                writer = SummaryWriter(log_dir=save_dir)
+            except:
+                writer = SummaryWriter(logdir=save_dir)
         else:
-            debug(f'Building model {model_idx}')
-            model = MoleculeModel(args)
-
-        # Optionally, overwrite weights:
-        if args.checkpoint_frzn is not None:
-            debug(f'Loading and freezing parameters from {args.checkpoint_frzn}.')
-            model = load_frzn_model(model=model, path=args.checkpoint_frzn, current_args=args, logger=logger)
-
-        debug(model)
+            writer = None
 
-        if args.checkpoint_frzn is not None:
-            debug(f'Number of unfrozen parameters = {param_count(model):,}')
-            debug(f'Total number of parameters = {param_count_all(model):,}')
+        if pretrained:
+            debug(f'Loading trained model {model_idx}')
+            n_iter, task_names = 0, args.task_names
         else:
-            debug(f'Number of parameters = {param_count_all(model):,}')
+            if model_indices is not None:
+                # Members trained separately cannot share a random stream, so each one gets its own seed
+                torch.manual_seed(args.pytorch_seed + model_idx)
+
+            # Load/build model
+            if args.checkpoint_paths is not None:
+                debug(f'Loading model {model_idx} from {args.checkpoint_paths[model_idx]}')
+                model = load_checkpoint(args.checkpoint_paths[model_idx], logger=logger)
+            else:
+                debug(f'Building model {model_idx}')
+                model = MoleculeModel(args)
 
-        if args.cuda:
-            debug('Moving model to cuda')
-        model = model.to(args.device)
+            # Optionally, overwrite weights:
+            if args.checkpoint_frzn is not None:
+                debug(f'Loading and freezing parameters from {args.checkpoint_frzn}.')
+                model = load_frzn_model(model=model, path=args.checkpoint_frzn, current_args=args, logger=logger)
 
-        # Ensure that model is saved in correct location for evaluation if 0 epochs
-        save_checkpoint(os.path.join(save_dir, MODEL_FILE_NAME), model, scaler,
-                        features_scaler, atom_descriptor_scaler, bond_descriptor_scaler,
-                        atom_bond_scaler, args)
+            debug(model)
 
-        # Optimizers
-        optimizer = build_optimizer(model, args)
+            if args.checkpoint_frzn is not None:
+                debug(f'Number of unfrozen parameters = {param_count(model):,}')
+                debug(f'Total number of parameters = {param_count_all(model):,}')
+            else:
+                debug(f'Number of parameters = {param_count_all(model):,}')
 
-        # Learning rate schedulers
-        scheduler = build_lr_scheduler(optimizer, args)
+            if args.cuda:
+                debug('Moving model to cuda')
+            model = model.to(args.device)
 
-        # Run training
-        best_score = float('inf') if args.minimize_score else -float('inf')
-        best_epoch, n_iter = 0, 0
-        for epoch in trange(args.epochs):
-            debug(f'Epoch {epoch}')
-            n_iter = train(
-                model=model,
-                data_loader=train_data_loader,
-                loss_func=loss_func,
-                optimizer=optimizer,
-                scheduler=scheduler,
-                args=args,
-                n_iter=n_iter,
-                atom_bond_scaler=atom_bond_scaler,
-                logger=logger,
-                writer=writer
-            )
-            if isinstance(scheduler, ExponentialLR):
-                scheduler.step()
-            val_scores = evaluate(
-                model=model,
-                data_loader=val_data_loader,
-                num_tasks=args.num_tasks,
-                metrics=args.metrics,
-                dataset_type=args.dataset_type,
-                scaler=scaler,
-                quantiles=args.quantiles,
-                atom_bond_scaler=atom_bond_scaler,
-                logger=logger
+            # The wrapper averages the gradients of the processes, while the model itself is evaluated and saved
+            if args.distributed:
+                train_model = DistributedDataParallel(model, find_unused_parameters=True)
+            else:
+                train_model = model
+
+            # The outputs of the frozen layers are computed once and only the remaining layers are trained on them
+            embeddings_paths = []
+            if args.cache_frozen_embeddings:
+                debug('Caching frozen embeddings')
+                suffix = f'_{args.rank}' if args.distributed else ''
+                for split, dataset in [('train', train_data), ('val', val_data)]:
+                    path = os.path.join(save_dir, f'{split}_frozen_embeddings{suffix}.npy')
+                    dataset.set_embeddings(None)
+                    dataset.set_embeddings(frozen_embeddings(
+                        model=model,
+                        data_loader=MoleculeDataLoader(dataset=dataset, batch_size=args.batch_size, num_workers=num_workers),
+                        path=path
+                    ))
+                    embeddings_paths.append(path)
+
+            # Ensure that model is saved in correct location for evaluation if 0 epochs
+            if is_main:
+                save_checkpoint(os.path.join(save_dir, MODEL_FILE_NAME), model, scaler,
+                                features_scaler, atom_descriptor_scaler, bond_descriptor_scaler,
+                                atom_bond_scaler, args)
+
+            # Optimizers
+            optimizer = build_optimizer(model, args)
+
+            # Learning rate schedulers
+            # The number of batches of a size-batched or sharded loader differs from train_data_size // batch_size,
+            # e.g. each size bucket ends in a partial batch
+            size_batching = args.size_buckets is not None or args.batch_atoms is not None
+            scheduler = build_lr_scheduler(
+                optimizer, args,
+                steps_per_epoch=len(train_data_loader) if size_batching or args.distributed else None
             )
 
-            for metric, scores in val_scores.items():
-                # Average validation score\
+            # Run training
+            best_score = float('inf') if args.minimize_score else -float('inf')
+            best_epoch, n_iter = 0, 0
+            for epoch in trange(args.epochs):
+                debug(f'Epoch {epoch}')
+                n_iter = train(
+                    model=train_model,
+                    data_loader=train_data_loader,
+                    loss_func=loss_func,
+                    optimizer=optimizer,
+                    scheduler=scheduler,
+                    args=args,
+                    n_iter=n_iter,
+                    atom_bond_scaler=atom_bond_scaler,
+                    logger=logger,
+                    writer=writer
+                )
+                if isinstance(scheduler, ExponentialLR):
+                    scheduler.step()
+                if not is_main:
+                    continue
+                val_scores = evaluate(
+                    model=model,
+                    data_loader=val_data_loader,
+                    num_tasks=args.num_tasks,
+                    metrics=args.metrics,
+                    dataset_type=args.dataset_type,
+                    scaler=scaler,
+                    quantiles=args.quantiles,
+                    atom_bond_scaler=atom_bond_scaler,
+                    logger=logger
+                )
+
+                for metric, scores in val_scores.items():
+                    # Average validation score\
+                    mean_val_score = multitask_mean(
+                        scores=scores,
+                        metric=metric,
+                        ignore_nan_metrics=args.ignore_nan_metrics
+                    )
+                    debug(f'Validation {metric} = {mean_val_score:.6f}')
+                    writer.add_scalar(f'validation_{metric}', mean_val_score, n_iter)
+
+                    if args.show_individual_scores:
+                        if args.loss_function == "quantile_interval" and metric == "quantile":
+                            num_tasks = len(args.task_names) // 2
+                            task_names = args.task_names[:num_tasks]
+                            task_names = [f"{task_name} lower" for task_name in task_names] + [
+                                            f"{task_name} upper" for task_name in task_names]
+                        else:
+                            task_names = args.task_names
+                        # Individual validation scores
+                        for task_name, val_score in zip(task_names, scores):
+                            debug(f'Validation {task_name} {metric} = {val_score:.6f}')
+                            writer.add_scalar(f'validation_{task_name}_{metric}', val_score, n_iter)
+
+                # Save model checkpoint if improved validation score
                 mean_val_score = multitask_mean(
-                    scores=scores,
-                    metric=metric,
+                    scores=val_scores[args.metric],
+                    metric=args.metric,
                     ignore_nan_metrics=args.ignore_nan_metrics
                 )
-                debug(f'Validation {metric} = {mean_val_score:.6f}')
-                writer.add_scalar(f'validation_{metric}', mean_val_score, n_iter)
-
-                if args.show_individual_scores:
-                    if args.loss_function == "quantile_interval" and metric == "quantile":
-                        num_tasks = len(args.task_names) // 2
-                        task_names = args.task_names[:num_tasks]
-                        task_names = [f"{task_name} lower" for task_name in task_names] + [
-                                        f"{task_name} upper" for task_name in task_names]
-                    else:
-                        task_names = args.task_names
-                    # Individual validation scores
-                    for task_name, val_score in zip(task_names, scores):
-                        debug(f'Validation {task_name} {metric} = {val_score:.6f}')
-                        writer.add_scalar(f'validation_{task_name}_{metric}', val_score, n_iter)
-
-            # Save model checkpoint if improved validation score
-            mean_val_score = multitask_mean(
-                scores=val_scores[args.metric],
-                metric=args.metric,
-                ignore_nan_metrics=args.ignore_nan_metrics
-            )
-            if args.minimize_score and mean_val_score < best_score or \
-                    not args.minimize_score and mean_val_score > best_score:
-                best_score, best_epoch = mean_val_score, epoch
-                save_checkpoint(os.path.join(save_dir, MODEL_FILE_NAME), model, scaler, features_scaler,
-                                atom_descriptor_scaler, bond_descriptor_scaler, atom_bond_scaler, args)
+                if args.minimize_score and mean_val_score < best_score or \
+                        not args.minimize_score and mean_val_score > best_score:
+                    best_score, best_epoch = mean_val_score, epoch
+                    save_checkpoint(os.path.join(save_dir, MODEL_FILE_NAME), model, scaler, features_scaler,
+                                    atom_descriptor_scaler, bond_descriptor_scaler, atom_bond_scaler, args)
+
+            if args.cache_frozen_embeddings:
+                train_data.set_embeddings(None)
+                val_data.set_embeddings(None)
+                for path in embeddings_paths:
+                    os.remove(path)
+
+            if not is_main:
+                continue
+
+            info(f'Model {model_idx} best validation {args.metric} = {best_score:.6f} on epoch {best_epoch}')
 
         # Evaluate on test set using model with best validation score
-        info(f'Model {model_idx} best validation {args.metric} = {best_score:.6f} on epoch {best_epoch}')
         model = load_checkpoint(os.path.join(save_dir, MODEL_FILE_NAME), device=args.device, logger=logger)
 
+        if model_indices is not None:
+            writer.close()
+            continue
+
         if empty_test_set:
             info(f'Model {model_idx} provided with no test set, no metric evaluation will be performed.')
         else:
@@ -399,6 +473,9 @@ def run_training(args: TrainArgs,
                         writer.add_scalar(f'test_{task_name}_{metric}', test_score, n_iter)
         writer.close()
 
+    if model_indices is not None or not is_main:
+        return {}
+
     # Evaluate ensemble on test set
     if empty_test_set:
         ensemble_scores = {
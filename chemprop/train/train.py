@@ -1,10 +1,11 @@
 import logging
-from typing import Callable
+from typing import Callable, Union
 
 import numpy as np
 from tensorboardX import SummaryWriter
 import torch
 import torch.nn as nn
+from torch.nn.parallel import DistributedDataParallel
 from torch.optim import Optimizer
 from torch.optim.lr_scheduler import _LRScheduler
 from tqdm import tqdm
@@ -16,7 +17,7 @@ from chemprop.nn_utils import compute_gnorm, compute_pnorm, NoamLR
 
 
 def train(
-    model: MoleculeModel,
+    model: Union[MoleculeModel, DistributedDataParallel],
     data_loader: MoleculeDataLoader,
     loss_func: Callable,
     optimizer: Optimizer,
@@ -30,7 +31,8 @@ def train(
     """
     Trains a model for an epoch.
 
-    :param model: A :class:`~chemprop.models.model.MoleculeModel`.
+    :param model: A :class:`~chemprop.models.model.MoleculeModel`, possibly wrapped in a
+                  :class:`~torch.nn.parallel.DistributedDataParallel` for distributed training.
     :param data_loader: A :class:`~chemprop.data.data.MoleculeDataLoader`.
     :param loss_func: Loss function.
     :param optimizer: An optimizer.
@@ -44,31 +46,35 @@ def train(
     """
     debug = logger.debug if logger is not None else print
 
+    module = model.module if isinstance(model, DistributedDataParallel) else model
     model.train()
-    if model.is_atom_bond_targets:
+    if module.is_atom_bond_targets:
         loss_sum, iter_count = [0]*(len(args.atom_targets) + len(args.bond_targets)), 0
     else:
         loss_sum = iter_count = 0
 
+    # The targets, masks, and data weights of each batch are sliced from arrays computed once for the dataset
+    data_loader.precompute_targets()
+
     for batch in tqdm(data_loader, total=len(data_loader), leave=False):
         # Prepare batch
         batch: MoleculeDataset
-        mol_batch, features_batch, target_batch, mask_batch, atom_descriptors_batch, atom_features_batch, bond_descriptors_batch, bond_features_batch, constraints_batch, data_weights_batch = \
-            batch.batch_graph(), batch.features(), batch.targets(), batch.mask(), batch.atom_descriptors(), \
-            batch.atom_features(), batch.bond_descriptors(), batch.bond_features(), batch.constraints(), batch.data_weights()
+        features_batch, target_tensors, atom_descriptors_batch, atom_features_batch, bond_descriptors_batch, bond_features_batch, constraints_batch = \
+            batch.features(), batch.target_tensors(), batch.atom_descriptors(), \
+            batch.atom_features(), batch.bond_descriptors(), batch.bond_features(), batch.constraints()
+        # Cached frozen embeddings replace the graphs of the molecules
+        embeddings_batch = batch.embeddings()
+        if embeddings_batch is None:
+            mol_batch = batch.batch_graph()
+        else:
+            mol_batch, embeddings_batch = None, embeddings_batch.to(args.device)
+        targets, masks, data_weights = target_tensors['targets'], target_tensors['mask'], target_tensors['data_weights']
 
-        if model.is_atom_bond_targets:
-            targets = []
-            for dt in zip(*target_batch):
-                dt = np.concatenate(dt)
-                targets.append(torch.tensor([0 if x is None else x for x in dt], dtype=torch.float))
-            masks = [torch.tensor(mask, dtype=torch.bool) for mask in mask_batch]
+        if module.is_atom_bond_targets:
             if args.target_weights is not None:
                 target_weights = [torch.ones(1, 1) * i for i in args.target_weights]  # shape(tasks, 1)
             else:
                 target_weights = [torch.ones(1, 1) for i in targets]
-            data_weights = batch.atom_bond_data_weights()
-            data_weights = [torch.tensor(x).unsqueeze(1) for x in data_weights]
 
             natoms, nbonds = batch.number_of_atoms, batch.number_of_bonds
             natoms, nbonds = np.array(natoms).flatten(), np.array(nbonds).flatten()
@@ -104,24 +110,17 @@ def train(
                 else:
                     bond_types_batch.append(None)
         else:
-            mask_batch = np.transpose(mask_batch).tolist()
-            masks = torch.tensor(mask_batch, dtype=torch.bool)  # shape(batch, tasks)
-            targets = torch.tensor([[0 if x is None else x for x in tb] for tb in target_batch])  # shape(batch, tasks)
-
             if args.target_weights is not None:
                 target_weights = torch.tensor(args.target_weights).unsqueeze(0)  # shape(1,tasks)
             else:
                 target_weights = torch.ones(targets.shape[1]).unsqueeze(0)
-            data_weights = torch.tensor(data_weights_batch).unsqueeze(1)  # shape(batch,1)
 
             constraints_batch = None
             bond_types_batch = None
 
             if args.loss_function == "bounded_mse":
-                lt_target_batch = batch.lt_targets()  # shape(batch, tasks)
-                gt_target_batch = batch.gt_targets()  # shape(batch, tasks)
-                lt_target_batch = torch.tensor(lt_target_batch)
-                gt_target_batch = torch.tensor(gt_target_batch)
+                lt_target_batch = target_tensors['lt_targets']  # shape(batch, tasks)
+                gt_target_batch = target_tensors['gt_targets']  # shape(batch, tasks)
 
         # Run model
         model.zero_grad()
@@ -134,11 +133,12 @@ def train(
             bond_features_batch,
             constraints_batch,
             bond_types_batch,
+            embeddings_batch,
         )
 
         # Move tensors to correct device
         torch_device = args.device
-        if model.is_atom_bond_targets:
+        if module.is_atom_bond_targets:
             masks = [x.to(torch_device) for x in masks]
             masks = [x.reshape([-1, 1]) for x in masks]
             targets = [x.to(torch_device) for x in targets]
@@ -155,7 +155,7 @@ def train(
                 gt_target_batch = gt_target_batch.to(torch_device)
 
         # Calculate losses
-        if model.is_atom_bond_targets:
+        if module.is_atom_bond_targets:
             loss_multi_task = []
             for target, pred, target_weight, data_weight, mask in zip(targets, preds, target_weights, data_weights, masks):
                 if args.loss_function == "mcc" and args.dataset_type == "classification":
@@ -238,7 +238,7 @@ def train(
             lrs = scheduler.get_lr()
             pnorm = compute_pnorm(model)
             gnorm = compute_gnorm(model)
-            if model.is_atom_bond_targets:
+            if module.is_atom_bond_targets:
                 loss_avg = sum(loss_sum) / iter_count
                 loss_sum, iter_count = [0]*(len(args.atom_targets) + len(args.bond_targets)), 0
             else:
@@ -38,6 +38,7 @@ class UncertaintyCalibrator(ABC):
         conformal_alpha: float,
         dropout_sampling_size: int,
         spectra_phase_mask: List[List[bool]],
+        ensemble_execution: str = "per_model",
     ):
         self.calibration_data = calibration_data
         self.calibration_data_loader = calibration_data_loader
@@ -66,6 +67,7 @@ class UncertaintyCalibrator(ABC):
             dropout_sampling_size=dropout_sampling_size,
             individual_ensemble_predictions=False,
             spectra_phase_mask=spectra_phase_mask,
+            ensemble_execution=ensemble_execution,
         )
 
         self.calibrate()
@@ -1174,6 +1176,7 @@ def build_uncertainty_calibrator(
     conformal_alpha: float,
     dropout_sampling_size: int,
     spectra_phase_mask: List[List[bool]],
+    ensemble_execution: str = "per_model",
 ) -> UncertaintyCalibrator:
     """
     Function that chooses the subclass of :class: `UncertaintyCalibrator`
@@ -1228,5 +1231,6 @@ def build_uncertainty_calibrator(
             conformal_alpha=conformal_alpha,
             dropout_sampling_size=dropout_sampling_size,
             spectra_phase_mask=spectra_phase_mask,
+            ensemble_execution=ensemble_execution,
         )
     return calibrator
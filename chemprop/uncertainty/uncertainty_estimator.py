@@ -24,6 +24,7 @@ class UncertaintyEstimator:
         dropout_sampling_size: int,
         individual_ensemble_predictions: bool,
         spectra_phase_mask: List[List[bool]],
+        ensemble_execution: str = "per_model",
     ):
         self.uncertainty_method = uncertainty_method
 
@@ -41,6 +42,7 @@ class UncertaintyEstimator:
             dropout_sampling_size=dropout_sampling_size,
             individual_ensemble_predictions=individual_ensemble_predictions,
             spectra_phase_mask=spectra_phase_mask,
+            ensemble_execution=ensemble_execution,
         )
         self.label = self.predictor.label
 
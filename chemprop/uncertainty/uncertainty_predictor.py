@@ -1,12 +1,12 @@
 from abc import ABC, abstractmethod
-from typing import Iterator, List
+from typing import Any, Iterator, List, Tuple
 
 import numpy as np
 from tqdm import tqdm
 
 from chemprop.data import MoleculeDataset, StandardScaler, MoleculeDataLoader
 from chemprop.models import MoleculeModel
-from chemprop.train.predict import predict
+from chemprop.train.predict import predict, predict_dropout, predict_ensemble, scale_features
 from chemprop.spectra_utils import normalize_spectra, roundrobin_sid
 from chemprop.multitask_utils import reshape_values, reshape_individual_preds
 
@@ -31,6 +31,7 @@ class UncertaintyPredictor(ABC):
         dropout_sampling_size: int,
         individual_ensemble_predictions: bool = False,
         spectra_phase_mask: List[List[bool]] = None,
+        ensemble_execution: str = "per_model",
     ):
         self.test_data = test_data
         self.models = models
@@ -49,6 +50,7 @@ class UncertaintyPredictor(ABC):
         self.individual_ensemble_predictions = individual_ensemble_predictions
         self.spectra_phase_mask = spectra_phase_mask
         self.train_class_sizes = None
+        self.ensemble_execution = ensemble_execution
 
         self.raise_argument_errors()
         self.test_data_loader = test_data_loader
@@ -72,6 +74,49 @@ class UncertaintyPredictor(ABC):
         Calculate the uncalibrated predictions and store them as attributes
         """
 
+    def member_predictions(self, return_unc_parameters: bool) -> Iterator[Tuple[int, MoleculeModel, Any]]:
+        """
+        Makes the predictions of each model of the ensemble on the test data.
+
+        With the :code:`per_model` ensemble execution, each model makes a pass through the test data after it is
+        loaded. Otherwise, all the models are loaded and run on each batch in a single pass, see
+        :func:`~chemprop.train.predict.predict_ensemble`.
+
+        :param return_unc_parameters: Whether to return the uncertainty parameters alongside the predictions.
+        :return: An iterator over the index, model, and output of :func:`~chemprop.train.predict.predict` of each model.
+        """
+        if self.ensemble_execution == "per_model":
+            for i, (model, scaler_list) in enumerate(
+                tqdm(zip(self.models, self.scalers), total=self.num_models)
+            ):
+                (
+                    scaler,
+                    features_scaler,
+                    atom_descriptor_scaler,
+                    bond_descriptor_scaler,
+                    atom_bond_scaler,
+                ) = scaler_list
+                scale_features(self.test_data, features_scaler, atom_descriptor_scaler, bond_descriptor_scaler)
+
+                yield i, model, predict(
+                    model=model,
+                    data_loader=self.test_data_loader,
+                    scaler=scaler,
+                    atom_bond_scaler=atom_bond_scaler,
+                    return_unc_parameters=return_unc_parameters,
+                )
+        else:
+            models, scalers = list(self.models), list(self.scalers)
+            outputs = predict_ensemble(
+                models=models,
+                scalers=scalers,
+                data_loader=self.test_data_loader,
+                return_unc_parameters=return_unc_parameters,
+                stack=self.ensemble_execution == "stacked",
+            )
+            for i, (model, output) in enumerate(zip(models, outputs)):
+                yield i, model, output
+
     def get_uncal_preds(self):
         """
         Return the predicted values for the test data.
@@ -120,40 +165,9 @@ class NoUncertaintyPredictor(UncertaintyPredictor):
         return "no_uncertainty_method"
 
     def calculate_predictions(self):
-        for i, (model, scaler_list) in enumerate(
-            tqdm(zip(self.models, self.scalers), total=self.num_models)
+        for i, model, preds in self.member_predictions(
+            return_unc_parameters=False
         ):
-            (
-                scaler,
-                features_scaler,
-                atom_descriptor_scaler,
-                bond_descriptor_scaler,
-                atom_bond_scaler,
-            ) = scaler_list
-            if (
-                features_scaler is not None
-                or atom_descriptor_scaler is not None
-                or bond_descriptor_scaler is not None
-            ):
-                self.test_data.reset_features_and_targets()
-                if features_scaler is not None:
-                    self.test_data.normalize_features(features_scaler)
-                if atom_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        atom_descriptor_scaler, scale_atom_descriptors=True
-                    )
-                if bond_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        bond_descriptor_scaler, scale_bond_descriptors=True
-                    )
-
-            preds = predict(
-                model=model,
-                data_loader=self.test_data_loader,
-                scaler=scaler,
-                atom_bond_scaler=atom_bond_scaler,
-                return_unc_parameters=False,
-            )
             if self.dataset_type == "spectra":
                 preds = normalize_spectra(
                     spectra=preds,
@@ -276,40 +290,9 @@ class ConformalQuantileRegressionPredictor(UncertaintyPredictor):
         return intervals
 
     def calculate_predictions(self):
-        for i, (model, scaler_list) in enumerate(
-            tqdm(zip(self.models, self.scalers), total=self.num_models)
+        for i, model, preds in self.member_predictions(
+            return_unc_parameters=False
         ):
-            (
-                scaler,
-                features_scaler,
-                atom_descriptor_scaler,
-                bond_descriptor_scaler,
-                atom_bond_scaler,
-            ) = scaler_list
-            if (
-                features_scaler is not None
-                or atom_descriptor_scaler is not None
-                or bond_descriptor_scaler is not None
-            ):
-                self.test_data.reset_features_and_targets()
-                if features_scaler is not None:
-                    self.test_data.normalize_features(features_scaler)
-                if atom_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        atom_descriptor_scaler, scale_atom_descriptors=True
-                    )
-                if bond_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        bond_descriptor_scaler, scale_bond_descriptors=True
-                    )
-
-            preds = predict(
-                model=model,
-                data_loader=self.test_data_loader,
-                scaler=scaler,
-                atom_bond_scaler=atom_bond_scaler,
-                return_unc_parameters=False,
-            )
             if i == 0:
                 sum_preds = np.array(preds)
                 if self.individual_ensemble_predictions:
@@ -397,40 +380,9 @@ class RoundRobinSpectraPredictor(UncertaintyPredictor):
             )
 
     def calculate_predictions(self):
-        for i, (model, scaler_list) in enumerate(
-            tqdm(zip(self.models, self.scalers), total=self.num_models)
+        for i, model, preds in self.member_predictions(
+            return_unc_parameters=False
         ):
-            (
-                scaler,
-                features_scaler,
-                atom_descriptor_scaler,
-                bond_descriptor_scaler,
-                atom_bond_scaler,
-            ) = scaler_list
-            if (
-                features_scaler is not None
-                or atom_descriptor_scaler is not None
-                or bond_descriptor_scaler is not None
-            ):
-                self.test_data.reset_features_and_targets()
-                if features_scaler is not None:
-                    self.test_data.normalize_features(features_scaler)
-                if atom_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        atom_descriptor_scaler, scale_atom_descriptors=True
-                    )
-                if bond_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        bond_descriptor_scaler, scale_bond_descriptors=True
-                    )
-
-            preds = predict(
-                model=model,
-                data_loader=self.test_data_loader,
-                scaler=scaler,
-                atom_bond_scaler=atom_bond_scaler,
-                return_unc_parameters=False,
-            )
             if self.dataset_type == "spectra":
                 preds = normalize_spectra(
                     spectra=preds,
@@ -474,40 +426,9 @@ class MVEPredictor(UncertaintyPredictor):
             )
 
     def calculate_predictions(self):
-        for i, (model, scaler_list) in enumerate(
-            tqdm(zip(self.models, self.scalers), total=self.num_models)
+        for i, model, (preds, var) in self.member_predictions(
+            return_unc_parameters=True
         ):
-            (
-                scaler,
-                features_scaler,
-                atom_descriptor_scaler,
-                bond_descriptor_scaler,
-                atom_bond_scaler,
-            ) = scaler_list
-            if (
-                features_scaler is not None
-                or atom_descriptor_scaler is not None
-                or bond_descriptor_scaler is not None
-            ):
-                self.test_data.reset_features_and_targets()
-                if features_scaler is not None:
-                    self.test_data.normalize_features(features_scaler)
-                if atom_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        atom_descriptor_scaler, scale_atom_descriptors=True
-                    )
-                if bond_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        bond_descriptor_scaler, scale_bond_descriptors=True
-                    )
-
-            preds, var = predict(
-                model=model,
-                data_loader=self.test_data_loader,
-                scaler=scaler,
-                atom_bond_scaler=atom_bond_scaler,
-                return_unc_parameters=True,
-            )
             if i == 0:
                 sum_preds = np.array(preds)
                 sum_squared = np.square(preds)
@@ -616,40 +537,9 @@ class EvidentialTotalPredictor(UncertaintyPredictor):
             )
 
     def calculate_predictions(self):
-        for i, (model, scaler_list) in enumerate(
-            tqdm(zip(self.models, self.scalers), total=self.num_models)
+        for i, model, (preds, lambdas, alphas, betas) in self.member_predictions(
+            return_unc_parameters=True
         ):
-            (
-                scaler,
-                features_scaler,
-                atom_descriptor_scaler,
-                bond_descriptor_scaler,
-                atom_bond_scaler,
-            ) = scaler_list
-            if (
-                features_scaler is not None
-                or atom_descriptor_scaler is not None
-                or bond_descriptor_scaler is not None
-            ):
-                self.test_data.reset_features_and_targets()
-                if features_scaler is not None:
-                    self.test_data.normalize_features(features_scaler)
-                if atom_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        atom_descriptor_scaler, scale_atom_descriptors=True
-                    )
-                if bond_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        bond_descriptor_scaler, scale_bond_descriptors=True
-                    )
-
-            preds, lambdas, alphas, betas = predict(
-                model=model,
-                data_loader=self.test_data_loader,
-                scaler=scaler,
-                atom_bond_scaler=atom_bond_scaler,
-                return_unc_parameters=True,
-            )
             var = np.array(betas) * (1 + 1 / np.array(lambdas)) / (np.array(alphas) - 1)
             if i == 0:
                 sum_preds = np.array(preds)
@@ -759,40 +649,9 @@ class EvidentialAleatoricPredictor(UncertaintyPredictor):
             )
 
     def calculate_predictions(self):
-        for i, (model, scaler_list) in enumerate(
-            tqdm(zip(self.models, self.scalers), total=self.num_models)
+        for i, model, (preds, lambdas, alphas, betas) in self.member_predictions(
+            return_unc_parameters=True
         ):
-            (
-                scaler,
-                features_scaler,
-                atom_descriptor_scaler,
-                bond_descriptor_scaler,
-                atom_bond_scaler,
-            ) = scaler_list
-            if (
-                features_scaler is not None
-                or atom_descriptor_scaler is not None
-                or bond_descriptor_scaler is not None
-            ):
-                self.test_data.reset_features_and_targets()
-                if features_scaler is not None:
-                    self.test_data.normalize_features(features_scaler)
-                if atom_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        atom_descriptor_scaler, scale_atom_descriptors=True
-                    )
-                if bond_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        bond_descriptor_scaler, scale_bond_descriptors=True
-                    )
-
-            preds, lambdas, alphas, betas = predict(
-                model=model,
-                data_loader=self.test_data_loader,
-                scaler=scaler,
-                atom_bond_scaler=atom_bond_scaler,
-                return_unc_parameters=True,
-            )
             var = np.array(betas) / (np.array(alphas) - 1)
             if i == 0:
                 sum_preds = np.array(preds)
@@ -902,40 +761,9 @@ class EvidentialEpistemicPredictor(UncertaintyPredictor):
             )
 
     def calculate_predictions(self):
-        for i, (model, scaler_list) in enumerate(
-            tqdm(zip(self.models, self.scalers), total=self.num_models)
+        for i, model, (preds, lambdas, alphas, betas) in self.member_predictions(
+            return_unc_parameters=True
         ):
-            (
-                scaler,
-                features_scaler,
-                atom_descriptor_scaler,
-                bond_descriptor_scaler,
-                atom_bond_scaler,
-            ) = scaler_list
-            if (
-                features_scaler is not None
-                or atom_descriptor_scaler is not None
-                or bond_descriptor_scaler is not None
-            ):
-                self.test_data.reset_features_and_targets()
-                if features_scaler is not None:
-                    self.test_data.normalize_features(features_scaler)
-                if atom_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        atom_descriptor_scaler, scale_atom_descriptors=True
-                    )
-                if bond_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        bond_descriptor_scaler, scale_bond_descriptors=True
-                    )
-
-            preds, lambdas, alphas, betas = predict(
-                model=model,
-                data_loader=self.test_data_loader,
-                scaler=scaler,
-                atom_bond_scaler=atom_bond_scaler,
-                return_unc_parameters=True,
-            )
             var = np.array(betas) / (np.array(lambdas) * (np.array(alphas) - 1))
             if i == 0:
                 sum_preds = np.array(preds)
@@ -1041,39 +869,9 @@ class EnsemblePredictor(UncertaintyPredictor):
             )
 
     def calculate_predictions(self):
-        for i, (model, scaler_list) in enumerate(
-            tqdm(zip(self.models, self.scalers), total=self.num_models)
+        for i, model, preds in self.member_predictions(
+            return_unc_parameters=False
         ):
-            (
-                scaler,
-                features_scaler,
-                atom_descriptor_scaler,
-                bond_descriptor_scaler,
-                atom_bond_scaler,
-            ) = scaler_list
-            if (
-                features_scaler is not None
-                or atom_descriptor_scaler is not None
-                or bond_descriptor_scaler is not None
-            ):
-                self.test_data.reset_features_and_targets()
-                if features_scaler is not None:
-                    self.test_data.normalize_features(features_scaler)
-                if atom_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        atom_descriptor_scaler, scale_atom_descriptors=True
-                    )
-                if bond_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        bond_descriptor_scaler, scale_bond_descriptors=True
-                    )
-            preds = predict(
-                model=model,
-                data_loader=self.test_data_loader,
-                scaler=scaler,
-                atom_bond_scaler=atom_bond_scaler,
-                return_unc_parameters=False,
-            )
             if self.dataset_type == "spectra":
                 preds = normalize_spectra(
                     spectra=preds,
@@ -1195,49 +993,17 @@ class DropoutPredictor(UncertaintyPredictor):
             bond_descriptor_scaler,
             atom_bond_scaler,
         ) = next(self.scalers)
-        if (
-            features_scaler is not None
-            or atom_descriptor_scaler is not None
-            or bond_descriptor_scaler is not None
-        ):
-            self.test_data.reset_features_and_targets()
-            if features_scaler is not None:
-                self.test_data.normalize_features(features_scaler)
-            if atom_descriptor_scaler is not None:
-                self.test_data.normalize_features(
-                    atom_descriptor_scaler, scale_atom_descriptors=True
-                )
-            if bond_descriptor_scaler is not None:
-                self.test_data.normalize_features(
-                    bond_descriptor_scaler, scale_bond_descriptors=True
-                )
-        for i in range(self.dropout_sampling_size):
-            preds = predict(
-                model=model,
-                data_loader=self.test_data_loader,
-                scaler=scaler,
-                atom_bond_scaler=atom_bond_scaler,
-                return_unc_parameters=False,
-                dropout_prob=self.uncertainty_dropout_p,
-            )
-            if i == 0:
-                sum_preds = np.array(preds)
-                sum_squared = np.square(preds)
-            else:
-                sum_preds += np.array(preds)
-                sum_squared += np.square(preds)
+        scale_features(self.test_data, features_scaler, atom_descriptor_scaler, bond_descriptor_scaler)
+        uncal_preds, uncal_vars = predict_dropout(
+            model=model,
+            data_loader=self.test_data_loader,
+            sampling_size=self.dropout_sampling_size,
+            dropout_prob=self.uncertainty_dropout_p,
+            scaler=scaler,
+            atom_bond_scaler=atom_bond_scaler,
+        )
 
         if model.is_atom_bond_targets:
-            num_tasks = sum_preds.shape[1]
-            uncal_preds, uncal_vars = [], []
-            for pred, square in zip(sum_preds, sum_squared):
-                uncal_pred = pred / self.dropout_sampling_size
-                uncal_var = (
-                    square / self.dropout_sampling_size
-                    - np.square(pred) / self.dropout_sampling_size**2
-                )
-                uncal_preds.append(uncal_pred)
-                uncal_vars.append(uncal_var)
             self.uncal_preds = reshape_values(
                 uncal_preds,
                 self.test_data,
@@ -1251,15 +1017,7 @@ class DropoutPredictor(UncertaintyPredictor):
                 len(model.bond_targets),
             )
         else:
-            uncal_preds = sum_preds / self.dropout_sampling_size
-            uncal_vars = (
-                sum_squared / self.dropout_sampling_size
-                - np.square(sum_preds) / self.dropout_sampling_size**2
-            )
-            self.uncal_preds, self.uncal_vars = (
-                uncal_preds.tolist(),
-                uncal_vars.tolist(),
-            )
+            self.uncal_preds, self.uncal_vars = uncal_preds, uncal_vars
 
     def get_uncal_output(self):
         return self.uncal_vars
@@ -1283,40 +1041,9 @@ class ClassPredictor(UncertaintyPredictor):
             )
 
     def calculate_predictions(self):
-        for i, (model, scaler_list) in enumerate(
-            tqdm(zip(self.models, self.scalers), total=self.num_models)
+        for i, model, preds in self.member_predictions(
+            return_unc_parameters=False
         ):
-            (
-                scaler,
-                features_scaler,
-                atom_descriptor_scaler,
-                bond_descriptor_scaler,
-                atom_bond_scaler,
-            ) = scaler_list
-            if (
-                features_scaler is not None
-                or atom_descriptor_scaler is not None
-                or bond_descriptor_scaler is not None
-            ):
-                self.test_data.reset_features_and_targets()
-                if features_scaler is not None:
-                    self.test_data.normalize_features(features_scaler)
-                if atom_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        atom_descriptor_scaler, scale_atom_descriptors=True
-                    )
-                if bond_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        bond_descriptor_scaler, scale_bond_descriptors=True
-                    )
-
-            preds = predict(
-                model=model,
-                data_loader=self.test_data_loader,
-                scaler=scaler,
-                atom_bond_scaler=atom_bond_scaler,
-                return_unc_parameters=False,
-            )
             if i == 0:
                 sum_preds = np.array(preds)
                 if self.individual_ensemble_predictions:
@@ -1403,40 +1130,9 @@ class DirichletPredictor(UncertaintyPredictor):
             )
 
     def calculate_predictions(self):
-        for i, (model, scaler_list) in enumerate(
-            tqdm(zip(self.models, self.scalers), total=self.num_models)
+        for i, model, (preds, alphas) in self.member_predictions(
+            return_unc_parameters=True
         ):
-            (
-                scaler,
-                features_scaler,
-                atom_descriptor_scaler,
-                bond_descriptor_scaler,
-                atom_bond_scaler,
-            ) = scaler_list
-            if (
-                features_scaler is not None
-                or atom_descriptor_scaler is not None
-                or bond_descriptor_scaler is not None
-            ):
-                self.test_data.reset_features_and_targets()
-                if features_scaler is not None:
-                    self.test_data.normalize_features(features_scaler)
-                if atom_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        atom_descriptor_scaler, scale_atom_descriptors=True
-                    )
-                if bond_descriptor_scaler is not None:
-                    self.test_data.normalize_features(
-                        bond_descriptor_scaler, scale_bond_descriptors=True
-                    )
-
-            preds, alphas = predict(
-                model=model,
-                data_loader=self.test_data_loader,
-                scaler=scaler,
-                atom_bond_scaler=atom_bond_scaler,
-                return_unc_parameters=True,
-            )
 
             alphas = np.array(alphas)
             S = np.sum(alphas, axis=2)
@@ -1529,6 +1225,7 @@ def build_uncertainty_predictor(
     dropout_sampling_size: int,
     individual_ensemble_predictions: bool,
     spectra_phase_mask: List[List[bool]],
+    ensemble_execution: str = "per_model",
 ) -> UncertaintyPredictor:
     """
     Function that chooses and returns the appropriate :class: `UncertaintyPredictor` subclass
@@ -1570,5 +1267,6 @@ def build_uncertainty_predictor(
             dropout_sampling_size=dropout_sampling_size,
             individual_ensemble_predictions=individual_ensemble_predictions,
             spectra_phase_mask=spectra_phase_mask,
+            ensemble_execution=ensemble_execution,
         )
     return predictor
@@ -10,6 +10,7 @@ from time import time
 from typing import Any, Callable, List, Tuple
 import collections
 
+from packaging import version
 import torch
 import torch.nn as nn
 import numpy as np
@@ -18,8 +19,12 @@ from torch.optim.lr_scheduler import _LRScheduler
 from tqdm import tqdm
 
 from chemprop.args import PredictArgs, TrainArgs, FingerprintArgs
-from chemprop.data import StandardScaler, AtomBondScaler, MoleculeDataset, preprocess_smiles_columns, get_task_names
-from chemprop.models import MoleculeModel
+from chemprop.constants import ONNX_MODEL_SUFFIX, QUANTIZED_MODEL_SUFFIX
+from chemprop.data import StandardScaler, AtomBondScaler, MoleculeDataset, preprocess_smiles_columns, get_smiles, \
+    get_task_names
+from chemprop.features import stack_features
+from chemprop.models import InferenceModel, MoleculeModel, OnnxModel
+from chemprop.models.inference import INFERENCE_INPUT_NAMES
 from chemprop.nn_utils import NoamLR
 from chemprop.models.ffn import MultiReadout
 
@@ -157,6 +162,157 @@ def load_checkpoint(
     return model
 
 
+def quantize_model(model: MoleculeModel) -> MoleculeModel:
+    """
+    Applies dynamic int8 quantization to the linear layers of a model, i.e. the :code:`W_i`, :code:`W_h` and :code:`W_o`
+    layers of the message passing encoders and the layers of the FFN readout.
+
+    The weights are stored as int8 and the activations are quantized on the fly, which speeds up inference on CPU.
+
+    :param model: A :class:`~chemprop.models.model.MoleculeModel` on CPU.
+    :return: The quantized :class:`~chemprop.models.model.MoleculeModel`, which only runs on CPU.
+    """
+    return torch.quantization.quantize_dynamic(model.eval(), {nn.Linear}, dtype=torch.qint8)
+
+
+def load_quantized_checkpoint(path: str, logger: logging.Logger = None) -> MoleculeModel:
+    """
+    Loads the dynamically quantized version of a model checkpoint (see :func:`quantize_model`) on CPU.
+
+    The quantized model is cached next to the checkpoint, with the suffix :code:`QUANTIZED_MODEL_SUFFIX`,
+    and quantized again if the checkpoint is more recent than the cache.
+
+    :param path: Path where checkpoint is saved.
+    :param logger: A logger for recording output.
+    :return: The quantized :class:`~chemprop.models.model.MoleculeModel`.
+    """
+    debug = logger.debug if logger is not None else print
+
+    quantized_path = path + QUANTIZED_MODEL_SUFFIX
+    if os.path.exists(quantized_path) and os.path.getmtime(quantized_path) >= os.path.getmtime(path):
+        debug(f"Loading quantized model from {quantized_path}")
+        # The quantized modules are pickled, as their packed weights cannot be loaded into a float model
+        load_kwargs = {"weights_only": False} if version.parse(torch.__version__) >= version.parse("1.13") else {}
+        return torch.load(quantized_path, map_location=lambda storage, loc: storage, **load_kwargs)
+
+    model = quantize_model(load_checkpoint(path, device=torch.device("cpu"), logger=logger))
+    try:
+        torch.save(model, f"{quantized_path}.tmp")
+        os.replace(f"{quantized_path}.tmp", quantized_path)
+        debug(f"Saved quantized model to {quantized_path}")
+    except OSError:
+        debug(f"Warning: Could not cache the quantized model at {quantized_path}.")
+
+    return model
+
+
+def script_checkpoint(path: str, save_path: str = None, logger: logging.Logger = None) -> torch.jit.ScriptModule:
+    """
+    Compiles a model checkpoint and its scalers into a TorchScript :class:`~chemprop.models.inference.InferenceModel`.
+
+    The saved module can be loaded with :func:`torch.jit.load` without importing chemprop, and called on the
+    tensors built by :func:`~chemprop.models.inference.inference_inputs` to get the unscaled predictions.
+
+    :param path: Path where checkpoint is saved.
+    :param save_path: Path where the TorchScript module is saved, if any.
+    :param logger: A logger for recording output.
+    :return: The scripted :class:`~chemprop.models.inference.InferenceModel`, on CPU.
+    """
+    debug = logger.debug if logger is not None else print
+
+    model = load_checkpoint(path, device=torch.device("cpu"), logger=logger)
+    scaler, features_scaler, _, _, _ = load_scalers(path)
+    scripted_model = torch.jit.script(InferenceModel(model, scaler, features_scaler))
+
+    if save_path is not None:
+        torch.jit.save(scripted_model, save_path)
+        debug(f"Saved TorchScript model to {save_path}")
+
+    return scripted_model
+
+
+def export_onnx(path: str, save_path: str, logger: logging.Logger = None) -> None:
+    """
+    Exports a model checkpoint and its scalers to an ONNX graph of an :class:`~chemprop.models.inference.InferenceModel`.
+
+    The graph takes the tensors built by :func:`~chemprop.models.inference.inference_inputs` with dynamic numbers
+    of atoms, bonds and molecules, and returns the unscaled predictions. The loss function, the dataset type and
+    whether the model uses atom messages are stored in the metadata of the graph.
+
+    :param path: Path where checkpoint is saved.
+    :param save_path: Path where the ONNX graph is saved.
+    :param logger: A logger for recording output.
+    """
+    try:
+        import onnx
+    except ImportError:
+        raise ImportError("Failed to import onnx. Please install onnx (https://onnx.ai) to export models to ONNX.")
+
+    debug = logger.debug if logger is not None else print
+
+    model = load_checkpoint(path, device=torch.device("cpu"), logger=logger)
+    scaler, features_scaler, _, _, _ = load_scalers(path)
+    inference_model = InferenceModel(model, scaler, features_scaler)
+
+    # The scatter of the attention aggregation takes a maximum, which ONNX only supports from opset 18
+    opset_version = 18 if inference_model.aggregation == "attention" else 16
+    if opset_version == 18 and version.parse(torch.__version__) < version.parse("2.0.0"):
+        raise ValueError(
+            "Exporting a model with attention aggregation to ONNX requires opset 18, which requires PyTorch 2.0 "
+            "or later. Use --backend torch or upgrade PyTorch."
+        )
+
+    dynamic_axes = {
+        "f_atoms": {0: "num_atoms"},
+        "f_bonds": {0: "num_bonds"},
+        "a2b": {0: "num_atoms", 1: "max_num_bonds"},
+        "b2a": {0: "num_bonds"},
+        "b2revb": {0: "num_bonds"},
+        "a2m": {0: "num_atoms_without_padding"},
+        "features": {0: "num_molecules"},
+        "preds": {0: "num_molecules"},
+    }
+    with torch.no_grad():
+        torch.onnx.export(
+            inference_model,
+            inference_model.example_inputs(),
+            save_path,
+            input_names=INFERENCE_INPUT_NAMES,
+            output_names=["preds"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset_version,
+        )
+
+    onnx_model = onnx.load(save_path)
+    onnx.helper.set_model_props(onnx_model, inference_model.metadata())
+    onnx.save(onnx_model, save_path)
+    debug(f"Exported ONNX model to {save_path}")
+
+
+def load_onnx_checkpoint(path: str, logger: logging.Logger = None) -> OnnxModel:
+    """
+    Loads the ONNX export of a model checkpoint (see :func:`export_onnx`) in an onnxruntime session.
+
+    The ONNX graph is cached next to the checkpoint, with the suffix :code:`ONNX_MODEL_SUFFIX`,
+    and exported again if the checkpoint is more recent than the cache.
+
+    :param path: Path where checkpoint is saved.
+    :param logger: A logger for recording output.
+    :return: An :class:`~chemprop.models.inference.OnnxModel` running the exported graph.
+    """
+    debug = logger.debug if logger is not None else print
+
+    onnx_path = path + ONNX_MODEL_SUFFIX
+    if os.path.exists(onnx_path) and os.path.getmtime(onnx_path) >= os.path.getmtime(path):
+        debug(f"Loading ONNX model from {onnx_path}")
+        return OnnxModel(onnx_path)
+
+    export_onnx(path, f"{onnx_path}.tmp", logger=logger)
+    os.replace(f"{onnx_path}.tmp", onnx_path)
+
+    return OnnxModel(onnx_path)
+
+
 def overwrite_state_dict(
     loaded_param_name: str,
     model_param_name: str,
@@ -500,7 +656,7 @@ def build_optimizer(model: nn.Module, args: TrainArgs) -> Optimizer:
 
 
 def build_lr_scheduler(
-    optimizer: Optimizer, args: TrainArgs, total_epochs: List[int] = None
+    optimizer: Optimizer, args: TrainArgs, total_epochs: List[int] = None, steps_per_epoch: int = None
 ) -> _LRScheduler:
     """
     Builds a PyTorch learning rate scheduler.
@@ -508,6 +664,7 @@ def build_lr_scheduler(
     :param optimizer: The Optimizer whose learning rate will be scheduled.
     :param args: A :class:`~chemprop.args.TrainArgs` object containing learning rate arguments.
     :param total_epochs: The total number of epochs for which the model will be run.
+    :param steps_per_epoch: The number of batches per epoch. Defaults to the training set size divided by the batch size.
     :return: An initialized learning rate scheduler.
     """
     # Learning rate scheduler
@@ -515,7 +672,7 @@ def build_lr_scheduler(
         optimizer=optimizer,
         warmup_epochs=[args.warmup_epochs],
         total_epochs=total_epochs or [args.epochs] * args.num_lrs,
-        steps_per_epoch=args.train_data_size // args.batch_size,
+        steps_per_epoch=steps_per_epoch or args.train_data_size // args.batch_size,
         init_lr=[args.init_lr],
         max_lr=[args.max_lr],
         final_lr=[args.final_lr],
@@ -638,20 +795,16 @@ def save_smiles_splits(
     if not isinstance(smiles_columns, list):
         smiles_columns = preprocess_smiles_columns(path=data_path, smiles_columns=smiles_columns)
 
-    with open(data_path) as f:
-        f = open(data_path)
-        reader = csv.DictReader(f)
-
-        indices_by_smiles = {}
-        for i, row in enumerate(tqdm(reader)):
-            smiles = tuple([row[column] for column in smiles_columns])
-            if smiles in indices_by_smiles:
-                save_split_indices = False
-                info(
-                    "Warning: Repeated SMILES found in data, pickle file of split indices cannot distinguish entries and will not be generated."
-                )
-                break
-            indices_by_smiles[smiles] = i
+    indices_by_smiles = {}
+    for i, smiles in enumerate(tqdm(get_smiles(path=data_path, smiles_columns=smiles_columns))):
+        smiles = tuple(smiles)
+        if smiles in indices_by_smiles:
+            save_split_indices = False
+            info(
+                "Warning: Repeated SMILES found in data, pickle file of split indices cannot distinguish entries and will not be generated."
+            )
+            break
+        indices_by_smiles[smiles] = i
 
     if task_names is None:
         task_names = get_task_names(
@@ -711,7 +864,7 @@ def save_smiles_splits(
                     writer.writerow(features_header)
                     writer.writerows(dataset_features)
             else:
-                np.save(os.path.join(save_dir, f"{name}_features.npy"), dataset_features)
+                np.save(os.path.join(save_dir, f"{name}_features.npy"), stack_features(dataset_features))
 
         if constraints_path is not None:
             dataset_constraints = [d.raw_constraints for d in dataset._data]
@@ -0,0 +1,6 @@
+"""Distills an ensemble of trained chemprop models into a single model."""
+
+from chemprop.train import chemprop_distill
+
+if __name__ == '__main__':
+    chemprop_distill()
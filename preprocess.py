@@ -0,0 +1,6 @@
+"""Compiles a data CSV file and its additional data files into a packed dataset for training."""
+
+from chemprop.train import chemprop_preprocess
+
+if __name__ == '__main__':
+    chemprop_preprocess()
@@ -38,13 +38,9 @@ def run_split_data(args: Args):
     assert len(lines) == len(smiles)
     assert all(s in line for smile, line in zip(smiles, lines) for s in smile)
 
-    # Create data
-    data = []
-    for smile, line in tqdm(zip(smiles, lines), total=len(smiles)):
-        datapoint = MoleculeDatapoint(smiles=smile)
-        datapoint.line = line
-        data.append(datapoint)
-    data = MoleculeDataset(data)
+    # Create data, keeping the index of each datapoint's line since datapoints cannot hold extra attributes
+    data = MoleculeDataset([MoleculeDatapoint(smiles=smile) for smile in tqdm(smiles)])
+    line_indices = {id(datapoint): i for i, datapoint in enumerate(data)}
 
     train, val, test = split_data(
         data=data,
@@ -60,7 +56,7 @@ def run_split_data(args: Args):
             writer = csv.writer(f)
             writer.writerow(header)
             for datapoint in dataset:
-                writer.writerow(datapoint.line)
+                writer.writerow(lines[line_indices[id(datapoint)]])
 
 
 if __name__ == '__main__':
@@ -28,6 +28,8 @@ setup(
             "chemprop_train=chemprop.train:chemprop_train",
             "chemprop_predict=chemprop.train:chemprop_predict",
             "chemprop_fingerprint=chemprop.train:chemprop_fingerprint",
+            "chemprop_distill=chemprop.train:chemprop_distill",
+            "chemprop_preprocess=chemprop.train:chemprop_preprocess",
             "chemprop_hyperopt=chemprop.hyperparameter_optimization:chemprop_hyperopt",
             "chemprop_interpret=chemprop.interpret:chemprop_interpret",
             "chemprop_web=chemprop.web.run:chemprop_web",
@@ -56,7 +58,12 @@ setup(
         "scipy>=1.9 ; python_version=='3.8'",
         "descriptastorus>=2.6.1 ; python_version=='3.8'",
     ],
-    extras_require={"test": ["pytest>=6.2.2", "parameterized>=0.8.1"]},
+    extras_require={
+        "test": ["pytest>=6.2.2", "parameterized>=0.8.1"],
+        "onnx": ["onnx>=1.12.0", "onnxruntime>=1.12.0", "torch>=2.0.0"],
+        "stacked": ["torch>=2.0.0"],
+        "zstd": ["zstandard>=0.18.0"],
+    },
     python_requires=">=3.7,<3.9",
     classifiers=[
         "Programming Language :: Python :: 3.7",
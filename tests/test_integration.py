@@ -1,5 +1,6 @@
 """Chemprop integration tests."""
 from flask import url_for
+from importlib import import_module
 from io import BytesIO
 import json
 import os
@@ -12,13 +13,17 @@ from unittest.mock import patch
 import numpy as np
 import pandas as pd
 from parameterized import parameterized
+import torch
+import torch.distributed as dist
 
 from chemprop.constants import TEST_SCORES_FILE_NAME
 from chemprop.hyperparameter_optimization import chemprop_hyperopt
 from chemprop.interpret import chemprop_interpret
 from chemprop.sklearn_predict import sklearn_predict
 from chemprop.sklearn_train import sklearn_train
-from chemprop.train import chemprop_train, chemprop_predict, evaluate_predictions, chemprop_fingerprint
+from chemprop.train import chemprop_train, chemprop_predict, evaluate_predictions, chemprop_fingerprint, \
+    cross_validate, train
+from chemprop.utils import save_checkpoint
 from chemprop.web.wsgi import build_app
 from chemprop.spectra_utils import normalize_spectra, load_phase_mask
 from chemprop.features import load_features
@@ -302,6 +307,100 @@ class ChempropTests(TestCase):
             mean_score = np.mean(test_scores)
             self.assertAlmostEqual(mean_score, expected_score, delta=DELTA*expected_score)
 
+    def test_train_workers(self):
+        """Concurrent training of the members of every fold, which are then evaluated fold by fold"""
+        with TemporaryDirectory() as save_dir:
+            metric = 'rmse'
+            self.train(
+                dataset_type='regression',
+                metric=metric,
+                save_dir=save_dir,
+                flags=['--ensemble_size', '2', '--num_folds', '2', '--train_workers', '2']
+            )
+
+            # Every member of every fold was saved in its own directory
+            for fold_num in range(2):
+                for model_idx in range(2):
+                    self.assertTrue(os.path.exists(os.path.join(save_dir, f'fold_{fold_num}', f'model_{model_idx}',
+                                                                'model.pt')))
+                self.assertFalse(os.path.exists(os.path.join(save_dir, f'fold_{fold_num}', 'model_2')))
+            self.assertFalse(os.path.exists(os.path.join(save_dir, 'fold_2')))
+
+            # The scores of the ensemble of each fold are aggregated over the folds
+            test_scores_data = pd.read_csv(os.path.join(save_dir, TEST_SCORES_FILE_NAME))
+            self.assertEqual(len(test_scores_data), 1)
+            fold_scores = []
+            for fold_num in range(2):
+                with open(os.path.join(save_dir, f'fold_{fold_num}', 'test_scores.json')) as f:
+                    fold_scores.append(json.load(f)[metric][0])
+                self.assertAlmostEqual(test_scores_data[f'Fold {fold_num} {metric}'][0], fold_scores[-1])
+            self.assertTrue(np.all(np.isfinite(fold_scores)))
+            self.assertAlmostEqual(test_scores_data[f'Mean {metric}'][0], np.mean(fold_scores))
+            self.assertAlmostEqual(test_scores_data[f'Standard deviation {metric}'][0], np.std(fold_scores))
+
+    def test_train_workers_uncached(self):
+        """Concurrent training on data above the cache cutoff, which the workers load without worker processes"""
+        with TemporaryDirectory() as save_dir:
+            self.train(
+                dataset_type='regression',
+                metric='rmse',
+                save_dir=save_dir,
+                flags=['--num_folds', '1', '--ensemble_size', '2', '--train_workers', '2',
+                       '--cache_cutoff', '0', '--num_workers', '2']
+            )
+
+            for model_idx in range(2):
+                self.assertTrue(os.path.exists(os.path.join(save_dir, 'fold_0', f'model_{model_idx}', 'model.pt')))
+            self.assertTrue(os.path.exists(os.path.join(save_dir, TEST_SCORES_FILE_NAME)))
+
+    def test_train_distributed(self):
+        """Distributed training on two local gloo processes, of which only rank 0 saves checkpoints and scores"""
+        with TemporaryDirectory() as save_dir, TemporaryDirectory() as record_dir:
+            # The ranks are forked, so they run the patched functions, which record what each rank did
+            def record(name, value):
+                torch.save(value, os.path.join(record_dir, f'{name}_{dist.get_rank()}.pt'))
+
+            def record_train(**kwargs):
+                n_iter = train(**kwargs)
+                record('weights', kwargs['model'].module.state_dict())
+                return n_iter
+
+            def record_save_checkpoint(*args, **kwargs):
+                record('checkpoint', True)
+                return save_checkpoint(*args, **kwargs)
+
+            def record_cross_validate(*args, **kwargs):
+                scores = cross_validate(*args, **kwargs)
+                record('scores', [float(score) for score in scores])
+                return scores
+
+            with patch.object(import_module('chemprop.train.run_training'), 'train', record_train), \
+                    patch.object(import_module('chemprop.train.run_training'), 'save_checkpoint', record_save_checkpoint), \
+                    patch.object(import_module('chemprop.train.cross_validate'), 'cross_validate', record_cross_validate):
+                self.train(
+                    dataset_type='regression',
+                    metric='rmse',
+                    save_dir=save_dir,
+                    flags=['--distributed', '--world_size', '2', '--num_folds', '1', '--epochs', '2',
+                           '--max_data_size', '100']
+                )
+
+            # Both ranks finished training with the same weights
+            weights = [torch.load(os.path.join(record_dir, f'weights_{rank}.pt')) for rank in range(2)]
+            self.assertEqual(weights[0].keys(), weights[1].keys())
+            for name in weights[0]:
+                self.assertTrue(torch.equal(weights[0][name], weights[1][name]), name)
+
+            # Only rank 0 saved checkpoints and scores
+            self.assertTrue(os.path.exists(os.path.join(record_dir, 'checkpoint_0.pt')))
+            self.assertFalse(os.path.exists(os.path.join(record_dir, 'checkpoint_1.pt')))
+            self.assertTrue(os.path.exists(os.path.join(save_dir, 'fold_0', 'model_0', 'model.pt')))
+            self.assertTrue(np.isfinite(torch.load(os.path.join(record_dir, 'scores_0.pt'))[0]))
+            self.assertTrue(np.isnan(torch.load(os.path.join(record_dir, 'scores_1.pt'))[0]))
+            test_scores_data = pd.read_csv(os.path.join(save_dir, TEST_SCORES_FILE_NAME))
+            self.assertEqual(len(test_scores_data), 1)
+            self.assertTrue(np.isfinite(test_scores_data['Mean rmse'][0]))
+
     @parameterized.expand([
         (
                 'chemprop',
@@ -489,6 +588,144 @@ class ChempropTests(TestCase):
             expected_columns = ['smiles', 'logSolubility'] + [f'logSolubility_model_{idx}' for idx in range(NUM_FOLDS)]
             self.assertTrue(columns == expected_columns)
 
+    def test_predict_chunks(self):
+        """Predicting in chunks writes the same csv as predicting on the whole file, including invalid SMILES"""
+        with TemporaryDirectory() as save_dir:
+            # Train
+            dataset_type = 'regression'
+            self.train(
+                dataset_type=dataset_type,
+                metric='rmse',
+                save_dir=save_dir,
+            )
+
+            # Chunks of two rows with only invalid SMILES before and after the first chunk with valid SMILES
+            smiles = list(pd.read_csv(os.path.join(TEST_DATA_DIR, f'{dataset_type}_test_smiles.csv'))['smiles'])
+            test_path = os.path.join(save_dir, 'test.csv')
+            pd.DataFrame({'smiles': ['invalid', 'invalid'] + smiles[:2] + ['invalid', 'invalid', smiles[2], 'invalid']
+                          + smiles[3:] + ['invalid']}).to_csv(test_path, index=False)
+
+            preds_path = os.path.join(save_dir, 'preds.csv')
+            self.predict(
+                dataset_type=dataset_type,
+                preds_path=preds_path,
+                save_dir=save_dir,
+                flags=['--test_path', test_path]
+            )
+            chunk_preds_path = os.path.join(save_dir, 'chunk_preds.csv')
+            self.predict(
+                dataset_type=dataset_type,
+                preds_path=chunk_preds_path,
+                save_dir=save_dir,
+                flags=['--test_path', test_path, '--chunk_size', '2']
+            )
+
+            # Check results
+            pred, chunk_pred = pd.read_csv(preds_path), pd.read_csv(chunk_preds_path)
+            self.assertEqual(list(chunk_pred.columns), list(pred.columns))
+            self.assertEqual(list(chunk_pred['smiles']), list(pd.read_csv(test_path)['smiles']))
+            invalid = pred['smiles'] == 'invalid'
+            self.assertTrue((chunk_pred.loc[invalid, 'logSolubility'] == 'Invalid SMILES').all())
+            np.testing.assert_allclose(chunk_pred.loc[~invalid, 'logSolubility'].astype(float),
+                                       pred.loc[~invalid, 'logSolubility'].astype(float), rtol=1e-6)
+            self.assertFalse(os.path.exists(f'{chunk_preds_path}.invalid.tmp'))
+
+            # A file without valid SMILES
+            pd.DataFrame({'smiles': ['invalid'] * 3}).to_csv(test_path, index=False)
+            with self.assertRaises(ValueError):
+                self.predict(
+                    dataset_type=dataset_type,
+                    preds_path=os.path.join(save_dir, 'invalid_preds.csv'),
+                    save_dir=save_dir,
+                    flags=['--test_path', test_path, '--chunk_size', '2']
+                )
+
+    def test_predict_resumable(self):
+        """An interrupted resumable prediction job resumes after its last completed chunk"""
+        with TemporaryDirectory() as save_dir:
+            # Train
+            dataset_type = 'regression'
+            self.train(
+                dataset_type=dataset_type,
+                metric='rmse',
+                save_dir=save_dir,
+            )
+
+            preds_path = os.path.join(save_dir, 'preds.csv')
+            self.predict(
+                dataset_type=dataset_type,
+                preds_path=preds_path,
+                save_dir=save_dir,
+            )
+
+            make_predictions_module = import_module('chemprop.train.make_predictions')
+            predict_and_save = make_predictions_module.predict_and_save
+            calls = []
+
+            def interrupted_predict_and_save(*args, **kwargs):
+                calls.append(kwargs['preds_path'])
+                if len(calls) > 2:
+                    raise KeyboardInterrupt
+                return predict_and_save(*args, **kwargs)
+
+            # Interrupt the job during its third chunk
+            resumable_preds_path = os.path.join(save_dir, 'resumable_preds.csv')
+            manifest_path = f'{resumable_preds_path}.manifest.json'
+            shard_dir = f'{resumable_preds_path}.shards'
+            flags = ['--chunk_size', '2', '--resumable']
+            with patch.object(make_predictions_module, 'predict_and_save', interrupted_predict_and_save):
+                with self.assertRaises(KeyboardInterrupt):
+                    self.predict(
+                        dataset_type=dataset_type,
+                        preds_path=resumable_preds_path,
+                        save_dir=save_dir,
+                        flags=flags
+                    )
+
+            self.assertFalse(os.path.exists(resumable_preds_path))
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            self.assertEqual(manifest['job']['test_path'],
+                             os.path.abspath(os.path.join(TEST_DATA_DIR, f'{dataset_type}_test_smiles.csv')))
+            self.assertEqual(len(manifest['job']['checkpoint_paths']), NUM_FOLDS)
+            self.assertEqual(manifest['job']['chunk_size'], 2)
+            self.assertEqual(manifest['completed_chunks'], 2)
+            self.assertEqual(manifest['next_row'], 4)
+            self.assertEqual(manifest['shards'], ['shard-000000.csv', 'shard-000001.csv'])
+            # Only committed shards are left, the shard of the interrupted chunk was never renamed
+            self.assertEqual(sorted(os.listdir(shard_dir)), manifest['shards'])
+            self.assertTrue(calls[0].endswith('.tmp'))
+
+            # A manifest of a different job is rejected
+            with self.assertRaises(ValueError):
+                self.predict(
+                    dataset_type=dataset_type,
+                    preds_path=resumable_preds_path,
+                    save_dir=save_dir,
+                    flags=['--chunk_size', '3', '--resumable']
+                )
+
+            # Resume
+            calls.clear()
+            with patch.object(make_predictions_module, 'predict_and_save',
+                              lambda *args, **kwargs: calls.append(kwargs['preds_path']) or predict_and_save(*args, **kwargs)):
+                self.predict(
+                    dataset_type=dataset_type,
+                    preds_path=resumable_preds_path,
+                    save_dir=save_dir,
+                    flags=flags
+                )
+
+            # Only the remaining chunks are predicted
+            self.assertEqual(len(calls), 3)
+            self.assertFalse(os.path.exists(manifest_path))
+            self.assertFalse(os.path.exists(shard_dir))
+
+            pred, resumable_pred = pd.read_csv(preds_path), pd.read_csv(resumable_preds_path)
+            self.assertEqual(list(resumable_pred.columns), list(pred.columns))
+            self.assertEqual(list(resumable_pred['smiles']), list(pred['smiles']))
+            np.testing.assert_allclose(resumable_pred['logSolubility'], pred['logSolubility'], rtol=1e-6)
+
 
     @parameterized.expand([
         (
@@ -935,6 +1172,41 @@ class ChempropTests(TestCase):
             fingerprints = pd.read_csv(fingerprint_path).drop(["smiles"], axis=1)
             self.assertAlmostEqual(np.sum(fingerprints.to_numpy()), expected_score, delta=DELTA*expected_score)
 
+    def test_fingerprint_quantization(self):
+        """The fingerprints of the quantized models are compared to those of the float models"""
+        with TemporaryDirectory() as save_dir:
+            dataset_type = 'classification'
+            self.train(
+                dataset_type=dataset_type,
+                metric='auc',
+                save_dir=save_dir,
+                flags=['--split_sizes', '0.4', '0.3', '0.3']
+            )
+
+            molecule_fingerprint_module = import_module('chemprop.train.molecule_fingerprint')
+            evaluate_fingerprint_quantization = molecule_fingerprint_module.evaluate_fingerprint_quantization
+            results = []
+
+            def record_evaluate_fingerprint_quantization(*args, **kwargs):
+                results.append(evaluate_fingerprint_quantization(*args, **kwargs))
+                return results[-1]
+
+            fingerprint_path = os.path.join(save_dir, 'fingerprints.csv')
+            with patch.object(molecule_fingerprint_module, 'evaluate_fingerprint_quantization',
+                              record_evaluate_fingerprint_quantization):
+                self.fingerprint(
+                    dataset_type=dataset_type,
+                    checkpoint_dir=save_dir,
+                    fingerprint_path=fingerprint_path,
+                    fingerprint_flags=['--fingerprint_type', 'MPN', '--quantize', '--quantize_eval_path',
+                                       os.path.join(TEST_DATA_DIR, f'{dataset_type}_test_smiles.csv')]
+                )
+
+            self.assertEqual(len(results), 1)
+            self.assertTrue(np.isfinite(results[0]['max_abs_diff']))
+            self.assertLess(results[0]['relative_diff'], 0.1)
+            self.assertTrue(os.path.exists(fingerprint_path))
+
     @parameterized.expand([
         (
                 'chemprop',
@@ -0,0 +1,48 @@
+"""Small regression models and data shared by the Chemprop unit tests of prediction and inference"""
+import os
+from typing import List, Tuple
+
+import torch
+
+from chemprop.args import TrainArgs
+from chemprop.data import MoleculeDataLoader, MoleculeDatapoint, MoleculeDataset
+from chemprop.models import MoleculeModel
+
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+SMILES = ['CCO', 'c1ccccc1O', 'CC(=O)O', 'C[N+](C)(C)[O-]', 'CCN', 'C', 'ClC(Cl)Cl']
+
+
+def make_args(extra_args: List[str] = None) -> TrainArgs:
+    """Parses the arguments of a small regression model with two tasks."""
+    args = TrainArgs().parse_args([
+        '--data_path', os.path.join(TEST_DATA_DIR, 'regression.csv'),
+        '--dataset_type', 'regression',
+        '--hidden_size', '20',
+        '--ffn_hidden_size', '10',
+    ] + (extra_args if extra_args is not None else []))
+    args.task_names = ['task_0', 'task_1']
+
+    return args
+
+
+def make_model(args: TrainArgs, seed: int = 0) -> MoleculeModel:
+    """Builds a model in evaluation mode with weights initialized from a seed."""
+    torch.manual_seed(seed)
+
+    return MoleculeModel(args).eval()
+
+
+def make_data_loader() -> Tuple[MoleculeDataset, MoleculeDataLoader]:
+    """Builds a dataset of :code:`SMILES` and a data loader over it in batches of three molecules."""
+    data = MoleculeDataset([MoleculeDatapoint([smiles]) for smiles in SMILES])
+
+    return data, MoleculeDataLoader(data, batch_size=3, num_workers=0)
+
+
+def make_model_and_loader(extra_args: List[str] = None) -> Tuple[TrainArgs, MoleculeModel, MoleculeDataset,
+                                                                 MoleculeDataLoader]:
+    """Builds the arguments, a model, a dataset and a data loader for a test."""
+    args = make_args(extra_args)
+
+    return (args, make_model(args)) + make_data_loader()
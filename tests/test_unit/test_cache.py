@@ -0,0 +1,55 @@
+"""Chemprop unit tests for chemprop/data/cache.py"""
+from unittest import TestCase
+
+from chemprop.data import LRUCache
+
+
+class TestLRUCache(TestCase):
+    """
+    Tests of the memory-bounded LRU cache.
+    """
+
+    def setUp(self):
+        self.cache = LRUCache(sizeof=len, max_bytes=10)
+
+    def test_eviction(self):
+        """The least recently used entries are evicted once the budget is exceeded"""
+        self.cache['a'] = 'xxxx'
+        self.cache['b'] = 'xxxx'
+        self.assertEqual(self.cache.get('a'), 'xxxx')
+        self.cache['c'] = 'xxxx'
+        self.assertNotIn('b', self.cache)
+        self.assertIn('a', self.cache)
+        self.assertEqual(self.cache.nbytes, 8)
+        self.assertEqual(self.cache.stats(), {'entries': 2, 'nbytes': 8, 'max_bytes': 10,
+                                              'hits': 1, 'misses': 0, 'evictions': 1})
+
+    def test_hits_and_misses(self):
+        """Lookups are counted and misses return the default"""
+        self.cache['a'] = 'x'
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache['a'], 'x')
+        with self.assertRaises(KeyError):
+            self.cache['b']
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_oversized_value(self):
+        """A value larger than the whole budget is not cached"""
+        self.cache['a'] = 'x'
+        self.cache['b'] = 'x' * 11
+        self.assertNotIn('b', self.cache)
+        self.assertIn('a', self.cache)
+
+    def test_resize(self):
+        """Shrinking the budget evicts right away and None makes the cache unbounded"""
+        for key in 'abcde':
+            self.cache[key] = 'xx'
+        self.cache.resize(4)
+        self.assertEqual(len(self.cache), 2)
+        self.assertIn('e', self.cache)
+        self.cache.resize(None)
+        for key in 'fghij':
+            self.cache[key] = 'xxxxx'
+        self.assertEqual(len(self.cache), 7)
+        self.cache.clear()
+        self.assertEqual((len(self.cache), self.cache.nbytes), (0, 0))
@@ -1,4 +1,5 @@
 """Chemprop unit tests for chemprop/data/utils.py"""
+import gzip
 import os
 from unittest import TestCase
 from unittest.mock import patch
@@ -6,8 +7,10 @@ from tempfile import TemporaryDirectory
 
 import numpy as np
 
+from chemprop.features import load_features
 from chemprop.data import get_header, preprocess_smiles_columns, get_task_names, get_mixed_task_names, \
-    get_data_weights, get_smiles, filter_invalid_smiles, MoleculeDataset, MoleculeDatapoint, get_data, split_data
+    get_data_weights, get_smiles, filter_invalid_smiles, MoleculeDataset, MoleculeDatapoint, get_data, get_data_chunks, \
+    split_data, StandardScaler
 
 
 class TestGetHeader(TestCase):
@@ -472,6 +475,160 @@ class TestGetData(TestCase):
                 phase_features_path='dummy_path.csv'
             )
 
+    def test_featurization_workers(self):
+        """Testing that datapoints built in worker processes are the same and in order"""
+        serial_data = get_data(
+            path=self.data_path,
+            smiles_columns=['column0', 'column1'],
+            features_generator=['morgan'],
+        )
+        parallel_data = get_data(
+            path=self.data_path,
+            smiles_columns=['column0', 'column1'],
+            features_generator=['morgan'],
+            featurization_workers=2,
+        )
+        self.assertEqual(parallel_data.smiles(), serial_data.smiles())
+        self.assertEqual(parallel_data.targets(), serial_data.targets())
+        self.assertTrue(np.array_equal(parallel_data.features(), serial_data.features()))
+        self.assertIs(parallel_data[0].is_mol_list, serial_data[0].is_mol_list)
+
+    def test_compressed(self):
+        """Testing that gzip-compressed data files are read like uncompressed ones"""
+        gzip_path = os.path.join(self.temp_dir.name, 'data.csv.gz')
+        with open(self.data_path, 'rb') as f, gzip.open(gzip_path, 'wb') as gzip_f:
+            gzip_f.write(f.read())
+        data, gzip_data = get_data(path=self.data_path), get_data(path=gzip_path)
+        self.assertEqual(gzip_data.smiles(), data.smiles())
+        self.assertEqual(gzip_data.targets(), data.targets())
+
+    def test_missing_targets_and_inequalities(self):
+        """Testing that missing targets are None and that inequalities require the bounded_mse loss"""
+        with open(self.data_path, 'w') as f:
+            f.write('column0,column1,column2,column3\nC,CC,,>1.5\nCC,CN,nan,2\nO,CO,3,<-4')
+        with self.assertRaises(ValueError):
+            get_data(path=self.data_path)
+
+        data = get_data(path=self.data_path, loss_function='bounded_mse')
+        self.assertEqual(data.targets(), [[None, 1.5], [None, 2.0], [3.0, -4.0]])
+        self.assertEqual(data.gt_targets(), [[False, True], [False, False], [False, False]])
+        self.assertEqual(data.lt_targets(), [[False, False], [False, False], [False, True]])
+        self.assertEqual(len(get_data(path=self.data_path, loss_function='bounded_mse', target_columns=['column2'],
+                                      skip_none_targets=True)), 1)
+
+    def test_compact_features(self):
+        """Testing that the features are float32 views of one matrix and that the flags are shared"""
+        data = get_data(
+            path=self.data_path,
+            smiles_columns=['column0', 'column1'],
+            features_generator=['morgan'],
+        )
+        matrix = data[0].features.base
+        self.assertIsNotNone(matrix)
+        for d in data:
+            self.assertEqual(d.features.dtype, np.float32)
+            self.assertIs(d.features.base, matrix)
+            self.assertIs(d.raw_features, d.features)
+            self.assertIs(d.is_reaction_list, data[0].is_reaction_list)
+            self.assertFalse(hasattr(d, '__dict__'))
+
+    def test_memory_mapped_float64_features(self):
+        """Testing that the rows of a float64 .npy features file stay memory-mapped and are read as float32"""
+        features_path = os.path.join(self.temp_dir.name, 'features.npy')
+        np.save(features_path, np.array([[0., 1.5], [np.nan, 2.], [3., -4.]]))
+        data = get_data(
+            path=self.data_path,
+            smiles_columns=['column0', 'column1'],
+            features_path=[features_path],
+        )
+        for d in data:
+            self.assertIsInstance(d.features, np.memmap)
+            self.assertIsInstance(d.raw_features, np.memmap)
+
+        features = data.features()
+        for row in features:
+            self.assertEqual(row.dtype, np.float32)
+        np.testing.assert_array_equal(np.stack(features), [[0., 1.5], [0., 2.], [3., -4.]])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+class TestNormalizeFeatures(TestCase):
+    """
+    Tests for MoleculeDataset.normalize_features.
+    """
+
+    def setUp(self):
+        self.features = np.array([[0., 1.], [2., 3.], [4., 8.]])
+        self.data = MoleculeDataset([
+            MoleculeDatapoint(smiles=['C'], features=features) for features in self.features
+        ])
+
+    def test_fit_and_transform(self):
+        """Testing that the features are scaled as by the fitted scaler"""
+        scaler = self.data.normalize_features(replace_nan_token=0)
+        np.testing.assert_allclose(scaler.means, self.features.mean(axis=0), rtol=1e-6)
+        np.testing.assert_allclose(np.array(self.data.features()), scaler.transform(self.features), rtol=1e-6)
+        np.testing.assert_array_equal(self.data[0].raw_features, self.features[0])
+
+    def test_cached_scaling(self):
+        """Testing that scaling again with an identical scaler reuses the scaled features"""
+        scaler = self.data.normalize_features(replace_nan_token=0)
+        scaled = self.data[1].features
+        self.data.reset_features_and_targets()
+        self.data.normalize_features(StandardScaler(np.copy(scaler.means), np.copy(scaler.stds), 0))
+        self.assertIs(self.data[1].features, scaled)
+
+        self.data.reset_features_and_targets()
+        self.data.normalize_features(StandardScaler(np.zeros(2), np.ones(2), 0))
+        np.testing.assert_array_equal(np.array(self.data.features()), self.features)
+
+
+class TestGetDataChunks(TestCase):
+    """
+    Tests for the get_data_chunks function.
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.data_path = os.path.join(self.temp_dir.name, 'data.csv')
+        with open(self.data_path, 'w') as f:
+            f.write('smiles,extra\nC,0\nCC,1\nxx,2\nO,3\nCO,4')
+
+    def test_chunks(self):
+        """Testing that the chunks cover the rows in order, including invalid SMILES"""
+        chunks = list(get_data_chunks(path=self.data_path, chunk_size=2, store_row=True))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual([smiles for chunk in chunks for smiles in chunk.smiles(flatten=True)],
+                         ['C', 'CC', 'xx', 'O', 'CO'])
+        self.assertEqual(chunks[1][1].row['extra'], '3')
+
+    def test_start_row(self):
+        """Testing that reading starts from the given row"""
+        chunks = list(get_data_chunks(path=self.data_path, chunk_size=2, start_row=3))
+        self.assertEqual([chunk.smiles(flatten=True) for chunk in chunks], [['O', 'CO']])
+
+    def test_features(self):
+        """Testing that the features follow the row numbers and that only the rows of each chunk are loaded"""
+        features_path = os.path.join(self.temp_dir.name, 'features.csv')
+        np.savetxt(features_path, np.arange(5.).reshape(-1, 1), delimiter=',', header='feature', comments='')
+        with patch('chemprop.data.utils.load_features', wraps=load_features) as mock_load_features:
+            chunks = list(get_data_chunks(path=self.data_path, chunk_size=3, features_path=[features_path], start_row=1))
+        self.assertTrue(np.array_equal(chunks[0].features(), [[1], [2], [3]]))
+        self.assertTrue(np.array_equal(chunks[1].features(), [[4]]))
+        self.assertEqual([call[1] for call in mock_load_features.call_args_list],
+                         [dict(start_row=1, end_row=4), dict(start_row=4, end_row=5)])
+
+    def test_features_npz(self):
+        """Testing that features files which cannot be read partially are loaded once and sliced for each chunk"""
+        features_path = os.path.join(self.temp_dir.name, 'features.npz')
+        np.savez_compressed(features_path, features=np.arange(5.).reshape(-1, 1))
+        with patch('chemprop.data.utils.load_features', wraps=load_features) as mock_load_features:
+            chunks = list(get_data_chunks(path=self.data_path, chunk_size=2, features_path=[features_path], start_row=1))
+        self.assertEqual([np.array(chunk.features()).tolist() for chunk in chunks], [[[1], [2]], [[3], [4]]])
+        self.assertEqual(mock_load_features.call_count, 1)
+
     def tearDown(self):
         self.temp_dir.cleanup()
 
@@ -0,0 +1,83 @@
+"""Chemprop unit tests for chemprop/train/distill.py"""
+import csv
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import numpy as np
+
+from chemprop.args import DistillArgs
+from chemprop.train import predict
+from chemprop.train.distill import ensemble_soft_targets, save_soft_targets
+from chemprop.utils import save_checkpoint
+from model_utils import TEST_DATA_DIR, make_args, make_data_loader, make_model
+
+
+class TestEnsembleSoftTargets(TestCase):
+    """
+    Tests the mean and the variance of the ensemble predictions used as soft targets.
+    """
+
+    def test_mve_ensemble(self):
+        """The variance is the mean predicted variance plus the variance of the predictions"""
+        args = make_args(['--loss_function', 'mve', '--no_cuda'])
+        data, data_loader = make_data_loader()
+
+        with TemporaryDirectory() as temp_dir:
+            paths, all_preds, all_vars = [], [], []
+            for seed in range(3):
+                model = make_model(args, seed)
+                preds, var = predict(model, data_loader, return_unc_parameters=True)
+                all_preds.append(preds)
+                all_vars.append(var)
+                paths.append(os.path.join(temp_dir, f'model_{seed}.pt'))
+                save_checkpoint(paths[-1], model, None, None, None, None, None, args)
+
+            distill_args = DistillArgs().parse_args([
+                '--data_path', os.path.join(TEST_DATA_DIR, 'regression.csv'),
+                '--dataset_type', 'regression',
+                '--loss_function', 'mve',
+                '--teacher_checkpoint_paths', *paths,
+                '--batch_size', '3',
+                '--no_cuda',
+            ])
+            means, variances = ensemble_soft_targets(distill_args, data)
+
+        np.testing.assert_allclose(means, np.mean(all_preds, axis=0), atol=1e-6)
+        np.testing.assert_allclose(variances, np.mean(all_vars, axis=0) + np.var(all_preds, axis=0), atol=1e-6)
+
+
+class TestSaveSoftTargets(TestCase):
+    """
+    Tests the CSV files of soft targets.
+    """
+
+    def load_targets(self, path):
+        with open(path) as f:
+            rows = list(csv.reader(f))
+        return rows[0], rows[1:]
+
+    def test_means(self):
+        """Without standard deviations, each molecule is saved once with its means"""
+        with TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'targets.csv')
+            save_soft_targets(path, [['CCO'], ['X'], ['C']], [np.array([1.0, 2.0]), None, np.array([3.0, 4.0])],
+                              None, ['smiles'], ['a', 'b'])
+            header, rows = self.load_targets(path)
+
+        self.assertEqual(header, ['smiles', 'a', 'b'])
+        self.assertEqual(rows, [['CCO', '1.0', '2.0'], ['X', '', ''], ['C', '3.0', '4.0']])
+
+    def test_moments(self):
+        """With standard deviations, the two copies of each molecule have the mean and variance of the ensemble"""
+        means = [np.array([1.0, -2.0]), np.array([0.5, 3.0])]
+        stds = [np.array([0.5, 2.0]), np.array([0.0, 1.0])]
+        with TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'targets.csv')
+            save_soft_targets(path, [['CCO'], ['C']], means, stds, ['smiles'], ['a', 'b'])
+            _, rows = self.load_targets(path)
+
+        self.assertEqual([row[0] for row in rows], ['CCO', 'C', 'CCO', 'C'])
+        targets = np.array([row[1:] for row in rows], dtype=float).reshape(2, 2, 2)
+        np.testing.assert_allclose(targets.mean(axis=0), means)
+        np.testing.assert_allclose(targets.std(axis=0), stds)
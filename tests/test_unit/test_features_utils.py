@@ -0,0 +1,68 @@
+"""Chemprop unit tests for chemprop/features/utils.py"""
+import os
+import pickle
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+
+from chemprop.features import load_features, stack_features
+
+
+class TestLoadFeatures(TestCase):
+    """
+    Tests that every format of features loads the same rows.
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.features = np.array([[0., 1.5, 0.], [2., 0., 0.], [0., 0., -3.], [4., 5., 6.]])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def save(self, extension):
+        path = os.path.join(self.temp_dir.name, f'features{extension}')
+        if extension == '.npy':
+            np.save(path, self.features)
+        elif extension == '.npz':
+            np.savez_compressed(path, features=self.features)
+        elif extension == '.csv':
+            np.savetxt(path, self.features, delimiter=',', header='a,b,c', comments='')
+        else:
+            with open(path, 'wb') as f:
+                pickle.dump([csr_matrix(row) for row in self.features], f)
+
+        return path
+
+    def test_formats(self):
+        """All formats load all rows or a range of rows"""
+        for extension in ['.npy', '.npz', '.csv', '.pkl']:
+            path = self.save(extension)
+            np.testing.assert_array_equal(load_features(path), self.features)
+            np.testing.assert_array_equal(load_features(path, start_row=1, end_row=3), self.features[1:3])
+            np.testing.assert_array_equal(load_features(path, start_row=2), self.features[2:])
+
+    def test_npy_memory_mapped(self):
+        """.npy features are memory-mapped"""
+        features = load_features(self.save('.npy'))
+        self.assertIsInstance(features, np.memmap)
+
+    def test_sparse(self):
+        """Pickled sparse features stay sparse when requested"""
+        features = load_features(self.save('.pkl'), start_row=1, sparse=True)
+        self.assertTrue(issparse(features))
+        np.testing.assert_array_equal(features.toarray(), self.features[1:])
+
+
+class TestStackFeatures(TestCase):
+    """
+    Tests the stacking of the features of a batch.
+    """
+
+    def test_dense_and_sparse(self):
+        """Dense and sparse rows are stacked into the same dense array"""
+        features = np.array([[0., 1.], [2., 0.]])
+        np.testing.assert_array_equal(stack_features(list(features)), features)
+        np.testing.assert_array_equal(stack_features([csr_matrix(row) for row in features]), features)
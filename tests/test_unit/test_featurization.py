@@ -0,0 +1,95 @@
+"""Chemprop unit tests for chemprop/features/featurization.py"""
+from unittest import TestCase
+
+import numpy as np
+from rdkit import Chem
+import torch
+
+from chemprop.features import BatchMolGraph, MolGraph, atom_features, bond_features
+from chemprop.features.featurization import atom_features_array, bond_features_array
+
+
+SMILES = ['CCO', 'c1ccccc1O', 'C[C@H](N)C(=O)O', 'F/C=C/F', 'C[N+](C)(C)[O-]', 'N->[Pt+2]<-N', '[Na+].[Cl-]', 'C']
+
+
+class TestFeatureArrays(TestCase):
+    """
+    Tests that the array featurization matches the list-based atom and bond features.
+    """
+
+    def test_atom_features_array(self):
+        """Each row matches atom_features"""
+        for smiles in SMILES:
+            atoms = list(Chem.MolFromSmiles(smiles).GetAtoms())
+            expected = np.array([atom_features(atom) for atom in atoms], dtype=np.float32)
+            np.testing.assert_array_equal(atom_features_array(atoms), expected)
+
+    def test_bond_features_array(self):
+        """Each row matches bond_features"""
+        for smiles in SMILES:
+            bonds = list(Chem.MolFromSmiles(smiles).GetBonds())
+            features = bond_features_array(bonds)
+            self.assertEqual(features.shape[0], len(bonds))
+            for row, bond in zip(features, bonds):
+                np.testing.assert_array_equal(row, np.array(bond_features(bond), dtype=np.float32))
+
+
+class TestMolGraph(TestCase):
+    """
+    Tests of the MolGraph graph structure.
+    """
+
+    def test_bond_order_and_mappings(self):
+        """Bonds are ordered by atom pair and the index mappings are consistent"""
+        mol_graph = MolGraph('OCC(C)N')  # bonds: O-C1, C1-C2, C2-C3, C2-N4
+        self.assertEqual(mol_graph.n_atoms, 5)
+        self.assertEqual(mol_graph.n_bonds, 8)
+        self.assertEqual(mol_graph.b2a.tolist(), [0, 1, 1, 2, 2, 3, 2, 4])
+        self.assertEqual(mol_graph.b2revb.tolist(), [1, 0, 3, 2, 5, 4, 7, 6])
+        self.assertEqual([in_bonds.tolist() for in_bonds in mol_graph.a2b], [[1], [0, 3], [2, 5, 7], [4], [6]])
+        self.assertEqual(mol_graph.f_atoms.dtype, np.float32)
+        self.assertEqual(mol_graph.b2a.dtype, np.int32)
+
+    def test_extra_features(self):
+        """Extra atom and bond features are appended to the default features"""
+        mol = Chem.MolFromSmiles('CCO')
+        atom_extra = np.arange(6).reshape(3, 2)
+        bond_extra = np.array([[10.], [20.]])
+        mol_graph = MolGraph(mol, atom_extra, bond_extra)
+        np.testing.assert_array_equal(mol_graph.f_atoms[:, -2:], atom_extra)
+        np.testing.assert_array_equal(mol_graph.f_bonds[:, -1], [10., 10., 20., 20.])
+
+    def test_extra_features_wrong_length(self):
+        """Extra features must have one row per atom or bond"""
+        mol = Chem.MolFromSmiles('CCO')
+        with self.assertRaises(ValueError):
+            MolGraph(mol, atom_features_extra=np.zeros((2, 1)))
+        with self.assertRaises(ValueError):
+            MolGraph(mol, bond_features_extra=np.zeros((3, 1)))
+
+
+class TestBatchMolGraph(TestCase):
+    """
+    Tests of the BatchMolGraph collation.
+    """
+
+    def test_collation(self):
+        """Per-molecule indices are shifted past the zero padding and the previous molecules"""
+        batch = BatchMolGraph([MolGraph('CO'), MolGraph('[Na+]'), MolGraph('CCN')])
+        f_atoms, f_bonds, a2b, b2a, b2revb, a_scope, b_scope = batch.get_components()
+        self.assertEqual(a_scope, [(1, 2), (3, 1), (4, 3)])
+        self.assertEqual(b_scope, [(1, 2), (3, 0), (3, 4)])
+        self.assertEqual(f_atoms.shape, (7, batch.atom_fdim))
+        self.assertEqual(f_bonds.shape, (7, batch.bond_fdim))
+        self.assertEqual(f_atoms.dtype, torch.float32)
+        self.assertTrue(torch.all(f_atoms[0] == 0))
+        self.assertEqual(b2a.tolist(), [0, 1, 2, 4, 5, 5, 6])
+        self.assertEqual(b2revb.tolist(), [0, 2, 1, 4, 3, 6, 5])
+        self.assertEqual(a2b.tolist(), [[0, 0], [2, 0], [1, 0], [0, 0], [4, 0], [3, 6], [5, 0]])
+
+    def test_no_bonds(self):
+        """A batch without any bonds still has a padded a2b"""
+        batch = BatchMolGraph([MolGraph('C'), MolGraph('[Na+]')])
+        self.assertEqual(batch.max_num_bonds, 1)
+        self.assertEqual(batch.a2b.tolist(), [[0], [0], [0]])
+        self.assertEqual(batch.b2a.tolist(), [0])
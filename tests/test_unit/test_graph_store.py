@@ -0,0 +1,153 @@
+"""Chemprop unit tests for chemprop/data/graph_store.py"""
+import hashlib
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+
+from chemprop.data import MoleculeDatapoint, MoleculeDataset, MolGraphStore, \
+    empty_cache, featurization_key, set_graph_store
+from chemprop.data.data import SMILES_TO_GRAPH
+from chemprop.data.graph_store import FEATURIZATION_KEYS
+from chemprop.features import BatchMolGraph, MolGraph, set_explicit_h
+
+
+SMILES = ['CCO', 'c1ccccc1O', '[Na+].[Cl-]', 'C']
+
+
+class TestMolGraphStore(TestCase):
+    """
+    Tests of the on-disk graph store.
+    """
+
+    def setUp(self):
+        # Graphs cached in memory by other tests would not be read from or written to the store
+        empty_cache()
+        self.temp_dir = TemporaryDirectory()
+
+    def tearDown(self):
+        set_graph_store(None)
+        empty_cache()
+        self.temp_dir.cleanup()
+
+    def test_round_trip(self):
+        """Stored graphs are read back from a new store with the same featurization"""
+        store = MolGraphStore(self.temp_dir.name, flush_size=3)
+        for smiles in SMILES:
+            store.put(smiles, MolGraph(smiles))
+        store.flush()
+        self.assertEqual(len(os.listdir(os.path.join(self.temp_dir.name, featurization_key()))), 3)
+
+        store = MolGraphStore(self.temp_dir.name)
+        self.assertEqual(len(store), len(SMILES))
+        self.assertIsNone(store.get('CCN'))
+        for smiles in SMILES:
+            expected, stored = MolGraph(smiles), store.get(smiles)
+            self.assertEqual(stored.n_atoms, expected.n_atoms)
+            np.testing.assert_array_equal(stored.f_atoms, expected.f_atoms)
+            np.testing.assert_array_equal(stored.f_bonds, expected.f_bonds)
+            np.testing.assert_array_equal(stored.b2a, expected.b2a)
+            np.testing.assert_array_equal(stored.b2br, expected.b2br)
+            self.assertEqual([b.tolist() for b in stored.a2b], [b.tolist() for b in expected.a2b])
+
+        expected, stored = BatchMolGraph([MolGraph(s) for s in SMILES]), BatchMolGraph([store.get(s) for s in SMILES])
+        for expected_component, stored_component in zip(expected.get_components(), stored.get_components()):
+            if isinstance(expected_component, list):
+                self.assertEqual(stored_component, expected_component)
+            else:
+                self.assertTrue(expected_component.equal(stored_component))
+
+    def test_featurization_key(self):
+        """Graphs built with other featurization settings are not returned"""
+        store = MolGraphStore(self.temp_dir.name)
+        store.put('CCO', MolGraph('CCO'))
+        self.assertIsNone(store.get('CCO', atom_bond_targets=True))
+        set_explicit_h(True)
+        try:
+            self.assertIsNone(store.get('CCO'))
+        finally:
+            set_explicit_h(False)
+        self.assertIsNotNone(store.get('CCO'))
+
+    def test_featurization_key_cached(self):
+        """The featurization parameters are only hashed again once they change"""
+        FEATURIZATION_KEYS.clear()
+        store = MolGraphStore(self.temp_dir.name)
+        store.put('CCO', MolGraph('CCO'))
+        with patch('chemprop.data.graph_store.hashlib.sha1', wraps=hashlib.sha1) as sha1:
+            for smiles in SMILES:
+                store.get(smiles)
+            self.assertEqual(sha1.call_count, 0)
+            set_explicit_h(True)
+            try:
+                key = featurization_key()
+            finally:
+                set_explicit_h(False)
+            self.assertEqual(sha1.call_count, 1)
+        self.assertNotEqual(key, featurization_key())
+
+    def test_compaction(self):
+        """Many small segments are merged into one, and stores that opened them still read their graphs"""
+        smiles_list = ['C' * n for n in range(1, 11)] + ['c1ccccc1O', '[Na+].[Cl-]']
+        store = MolGraphStore(self.temp_dir.name, compact_segments=4)
+        for smiles in smiles_list[:2]:
+            store.put(smiles, MolGraph(smiles))
+            store.flush()
+        reader = MolGraphStore(self.temp_dir.name)
+        self.assertEqual(len(reader), 2)
+
+        for smiles in smiles_list[2:]:
+            store.put(smiles, MolGraph(smiles))
+            store.flush()
+        featurization_path = os.path.join(self.temp_dir.name, featurization_key())
+        segments = [name for name in os.listdir(featurization_path) if name.startswith('segment-')]
+        self.assertLess(len(segments), 4)
+        self.assertFalse(os.path.exists(os.path.join(featurization_path, 'compact.lock')))
+
+        for smiles in smiles_list[:2]:
+            np.testing.assert_array_equal(reader.get(smiles).f_atoms, MolGraph(smiles).f_atoms)
+        for opened in [store, MolGraphStore(self.temp_dir.name)]:
+            self.assertEqual(len(opened), len(smiles_list))
+            for smiles in smiles_list:
+                expected, stored = MolGraph(smiles), opened.get(smiles)
+                np.testing.assert_array_equal(stored.f_atoms, expected.f_atoms)
+                np.testing.assert_array_equal(stored.f_bonds, expected.f_bonds)
+                np.testing.assert_array_equal(stored.b2a, expected.b2a)
+                np.testing.assert_array_equal(stored.b2revb, expected.b2revb)
+
+    def test_compaction_lock_released(self):
+        """A compaction lock released while its age is checked is taken again"""
+        store = MolGraphStore(self.temp_dir.name, compact_segments=2)
+        store.put('C', MolGraph('C'))
+        store.flush()
+        featurization_path = os.path.join(self.temp_dir.name, featurization_key())
+        lock_path = os.path.join(featurization_path, 'compact.lock')
+        open(lock_path, 'w').close()
+
+        def release_lock(path):
+            os.remove(lock_path)
+            raise FileNotFoundError(path)
+
+        store.put('CC', MolGraph('CC'))
+        with patch('os.path.getmtime', side_effect=release_lock) as getmtime:
+            store.flush()
+        self.assertEqual(getmtime.call_count, 1)
+        segments = [name for name in os.listdir(featurization_path) if name.startswith('segment-')]
+        self.assertEqual(len(segments), 1)
+        self.assertFalse(os.path.exists(lock_path))
+
+    def test_batch_graph(self):
+        """MoleculeDataset reads graphs from the global store and writes the missing ones"""
+        set_graph_store(self.temp_dir.name)
+        MoleculeDataset([MoleculeDatapoint([s]) for s in SMILES[:2]]).batch_graph()
+        set_graph_store(self.temp_dir.name)
+        empty_cache()
+
+        store = MolGraphStore(self.temp_dir.name)
+        self.assertEqual(len(store), 2)
+        dataset = MoleculeDataset([MoleculeDatapoint([s]) for s in SMILES])
+        batch = dataset.batch_graph()[0]
+        self.assertTrue(batch.f_atoms.equal(BatchMolGraph([MolGraph(s) for s in SMILES]).f_atoms))
+        self.assertIsInstance(SMILES_TO_GRAPH['CCO'].f_atoms, np.memmap)
@@ -0,0 +1,74 @@
+"""Chemprop unit tests for chemprop/models/inference.py"""
+from importlib.util import find_spec
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipUnless
+
+import numpy as np
+import torch
+
+from chemprop.data import StandardScaler
+from chemprop.models import inference_inputs
+from chemprop.train import predict
+from chemprop.utils import load_onnx_checkpoint, save_checkpoint, script_checkpoint
+from model_utils import make_model_and_loader
+
+
+class TestScriptCheckpoint(TestCase):
+    """
+    Tests that the TorchScript inference model gives the predictions of the checkpoint.
+    """
+
+    def assert_scripted_predictions(self, extra_args):
+        args, model, data, data_loader = make_model_and_loader(['--no_cuda'] + extra_args)
+        scaler = StandardScaler(np.array([1.0, -2.0]), np.array([0.5, 3.0]))
+        if args.loss_function == 'mve':
+            expected = np.concatenate(predict(model, data_loader, scaler=scaler, return_unc_parameters=True), axis=1)
+        else:
+            expected = predict(model, data_loader, scaler=scaler)
+
+        with TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'model.pt')
+            save_checkpoint(path, model, scaler, None, None, None, None, args)
+            script_checkpoint(path, save_path=os.path.join(temp_dir, 'model.ts'))
+            scripted_model = torch.jit.load(os.path.join(temp_dir, 'model.ts'))
+
+        inputs = inference_inputs(data.batch_graph()[0], atom_messages=args.atom_messages)
+        with torch.no_grad():
+            preds = scripted_model(*inputs)
+        np.testing.assert_allclose(preds.numpy(), expected, atol=1e-5)
+
+    def test_regression(self):
+        """The scripted model gives the unscaled predictions"""
+        self.assert_scripted_predictions([])
+
+    def test_atom_messages(self):
+        """The scripted model supports atom messages and mean aggregation"""
+        self.assert_scripted_predictions(['--atom_messages', '--aggregation', 'mean'])
+
+    def test_mve(self):
+        """The scripted model scales the predicted variances"""
+        self.assert_scripted_predictions(['--loss_function', 'mve'])
+
+
+@skipUnless(find_spec('onnx') and find_spec('onnxruntime'), 'onnx and onnxruntime are not installed')
+class TestOnnx(TestCase):
+    """
+    Tests that the onnxruntime backend gives the predictions of the checkpoint.
+    """
+
+    def test_load_onnx_checkpoint(self):
+        """The exported model gives the unscaled predictions on batches of any size"""
+        args, model, _, data_loader = make_model_and_loader(['--loss_function', 'mve', '--no_cuda'])
+        scaler = StandardScaler(np.array([1.0, -2.0]), np.array([0.5, 3.0]))
+        expected = predict(model, data_loader, scaler=scaler, return_unc_parameters=True)
+
+        with TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'model.pt')
+            save_checkpoint(path, model, scaler, None, None, None, None, args)
+            onnx_model = load_onnx_checkpoint(path)
+            self.assertTrue(os.path.exists(path + '.onnx'))
+
+        preds = predict(onnx_model, data_loader, return_unc_parameters=True)
+        for values, expected_values in zip(preds, expected):
+            np.testing.assert_allclose(values, expected_values, atol=1e-5)
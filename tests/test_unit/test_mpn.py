@@ -0,0 +1,84 @@
+"""Chemprop unit tests for chemprop/models/mpn.py"""
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+import torch
+
+from chemprop.args import TrainArgs
+from chemprop.features import get_atom_fdim, get_bond_fdim, mol2graph
+from chemprop.models.mpn import MPNEncoder
+
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+SMILES = ['CCO', 'c1ccccc1O', 'F[S](F)(F)(F)(F)F', 'C[N+](C)(C)[O-]', 'N->[Pt+2]<-N', '[Na+].[Cl-]', 'C']
+
+
+class TestMessageAggregation(TestCase):
+    """
+    Tests that the sparse message aggregation matches the dense one.
+    """
+
+    def encode(self, message_aggregation: str, atom_messages: bool) -> torch.Tensor:
+        args = TrainArgs().parse_args([
+            '--data_path', os.path.join(TEST_DATA_DIR, 'regression.csv'),
+            '--dataset_type', 'regression',
+            '--message_aggregation', message_aggregation,
+            '--bias',
+            '--depth', '4',
+        ] + (['--atom_messages'] if atom_messages else []))
+        torch.manual_seed(0)
+        encoder = MPNEncoder(args, get_atom_fdim(), get_bond_fdim(atom_messages=atom_messages)).eval()
+
+        return encoder(mol2graph(SMILES))
+
+    def test_bond_messages(self):
+        """Bond messages give the same molecule encodings"""
+        self.assertTrue(torch.allclose(self.encode('sparse', False), self.encode('dense', False), atol=1e-6))
+
+    def test_atom_messages(self):
+        """Atom messages give the same molecule encodings"""
+        self.assertTrue(torch.allclose(self.encode('sparse', True), self.encode('dense', True), atol=1e-6))
+
+
+class TestReadout(TestCase):
+    """
+    Tests of the segment readout of atom hidden states into molecule vectors.
+    """
+
+    def make_encoder(self, aggregation: str) -> MPNEncoder:
+        args = TrainArgs().parse_args([
+            '--data_path', os.path.join(TEST_DATA_DIR, 'regression.csv'),
+            '--dataset_type', 'regression',
+            '--aggregation', aggregation,
+            '--aggregation_norm', '7',
+        ])
+        torch.manual_seed(0)
+
+        return MPNEncoder(args, get_atom_fdim(), get_bond_fdim()).eval()
+
+    def test_mean_sum_norm(self):
+        """The readout matches a per-molecule reduction, with zero vectors for molecules without atoms"""
+        mol_graph = mol2graph(SMILES + [''])
+        atom_hiddens = torch.randn(mol_graph.n_atoms, 5)
+        for aggregation, divide in [('mean', None), ('sum', 1), ('norm', 7)]:
+            mol_vecs = self.make_encoder(aggregation).readout(atom_hiddens, mol_graph.a2m, len(mol_graph.a_scope))
+            for mol_vec, (a_start, a_size) in zip(mol_vecs, mol_graph.a_scope):
+                expected = atom_hiddens.narrow(0, a_start, a_size).sum(dim=0) / (divide or max(a_size, 1))
+                self.assertTrue(torch.allclose(mol_vec, expected, atol=1e-6))
+
+    def test_attention(self):
+        """Attention pooling of identical atoms is their mean"""
+        encoder = self.make_encoder('attention')
+        mol_graph = mol2graph(['CC', 'CCCC'])
+        atom_hiddens = torch.ones(mol_graph.n_atoms, encoder.hidden_size)
+        mol_vecs = encoder.readout(atom_hiddens, mol_graph.a2m, len(mol_graph.a_scope))
+        self.assertTrue(torch.allclose(mol_vecs, torch.ones_like(mol_vecs)))
+        self.assertEqual(tuple(encoder(mol_graph).shape), (2, encoder.hidden_size))
+
+    def test_attention_old_torch(self):
+        """Attention pooling is rejected before PyTorch 1.12, which lacks scatter_reduce"""
+        with patch('torch.__version__', '1.11.0'):
+            with self.assertRaises(ValueError):
+                self.make_encoder('attention')
+            self.make_encoder('weighted')
@@ -0,0 +1,117 @@
+"""Chemprop unit tests for chemprop/data/packed.py"""
+import os
+import warnings
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import numpy as np
+
+from chemprop.args import PreprocessArgs, TrainArgs
+from chemprop.data import get_data, get_header, get_task_names, graph_store, is_packed_dataset, \
+    set_cache_graph, set_graph_store
+from chemprop.train import preprocess
+
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+class TestPackedDataset(TestCase):
+    """
+    Tests that a packed dataset loads the same datapoints as its CSV file.
+    """
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.packed_path = os.path.join(self.temp_dir.name, 'packed')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def pack(self, data_path, extra_args=()):
+        preprocess(PreprocessArgs().parse_args([
+            '--data_path', data_path,
+            '--save_dir', self.packed_path,
+        ] + list(extra_args)))
+
+    def assert_same_data(self, packed_data, csv_data):
+        self.assertEqual(packed_data.smiles(), csv_data.smiles())
+        self.assertEqual(packed_data.targets(), csv_data.targets())
+        if csv_data.features() is not None:
+            np.testing.assert_allclose(np.array(packed_data.features()), np.array(csv_data.features()), rtol=1e-6)
+
+    def test_features(self):
+        """The packed features are those of the features file"""
+        data_path = os.path.join(TEST_DATA_DIR, 'regression.csv')
+        features_path = [os.path.join(TEST_DATA_DIR, 'regression.npz')]
+        self.pack(data_path, ['--features_path', *features_path])
+
+        self.assertTrue(is_packed_dataset(self.packed_path))
+        self.assertFalse(is_packed_dataset(data_path))
+        self.assertEqual(get_header(self.packed_path), get_header(data_path))
+        self.assert_same_data(get_data(self.packed_path, features_path=features_path),
+                              get_data(data_path, features_path=features_path))
+
+        with self.assertRaises(ValueError):
+            get_data(self.packed_path)
+
+    def test_other_data_files(self):
+        """Data files other than those the dataset was compiled from warn that they are not read"""
+        data_path = os.path.join(TEST_DATA_DIR, 'regression.csv')
+        features_path = [os.path.join(TEST_DATA_DIR, 'regression.npz')]
+        self.pack(data_path, ['--features_path', *features_path])
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            get_data(self.packed_path, features_path=[os.path.relpath(features_path[0])])
+        with self.assertWarns(UserWarning):
+            get_data(self.packed_path, features_path=[os.path.join(TEST_DATA_DIR, 'regression.csv')])
+
+    def test_featurized_graphs(self):
+        """Training uses the featurized graphs of a packed dataset unless another graph store is given"""
+        try:
+            self.pack(os.path.join(TEST_DATA_DIR, 'regression.csv'), ['--featurize_graphs'])
+            set_graph_store(None)
+            get_data(self.packed_path)
+            self.assertIsNone(graph_store())
+
+            args = TrainArgs().parse_args(['--data_path', self.packed_path, '--dataset_type', 'regression'])
+            self.assertEqual(args.graph_store_path, os.path.join(self.packed_path, 'graphs'))
+            self.assertIsNotNone(graph_store())
+
+            other_path = os.path.join(self.temp_dir.name, 'graphs')
+            args = TrainArgs().parse_args(['--data_path', self.packed_path, '--dataset_type', 'regression',
+                                           '--graph_store_path', other_path])
+            self.assertEqual(args.graph_store_path, other_path)
+        finally:
+            set_graph_store(None)
+            set_cache_graph(True)
+
+    def test_invalid_smiles_and_missing_targets(self):
+        """Invalid SMILES and datapoints without targets are skipped as when loading the CSV file"""
+        data_path = os.path.join(self.temp_dir.name, 'data.csv')
+        with open(data_path, 'w') as f:
+            f.write('smiles,a,b\nCCO,1.5,\nX,2,3\nC,,nan\nc1ccccc1O,-1,0.5\n')
+        self.pack(data_path, ['--features_generator', 'morgan'])
+
+        for skip_none_targets in [False, True]:
+            for target_columns in [None, ['b']]:
+                kwargs = dict(features_generator=['morgan'], target_columns=target_columns,
+                              skip_none_targets=skip_none_targets)
+                self.assert_same_data(get_data(self.packed_path, **kwargs), get_data(data_path, **kwargs))
+
+        self.assertEqual(len(get_data(self.packed_path, skip_invalid_smiles=False, features_generator=['morgan'])), 4)
+        self.assertEqual(get_task_names(self.packed_path, ignore_columns=['a']), ['b'])
+
+    def test_inequalities(self):
+        """Inequality targets require the bounded_mse loss function"""
+        data_path = os.path.join(TEST_DATA_DIR, 'regression_inequality.csv')
+        self.pack(data_path)
+
+        with self.assertRaises(ValueError):
+            get_data(self.packed_path)
+
+        packed_data = get_data(self.packed_path, loss_function='bounded_mse')
+        csv_data = get_data(data_path, loss_function='bounded_mse')
+        self.assert_same_data(packed_data, csv_data)
+        self.assertEqual(packed_data.gt_targets(), csv_data.gt_targets())
+        self.assertEqual(packed_data.lt_targets(), csv_data.lt_targets())
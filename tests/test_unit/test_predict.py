@@ -0,0 +1,117 @@
+"""Chemprop unit tests for chemprop/train/predict.py"""
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+import torch
+
+from chemprop.features import BatchMolGraph
+from chemprop.train import predict
+from chemprop.train.predict import frozen_embeddings, predict_dropout, predict_ensemble
+from chemprop.utils import load_quantized_checkpoint, quantize_model, save_checkpoint
+from model_utils import SMILES, make_args, make_data_loader, make_model, make_model_and_loader
+
+
+class TestPredictEnsemble(TestCase):
+    """
+    Tests that the fused and stacked ensemble predictions match the predictions of each model.
+    """
+
+    def setUp(self):
+        args = make_args()
+        self.models = [make_model(args, seed) for seed in range(3)]
+        _, self.data_loader = make_data_loader()
+        self.scalers = [(None, None, None, None, None)] * len(self.models)
+
+    def test_fused(self):
+        """The fused pass gives the predictions of each model"""
+        preds = predict_ensemble(self.models, self.scalers, self.data_loader)
+        for model, model_preds in zip(self.models, preds):
+            self.assertEqual(model_preds, predict(model, self.data_loader))
+
+    def test_stacked(self):
+        """The stacked pass gives the predictions of each model"""
+        preds = predict_ensemble(self.models, self.scalers, self.data_loader, stack=True)
+        for model, model_preds in zip(self.models, preds):
+            np.testing.assert_allclose(model_preds, predict(model, self.data_loader), atol=1e-6)
+
+
+class TestPredictDropout(TestCase):
+    """
+    Tests the moments of the Monte Carlo dropout predictions.
+    """
+
+    def setUp(self):
+        _, self.model, _, self.data_loader = make_model_and_loader()
+
+    def test_no_dropout(self):
+        """Without dropout, the mean is the prediction and the variance is zero"""
+        expected = predict(self.model, self.data_loader)
+        means, variances = predict_dropout(self.model, self.data_loader, sampling_size=4, dropout_prob=0.0)
+        np.testing.assert_allclose(means, expected, atol=1e-6)
+        np.testing.assert_allclose(variances, np.zeros_like(expected), atol=1e-10)
+
+    def test_dropout(self):
+        """With dropout, the samples differ while the batch graph and the input layer are computed once per batch"""
+        input_layer = self.model.encoder.encoder[0].W_i
+        with patch('chemprop.data.data.BatchMolGraph', wraps=BatchMolGraph) as batch_graph, \
+                patch.object(input_layer, 'forward', wraps=input_layer.forward) as input_forward:
+            means, variances = predict_dropout(self.model, self.data_loader, sampling_size=4, dropout_prob=0.5)
+        self.assertEqual(batch_graph.call_count, len(self.data_loader))
+        self.assertEqual(input_forward.call_count, len(self.data_loader))
+        self.assertIs(self.model.encoder.encoder[0].W_i, input_layer)
+        self.assertEqual(np.shape(means), (len(SMILES), 2))
+        self.assertEqual(np.shape(variances), (len(SMILES), 2))
+        self.assertTrue(np.all(np.array(variances) > 0))
+
+
+class TestFrozenEmbeddings(TestCase):
+    """
+    Tests that predicting from cached frozen embeddings matches predicting from the molecules.
+    """
+
+    def test_frozen_embeddings(self):
+        """Predictions from the cached embeddings match those from the graphs"""
+        for frzn_ffn_layers in ['0', '1']:
+            with self.subTest(frzn_ffn_layers=frzn_ffn_layers):
+                _, model, data, data_loader = make_model_and_loader([
+                    '--ffn_num_layers', '3',
+                    '--checkpoint_frzn', 'frozen.pt',
+                    '--frzn_ffn_layers', frzn_ffn_layers,
+                    '--cache_frozen_embeddings',
+                ])
+                expected = predict(model, data_loader)
+
+                with TemporaryDirectory() as temp_dir:
+                    embeddings = frozen_embeddings(model, data_loader, os.path.join(temp_dir, 'embeddings.npy'))
+                    self.assertEqual(embeddings.shape, (len(SMILES), 20 if frzn_ffn_layers == '0' else 10))
+                    data.set_embeddings(embeddings)
+                    np.testing.assert_allclose(predict(model, data_loader), expected, atol=1e-6)
+                    data.set_embeddings(None)
+
+
+class TestQuantization(TestCase):
+    """
+    Tests the dynamically quantized models.
+    """
+
+    def setUp(self):
+        self.args, self.model, _, self.data_loader = make_model_and_loader(['--no_cuda'])
+
+    def test_quantize_model(self):
+        """The quantized model gives approximately the predictions of the float model"""
+        expected = predict(self.model, self.data_loader)
+        quantized = quantize_model(self.model)
+        self.assertIsInstance(quantized.readout[1], torch.nn.quantized.dynamic.Linear)
+        np.testing.assert_allclose(predict(quantized, self.data_loader), expected, atol=1e-1)
+
+    def test_cached_checkpoint(self):
+        """The cached quantized model gives the predictions of the quantized model"""
+        with TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'model.pt')
+            save_checkpoint(path, self.model, None, None, None, None, None, self.args)
+            preds = predict(load_quantized_checkpoint(path), self.data_loader)
+            self.assertTrue(os.path.exists(path + '.int8'))
+            self.assertEqual(predict(load_quantized_checkpoint(path), self.data_loader), preds)
@@ -0,0 +1,91 @@
+"""Chemprop unit tests for the batch samplers in chemprop/data/data.py"""
+from unittest import TestCase
+from unittest.mock import patch
+
+from chemprop.data import DistributedMoleculeSampler, MoleculeDataLoader, MoleculeDatapoint, MoleculeDataset, \
+    MoleculeSampler, MoleculeSizeBatchSampler, empty_cache
+from chemprop.features import MolGraph
+
+
+SMILES = ['C', 'CC', 'CCC', 'CCCC', 'CCCCC', 'CCCCCC', 'CCCCCCC', 'CCCCCCCC', 'c1ccccc1', 'c1ccccc1CCCCCCCC']
+
+
+class TestMoleculeSizeBatchSampler(TestCase):
+    """
+    Tests of batching molecules by size.
+    """
+
+    def setUp(self):
+        empty_cache()
+        self.dataset = MoleculeDataset([MoleculeDatapoint([s], targets=[0.0]) for s in SMILES])
+
+    def tearDown(self):
+        empty_cache()
+
+    def test_sizes(self):
+        """Molecule sizes match their graphs without building RDKit molecules or reparsing cached graphs"""
+        expected = [MolGraph(s).n_atoms for s in SMILES]
+        with patch('chemprop.data.data.make_mol') as make_mol:
+            sampler = MoleculeSizeBatchSampler(self.dataset, batch_size=2)
+        make_mol.assert_not_called()
+        self.assertEqual(sampler.num_atoms.tolist(), expected)
+
+        self.dataset.batch_graph()
+        with patch('chemprop.data.data.Chem.MolFromSmiles') as mol_from_smiles:
+            sampler = MoleculeSizeBatchSampler(self.dataset, batch_size=2)
+        mol_from_smiles.assert_not_called()
+        self.assertEqual(sampler.num_atoms.tolist(), expected)
+
+    def test_buckets(self):
+        """Batches hold molecules of the same bucket and cover the dataset once"""
+        sampler = MoleculeSizeBatchSampler(self.dataset, batch_size=2, num_buckets=2, shuffle=True, seed=1)
+        small, large = set(sampler.buckets[0]), set(sampler.buckets[1])
+        self.assertEqual(small, {0, 1, 2, 3, 4})
+        for _ in range(3):
+            batches = list(sampler)
+            self.assertEqual(sorted(i for batch in batches for i in batch), list(range(len(SMILES))))
+            for batch in batches:
+                self.assertTrue(set(batch) <= small or set(batch) <= large)
+
+    def test_batch_atoms(self):
+        """Batches stay within the atom budget unless a single molecule exceeds it"""
+        sampler = MoleculeSizeBatchSampler(self.dataset, batch_atoms=10, num_buckets=1, shuffle=True)
+        num_batches = len(sampler)
+        batches = list(sampler)
+        self.assertEqual(len(batches), num_batches)
+        self.assertEqual(sorted(i for batch in batches for i in batch), list(range(len(SMILES))))
+        for batch in batches:
+            self.assertTrue(len(batch) == 1 or sum(sampler.num_atoms[i] for i in batch) <= 10)
+
+    def test_data_loader(self):
+        """The data loader collates size batches and refuses to report targets in dataset order"""
+        loader = MoleculeDataLoader(self.dataset, batch_size=3, size_buckets=2, num_workers=0)
+        self.assertEqual(sum(len(batch) for batch in loader), len(SMILES))
+        with self.assertRaises(ValueError):
+            loader.targets
+
+
+class TestDistributedMoleculeSampler(TestCase):
+    """
+    Tests of sharding samplers across the processes of distributed training.
+    """
+
+    def setUp(self):
+        self.dataset = MoleculeDataset([MoleculeDatapoint([s], targets=[0.0]) for s in SMILES])
+
+    def test_shards(self):
+        """The shards have equal lengths and together cover the epoch of the sampler"""
+        shards = [list(DistributedMoleculeSampler(MoleculeSampler(self.dataset, shuffle=True, seed=3),
+                                                  num_replicas=4, rank=rank)) for rank in range(4)]
+        self.assertEqual([len(shard) for shard in shards], [3] * 4)
+        epoch = list(MoleculeSampler(self.dataset, shuffle=True, seed=3))
+        self.assertEqual([shards[i % 4][i // 4] for i in range(len(epoch))], epoch)
+
+    def test_size_batches(self):
+        """Batches of molecules of similar sizes are sharded as whole batches"""
+        loaders = [MoleculeDataLoader(self.dataset, batch_atoms=10, size_buckets=2, shuffle=True, num_workers=0,
+                                      num_replicas=2, rank=rank) for rank in range(2)]
+        for _ in range(2):
+            self.assertEqual(len(loaders[0]), len(loaders[1]))
+            batches = [batch.smiles() for loader in loaders for batch in loader]
+            self.assertEqual({s for batch in batches for s, in batch}, set(SMILES))
@@ -0,0 +1,57 @@
+"""Chemprop unit tests for chemprop/data/targets.py"""
+from unittest import TestCase
+
+import numpy as np
+import torch
+
+from chemprop.data import MoleculeDataLoader, MoleculeDatapoint, MoleculeDataset, TargetArrays
+
+
+class TestTargetArrays(TestCase):
+    """
+    Tests of the dataset-level target arrays.
+    """
+
+    def test_molecule_targets(self):
+        """Missing targets are masked and set to zero"""
+        arrays = TargetArrays(targets=[[1.0, None], [None, 2.5], [3.0, 4.0]], data_weights=[1.0, 0.5, 2.0],
+                              lt_targets=[[False, True], [False, False], [True, False]])
+        batch = arrays.batch([2, 0])
+        self.assertTrue(batch['targets'].equal(torch.tensor([[3.0, 4.0], [1.0, 0.0]])))
+        self.assertTrue(batch['mask'].equal(torch.tensor([[True, True], [True, False]])))
+        self.assertTrue(batch['data_weights'].equal(torch.tensor([[2.0], [1.0]])))
+        self.assertTrue(batch['lt_targets'].equal(torch.tensor([[True, False], [False, True]])))
+        self.assertIsNone(batch['gt_targets'])
+        self.assertEqual(batch['targets'].dtype, torch.float32)
+
+    def test_atom_bond_targets(self):
+        """Ragged atomic/bond targets are taken per molecule and flattened"""
+        targets = [
+            [[1.0, 2.0], [10.0]],
+            [[3.0, None, 5.0], [20.0, 30.0]],
+            [[6.0], []],
+        ]
+        arrays = TargetArrays(targets=targets, data_weights=[1.0, 2.0, 3.0], is_atom_bond_targets=True)
+        np.testing.assert_array_equal(arrays.offsets[0], [0, 2, 5, 6])
+        batch = arrays.batch([2, 1])
+        self.assertTrue(batch['targets'][0].equal(torch.tensor([6.0, 3.0, 0.0, 5.0])))
+        self.assertTrue(batch['mask'][0].equal(torch.tensor([True, True, False, True])))
+        self.assertTrue(batch['data_weights'][0].equal(torch.tensor([[3.0], [2.0], [2.0], [2.0]])))
+        self.assertTrue(batch['targets'][1].equal(torch.tensor([20.0, 30.0])))
+        self.assertTrue(batch['data_weights'][1].equal(torch.tensor([[2.0], [2.0]])))
+
+    def test_data_loader(self):
+        """Batches sliced from the dataset arrays match the arrays built from the batch datapoints"""
+        dataset = MoleculeDataset([MoleculeDatapoint(['C' * (i + 1)], targets=[float(i), None if i % 2 else 1.0])
+                                   for i in range(7)])
+        loader = MoleculeDataLoader(dataset, batch_size=3, shuffle=True, num_workers=0)
+        self.assertIs(loader.dataset, dataset)
+        loader.precompute_targets()
+        for batch in loader:
+            sliced = batch.target_tensors()
+            expected = MoleculeDataset(batch[:]).target_tensors()
+            for key in ['targets', 'mask', 'data_weights']:
+                self.assertTrue(sliced[key].equal(expected[key]))
+
+        dataset.set_targets([[0.0, 0.0]] * len(dataset))
+        self.assertTrue(dataset.target_tensors()['mask'].all())